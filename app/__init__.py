@@ -1,4 +1,8 @@
-from flask import Flask
+from flask import Flask, g, request
+from app.agent.admission import BROWSER_COOKIE, BROWSER_TOKEN, new_browser_token
+from app.database.catalog import catalog
+from app.database.values import dictionary
+from app.utils import tracing
 from config import settings
 
 
@@ -14,7 +18,65 @@ def create_app() -> Flask:
 
     # Register blueprints
     from app.routes.chat import chat_bp
+    from app.routes.conversations import conversations_bp
+    from app.routes.jobs import jobs_bp
+    from app.routes.pins import pins_bp
+    from app.routes.profiles import profiles_bp
+    from app.routes.results import results_bp
     app.register_blueprint(chat_bp)
+    app.register_blueprint(conversations_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(pins_bp)
+    app.register_blueprint(profiles_bp)
+    app.register_blueprint(results_bp)
+
+    # Trace API requests; clients get the trace ID in X-Trace-Id
+    @app.before_request
+    def start_trace():
+        if request.path.startswith("/api/"):
+            route = request.url_rule.rule if request.url_rule else request.path
+            g.trace = tracing.start_span(
+                f"{request.method} {route}", traceparent=request.headers.get("traceparent"),
+                **{"http.method": request.method, "http.route": route}
+            )
+            tracing.activate(g.trace)
+
+    @app.after_request
+    def trace_header(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.set_attribute("http.status_code", response.status_code)
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
+    # Anonymous browsers are named by a random token (see owner_key); the
+    # chat page's first load sets it, before any conversation is saved
+    @app.after_request
+    def browser_cookie(response):
+        if not BROWSER_TOKEN.fullmatch(request.cookies.get(BROWSER_COOKIE, "")):
+            response.set_cookie(
+                BROWSER_COOKIE, new_browser_token(), max_age=365 * 24 * 3600,
+                httponly=True, samesite="Lax", secure=request.is_secure
+            )
+        return response
+
+    @app.teardown_request
+    def end_trace(error):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            if error is not None:
+                trace.fail(error)
+            tracing.activate(None)
+            trace.end()
+
+    # Live column metadata for the SQL validator, from the disk cache (no network)
+    catalog.load()
+    # Keyword, brand and seller values resolved from questions, also from disk
+    dictionary.load()
+
+    # Keep pinned answers fresh in the background (after the fork, when preloaded)
+    if not settings.preload_app:
+        start_background_tasks()
 
     # Register main routes
     @app.route("/")
@@ -28,4 +90,27 @@ def create_app() -> Flask:
         """Health check endpoint."""
         return {"status": "ok"}
 
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus metrics for this worker process, or for all of them (METRICS_SHARED)."""
+        from app.utils.metrics import CONTENT_TYPE, registry
+        return registry.render(), 200, {"Content-Type": CONTENT_TYPE}
+
     return app
+
+
+def start_background_tasks():
+    """Start the process's background threads (gunicorn.conf.py calls this in each worker)."""
+    from app.routes.chat import agent
+    from app.routes.pins import scheduler
+    if settings.pin_scheduler_enabled:
+        scheduler.start()
+    # A replayed session has no warehouse to refresh from; the disk caches serve it
+    replaying = settings.replay_mode == "replay"
+    if settings.schema_refresh_enabled and not replaying:
+        catalog.start(agent.db)
+    if settings.value_refresh_enabled and not replaying:
+        dictionary.start(agent.db)
+    if settings.metrics_shared:
+        from app.utils.metrics import registry
+        registry.share(settings.metrics_file, settings.metrics_publish_seconds)
@@ -0,0 +1,404 @@
+"""Admission control: global and per-user limits on questions in flight."""
+
+import asyncio
+import hashlib
+import logging
+import re
+import secrets
+import threading
+import time
+
+from app.utils import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Error for a question that waited its whole timeout without a slot
+TIMED_OUT = "Timed out waiting for capacity"
+
+# Cookie holding the random token that names an anonymous browser (see owner_key)
+BROWSER_COOKIE = "umip_browser"
+BROWSER_TOKEN = re.compile(r"[A-Za-z0-9_-]{43}")
+
+# Ticket states
+WAITING, ADMITTED, RELEASED, CANCELLED, EXPIRED = (
+    "waiting", "admitted", "released", "cancelled", "expired"
+)
+
+
+class Rejected(Exception):
+    """
+    Raised when a question is shed instead of queued.
+
+    Attributes:
+        status: HTTP status (429 for a user over their limit, 503 when the queue is full)
+        retry_after: Suggested seconds before retrying
+    """
+
+    def __init__(self, status: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionTimeout(TimeoutError):
+    """Raised when a queued question is not admitted within its timeout."""
+
+
+class Ticket:
+    """
+    One question's claim on a slot: waiting in the queue, then admitted
+    until released.
+
+    Subscribers are called with the ticket whenever its state or queue
+    position changes (from whichever thread made the change).
+
+    A ticket of ``weight`` n takes n slots, for a request that answers n
+    questions at once (see /api/chat/batch).
+    """
+
+    def __init__(self, controller: "AdmissionController", user: str, expires_at: float, weight: int = 1):
+        self.controller = controller
+        self.user = user
+        self.expires_at = expires_at
+        self.weight = weight
+        self.created_at = time.monotonic()
+        self.state = WAITING
+        self.position = 0
+        self._admitted = threading.Event()
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call ``callback(ticket)`` on every change, starting with the current state."""
+        with self.controller._lock:
+            self._subscribers.append(callback)
+        callback(self)
+
+    def wait(self, timeout: float) -> bool:
+        """Block until admitted; on timeout leave the queue and return False."""
+        if self._admitted.wait(timeout):
+            return True
+        return not self.controller.cancel(self, expired=True) and self.state == ADMITTED
+
+    async def events(self):
+        """
+        Yield a status event for each queue position until admitted.
+
+        Raises:
+            AdmissionTimeout: If the ticket expired (or was cancelled) while queued
+        """
+        loop = asyncio.get_running_loop()
+        changes: asyncio.Queue = asyncio.Queue()
+        self.subscribe(lambda ticket: loop.call_soon_threadsafe(changes.put_nowait, ticket.state))
+        while True:
+            try:
+                state = await asyncio.wait_for(changes.get(), max(0.0, self.expires_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.controller.cancel(self, expired=True)
+                state = self.state
+            if state == ADMITTED:
+                return
+            if state != WAITING:
+                raise AdmissionTimeout(TIMED_OUT)
+            if self.position:
+                yield queue_status(self.position)
+
+    def release(self):
+        self.controller.release(self)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("Admission subscriber failed")
+
+
+def queue_status(position: int) -> dict:
+    """Status event (ask_stream protocol) for a question waiting in the queue."""
+    return {
+        "type": "status",
+        "content": f"Waiting for capacity ({position} in queue)...",
+        "queue_position": position,
+    }
+
+
+class AdmissionController:
+    """
+    Bounds the questions answered at once, overall and per user.
+
+    A question is admitted straight away while both limits have room.
+    Otherwise it waits in a bounded FIFO queue; a waiting question whose
+    user is at their limit lets later questions from other users go first.
+    Over-eager users are shed with 429 and a full queue with 503, before
+    any LLM or warehouse work starts.
+
+    Limits are per process (each gunicorn or uvicorn worker has its own).
+
+    Args:
+        max_concurrent: Questions answered at once
+        max_per_user: Questions answered at once for one user
+        queue_size: Questions allowed to wait for a slot
+        max_queued_per_user: Questions one user may have waiting
+    """
+
+    # Upper bounds of the wait-time histogram, in seconds
+    WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+    # Suggested client back-off, in seconds
+    RETRY_AFTER_USER = 2
+    RETRY_AFTER_FULL = 5
+
+    def __init__(self, max_concurrent: int, max_per_user: int, queue_size: int, max_queued_per_user: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self._lock = threading.Lock()
+        self._running: dict[str, int] = {}
+        self._waiting: list[Ticket] = []
+        self._counters = {"admitted": 0, "rejected_user_limit": 0, "rejected_queue_full": 0,
+                          "expired": 0, "cancelled": 0}
+        self._wait_buckets = [0] * (len(self.WAIT_BUCKETS) + 1)
+        self._wait_sum = 0.0
+
+    def request(self, user: str, timeout: float, weight: int = 1) -> Ticket:
+        """
+        Claim a slot for one question, queueing it if none is free.
+
+        Args:
+            user: Who is asking (see user_key)
+            timeout: Seconds the question may wait in the queue
+            weight: Slots to claim, for questions answered together; capped
+                at the per-user and global limits (read it back from the ticket)
+
+        Raises:
+            Rejected: If the user or the queue is at its limit
+        """
+        weight = max(1, min(weight, self.max_per_user, self.max_concurrent))
+        ticket = Ticket(self, user, time.monotonic() + timeout, weight)
+        with self._lock:
+            changed = self._expire()
+            running = self._running.get(user, 0)
+            queued = sum(1 for t in self._waiting if t.user == user)
+            # Questions that can start now are never shed, whatever the queue holds
+            admissible = (sum(self._running.values()) + weight <= self.max_concurrent
+                          and running + weight <= self.max_per_user)
+            rejected = None
+            if not admissible and running + weight > self.max_per_user and queued >= self.max_queued_per_user:
+                self._counters["rejected_user_limit"] += 1
+                rejected = Rejected(
+                    429, f"Too many questions in flight (limit {self.max_per_user} at a time)",
+                    self.RETRY_AFTER_USER
+                )
+            elif not admissible and len(self._waiting) >= self.queue_size:
+                self._counters["rejected_queue_full"] += 1
+                rejected = Rejected(503, "Server is at capacity, try again shortly", self.RETRY_AFTER_FULL)
+            if rejected is None:
+                self._waiting.append(ticket)
+                changed += self._dispatch()
+        self._notify(changed)
+        if rejected:
+            logger.warning("Admission rejected for %s: %s", user, rejected)
+            raise rejected
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free an admitted ticket's slot (or drop it from the queue)."""
+        with self._lock:
+            if ticket.state == ADMITTED:
+                ticket.state = RELEASED
+                self._running[ticket.user] -= ticket.weight
+                if not self._running[ticket.user]:
+                    del self._running[ticket.user]
+                changed = self._dispatch()
+            elif ticket.state == WAITING:
+                changed = self._remove(ticket, CANCELLED)
+            else:
+                return
+        self._notify(changed)
+
+    def cancel(self, ticket: Ticket, expired: bool = False) -> bool:
+        """Leave the queue (timed out if ``expired``); False if the ticket is no longer waiting."""
+        with self._lock:
+            if ticket.state != WAITING:
+                return False
+            changed = self._remove(ticket, EXPIRED if expired else CANCELLED)
+        self._notify(changed)
+        return True
+
+    def stats(self) -> dict:
+        """Queue depth, slots in use, wait times and shedding counts."""
+        with self._lock:
+            buckets, cumulative = {}, 0
+            for bound, count in zip(self.WAIT_BUCKETS + ("+Inf",), self._wait_buckets):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "running": sum(self._running.values()),
+                "queued": len(self._waiting),
+                "users_running": len(self._running),
+                "limits": {
+                    "max_concurrent": self.max_concurrent,
+                    "max_per_user": self.max_per_user,
+                    "queue_size": self.queue_size,
+                    "max_queued_per_user": self.max_queued_per_user,
+                },
+                **{f"{name}_total": count for name, count in self._counters.items()},
+                "wait_seconds": {
+                    "count": cumulative,
+                    "sum": round(self._wait_sum, 3),
+                    "buckets": buckets,
+                },
+            }
+
+    def collect(self) -> list:
+        """Queue depth, slots in use and shedding counts (see Registry.add_collector)."""
+        stats = self.stats()
+        return [
+            ("umip_admission_running", "gauge", "Questions being answered.",
+             [({}, stats["running"])]),
+            ("umip_admission_queued", "gauge", "Questions waiting for a slot.",
+             [({}, stats["queued"])]),
+            ("umip_admission_admitted_total", "counter", "Questions admitted.",
+             [({}, stats["admitted_total"])]),
+            ("umip_admission_rejected_total", "counter", "Questions shed, by reason.", [
+                ({"reason": "user_limit"}, stats["rejected_user_limit_total"]),
+                ({"reason": "queue_full"}, stats["rejected_queue_full_total"]),
+            ]),
+            ("umip_admission_abandoned_total", "counter", "Queued questions that left without a slot.", [
+                ({"reason": "expired"}, stats["expired_total"]),
+                ({"reason": "cancelled"}, stats["cancelled_total"]),
+            ]),
+        ]
+
+    def _dispatch(self) -> list[Ticket]:
+        """Admit waiting tickets in order while slots are free (lock held)."""
+        changed = []
+        for ticket in list(self._waiting):
+            if sum(self._running.values()) + ticket.weight > self.max_concurrent:
+                break
+            if self._running.get(ticket.user, 0) + ticket.weight > self.max_per_user:
+                continue
+            self._waiting.remove(ticket)
+            ticket.state = ADMITTED
+            ticket.position = 0
+            self._running[ticket.user] = self._running.get(ticket.user, 0) + ticket.weight
+            self._counters["admitted"] += 1
+            self._observe_wait(time.monotonic() - ticket.created_at)
+            changed.append(ticket)
+        return changed + self._renumber()
+
+    def _remove(self, ticket: Ticket, state: str) -> list[Ticket]:
+        self._waiting.remove(ticket)
+        ticket.state = state
+        self._counters["cancelled" if state == CANCELLED else "expired"] += 1
+        return [ticket] + self._dispatch()
+
+    def _expire(self) -> list[Ticket]:
+        now = time.monotonic()
+        changed = []
+        for ticket in [t for t in self._waiting if t.expires_at <= now]:
+            changed += self._remove(ticket, EXPIRED)
+        return changed
+
+    def _renumber(self) -> list[Ticket]:
+        changed = []
+        for position, ticket in enumerate(self._waiting, 1):
+            if ticket.position != position:
+                ticket.position = position
+                changed.append(ticket)
+        return changed
+
+    def _observe_wait(self, seconds: float):
+        metrics.ADMISSION_WAIT.observe(seconds)
+        self._wait_sum += seconds
+        for i, bound in enumerate(self.WAIT_BUCKETS):
+            if seconds <= bound:
+                self._wait_buckets[i] += 1
+                return
+        self._wait_buckets[-1] += 1
+
+    @staticmethod
+    def _notify(changed: list[Ticket]):
+        for ticket in dict.fromkeys(changed):
+            if ticket.state == ADMITTED:
+                ticket._admitted.set()
+            ticket._notify()
+
+
+def authenticated_user(headers: dict, client: str | None) -> str | None:
+    """
+    The user a trusted front end named, or None.
+
+    Sf-Context-Current-User counts with SNOWFLAKE_INGRESS (the Snowpark
+    Container Services ingress sets it and nothing else reaches the app) or
+    from one of TRUSTED_PROXIES; X-User-Id counts only from TRUSTED_PROXIES.
+    A client that reaches the app directly can send either header, so
+    otherwise neither names anyone.
+
+    Args:
+        headers: Request headers with lower-case names
+        client: Client address, if known
+    """
+    proxied = client in settings.trusted_proxies
+    user = headers.get("sf-context-current-user")
+    if user and (settings.snowflake_ingress or proxied):
+        return user
+    if proxied and headers.get("x-user-id"):
+        return headers.get("x-user-id")
+    return None
+
+
+def user_key(headers: dict, client: str | None) -> str:
+    """
+    Who is asking, for per-user limits: the authenticated user (see
+    authenticated_user), else the client address. Identity headers a client
+    sets itself are ignored, since rotating them would get fresh limits.
+
+    Args:
+        headers: Request headers with lower-case names
+        client: Client address, if known
+    """
+    return authenticated_user(headers, client) or client or "anonymous"
+
+
+def new_browser_token() -> str:
+    """A fresh BROWSER_COOKIE value."""
+    return secrets.token_urlsafe(32)
+
+
+def owner_key(headers: dict, client: str | None, browser_token: str | None) -> str | None:
+    """
+    Who owns saved conversations and a conversation's results.
+
+    The authenticated user (see authenticated_user), else the browser, by a
+    hash of the random token in its BROWSER_COOKIE cookie; None if there is
+    neither. Never the client address, which everyone behind one NAT (or on
+    localhost) shares, and never a header the client picks.
+
+    Args:
+        headers: Request headers with lower-case names
+        client: Client address, if known
+        browser_token: BROWSER_COOKIE value sent with the request
+    """
+    user = authenticated_user(headers, client)
+    if user:
+        return user
+    if browser_token and BROWSER_TOKEN.fullmatch(browser_token):
+        return "browser:" + hashlib.sha256(browser_token.encode()).hexdigest()
+    return None
+
+
+def conversation_key(owner: str | None, conversation_id) -> str | None:
+    """
+    Key of a caller's conversation in the agent's memory and LAST_RESULT tables.
+
+    Conversation ids come from the client, so they are scoped by owner (see
+    owner_key): another caller sending the same id gets a context of its
+    own. Without an owner or an id the question has no shared context.
+    """
+    if not owner or not conversation_id:
+        return None
+    return f"{owner}/{conversation_id}"
@@ -0,0 +1,154 @@
+"""Async SQL agent for the ASGI streaming path."""
+
+import asyncio
+import time
+
+from app.agent.sql_agent import Execute, NextToken, SQLAgent, Speculate, Stream
+from app.utils import metrics, tracing
+from app.utils.deadline import Deadline
+from app.utils.recording import build_async_clients
+from config import settings
+
+
+class AsyncSQLAgent:
+    """
+    Awaitable counterpart of SQLAgent.ask_stream.
+
+    Drives the same pipeline as SQLAgent.ask_stream (see
+    SQLAgent._stream_pipeline), but the LLM stream and the warehouse query
+    are awaited and blocking work runs in threads, so one worker can hold
+    thousands of open chat streams. Prompts, parsing, fast-path answers,
+    routing, conversation memory and local result tables are shared with
+    the wrapped synchronous agent, so both paths see the same conversations.
+
+    Args:
+        agent: Synchronous agent to share state with
+        llm: Async LLM client (defaults per REPLAY_MODE, see app.utils.recording)
+        db: Async database client (defaults per REPLAY_MODE)
+    """
+
+    def __init__(self, agent: SQLAgent, llm=None, db=None):
+        if llm is None or db is None:
+            default_llm, default_db = build_async_clients(
+                settings.replay_mode, settings.replay_fixture, settings.replay_realtime,
+                agent.llm, agent.db
+            )
+            llm = llm or default_llm
+            db = db or default_db
+        self.agent = agent
+        self.llm = llm
+        self.db = db
+
+    async def ask_stream(
+        self,
+        question: str,
+        llm_summary: bool = False,
+        conversation_id: str | None = None,
+        deadline: Deadline | None = None,
+        approximate: bool = False
+    ):
+        """Process a question, yielding SQLAgent.ask_stream events as they happen."""
+        pipeline = self.agent._stream_pipeline(
+            question, llm_summary, conversation_id, deadline, approximate
+        )
+        events = self._drive(pipeline)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def _drive(self, pipeline):
+        """Run a stream pipeline (see SQLAgent._stream_pipeline), awaiting its steps."""
+        agent = self.agent
+        reply, error = None, None
+        try:
+            while True:
+                try:
+                    step = pipeline.throw(error) if error else pipeline.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(step, dict):
+                    yield step
+                    continue
+                try:
+                    if isinstance(step, Stream):
+                        tokens = self.llm.generate_stream(
+                            step.prompt, agent.system_prompt, step.history,
+                            model_key=step.model_key, timeout=step.timeout
+                        )
+                        reply = self._timed_stream(step.phase, step.model_key, tokens)
+                    elif isinstance(step, NextToken):
+                        reply = await anext(step.stream, None)
+                    elif isinstance(step, Speculate):
+                        reply = await self._generate_speculative(
+                            step.prompt, step.history, step.conversation_id, step.model_key, step.timeout
+                        )
+                    elif isinstance(step, Execute):
+                        reply = await self._execute(step.sql, step.conversation_id, step.timeout)
+                    else:
+                        reply = await asyncio.to_thread(step.fn, *step.args)
+                except Exception as e:
+                    error = e
+        finally:
+            pipeline.close()
+
+    async def _timed_stream(self, phase: str, model_key: str | None, stream):
+        """Async counterpart of SQLAgent._timed_stream."""
+        model = self.agent.model_label(model_key)
+        start = time.perf_counter()
+        first = True
+        with tracing.span(f"llm.{phase}", model=model) as span:
+            try:
+                async for token in stream:
+                    if first:
+                        metrics.LLM_FIRST_TOKEN.observe(time.perf_counter() - start, model=model, phase=phase)
+                        span.add_event("first_token")
+                        first = False
+                    yield token
+            finally:
+                metrics.LLM_GENERATION.observe(time.perf_counter() - start, model=model, phase=phase)
+
+    async def _generate_speculative(
+        self,
+        prompt: str,
+        history: list[dict] | None,
+        conversation_id: str | None,
+        model_key: str | None,
+        timeout: float
+    ) -> str:
+        """Draft candidates concurrently; selection is shared with SQLAgent."""
+        agent = self.agent
+        count = settings.speculative_candidates
+        temperatures = [round(i / (count - 1), 2) for i in range(count)]
+        start = time.perf_counter()
+
+        drafts = await asyncio.gather(
+            *(
+                self.llm.generate(prompt, agent.system_prompt, history, t, model_key, timeout)
+                for t in temperatures
+            ),
+            return_exceptions=True
+        )
+        responses = [d for d in drafts if not isinstance(d, BaseException)]
+        # Candidate checks call EXPLAIN; keep them off the event loop
+        return await asyncio.to_thread(agent._pick_candidate, responses, conversation_id, start)
+
+    async def _execute(self, sql: str, conversation_id: str | None, timeout: float) -> list[dict]:
+        """Async counterpart of SQLAgent._execute."""
+        agent = self.agent
+        source = agent._query_source(sql, conversation_id)
+
+        start = time.perf_counter()
+        with tracing.span("sql.execute", source=source) as span:
+            if source == "local":
+                results = await asyncio.to_thread(agent.local.execute_query, conversation_id, sql)
+            else:
+                results = await self.db.execute_query(sql, timeout=timeout)
+            span.set_attribute("rows", len(results))
+        # Storing the result builds a DataFrame; keep it off the event loop
+        await asyncio.to_thread(
+            agent._record_execution, source, sql, results, time.perf_counter() - start, conversation_id
+        )
+        return results
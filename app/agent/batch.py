@@ -0,0 +1,169 @@
+"""Batch execution of many questions with bounded per-stage concurrency."""
+
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.utils import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# (generation, execution, summary) semaphores shared by every batch over an agent
+_gates: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_gates_lock = threading.Lock()
+
+
+class BatchRunner:
+    """
+    Runs a list of questions through generation, execution and summary.
+
+    Every question runs in its own worker, but each stage is gated by its
+    own semaphore (BATCH_*_CONCURRENCY settings). The semaphores belong to
+    the agent, so all batches running at once together never run more than
+    a few warehouse queries or LLM calls. All questions share the agent's
+    prompt cache, connection pool and result cache, so repeated SQL is
+    served without a warehouse trip.
+    """
+
+    # Upper bound on questions per batch
+    MAX_QUESTIONS = 100
+
+    def __init__(self, agent):
+        self.agent = agent
+        with _gates_lock:
+            gates = _gates.get(agent)
+            if gates is None:
+                gates = _gates[agent] = (
+                    threading.BoundedSemaphore(settings.batch_generation_concurrency),
+                    threading.BoundedSemaphore(settings.batch_execution_concurrency),
+                    threading.BoundedSemaphore(settings.batch_summary_concurrency),
+                )
+        self.generation, self.execution, self.summary = gates
+
+    def run(self, questions: list[str], llm_summary: bool = False, workers: int | None = None):
+        """
+        Answer all questions, yielding an event as each one completes.
+
+        Args:
+            questions: Questions to answer
+            llm_summary: Always summarize with the LLM, even for trivial results
+            workers: Questions answered at once (see workers_for); the
+                admission slots the batch holds
+
+        Yields:
+            {"type": "question_complete", "index": int, "completed": int,
+             "total": int, "result": {...}}
+            {"type": "batch_complete", "elapsed_ms": float, "results": [...]}
+        """
+        start = time.perf_counter()
+        results: list[dict | None] = [None] * len(questions)
+        workers = workers or self.workers_for(len(questions))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self._answer, question, llm_summary): index
+                for index, question in enumerate(questions)
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                results[index] = future.result()
+                yield {
+                    "type": "question_complete",
+                    "index": index,
+                    "completed": completed,
+                    "total": len(questions),
+                    "result": results[index]
+                }
+
+        yield {
+            "type": "batch_complete",
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "results": results
+        }
+
+    @staticmethod
+    def workers_for(count: int) -> int:
+        """Questions of a ``count``-question batch answered at once."""
+        return max(1, min(count, settings.batch_generation_concurrency * 2))
+
+    def _answer(self, question: str, llm_summary: bool) -> dict:
+        """Run one question through the three gated stages."""
+        agent = self.agent
+        start = time.perf_counter()
+        result = {"question": question, "answer": None, "sql": None, "data": None, "error": None}
+        route = agent.router.route(question)
+
+        try:
+            with self.generation:
+                response = agent.llm.generate(
+                    question, agent.system_prompt, model_key=route.model("sql")
+                )
+            sql = agent._extract_sql(response)
+
+            if not sql:
+                result["answer"] = response
+            elif not agent._is_safe_query(sql):
+                result.update(sql=sql, error="Query blocked: only SELECT statements allowed")
+            else:
+                result["sql"] = sql
+                prefix = ""
+                try:
+                    with self.execution:
+                        rows = agent._execute(sql, None)
+                except Exception as db_error:
+                    fixed = self._fix(question, sql, str(db_error), route)
+                    if fixed is None:
+                        result.update(
+                            answer=f"I generated a query but it failed: {db_error}", error=str(db_error)
+                        )
+                        rows = None
+                    else:
+                        sql, rows = fixed
+                        result["sql"] = sql
+                        prefix = "(Fixed query) "
+
+                if rows is not None:
+                    result["data"] = rows
+                    with self.summary:
+                        fast_path = agent._fast_answer(sql, rows, llm_summary)
+                        if fast_path:
+                            answer = fast_path["answer"]
+                        else:
+                            answer = agent._summarize_results(
+                                question, sql, rows, route.model("summary")
+                            )
+                    result["answer"] = prefix + answer
+        except Exception as e:
+            result["error"] = str(e)
+
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        agent.router.log(question, route, result["elapsed_ms"], result["error"])
+        return result
+
+    def _fix(self, question: str, failed_sql: str, error: str, route) -> tuple[str, list[dict]] | None:
+        """
+        Ask for a fixed query and run it, each step under its stage's gate.
+
+        Returns:
+            (fixed SQL, rows), or None if no safe fix was generated or it failed too
+        """
+        agent = self.agent
+        try:
+            with self.generation:
+                response = agent.llm.generate(
+                    agent._build_fix_prompt(question, failed_sql, error, None),
+                    agent.system_prompt, model_key=route.model("fix")
+                )
+            fixed_sql, fixed_safe = agent._extract_checked(response)
+            if fixed_sql and fixed_safe:
+                with self.execution:
+                    rows = agent._execute(fixed_sql, None)
+                metrics.FIX_ATTEMPTS.inc(outcome="fixed")
+                return fixed_sql, rows
+        except Exception:
+            logger.exception("Batch fix failed for %r", question)
+        metrics.FIX_ATTEMPTS.inc(outcome="failed")
+        return None
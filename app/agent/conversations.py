@@ -0,0 +1,263 @@
+"""Saved conversations: messages, their SQL and result handles, with full-text search."""
+
+import json
+import os
+import re
+import sqlite3
+import time
+
+# Characters kept from the first question for a conversation's default title
+TITLE_LENGTH = 50
+
+# Words (letters, digits, underscores) in a search query; FTS5 syntax is not exposed
+QUERY_TERM = re.compile(r"\w+")
+
+
+def _title(content: str) -> str:
+    content = " ".join(content.split())
+    return content[:TITLE_LENGTH] + ("..." if len(content) > TITLE_LENGTH else "")
+
+
+def _match_query(query: str) -> str | None:
+    """FTS5 query matching every word of a search, the last one as a prefix."""
+    terms = QUERY_TERM.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+class ConversationStore:
+    """
+    SQLite-backed store of each user's conversations.
+
+    Messages keep their text, the SQL that answered them, the row count and
+    columns of the result, and the job that produced it (the result handle:
+    its rows are fetched from /api/jobs/<id> while the job is kept). An FTS5
+    index over message text and SQL serves search.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (user, id)
+                );
+                CREATE INDEX IF NOT EXISTS conversations_recent ON conversations (user, updated_at);
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user TEXT NOT NULL,
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    sql TEXT,
+                    row_count INTEGER,
+                    columns TEXT,
+                    job_id TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_conversation ON messages (user, conversation_id, id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+                    content, sql, content='messages', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts (rowid, content, sql) VALUES (new.id, new.content, new.sql);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, content, sql)
+                    VALUES ('delete', old.id, old.content, old.sql);
+                END;
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_message(
+        self,
+        user: str,
+        conversation_id: str,
+        role: str,
+        content: str,
+        sql: str | None = None,
+        row_count: int | None = None,
+        columns: list[str] | None = None,
+        job_id: str | None = None,
+        created_at: float | None = None
+    ) -> dict:
+        """
+        Append a message, starting the conversation (titled after its first
+        question) if it is new.
+
+        Returns:
+            The conversation's summary
+        """
+        now = created_at or time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, user, title, message_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?) ON CONFLICT (user, id) DO NOTHING",
+                (conversation_id, user, _title(content) if role == "user" else "New conversation", now, now)
+            )
+            conn.execute(
+                "INSERT INTO messages (user, conversation_id, role, content, sql, row_count, columns, "
+                "job_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user, conversation_id, role, content, sql, row_count,
+                 json.dumps(columns) if columns is not None else None, job_id, now)
+            )
+            conn.execute(
+                "UPDATE conversations SET message_count = message_count + 1, "
+                "updated_at = MAX(updated_at, ?) WHERE user = ? AND id = ?",
+                (now, user, conversation_id)
+            )
+        return self.get(user, conversation_id, include_messages=False)
+
+    def import_conversation(self, user: str, conversation_id: str, title: str, messages: list[dict],
+                            created_at: float | None = None) -> dict | None:
+        """
+        Save a whole conversation kept elsewhere (the chat page's local history).
+
+        Conversations already stored are left alone, so retried imports are safe.
+
+        Returns:
+            The stored conversation's summary, or None if it already existed
+        """
+        if self.get(user, conversation_id, include_messages=False):
+            return None
+        created_at = created_at or time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, user, title, message_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, user, title, len(messages), created_at, created_at)
+            )
+            for message in messages:
+                conn.execute(
+                    "INSERT INTO messages (user, conversation_id, role, content, sql, row_count, "
+                    "columns, job_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user, conversation_id, message["role"], message["content"], message.get("sql"),
+                     message.get("row_count"), json.dumps(message["columns"]) if message.get("columns") else None,
+                     message.get("job_id"), message.get("created_at") or created_at)
+                )
+            conn.execute(
+                "UPDATE conversations SET updated_at = (SELECT COALESCE(MAX(created_at), ?) FROM messages "
+                "WHERE user = ? AND conversation_id = ?) WHERE user = ? AND id = ?",
+                (created_at, user, conversation_id, user, conversation_id)
+            )
+        return self.get(user, conversation_id, include_messages=False)
+
+    def get(self, user: str, conversation_id: str, include_messages: bool = True) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM conversations WHERE user = ? AND id = ?", (user, conversation_id)
+            ).fetchone()
+            if row is None:
+                return None
+            conversation = self._summary(row)
+            if include_messages:
+                messages = conn.execute(
+                    "SELECT * FROM messages WHERE user = ? AND conversation_id = ? ORDER BY id",
+                    (user, conversation_id)
+                ).fetchall()
+                conversation["messages"] = [self._message(message) for message in messages]
+        return conversation
+
+    def list_conversations(self, user: str, limit: int = 30, offset: int = 0) -> tuple[list[dict], int]:
+        """
+        A page of a user's conversations (titles only), most recently active first.
+
+        Returns:
+            The page and the user's total number of conversations
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM conversations WHERE user = ? ORDER BY updated_at DESC, id LIMIT ? OFFSET ?",
+                (user, limit, offset)
+            ).fetchall()
+            total = conn.execute("SELECT COUNT(*) FROM conversations WHERE user = ?", (user,)).fetchone()[0]
+        return [self._summary(row) for row in rows], total
+
+    def search(self, user: str, query: str, limit: int = 20, offset: int = 0) -> list[dict]:
+        """
+        A user's conversations whose messages or SQL match every word of a
+        query, best match first, each with a snippet of its best message.
+        """
+        match = _match_query(query)
+        if match is None:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                WITH hits AS MATERIALIZED (
+                    SELECT m.conversation_id, m.id AS message_id, bm25(messages_fts) AS rank,
+                           snippet(messages_fts, -1, '', '', '...', 12) AS snippet
+                    FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ? AND m.user = ?
+                )
+                SELECT c.*, hits.message_id, hits.snippet, MIN(hits.rank) AS rank
+                FROM hits JOIN conversations c ON c.user = ? AND c.id = hits.conversation_id
+                GROUP BY c.id
+                ORDER BY rank, c.updated_at DESC
+                LIMIT ? OFFSET ?
+                """,
+                (match, user, user, limit, offset)
+            ).fetchall()
+        return [
+            {**self._summary(row), "message_id": row["message_id"], "snippet": row["snippet"]}
+            for row in rows
+        ]
+
+    def rename(self, user: str, conversation_id: str, title: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE conversations SET title = ? WHERE user = ? AND id = ?",
+                (title, user, conversation_id)
+            ).rowcount > 0
+
+    def delete(self, user: str, conversation_id: str) -> bool:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages WHERE user = ? AND conversation_id = ?", (user, conversation_id))
+            return conn.execute(
+                "DELETE FROM conversations WHERE user = ? AND id = ?", (user, conversation_id)
+            ).rowcount > 0
+
+    def clear(self, user: str) -> list[str]:
+        """Delete all of a user's conversations; returns their IDs."""
+        with self._connect() as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM conversations WHERE user = ?", (user,))]
+            conn.execute("DELETE FROM messages WHERE user = ?", (user,))
+            conn.execute("DELETE FROM conversations WHERE user = ?", (user,))
+        return ids
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "message_count": row["message_count"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    @staticmethod
+    def _message(row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "sql": row["sql"],
+            "row_count": row["row_count"],
+            "columns": json.loads(row["columns"]) if row["columns"] else None,
+            "job_id": row["job_id"],
+            "created_at": row["created_at"],
+        }
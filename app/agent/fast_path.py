@@ -0,0 +1,125 @@
+"""Rule-based answers for trivial result shapes (no summarization LLM call)."""
+
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+
+from app.database.schema import Column, get_column
+
+
+# Longest single-column result rendered as a list
+MAX_LIST_ROWS = 10
+
+# Widest single-row result rendered as a comparison
+MAX_COMPARISON_COLUMNS = 8
+
+# Aggregate prefixes/suffixes stripped from result aliases (e.g. AVG_PRICE -> PRICE)
+_AGGREGATE_PREFIXES = ("AVG_", "AVERAGE_", "TOTAL_", "SUM_", "MAX_", "MIN_", "MEDIAN_")
+_AGGREGATE_SUFFIXES = ("_AVG", "_TOTAL", "_SUM", "_MAX", "_MIN")
+
+# Count affixes: the value counts rows, whatever the unit of the column named
+_COUNT_PREFIXES = ("COUNT_", "NUM_")
+_COUNT_SUFFIXES = ("_COUNT",)
+
+
+@dataclass
+class FastAnswer:
+    """A deterministic answer and the result shape that produced it."""
+    text: str
+    shape: str  # empty, scalar, list, comparison
+
+
+def render_fast_answer(results: list[dict]) -> FastAnswer | None:
+    """
+    Render an answer for trivial result shapes without calling the LLM.
+
+    Handles:
+      - empty: no rows
+      - scalar: one row, one column (e.g. a COUNT)
+      - list: one column, up to MAX_LIST_ROWS rows
+      - comparison: one row, up to MAX_COMPARISON_COLUMNS columns
+
+    Returns:
+        FastAnswer, or None if the result needs an LLM summary
+    """
+    if not results:
+        return FastAnswer("The query returned no results.", "empty")
+
+    columns = list(results[0].keys())
+
+    if len(results) == 1 and len(columns) == 1:
+        name = columns[0]
+        value = format_value(name, results[0][name])
+        return FastAnswer(f"**{column_label(name)}:** **{value}**", "scalar")
+
+    if len(columns) == 1 and len(results) <= MAX_LIST_ROWS:
+        name = columns[0]
+        lines = [f"Found **{len(results)}** results for **{column_label(name)}**:", ""]
+        for i, row in enumerate(results, 1):
+            lines.append(f"**{i}. {format_value(name, row[name])}**")
+        return FastAnswer("\n".join(lines), "list")
+
+    if len(results) == 1 and len(columns) <= MAX_COMPARISON_COLUMNS:
+        row = results[0]
+        lines = [f"- **{column_label(name)}:** {format_value(name, row[name])}" for name in columns]
+        return FastAnswer("\n".join(lines), "comparison")
+
+    return None
+
+
+def _base_column(name: str) -> Column | None:
+    """Resolve a result alias to schema metadata, ignoring aggregate affixes."""
+    upper = name.upper()
+    column = get_column(upper)
+    if column:
+        return column
+
+    for prefix in _AGGREGATE_PREFIXES:
+        if upper.startswith(prefix):
+            column = get_column(upper[len(prefix):])
+            if column:
+                return column
+    for suffix in _AGGREGATE_SUFFIXES:
+        if upper.endswith(suffix):
+            column = get_column(upper[:-len(suffix)])
+            if column:
+                return column
+    return None
+
+
+def column_label(name: str) -> str:
+    """Human-readable label for a result column, using schema descriptions when available."""
+    column = get_column(name)
+    if column:
+        return column.description
+    return re.sub(r"_+", " ", name).strip().capitalize()
+
+
+def format_value(name: str, value) -> str:
+    """
+    Format a value using the unit of the underlying schema column.
+
+    Counts (COUNT_*, NUM_*, *_COUNT) are whole numbers even when the column
+    they count is a price; aliases with no schema column get no unit.
+    """
+    if value is None:
+        return "n/a"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if not isinstance(value, (int, float, Decimal)):
+        return str(value)
+
+    upper = name.upper()
+    if upper.startswith(_COUNT_PREFIXES) or upper.endswith(_COUNT_SUFFIXES):
+        return f"{round(value):,}"
+
+    column = _base_column(name)
+    unit = column.unit if column else ""
+
+    if unit == "usd":
+        return f"${float(value):,.2f}"
+    if unit == "ratio":
+        return f"{float(value) * 100:.2f}%"
+    if isinstance(value, int) or float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{float(value):,.2f}"
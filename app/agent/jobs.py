@@ -0,0 +1,537 @@
+"""Questions as background jobs with a durable, resumable event log."""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.agent.admission import ADMITTED, TIMED_OUT, WAITING, AdmissionController, Rejected, Ticket, queue_status
+from app.utils import tracing
+from app.utils.deadline import Deadline
+from app.utils.profiling import Profile
+
+logger = logging.getLogger(__name__)
+
+
+# Job states; a job is finished once it is done or failed
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class JobStore:
+    """
+    SQLite-backed store of question jobs and the events they produced.
+
+    Every event of ``SQLAgent.ask_stream`` is appended under a per-job
+    sequence number, so a client that drops mid-answer can resume from the
+    last number it saw (SSE ``Last-Event-ID``), and the final answer stays
+    available after the stream is gone. Any process sharing the database
+    can serve a job's events, whichever process runs it.
+
+    Each thread keeps one connection open, and interrupted jobs are expired
+    on open and then at most every EXPIRE_SECONDS, so followers polling the
+    store cost one indexed read per poll.
+    """
+
+    # Seconds past its deadline before an unfinished job counts as interrupted
+    GRACE_SECONDS = 30
+
+    # Seconds between sweeps for interrupted jobs
+    EXPIRE_SECONDS = 5
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_expiry = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    client_key TEXT UNIQUE,
+                    question TEXT NOT NULL,
+                    conversation_id TEXT,
+                    llm_summary INTEGER NOT NULL,
+                    approximate INTEGER NOT NULL DEFAULT 0,
+                    deadline_seconds REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, expires_at);
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+            """)
+            # Job stores created before approximate mode
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "approximate" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN approximate INTEGER NOT NULL DEFAULT 0")
+        self._expire_due()
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection (used as a context manager, it commits but stays open)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            # WAL readers never block the writer; losing the last commits on a
+            # power cut is acceptable for an event log
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(
+        self,
+        question: str,
+        conversation_id: str | None,
+        llm_summary: bool,
+        deadline_seconds: float,
+        client_key: str | None = None,
+        approximate: bool = False
+    ) -> tuple[dict, bool]:
+        """
+        Queue a job, or find the one already created under ``client_key``.
+
+        Returns:
+            (job, created): created is False when an existing job was returned
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, client_key, question, conversation_id, llm_summary, "
+                    "approximate, deadline_seconds, status, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, client_key, question, conversation_id, int(llm_summary),
+                     int(approximate), deadline_seconds, QUEUED, now, now + deadline_seconds + self.GRACE_SECONDS)
+                )
+                created = True
+            except sqlite3.IntegrityError:
+                row = conn.execute("SELECT id FROM jobs WHERE client_key = ?", (client_key,)).fetchone()
+                job_id = row["id"]
+                created = False
+        return self.get(job_id, include_result=False), created
+
+    def get(self, job_id: str, include_result: bool = True) -> dict | None:
+        self._expire_due()
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row, include_result) if row else None
+
+    def start(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id)
+            )
+
+    def append(self, job_id: str, events: list[tuple[int, dict]]):
+        """Append numbered events to a job's log."""
+        if not events:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO events (job_id, seq, event) VALUES (?, ?, ?)",
+                [(job_id, seq, json.dumps(event, default=str)) for seq, event in events]
+            )
+
+    def finish(self, job_id: str, result: dict, events: list[tuple[int, dict]] = ()):
+        """
+        Store the final answer (failed if it carries an error), together
+        with the last events, so the complete event and the status are
+        visible at once.
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO events (job_id, seq, event) VALUES (?, ?, ?)",
+                [(job_id, seq, json.dumps(event, default=str)) for seq, event in events]
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (FAILED if result.get("error") else DONE, json.dumps(result, default=str),
+                 time.time(), job_id)
+            )
+
+    def poll(self, job_id: str, after: int) -> tuple[str | None, list[tuple[int, dict]]]:
+        """
+        A job's status and its events numbered above ``after``.
+
+        The status is read first: if it says finished, the events returned
+        are all there will ever be. The status is None for unknown jobs.
+        """
+        self._expire_due()
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None, []
+            rows = conn.execute(
+                "SELECT seq, event FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return row["status"], [(r["seq"], json.loads(r["event"])) for r in rows]
+
+    def last_seq(self, job_id: str) -> int:
+        """Highest sequence number in a job's log (0 if it has none)."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM events WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+
+    def fail(self, job_id: str, error: str):
+        """Finish a job that never ran, closing its log with error + complete."""
+        last = self.last_seq(job_id)
+        self.finish(job_id, {"answer": "", "sql": None, "data": None, "error": error}, [
+            (last + 1, {"type": "error", "content": error}),
+            (last + 2, {"type": "complete", "sql": None, "data": None, "error": error}),
+        ])
+
+    def expire(self, now: float | None = None):
+        """
+        Fail jobs that outlived their deadline without finishing (e.g. the
+        process running them restarted), closing their logs with an error.
+        """
+        now = now or time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND expires_at < ?",
+                (QUEUED, RUNNING, now)
+            ).fetchall()
+        for row in rows:
+            self.fail(row["id"], "Job interrupted before it finished")
+
+    def _expire_due(self):
+        """Expire interrupted jobs if the last sweep is EXPIRE_SECONDS old."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_expiry:
+                return
+            self._next_expiry = now + self.EXPIRE_SECONDS
+        self.expire()
+
+    def delete(self, job_id: str):
+        """Forget a job that was never admitted, freeing its client key for a retry."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def purge(self, before: float) -> int:
+        """Delete finished jobs (and their events) created before a timestamp."""
+        with self._connect() as conn:
+            ids = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE created_at < ? AND status IN (?, ?)",
+                (before, *FINISHED)
+            ).fetchall()]
+            conn.executemany("DELETE FROM events WHERE job_id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_result: bool) -> dict:
+        job = {
+            "id": row["id"],
+            "question": row["question"],
+            "conversation_id": row["conversation_id"],
+            "llm_summary": bool(row["llm_summary"]),
+            "approximate": bool(row["approximate"]),
+            "deadline_seconds": row["deadline_seconds"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if include_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+
+class JobRecorder:
+    """
+    Numbers a job's events and batches them for the store.
+
+    Token events arrive a character at a time; consecutive tokens are
+    merged and written at most every FLUSH_SECONDS, while other events
+    are written as soon as they happen (the complete event with the
+    job's final status).
+    """
+
+    FLUSH_SECONDS = 0.1
+
+    def __init__(self, seq: int = 0):
+        self.seq = seq
+        self.pending: list[dict] = []
+        self.answer: list[str] = []
+        self.complete: dict | None = None
+        self._flushed_at = time.monotonic()
+
+    def add(self, event: dict) -> bool:
+        """Buffer an event; True when the buffer should be written now."""
+        if event["type"] == "token":
+            self.answer.append(event["content"])
+            if self.pending and self.pending[-1]["type"] == "token":
+                self.pending[-1] = {"type": "token", "content": self.pending[-1]["content"] + event["content"]}
+            else:
+                self.pending.append(dict(event))
+            return time.monotonic() - self._flushed_at >= self.FLUSH_SECONDS
+
+        self.pending.append(event)
+        if event["type"] == "complete":
+            # Written by JobStore.finish, together with the job's status
+            self.complete = event
+            return False
+        return True
+
+    def take(self) -> list[tuple[int, dict]]:
+        """Number and hand over the buffered events."""
+        numbered = []
+        for event in self.pending:
+            self.seq += 1
+            numbered.append((self.seq, event))
+        self.pending = []
+        self._flushed_at = time.monotonic()
+        return numbered
+
+    def result(self) -> dict:
+        """Final answer in the shape of SQLAgent.ask's result."""
+        complete = self.complete or {
+            "sql": None, "data": None, "error": "Job ended without completing"
+        }
+        result = {key: value for key, value in complete.items() if key != "type"}
+        return {"answer": "".join(self.answer), **result}
+
+
+class JobQueue:
+    """
+    Local worker pool running question jobs through ``SQLAgent.ask_stream``.
+
+    Jobs keep running when the client that submitted them disconnects;
+    their events and final answer land in the JobStore, so reconnecting
+    clients resume from the log instead of repeating LLM or warehouse work.
+
+    With an admission controller, a job waits for its ticket before it is
+    queued, logging status events with its queue position meanwhile.
+
+    Followers of a job submitted here wake on its writes; only jobs run by
+    another process are polled every POLL_SECONDS.
+
+    Args:
+        agent: SQLAgent answering the questions
+        store: Durable job and event store
+        workers: Number of jobs answered concurrently
+        admission: Optional admission controller limiting jobs in flight
+    """
+
+    # Seconds between store polls while following a job run elsewhere
+    POLL_SECONDS = 0.25
+
+    # Finished jobs are deleted after this long
+    RETENTION_SECONDS = 24 * 3600
+
+    def __init__(self, agent, store: JobStore, workers: int = 8, admission: AdmissionController | None = None):
+        self.agent = agent
+        self.store = store
+        self.workers = workers
+        self.admission = admission
+        self._queue: queue.Queue[str] = queue.Queue()
+        self._tickets: dict[str, Ticket] = {}
+        # Span of the request that submitted each job, parent of its job.run span
+        self._traces: dict[str, tracing.Span] = {}
+        # Profiles of profiled requests, which sample the worker answering the job
+        self._profiles: dict[str, Profile] = {}
+        # Jobs submitted here and not yet finished, whose writes notify followers
+        self._owned: set[str] = set()
+        self._changed = threading.Condition()
+        self._version = 0
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            self.store.purge(time.time() - self.RETENTION_SECONDS)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self,
+        question: str,
+        conversation_id: str | None = None,
+        llm_summary: bool = False,
+        deadline_seconds: float = 60,
+        client_key: str | None = None,
+        user: str = "anonymous",
+        profile: Profile | None = None,
+        approximate: bool = False
+    ) -> dict:
+        """
+        Queue a question, or return the job already submitted under ``client_key``
+        (a retried request never starts a second job).
+
+        With a profile, the worker thread answering the job is sampled too.
+
+        Raises:
+            Rejected: If admission control sheds the new job (it is not kept)
+        """
+        job, created = self.store.create(
+            question, conversation_id, llm_summary, deadline_seconds, client_key, approximate
+        )
+        if not created:
+            return job
+        self.start()
+        self._owned.add(job["id"])
+        trace = tracing.current_span()
+        if trace is not None:
+            self._traces[job["id"]] = trace
+        if profile is not None:
+            self._profiles[job["id"]] = profile
+        if self.admission is None:
+            self._queue.put(job["id"])
+            return job
+        try:
+            ticket = self.admission.request(user, deadline_seconds)
+        except Rejected:
+            self._owned.discard(job["id"])
+            self._traces.pop(job["id"], None)
+            self._profiles.pop(job["id"], None)
+            self.store.delete(job["id"])
+            raise
+        self._admit(job["id"], ticket)
+        return job
+
+    def _admit(self, job_id: str, ticket: Ticket):
+        """Queue a job once its ticket is admitted, logging its queue position until then."""
+        lock = threading.Lock()
+        settled = threading.Event()
+
+        def changed(ticket: Ticket):
+            with lock:
+                if settled.is_set():
+                    return
+                if ticket.state == WAITING:
+                    if ticket.position:
+                        seq = self.store.last_seq(job_id) + 1
+                        self.store.append(job_id, [(seq, queue_status(ticket.position))])
+                        self._notify()
+                    return
+                settled.set()
+                timer.cancel()
+                if ticket.state == ADMITTED:
+                    self._tickets[job_id] = ticket
+                    self._queue.put(job_id)
+                else:
+                    self._owned.discard(job_id)
+                    self._traces.pop(job_id, None)
+                    self._profiles.pop(job_id, None)
+                    self.store.fail(job_id, TIMED_OUT)
+                    self._notify()
+
+        # Waiting counts against the job's deadline
+        timer = threading.Timer(
+            max(0.0, ticket.expires_at - time.monotonic()),
+            ticket.controller.cancel, (ticket,), {"expired": True}
+        )
+        timer.daemon = True
+        timer.start()
+        ticket.subscribe(changed)
+
+    def follow(self, job_id: str, after: int = 0):
+        """
+        Yield (seq, event) for a job's events numbered above ``after``, waiting
+        for new ones until the job's complete event.
+        """
+        while True:
+            # Note the version before reading, so no write goes unnoticed
+            with self._changed:
+                version = self._version
+            status, events = self.store.poll(job_id, after)
+            for seq, event in events:
+                after = seq
+                yield seq, event
+                if event["type"] == "complete":
+                    return
+            if status is None or status in FINISHED:
+                return
+            if not events:
+                with self._changed:
+                    if self._version == version:
+                        self._changed.wait(None if job_id in self._owned else self.POLL_SECONDS)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self.run(job_id)
+            except Exception:
+                logger.exception("Job %s failed", job_id)
+
+    def run(self, job_id: str):
+        """Answer one job, writing its events to the store as they happen."""
+        ticket = self._tickets.pop(job_id, None)
+        trace = self._traces.pop(job_id, None)
+        profile = self._profiles.pop(job_id, None)
+        thread = profile.attach() if profile is not None else None
+        try:
+            with tracing.span("job.run", parent=trace, job_id=job_id):
+                self._run(job_id)
+        finally:
+            if thread is not None:
+                profile.detach(thread)
+            if ticket is not None:
+                ticket.release()
+            self._owned.discard(job_id)
+            self._notify()
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id, include_result=False)
+        if job is None or job["status"] != QUEUED:
+            return
+        self.store.start(job_id)
+
+        # Time spent queued counts against the request's budget
+        waited = time.time() - job["created_at"]
+        deadline = Deadline(max(0.001, job["deadline_seconds"] - waited))
+
+        # Continue after any queue-position events logged while waiting
+        recorder = JobRecorder(seq=self.store.last_seq(job_id))
+        options = {"approximate": True} if job["approximate"] else {}
+        try:
+            for event in self.agent.ask_stream(
+                job["question"], llm_summary=job["llm_summary"],
+                conversation_id=job["conversation_id"], deadline=deadline, **options
+            ):
+                if recorder.add(event):
+                    self._write(job_id, recorder)
+        except Exception as e:
+            logger.exception("Job %s stream error", job_id)
+            recorder.add({"type": "error", "content": f"Stream error: {str(e)}"})
+            recorder.add({"type": "complete", "sql": None, "data": None, "error": str(e)})
+        self.store.finish(job_id, recorder.result(), recorder.take())
+        self._notify()
+
+    def _write(self, job_id: str, recorder: JobRecorder):
+        self.store.append(job_id, recorder.take())
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
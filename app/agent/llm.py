@@ -1,22 +1,71 @@
 """Multi-provider LLM client supporting Claude and DeepSeek."""
 
-from openai import OpenAI
-from anthropic import Anthropic
+import threading
+import time
+from contextlib import contextmanager
+
+from app.agent.models import MODELS
+from app.utils import metrics, tracing
 from config import settings
 
 
-class LLMClient:
+HYPERBOLIC_BASE_URL = "https://api.hyperbolic.xyz/v1"
+
+
+def _build_provider_client(provider: str, asynchronous: bool):
+    """Import a provider's SDK and create its client."""
+    if provider == "anthropic":
+        from anthropic import Anthropic, AsyncAnthropic
+        return (AsyncAnthropic if asynchronous else Anthropic)(api_key=settings.anthropic_api_key)
+    from openai import AsyncOpenAI, OpenAI
+    return (AsyncOpenAI if asynchronous else OpenAI)(
+        api_key=settings.hyperbolic_api_key,
+        base_url=HYPERBOLIC_BASE_URL
+    )
+
+
+class _ProviderClients:
+    """
+    Provider SDK clients, each imported and created on first use.
+
+    The anthropic and openai SDKs take most of a second to import, so
+    workers start without them and only load the providers they call;
+    nothing is connected before a (preloading) server forks its workers.
+
+    Args:
+        asynchronous: Create the SDKs' async clients
+    """
+
+    def __init__(self, asynchronous: bool):
+        self._asynchronous = asynchronous
+        self._clients: dict[str, object] = {}
+        self._clients_lock = threading.Lock()
+
+    def _provider_client(self, provider: str):
+        client = self._clients.get(provider)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(provider)
+                if client is None:
+                    client = self._clients[provider] = _build_provider_client(provider, self._asynchronous)
+        return client
+
+    @property
+    def anthropic_client(self):
+        return self._provider_client("anthropic")
+
+    @property
+    def hyperbolic_client(self):
+        return self._provider_client("hyperbolic")
+
+
+class LLMClient(_ProviderClients):
     """Wrapper for multiple LLM providers with unified interface."""
 
     MAX_TOKENS = 4096
 
     def __init__(self):
-        # Initialize all providers
-        self.anthropic_client = Anthropic(api_key=settings.anthropic_api_key)
-        self.hyperbolic_client = OpenAI(
-            api_key=settings.hyperbolic_api_key,
-            base_url="https://api.hyperbolic.xyz/v1"
-        )
+        super().__init__(asynchronous=False)
 
         # Default to current .env model
         self.current_provider = "hyperbolic"
@@ -33,16 +82,33 @@ class LLMClient:
         self.model = model_identifier
 
         # Determine provider based on model_key
-        if model_key == "claude-sonnet":
-            self.current_provider = "anthropic"
-        elif model_key == "deepseek-v3":
-            self.current_provider = "hyperbolic"
+        if model_key in MODELS:
+            self.current_provider = MODELS[model_key][0]
+
+    def _resolve(self, model_key: str | None) -> tuple[str, str]:
+        """Provider and model identifier for a call (the active model if no key)."""
+        if model_key is None:
+            return self.current_provider, self.model
+        return MODELS[model_key]
+
+    @staticmethod
+    def _cached_system(system_prompt: str) -> list[dict]:
+        """
+        Mark the system prompt as a prompt-cache breakpoint (Anthropic).
+
+        The system prompt (rules + full schema) is identical across requests,
+        so repeated and concurrent questions reuse the cached prefix.
+        """
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
 
     def generate(
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
     ) -> str:
         """
         Generate a response using the currently selected LLM provider.
@@ -51,20 +117,33 @@ class LLMClient:
             user_message: The user's current message
             system_prompt: System instructions for the model
             conversation_history: Optional list of previous messages
+            temperature: Sampling temperature (provider default if None)
+            model_key: Model for this call only (see app.agent.models);
+                defaults to the active model
+            timeout: Seconds before the request is abandoned (SDK default if None)
 
         Returns:
             The assistant's response text
         """
-        if self.current_provider == "anthropic":
-            return self._generate_anthropic(user_message, system_prompt, conversation_history)
-        else:  # hyperbolic (uses OpenAI-compatible API)
-            return self._generate_hyperbolic(user_message, system_prompt, conversation_history)
+        provider, model = self._resolve(model_key)
+        with _counted(provider, model, "generate"):
+            if provider == "anthropic":
+                return self._generate_anthropic(
+                    user_message, system_prompt, conversation_history, temperature, model, timeout
+                )
+            else:  # hyperbolic (uses OpenAI-compatible API)
+                return self._generate_hyperbolic(
+                    user_message, system_prompt, conversation_history, temperature, model, timeout
+                )
 
     def _generate_hyperbolic(
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model: str | None = None,
+        timeout: float | None = None
     ) -> str:
         """Generate using Hyperbolic API (OpenAI-compatible)."""
         messages = [{"role": "system", "content": system_prompt}]
@@ -72,10 +151,15 @@ class LLMClient:
             messages.extend(conversation_history)
         messages.append({"role": "user", "content": user_message})
 
+        options = {"temperature": temperature} if temperature is not None else {}
+        if timeout is not None:
+            options["timeout"] = timeout
+
         response = self.hyperbolic_client.chat.completions.create(
-            model=self.model,
+            model=model or self.model,
             max_tokens=self.MAX_TOKENS,
-            messages=messages
+            messages=messages,
+            **options
         )
 
         return response.choices[0].message.content
@@ -84,7 +168,10 @@ class LLMClient:
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model: str | None = None,
+        timeout: float | None = None
     ) -> str:
         """Generate using Anthropic Claude API."""
         messages = []
@@ -92,11 +179,16 @@ class LLMClient:
             messages.extend(conversation_history)
         messages.append({"role": "user", "content": user_message})
 
+        options = {"temperature": temperature} if temperature is not None else {}
+        if timeout is not None:
+            options["timeout"] = timeout
+
         response = self.anthropic_client.messages.create(
-            model=self.model,
+            model=model or self.model,
             max_tokens=self.MAX_TOKENS,
-            system=system_prompt,
-            messages=messages
+            system=self._cached_system(system_prompt),
+            messages=messages,
+            **options
         )
 
         return response.content[0].text
@@ -105,7 +197,9 @@ class LLMClient:
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
     ):
         """
         Stream a response using the currently selected LLM provider.
@@ -114,20 +208,39 @@ class LLMClient:
             user_message: The user's current message
             system_prompt: System instructions for the model
             conversation_history: Optional list of previous messages
+            model_key: Model for this call only; defaults to the active model
+            timeout: Seconds for the whole stream; TimeoutError is raised
+                once it runs past them
 
         Yields:
             Text tokens as they arrive
         """
-        if self.current_provider == "anthropic":
-            yield from self._generate_stream_anthropic(user_message, system_prompt, conversation_history)
+        provider, model = self._resolve(model_key)
+        if provider == "anthropic":
+            stream = self._generate_stream_anthropic(
+                user_message, system_prompt, conversation_history, model, timeout
+            )
         else:  # hyperbolic
-            yield from self._generate_stream_hyperbolic(user_message, system_prompt, conversation_history)
+            stream = self._generate_stream_hyperbolic(
+                user_message, system_prompt, conversation_history, model, timeout
+            )
+
+        # SDK timeouts bound each read; enforce the total here
+        start = time.monotonic()
+        with _counted(provider, model, "stream"):
+            for token in stream:
+                yield token
+                if timeout is not None and time.monotonic() - start > timeout:
+                    stream.close()
+                    raise TimeoutError(f"LLM stream exceeded its {timeout:.1f}s budget")
 
     def _generate_stream_hyperbolic(
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        model: str | None = None,
+        timeout: float | None = None
     ):
         """Stream using Hyperbolic API (OpenAI-compatible)."""
         messages = [{"role": "system", "content": system_prompt}]
@@ -136,10 +249,11 @@ class LLMClient:
         messages.append({"role": "user", "content": user_message})
 
         stream = self.hyperbolic_client.chat.completions.create(
-            model=self.model,
+            model=model or self.model,
             max_tokens=self.MAX_TOKENS,
             messages=messages,
-            stream=True
+            stream=True,
+            **({"timeout": timeout} if timeout is not None else {})
         )
 
         for chunk in stream:
@@ -150,7 +264,9 @@ class LLMClient:
         self,
         user_message: str,
         system_prompt: str,
-        conversation_history: list[dict] | None = None
+        conversation_history: list[dict] | None = None,
+        model: str | None = None,
+        timeout: float | None = None
     ):
         """Stream using Anthropic Claude API."""
         messages = []
@@ -159,10 +275,11 @@ class LLMClient:
         messages.append({"role": "user", "content": user_message})
 
         with self.anthropic_client.messages.stream(
-            model=self.model,
+            model=model or self.model,
             max_tokens=self.MAX_TOKENS,
-            system=system_prompt,
-            messages=messages
+            system=self._cached_system(system_prompt),
+            messages=messages,
+            **({"timeout": timeout} if timeout is not None else {})
         ) as stream:
             for text in stream.text_stream:
                 yield text
@@ -175,7 +292,6 @@ class LLMClient:
     ) -> str:
         """Generate with automatic retry on transient failures."""
         from openai import APIConnectionError, RateLimitError, APIStatusError
-        import time
 
         last_error = None
 
@@ -196,3 +312,141 @@ class LLMClient:
                 raise
 
         raise last_error
+
+
+@contextmanager
+def _counted(provider: str, model: str, mode: str):
+    """
+    Trace an LLM call and count it by outcome once finished (streams
+    closed early are not counted).
+    """
+    with tracing.span("llm.request", provider=provider, model=model, mode=mode):
+        try:
+            yield
+        except Exception:
+            metrics.LLM_REQUESTS.inc(provider=provider, model=model, outcome="error")
+            raise
+        metrics.LLM_REQUESTS.inc(provider=provider, model=model, outcome="ok")
+
+
+class AsyncLLMClient(_ProviderClients):
+    """
+    Awaitable LLM calls for the ASGI streaming path.
+
+    Follows the wrapped LLMClient's active model, so /api/model applies to
+    both paths.
+
+    Args:
+        llm: LLMClient whose model selection is shared
+    """
+
+    MAX_TOKENS = LLMClient.MAX_TOKENS
+
+    def __init__(self, llm: LLMClient):
+        super().__init__(asynchronous=True)
+        self.llm = llm
+
+    @staticmethod
+    def _messages(
+        provider: str,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None
+    ) -> list[dict]:
+        messages = [{"role": "system", "content": system_prompt}] if provider == "hyperbolic" else []
+        if conversation_history:
+            messages.extend(conversation_history)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    async def generate(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ) -> str:
+        """Async counterpart of LLMClient.generate."""
+        provider, model = self.llm._resolve(model_key)
+        messages = self._messages(provider, user_message, system_prompt, conversation_history)
+
+        options = {"temperature": temperature} if temperature is not None else {}
+        if timeout is not None:
+            options["timeout"] = timeout
+
+        with _counted(provider, model, "generate"):
+            if provider == "anthropic":
+                response = await self.anthropic_client.messages.create(
+                    model=model,
+                    max_tokens=self.MAX_TOKENS,
+                    system=LLMClient._cached_system(system_prompt),
+                    messages=messages,
+                    **options
+                )
+                return response.content[0].text
+
+            response = await self.hyperbolic_client.chat.completions.create(
+                model=model,
+                max_tokens=self.MAX_TOKENS,
+                messages=messages,
+                **options
+            )
+            return response.choices[0].message.content
+
+    async def generate_stream(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ):
+        """Async counterpart of LLMClient.generate_stream (an async generator)."""
+        provider, model = self.llm._resolve(model_key)
+        with _counted(provider, model, "stream"):
+            async for token in self._stream(provider, model, user_message, system_prompt,
+                                            conversation_history, timeout):
+                yield token
+
+    async def _stream(
+        self,
+        provider: str,
+        model: str,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None,
+        timeout: float | None
+    ):
+        messages = self._messages(provider, user_message, system_prompt, conversation_history)
+        options = {"timeout": timeout} if timeout is not None else {}
+        start = time.monotonic()
+
+        if provider == "anthropic":
+            async with self.anthropic_client.messages.stream(
+                model=model,
+                max_tokens=self.MAX_TOKENS,
+                system=LLMClient._cached_system(system_prompt),
+                messages=messages,
+                **options
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                    if timeout is not None and time.monotonic() - start > timeout:
+                        raise TimeoutError(f"LLM stream exceeded its {timeout:.1f}s budget")
+            return
+
+        stream = await self.hyperbolic_client.chat.completions.create(
+            model=model,
+            max_tokens=self.MAX_TOKENS,
+            messages=messages,
+            stream=True,
+            **options
+        )
+        async for chunk in stream:
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if timeout is not None and time.monotonic() - start > timeout:
+                await stream.close()
+                raise TimeoutError(f"LLM stream exceeded its {timeout:.1f}s budget")
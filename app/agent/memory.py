@@ -0,0 +1,148 @@
+"""Server-side, token-bounded conversation memory for follow-up questions."""
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from app.utils.digest import build_result_digest, estimate_tokens
+
+
+@dataclass
+class Turn:
+    """One answered question in a conversation."""
+    question: str
+    sql: str | None
+    digest: str
+    answer: str
+
+
+@dataclass
+class Conversation:
+    """Recent turns kept verbatim plus a running summary of older ones."""
+    summary: list[str] = field(default_factory=list)
+    turns: deque = field(default_factory=deque)
+
+
+class ConversationMemory:
+    """
+    Keeps prior questions, SQL and compact result digests per conversation.
+
+    History is returned as chat messages for ``LLMClient.generate``'s
+    ``conversation_history`` argument, so the system prompt never changes
+    between turns and provider-side prompt caching keeps working.
+
+    When a conversation exceeds ``max_tokens``, the oldest verbatim turn is
+    folded into a one-line summary entry (incremental compaction, no LLM
+    call). The summary itself is capped at half the budget by dropping its
+    oldest entries, so memory never grows without bound.
+    """
+
+    # Token budget for the history of a single conversation
+    MAX_TOKENS = 2000
+
+    # Conversations kept in memory (least recently used are evicted)
+    MAX_CONVERSATIONS = 500
+
+    # Per-turn caps for the stored digest and answer excerpt
+    DIGEST_TOKENS = 150
+    ANSWER_CHARS = 600
+
+    def __init__(self, max_tokens: int | None = None):
+        self.max_tokens = max_tokens or self.MAX_TOKENS
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, conversation_id: str) -> list[dict]:
+        """
+        Return the conversation as alternating user/assistant messages.
+
+        Returns:
+            List of {"role": str, "content": str}, empty for new conversations
+        """
+        with self._lock:
+            conv = self._conversations.get(conversation_id)
+            if conv is None:
+                return []
+            self._conversations.move_to_end(conversation_id)
+            return self._to_messages(conv)
+
+    def record(
+        self,
+        conversation_id: str,
+        question: str,
+        sql: str | None,
+        results: list[dict] | None,
+        answer: str
+    ):
+        """Append an answered question and compact the history if needed."""
+        if results:
+            digest = build_result_digest(results, max_tokens=self.DIGEST_TOKENS, sample_rows=3)
+        elif results is not None:
+            digest = "No rows returned."
+        else:
+            digest = ""
+
+        turn = Turn(
+            question=question,
+            sql=sql,
+            digest=digest,
+            answer=answer.strip()[:self.ANSWER_CHARS]
+        )
+
+        with self._lock:
+            conv = self._conversations.setdefault(conversation_id, Conversation())
+            self._conversations.move_to_end(conversation_id)
+            conv.turns.append(turn)
+            self._compact(conv)
+
+            while len(self._conversations) > self.MAX_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+
+    def clear(self, conversation_id: str):
+        """Forget a conversation."""
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def _compact(self, conv: Conversation):
+        """Fold the oldest turns into the summary until under budget."""
+        while len(conv.turns) > 1 and self._tokens(conv) > self.max_tokens:
+            conv.summary.append(self._summarize_turn(conv.turns.popleft()))
+
+        while conv.summary and estimate_tokens("\n".join(conv.summary)) > self.max_tokens // 2:
+            conv.summary.pop(0)
+
+    def _tokens(self, conv: Conversation) -> int:
+        return sum(estimate_tokens(message["content"]) for message in self._to_messages(conv))
+
+    @staticmethod
+    def _summarize_turn(turn: Turn) -> str:
+        """One-line summary of a turn: the question, its SQL and result shape."""
+        line = f"- Asked: {turn.question}"
+        if turn.sql:
+            line += f" | SQL: {' '.join(turn.sql.split())[:300]}"
+        if turn.digest:
+            line += f" | {turn.digest.splitlines()[0]}"
+        return line
+
+    @staticmethod
+    def _to_messages(conv: Conversation) -> list[dict]:
+        messages = []
+        if conv.summary:
+            messages.append({
+                "role": "user",
+                "content": "Summary of earlier questions in this conversation:\n" + "\n".join(conv.summary)
+            })
+            messages.append({"role": "assistant", "content": "Noted."})
+
+        for turn in conv.turns:
+            parts = []
+            if turn.sql:
+                parts.append(f"```sql\n{turn.sql}\n```")
+            if turn.digest:
+                parts.append(f"Result digest:\n{turn.digest}")
+            if turn.answer:
+                parts.append(turn.answer)
+            messages.append({"role": "user", "content": turn.question})
+            messages.append({"role": "assistant", "content": "\n\n".join(parts) or "(no answer)"})
+
+        return messages
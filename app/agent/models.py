@@ -0,0 +1,8 @@
+"""Selectable LLM models, keyed by the names used in the UI and settings."""
+
+# Model key -> (provider, API model identifier)
+MODELS = {
+    "claude-sonnet": ("anthropic", "claude-sonnet-4-5-20250929"),
+    "claude-haiku": ("anthropic", "claude-haiku-4-5-20251001"),
+    "deepseek-v3": ("hyperbolic", "deepseek-ai/DeepSeek-V3"),
+}
@@ -0,0 +1,248 @@
+"""Pinned questions: validated SQL refreshed in the background when data changes."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.agent.validator import referenced_tables
+from app.database.schema import TABLES
+
+logger = logging.getLogger(__name__)
+
+
+# Columns that record when a table's rows were loaded, in order of preference
+FRESHNESS_COLUMNS = ("LOADED_AT", "FETCHED_AT", "LAST_UPDATED", "CREATED_AT", "SCRAPED_AT")
+
+
+def freshness_column(table_name: str) -> str | None:
+    """Return the load-timestamp column of a configured table, if it has one."""
+    for table in TABLES:
+        if table.name.upper() == table_name.upper():
+            names = {col.name for col in table.columns}
+            return next((col for col in FRESHNESS_COLUMNS if col in names), None)
+    return None
+
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class PinnedStore:
+    """
+    SQLite-backed store of pinned questions and their latest results.
+
+    A single row in the ``lease`` table ensures only one process (e.g. one
+    gunicorn worker) runs the refresh scheduler at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pins (
+                    id TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    normalized TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    refresh_seconds INTEGER NOT NULL,
+                    tables TEXT NOT NULL,
+                    freshness TEXT,
+                    answer TEXT,
+                    data TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    checked_at REAL,
+                    refreshed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS pins_normalized ON pins (normalized);
+                CREATE TABLE IF NOT EXISTS lease (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, question: str, sql: str, refresh_seconds: int) -> dict:
+        """Pin a question with its validated SQL."""
+        pin_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO pins (id, question, normalized, sql, refresh_seconds, tables, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pin_id, question, _normalize_question(question), sql, refresh_seconds,
+                 json.dumps(referenced_tables(sql)), time.time())
+            )
+        return self.get(pin_id, include_data=False)
+
+    def remove(self, pin_id: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM pins WHERE id = ?", (pin_id,)).rowcount > 0
+
+    def get(self, pin_id: str, include_data: bool = True) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM pins WHERE id = ?", (pin_id,)).fetchone()
+        return self._to_dict(row, include_data) if row else None
+
+    def find(self, question: str) -> dict | None:
+        """Return the refreshed pin matching a question, if any."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM pins WHERE normalized = ? AND refreshed_at IS NOT NULL "
+                "ORDER BY refreshed_at DESC LIMIT 1",
+                (_normalize_question(question),)
+            ).fetchone()
+        return self._to_dict(row, include_data=True) if row else None
+
+    def list_pins(self) -> list[dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM pins ORDER BY created_at").fetchall()
+        return [self._to_dict(row, include_data=False) for row in rows]
+
+    def due(self, now: float) -> list[dict]:
+        """Pins never checked, or not checked within their refresh interval."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM pins WHERE checked_at IS NULL OR checked_at + refresh_seconds <= ?",
+                (now,)
+            ).fetchall()
+        return [self._to_dict(row, include_data=False) for row in rows]
+
+    def mark_checked(self, pin_id: str, now: float):
+        with self._connect() as conn:
+            conn.execute("UPDATE pins SET checked_at = ? WHERE id = ?", (now, pin_id))
+
+    def save_result(self, pin_id: str, freshness: dict, answer: str | None,
+                    data: list[dict] | None, error: str | None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE pins SET freshness = ?, answer = ?, data = ?, error = ?, refreshed_at = ? "
+                "WHERE id = ?",
+                (json.dumps(freshness), answer, json.dumps(data, default=str), error,
+                 time.time(), pin_id)
+            )
+
+    def acquire_lease(self, owner: str, ttl: float) -> bool:
+        """Take or renew the scheduler lease; False if another owner holds it."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO lease (name, owner, expires_at) VALUES ('scheduler', ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE lease.owner = excluded.owner OR lease.expires_at < ?",
+                (owner, now + ttl, now)
+            )
+            row = conn.execute("SELECT owner FROM lease WHERE name = 'scheduler'").fetchone()
+        return row["owner"] == owner
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_data: bool) -> dict:
+        pin = {
+            "id": row["id"],
+            "question": row["question"],
+            "sql": row["sql"],
+            "refresh_seconds": row["refresh_seconds"],
+            "tables": json.loads(row["tables"]),
+            "freshness": json.loads(row["freshness"]) if row["freshness"] else None,
+            "answer": row["answer"],
+            "error": row["error"],
+            "refreshed_at": row["refreshed_at"],
+        }
+        if include_data:
+            pin["data"] = json.loads(row["data"]) if row["data"] else None
+        return pin
+
+
+class PinScheduler:
+    """
+    Background thread that keeps pinned answers fresh.
+
+    On every tick, each due pin checks MAX(<load column>) of the tables its
+    SQL reads (one round trip for all of them). The pinned SQL is re-run
+    and re-summarized only when one of those timestamps changed, or when
+    the pin has no stored result yet.
+    """
+
+    # Seconds between scheduler wake-ups
+    TICK_SECONDS = 30
+
+    def __init__(self, agent, store: PinnedStore):
+        self.agent = agent
+        self.store = store
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread (idempotent)."""
+        if self._thread is None:
+            # Named after the process running the thread (not a preloading master)
+            self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+            self._thread = threading.Thread(target=self._run, name="pin-scheduler", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Run a tick now (e.g. after a new pin is added)."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                if self.store.acquire_lease(self.owner, ttl=self.TICK_SECONDS * 3):
+                    self.tick()
+            except Exception:
+                logger.exception("Pin scheduler tick failed")
+            self._wake.wait(self.TICK_SECONDS)
+            self._wake.clear()
+
+    def tick(self, now: float | None = None):
+        """Refresh every due pin whose underlying data changed."""
+        now = now or time.time()
+        for pin in self.store.due(now):
+            self.store.mark_checked(pin["id"], now)
+            freshness = self._freshness(pin["tables"])
+            if pin["refreshed_at"] is not None and freshness and freshness == pin["freshness"]:
+                continue
+            self.refresh(pin, freshness)
+
+    def refresh(self, pin: dict, freshness: dict):
+        """Re-run a pin's SQL and store the new result and summary."""
+        agent = self.agent
+        try:
+            rows = agent.db.execute_query(pin["sql"], use_cache=False)
+            fast_path = agent._fast_answer(pin["sql"], rows)
+            if fast_path:
+                answer = fast_path["answer"]
+            else:
+                answer = agent._summarize_results(pin["question"], pin["sql"], rows)
+            self.store.save_result(pin["id"], freshness, answer, rows, None)
+            logger.info("Refreshed pin %s (%d rows)", pin["id"], len(rows))
+        except Exception as e:
+            self.store.save_result(pin["id"], freshness, None, None, str(e))
+            logger.warning("Refreshing pin %s failed: %s", pin["id"], e)
+
+    def _freshness(self, tables: list[str]) -> dict:
+        """Latest load timestamp per table, fetched in a single query."""
+        columns = {table: freshness_column(table) for table in tables}
+        selects = [
+            f"(SELECT MAX({column}) FROM {table}) AS T{i}"
+            for i, (table, column) in enumerate(columns.items()) if column
+        ]
+        if not selects:
+            return {}
+
+        row = self.agent.db.execute_query("SELECT " + ", ".join(selects), use_cache=False)[0]
+        values = list(row.values())
+        tracked = [table for table, column in columns.items() if column]
+        return {table: str(value) for table, value in zip(tracked, values)}
@@ -25,7 +25,8 @@ def build_system_prompt(schema_docs: str) -> str:
 
 ## Keyword Matching Best Practices
 When searching for keywords, brands, or product names:
-- Use flexible matching with ILIKE and wildcards: WHERE KEYWORD ILIKE '%search term%'
+- If the message lists exact warehouse values for a term, filter with = or IN on those values (faster than ILIKE)
+- Otherwise use flexible matching with ILIKE and wildcards: WHERE KEYWORD ILIKE '%search term%'
 - Handle spacing variations by using multiple OR conditions or REPLACE:
   Example: WHERE KEYWORD ILIKE '%CrossClimate%' OR KEYWORD ILIKE '%Cross Climate%'
   Or: WHERE REPLACE(KEYWORD, ' ', '') ILIKE REPLACE('%Cross Climate 2%', ' ', '')
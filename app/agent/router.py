@@ -0,0 +1,249 @@
+"""
+Complexity-based routing of LLM calls between a fast and a strong model.
+
+A cheap local classifier scores each question from keyword features and
+its schema footprint (how many tables it touches). Each phase (SQL
+generation, summary, fix) then runs on the fast or strong model per the
+ROUTING_* settings. Decisions are appended to a JSONL log together with
+latency and outcome so the threshold can be tuned:
+
+    python -m app.agent.router [data/routing.jsonl]
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.agent.models import MODELS
+from app.database.schema import TABLES
+from config import settings
+
+
+_AGGREGATION = re.compile(
+    r"\b(average|avg|mean|median|total|sum|count|how many|max(imum)?|min(imum)?|top \d+|"
+    r"rank(ing)?|percent(age)?|ratio|share|distribution|growth|per|by (month|week|quarter|year|brand|seller))\b"
+)
+_TIME_WINDOW = re.compile(
+    r"\b(last|past|previous|this|next) (day|week|month|quarter|year|\d+ (days|weeks|months|years))\b|"
+    r"\b(yoy|mom|year over year|month over month|since|between|trend(s|ing)?|season(al|ality)?|"
+    r"q[1-4]|20\d\d|january|february|march|april|may|june|july|august|september|october|"
+    r"november|december)\b"
+)
+_COMPARISON = re.compile(r"\b(compare[ds]?|comparison|vs\.?|versus|against|correlat\w*|relative to|difference)\b")
+_CONVERSATIONAL = re.compile(
+    r"^(hi|hello|hey|thanks|thank you|what can you|who are you|help|how do i|explain|what does)\b"
+)
+
+# Name and column words too generic to tie a question to a table
+_GENERIC_WORDS = {
+    "priority", "tire", "data", "umip", "mock", "master", "analysis", "metrics",
+    "name", "type", "date", "value", "at", "id", "is", "of", "the",
+}
+
+
+def _words(identifier: str) -> set[str]:
+    """Singular, non-generic words of an identifier."""
+    words = {w.rstrip("s") for w in identifier.lower().split("_")}
+    return {w for w in words if len(w) > 2 and w not in _GENERIC_WORDS}
+
+
+def _table_vocabulary() -> dict[str, tuple[set[str], set[str]]]:
+    """
+    Per table: (distinctive words of its name, distinctive column words).
+
+    Words shared by many tables (e.g. KEYWORD) say nothing about which
+    table a question needs, so name words must be unique to one table and
+    column words may appear in at most three.
+    """
+    names = {table.name: _words(table.name.rsplit(".", 1)[-1]) for table in TABLES}
+    columns = {
+        table.name: set().union(*(_words(col.name) for col in table.columns)) for table in TABLES
+    }
+    name_counts = Counter(word for words in names.values() for word in words)
+    column_counts = Counter(word for words in columns.values() for word in words)
+
+    return {
+        table: (
+            {w for w in names[table] if name_counts[w] == 1},
+            {w for w in columns[table] if column_counts[w] <= 3} - names[table],
+        )
+        for table in names
+    }
+
+
+_VOCABULARY = _table_vocabulary()
+
+
+def schema_footprint(question: str) -> list[str]:
+    """
+    Tables a question likely touches.
+
+    A table counts when the question names it (a distinctive word of its
+    table name) or mentions at least two of its distinctive column words.
+    """
+    words = set(re.findall(r"[a-z0-9]+", question.lower()))
+    words |= {w.rstrip("s") for w in words}
+    return [
+        table for table, (name_words, column_words) in _VOCABULARY.items()
+        if name_words & words or len(column_words & words) >= 2
+    ]
+
+
+@dataclass
+class RouteDecision:
+    """Model choice for one question."""
+    score: float
+    tier: str  # "fast" or "strong"
+    features: dict
+    models: dict[str, str | None] = field(default_factory=dict)
+
+    def model(self, phase: str) -> str | None:
+        """Model key for a phase (None = the globally selected model)."""
+        return self.models.get(phase)
+
+
+class ModelRouter:
+    """
+    Scores questions and picks a model per phase.
+
+    When ROUTING_ENABLED is false every phase uses the model selected
+    through /api/model, and nothing is logged. When it is true, unknown
+    ROUTING_* models or tiers raise ValueError here, at startup, rather
+    than a KeyError on every routed question.
+    """
+
+    # Feature weights for the complexity score
+    WEIGHTS = {
+        "extra_tables": 2.0,
+        "aggregation": 1.0,
+        "time_window": 1.0,
+        "comparison": 1.5,
+        "follow_up": 0.5,
+        "long_question": 1.0,
+    }
+
+    # Questions longer than this many words count as long
+    LONG_QUESTION_WORDS = 25
+
+    # Values of the ROUTING_*_TIER settings
+    TIERS = ("auto", "fast", "strong")
+
+    def __init__(self, log_path: str | None = None):
+        self.log_path = log_path or os.path.join(settings.data_dir, "routing.jsonl")
+        self._lock = threading.Lock()
+        if settings.routing_enabled:
+            self.check_settings()
+
+    @classmethod
+    def check_settings(cls):
+        """Check the ROUTING_* models are in MODELS and the tiers are known."""
+        for name, model in (("ROUTING_FAST_MODEL", settings.routing_fast_model),
+                            ("ROUTING_STRONG_MODEL", settings.routing_strong_model)):
+            if model not in MODELS:
+                raise ValueError(f"{name}={model!r} is not one of: {', '.join(MODELS)}")
+        for name, tier in (("ROUTING_SQL_TIER", settings.routing_sql_tier),
+                           ("ROUTING_SUMMARY_TIER", settings.routing_summary_tier),
+                           ("ROUTING_FIX_TIER", settings.routing_fix_tier)):
+            if tier not in cls.TIERS:
+                raise ValueError(f"{name}={tier!r} is not one of: {', '.join(cls.TIERS)}")
+
+    def features(self, question: str, history: list[dict] | None = None) -> dict:
+        """Keyword and schema-footprint features of a question."""
+        text = question.lower().strip()
+        tables = schema_footprint(text)
+        return {
+            "tables": len(tables),
+            "extra_tables": max(0, len(tables) - 1),
+            "aggregation": len(_AGGREGATION.findall(text)),
+            "time_window": bool(_TIME_WINDOW.search(text)),
+            "comparison": bool(_COMPARISON.search(text)),
+            "follow_up": bool(history),
+            "long_question": len(text.split()) > self.LONG_QUESTION_WORDS,
+            "conversational": bool(_CONVERSATIONAL.search(text)) and not tables,
+        }
+
+    def score(self, features: dict) -> float:
+        return sum(weight * float(features[name]) for name, weight in self.WEIGHTS.items())
+
+    def route(self, question: str, history: list[dict] | None = None) -> RouteDecision:
+        """Classify a question and choose the model for each phase."""
+        features = self.features(question, history)
+        score = 0.0 if features["conversational"] else self.score(features)
+        tier = "strong" if score >= settings.routing_threshold else "fast"
+        decision = RouteDecision(score=score, tier=tier, features=features)
+
+        if settings.routing_enabled:
+            tiers = {
+                "sql": settings.routing_sql_tier,
+                "summary": settings.routing_summary_tier,
+                "fix": settings.routing_fix_tier,
+            }
+            models = {"fast": settings.routing_fast_model, "strong": settings.routing_strong_model}
+            decision.models = {
+                phase: models[tier if configured == "auto" else configured]
+                for phase, configured in tiers.items()
+            }
+        return decision
+
+    def log(self, question: str, decision: RouteDecision, latency_ms: float, error: str | None):
+        """Append a routing decision and its outcome to the JSONL log."""
+        if not settings.routing_enabled:
+            return
+        entry = {
+            "ts": round(time.time(), 3),
+            "question": question[:200],
+            "score": decision.score,
+            "tier": decision.tier,
+            "models": decision.models,
+            "features": decision.features,
+            "latency_ms": round(latency_ms, 1),
+            "success": error is None,
+            "error": error,
+        }
+        with self._lock:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def summarize_log(path: str) -> dict:
+    """
+    Latency and success rate per tier and per score from a routing log.
+
+    Returns:
+        {"tiers": {tier: {...}}, "scores": {score: {...}}} where each entry
+        has count, success_rate, p50_ms and p95_ms
+    """
+    groups: dict[str, dict[str, list[dict]]] = {"tiers": {}, "scores": {}}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                groups["tiers"].setdefault(entry["tier"], []).append(entry)
+                groups["scores"].setdefault(str(entry["score"]), []).append(entry)
+
+    def stats(entries):
+        latencies = sorted(e["latency_ms"] for e in entries)
+        return {
+            "count": len(entries),
+            "success_rate": round(sum(e["success"] for e in entries) / len(entries), 3),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+
+    return {
+        name: {key: stats(entries) for key, entries in sorted(group.items())}
+        for name, group in groups.items()
+    }
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(settings.data_dir, "routing.jsonl")
+    print(json.dumps(summarize_log(log_path), indent=2))
@@ -0,0 +1,106 @@
+"""
+Approximate answers from a sample of the large tables.
+
+Exploratory aggregates ("typical price spread by seller") over the
+scraper table do not need every row before the user decides to dig in.
+In approximate mode the generated query is rewritten to read a
+``SAMPLE SYSTEM (p)`` sample of each large table it references, which
+skips most micro-partitions instead of scanning them, and its result is
+streamed as a preview labelled approximate. The exact query can then run
+and replace it.
+
+Only aggregating queries are sampled: a row listing ("the 10 cheapest
+listings") from a sample is not an estimate of anything. Nor is a count
+or a total, which over a p% sample comes out p% of the true value; those
+are sampled only as part of a ratio ("share of listings under $100"),
+where the factor cancels.
+"""
+
+import re
+
+from app.agent.validator import _NOT_ALIASES, _TABLE_REF, table_columns
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_SAMPLE_CLAUSE = re.compile(
+    r"\b(?:SAMPLE|TABLESAMPLE)\s*(?:SYSTEM|BLOCK|BERNOULLI|ROW)?\s*\(\s*(\d+(?:\.\d+)?)\s*\)",
+    re.IGNORECASE
+)
+_AGGREGATE = re.compile(
+    r"\bGROUP\s+BY\b|\b(?:COUNT|SUM|AVG|MEDIAN|MIN|MAX|STDDEV\w*|VAR\w*|PERCENTILE_\w+|APPROX_\w+)\s*\(",
+    re.IGNORECASE
+)
+# Aggregates that grow with the rows read
+_ADDITIVE = re.compile(r"\b(?:COUNT|COUNT_IF|SUM|APPROX_COUNT_DISTINCT|HLL)\s*\(", re.IGNORECASE)
+# After an aggregate: an optional cast and factors, then the division
+_DIVIDEND = re.compile(r"(?:\s*::\s*\w+)?(?:\s*\*\s*[\w.]+)*\s*/")
+# Before an aggregate: the division, then optional NULLIF( or ZEROIFNULL( wrappers
+_DIVISOR = re.compile(r"/(?:\s*(?:NULLIF|ZEROIFNULL|NVL|COALESCE)?\s*\()*\s*$", re.IGNORECASE)
+
+
+def _mask(sql: str) -> str:
+    """Blank out literals and comments, keeping every other character in place."""
+    return _LITERAL.sub(lambda m: " " * len(m.group(0)), sql)
+
+
+def _closing(masked: str, start: int) -> int:
+    """Index just past the parenthesis closing the one at ``start``."""
+    depth = 0
+    for index in range(start, len(masked)):
+        if masked[index] == "(":
+            depth += 1
+        elif masked[index] == ")":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return len(masked)
+
+
+def _scales_with_sample(masked: str) -> bool:
+    """Whether any count or total is used other than as a ratio operand."""
+    for match in _ADDITIVE.finditer(masked):
+        end = _closing(masked, match.end() - 1)
+        if not (_DIVIDEND.match(masked, end) or _DIVISOR.search(masked[:match.start()])):
+            return True
+    return False
+
+
+def sample_percent(sql: str) -> float | None:
+    """The sampling percentage of a query's first SAMPLE clause, if it has one."""
+    match = _SAMPLE_CLAUSE.search(_mask(sql))
+    return float(match.group(1)) if match else None
+
+
+def sample_query(sql: str, percent: float, tables: set[str]) -> str | None:
+    """
+    Rewrite an aggregating query to read a sample of the given tables.
+
+    ``SAMPLE SYSTEM (percent)`` is inserted after every reference to one
+    of ``tables`` (fully qualified, upper case), after its alias if it has
+    one. Returns None when there is nothing to sample: the query does not
+    aggregate, counts or totals rows outside a ratio, already samples, or
+    reads none of the tables.
+    """
+    masked = _mask(sql)
+    if _SAMPLE_CLAUSE.search(masked) or not _AGGREGATE.search(masked) or _scales_with_sample(masked):
+        return None
+
+    known = table_columns()
+    short_names = {name.rsplit(".", 1)[-1]: name for name in known}
+
+    positions = []
+    for match in _TABLE_REF.finditer(masked):
+        ref = match.group(1).upper()
+        table = ref if ref in known else short_names.get(ref)
+        if table not in tables:
+            continue
+        alias = match.group(2)
+        positions.append(match.end(2) if alias and alias.upper() not in _NOT_ALIASES else match.end(1))
+
+    if not positions:
+        return None
+
+    clause = f" SAMPLE SYSTEM ({percent:g})"
+    for position in reversed(positions):
+        sql = sql[:position] + clause + sql[position:]
+    return sql
@@ -1,10 +1,79 @@
 """SQL Agent - orchestrates LLM and database interactions."""
 
+import logging
 import re
-from app.agent.llm import LLMClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable
+from app.agent.fast_path import render_fast_answer
+from app.agent.memory import ConversationMemory
+from app.agent.models import MODELS
 from app.agent.prompts import build_system_prompt
-from app.database.snowflake import SnowflakeClient
+from app.agent.router import ModelRouter, RouteDecision
+from app.agent.sampling import sample_percent, sample_query
+from app.agent.validator import validate_sql
+from app.database.local import LocalResultEngine
 from app.database.schema import get_schema_documentation
+from app.database.snowflake import served_from_cache
+from app.database.values import dictionary
+from app.database.workload import workload
+from app.utils.deadline import Deadline
+from app.utils import metrics, tracing
+from app.utils.digest import build_result_digest, estimate_tokens
+from app.utils.recording import build_clients
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Steps of a stream pipeline (see SQLAgent._stream_pipeline), performed by its driver
+
+@dataclass
+class Stream:
+    """Start an LLM token stream; the reply is a handle for NextToken."""
+
+    phase: str
+    model_key: str | None
+    prompt: str
+    history: list[dict] | None
+    timeout: float
+
+
+@dataclass
+class NextToken:
+    """The next token of a Stream, or None once it is finished."""
+
+    stream: Any
+
+
+@dataclass
+class Speculate:
+    """Draft SQL candidates and pick one (see SQLAgent._generate_speculative)."""
+
+    prompt: str
+    history: list[dict] | None
+    conversation_id: str | None
+    model_key: str | None
+    timeout: float
+
+
+@dataclass
+class Execute:
+    """Run a query locally or in the warehouse (see SQLAgent._execute)."""
+
+    sql: str
+    conversation_id: str | None
+    timeout: float
+
+
+class Call:
+    """Blocking work (prompts, digests, file writes), kept off the event loop by async drivers."""
+
+    def __init__(self, fn: Callable, *args):
+        self.fn = fn
+        self.args = args
 
 
 class SQLAgent:
@@ -13,11 +82,34 @@ class SQLAgent:
     and returns results with explanations.
     """
 
-    def __init__(self):
-        self.llm = LLMClient()
-        self.db = SnowflakeClient()
+    # Approximate token budget for the result digest in summary prompts
+    SUMMARY_DIGEST_TOKENS = 1500
+
+    # Share of the remaining request budget each phase may use
+    PHASE_SHARES = {"sql": 0.5, "preview": 0.3, "execute": 0.6, "fix": 0.5, "summary": 1.0}
+
+    # Optional phases are skipped when fewer seconds than this remain
+    MIN_PHASE_SECONDS = {"fix": 5.0, "summary": 3.0}
+
+    def __init__(self, llm=None, db=None):
+        """
+        Args:
+            llm: LLM client (defaults per REPLAY_MODE, see app.utils.recording)
+            db: Database client (defaults per REPLAY_MODE)
+        """
+        if llm is None or db is None:
+            default_llm, default_db = build_clients(
+                settings.replay_mode, settings.replay_fixture, settings.replay_realtime
+            )
+            llm = llm or default_llm
+            db = db or default_db
+        self.llm = llm
+        self.db = db
         self.schema_docs = get_schema_documentation()
         self.system_prompt = build_system_prompt(self.schema_docs)
+        self.memory = ConversationMemory()
+        self.local = LocalResultEngine()
+        self.router = ModelRouter()
 
     def set_model(self, model_key: str, model_identifier: str):
         """
@@ -26,30 +118,160 @@ class SQLAgent:
         Args:
             model_key: Frontend model key (e.g., 'claude-sonnet', 'deepseek-v3')
             model_identifier: Actual model identifier for the API
+
+        With ROUTING_ENABLED, routed phases use the ROUTING_*_MODEL models instead.
         """
         self.llm.set_model(model_key, model_identifier)
     
-    def ask(self, question: str) -> dict:
+    def ask(
+        self,
+        question: str,
+        llm_summary: bool = False,
+        conversation_id: str | None = None,
+        deadline: Deadline | None = None
+    ) -> dict:
         """
         Process a user question and return an answer.
         
         Args:
             question: Natural language question from the user
+            llm_summary: Always summarize with the LLM, even for trivial results
+            conversation_id: Optional ID whose earlier turns give the LLM context
+            deadline: Time budget for the whole question
+                (defaults to REQUEST_DEADLINE_SECONDS)
         
         Returns:
             {
                 "answer": str,      # Natural language response
                 "sql": str | None,  # Generated SQL if any
                 "data": list | None, # Query results if any
-                "error": str | None  # Error message if any
+                "error": str | None, # Error message if any
+                "fast_path": dict | None, # Set when the summary LLM call was skipped
+                "source": str | None, # "warehouse" or "local" (cached result refined in-process)
+                "budget": dict      # Time used per phase (see Deadline.report)
             }
         """
+        start = time.perf_counter()
+        deadline = deadline or Deadline(settings.request_deadline_seconds)
+        route = self._route(question, conversation_id)
+        with tracing.span("agent.ask", conversation_id=conversation_id or "") as span:
+            result = self._ask(question, llm_summary, conversation_id, route, deadline)
+            self._trace_result(span, result)
+        result["budget"] = deadline.report()
+        self.router.log(question, route, (time.perf_counter() - start) * 1000, result["error"])
+        self.record_metrics("ask", deadline, result["error"])
+
+        if conversation_id:
+            self.memory.record(
+                conversation_id, question, result["sql"], result["data"], result["answer"]
+            )
+        return result
+
+    def remember(
+        self,
+        conversation_id: str,
+        question: str,
+        sql: str | None,
+        results: list[dict] | None,
+        answer: str
+    ):
+        """Record an answer served outside the agent (e.g. a pinned result) in a conversation."""
+        self.memory.record(conversation_id, question, sql, results, answer)
+        if results is not None:
+            self.local.store(conversation_id, results, complete=len(results) < self.db.MAX_ROWS)
+
+    def record_metrics(self, mode: str, deadline: Deadline, error: str | None):
+        """Export a finished question's phase timings and outcome."""
+        for phase, ms in deadline.phases.items():
+            metrics.PHASE_DURATION.observe(ms / 1000, phase=phase)
+        metrics.QUESTIONS.inc(mode=mode, outcome="error" if error else "ok")
+
+    def model_label(self, model_key: str | None) -> str:
+        """Model name for metrics: the routed model, else the active one."""
+        if model_key in MODELS:
+            return MODELS[model_key][1]
+        return getattr(self.llm, "model", None) or "default"
+
+    @staticmethod
+    def _trace_result(span: tracing.Span, result: dict):
+        """Record a finished question's outcome on its span."""
+        span.set_attribute("sql", result.get("sql") or "")
+        span.set_attribute("rows", len(result["data"]) if result.get("data") is not None else 0)
+        if result.get("error"):
+            span.fail(result["error"])
+
+    @contextmanager
+    def _timed_llm(self, phase: str, model_key: str | None):
+        """Time and trace a non-streaming LLM call."""
+        model = self.model_label(model_key)
+        with tracing.span(f"llm.{phase}", model=model), metrics.LLM_GENERATION.time(model=model, phase=phase):
+            yield
+
+    def _timed_stream(self, phase: str, model_key: str | None, stream):
+        """Pass an LLM token stream through, timing and tracing its first token and its total."""
+        model = self.model_label(model_key)
+        start = time.perf_counter()
+        first = True
+        with tracing.span(f"llm.{phase}", model=model) as span:
+            try:
+                for token in stream:
+                    if first:
+                        metrics.LLM_FIRST_TOKEN.observe(time.perf_counter() - start, model=model, phase=phase)
+                        span.add_event("first_token")
+                        first = False
+                    yield token
+            finally:
+                metrics.LLM_GENERATION.observe(time.perf_counter() - start, model=model, phase=phase)
+
+    def _extract_checked(self, response: str) -> tuple[str | None, bool]:
+        """Extract the SQL from an LLM response and run the safety check, traced."""
+        with tracing.span("sql.extract"):
+            sql = self._extract_sql(response)
+        if not sql:
+            return None, False
+        with tracing.span("sql.safety_check") as span:
+            safe = self._is_safe_query(sql)
+            span.set_attribute("allowed", safe)
+        return sql, safe
+
+    def _build_prompt(self, question: str, conversation_id: str | None) -> tuple[list[dict] | None, str]:
+        """Conversation history and user message for the SQL generation call."""
+        with tracing.span("prompt.build"):
+            history = self.memory.history(conversation_id) if conversation_id else None
+            return history, self._with_local_context(self._with_known_values(question), conversation_id)
+
+    def _route(self, question: str, conversation_id: str | None) -> RouteDecision:
+        """Pick the fast or strong model for each phase of a question."""
+        history = self.memory.history(conversation_id) if conversation_id else None
+        return self.router.route(question, history)
+
+    def _ask(
+        self,
+        question: str,
+        llm_summary: bool,
+        conversation_id: str | None,
+        route: RouteDecision,
+        deadline: Deadline
+    ) -> dict:
+        """Run one question through generate, execute and summarize (see ask)."""
+        history, prompt = self._build_prompt(question, conversation_id)
+
         try:
             # Get LLM response
-            llm_response = self.llm.generate(question, self.system_prompt)
+            with deadline.phase("sql"), self._timed_llm("sql", route.model("sql")):
+                timeout = deadline.share(self.PHASE_SHARES["sql"])
+                if settings.speculative_candidates > 1:
+                    llm_response = self._generate_speculative(
+                        prompt, history, conversation_id, route.model("sql"), timeout
+                    )
+                else:
+                    llm_response = self.llm.generate(
+                        prompt, self.system_prompt, history,
+                        model_key=route.model("sql"), timeout=timeout
+                    )
             
-            # Extract SQL from response if present
-            sql_query = self._extract_sql(llm_response)
+            # Extract SQL from response if present, and check it is safe
+            sql_query, safe = self._extract_checked(llm_response)
             
             if not sql_query:
                 # No SQL generated - just a conversational response
@@ -60,8 +282,9 @@ class SQLAgent:
                     "error": None
                 }
             
-            # Validate the query is safe
-            if not self._is_safe_query(sql_query):
+            # Refuse anything but a SELECT
+            if not safe:
+                metrics.QUERIES_BLOCKED.inc()
                 return {
                     "answer": "I can only run SELECT queries for safety reasons.",
                     "sql": sql_query,
@@ -71,22 +294,40 @@ class SQLAgent:
             
             # Execute the query
             try:
-                results = self.db.execute_query(sql_query)
+                with deadline.phase("execute"):
+                    results = self._execute(
+                        sql_query, conversation_id, deadline.share(self.PHASE_SHARES["execute"])
+                    )
                 
-                # Generate a summary of results
-                summary = self._summarize_results(question, sql_query, results)
+                # Answer deterministically for trivial shapes, else summarize
+                fast_path = self._fast_answer(sql_query, results, llm_summary)
+                if fast_path:
+                    summary = fast_path.pop("answer")
+                else:
+                    summary = self._summarize_results(
+                        question, sql_query, results, route.model("summary"), deadline
+                    )
                 
                 return {
                     "answer": summary,
                     "sql": sql_query,
                     "data": results,
-                    "error": None
+                    "error": None,
+                    "fast_path": fast_path,
+                    "source": self._query_source(sql_query, conversation_id)
                 }
             except Exception as db_error:
                 # Query failed - ask LLM to fix it
-                return self._handle_query_error(question, sql_query, str(db_error))
+                metrics.ERRORS.inc(stage="execute")
+                with tracing.span("agent.fix", error=str(db_error)) as span:
+                    result = self._handle_query_error(
+                        question, sql_query, str(db_error), llm_summary, conversation_id, route, deadline
+                    )
+                    span.set_attribute("fixed", result["error"] is None)
+                return result
                 
         except Exception as e:
+            metrics.ERRORS.inc(stage="agent")
             return {
                 "answer": "Sorry, I encountered an error processing your question.",
                 "sql": None,
@@ -94,6 +335,202 @@ class SQLAgent:
                 "error": str(e)
             }
     
+    def _generate_speculative(
+        self,
+        prompt: str,
+        history: list[dict] | None,
+        conversation_id: str | None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ) -> str:
+        """
+        Draft several SQL candidates concurrently and keep the cheapest valid one.
+
+        Candidates are sampled at temperatures spread over 0..1, then checked
+        in parallel: safety, static schema validation and an EXPLAIN cost
+        estimate (queries over cached local results cost nothing). The valid
+        candidate with the fewest bytes assigned wins; ties go to the lowest
+        temperature. If no candidate is valid, the lowest-temperature draft is
+        returned and goes through the normal fix loop.
+
+        Returns:
+            The chosen LLM response text
+        """
+        count = settings.speculative_candidates
+        temperatures = [round(i / (count - 1), 2) for i in range(count)]
+        start = time.perf_counter()
+        parent = tracing.current_span()
+
+        def draft(temperature):
+            try:
+                with tracing.span("sql.candidate", parent=parent, temperature=temperature):
+                    return self.llm.generate(
+                        prompt, self.system_prompt, history, temperature, model_key, timeout
+                    )
+            except Exception as e:
+                logger.warning("Candidate at temperature %s failed: %s", temperature, e)
+                return None
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            responses = [r for r in pool.map(draft, temperatures) if r is not None]
+        return self._pick_candidate(responses, conversation_id, start)
+
+    def _pick_candidate(
+        self,
+        responses: list[str],
+        conversation_id: str | None,
+        start: float
+    ) -> str:
+        """Choose among drafted responses, ordered by temperature (see _generate_speculative)."""
+        if not responses:
+            raise RuntimeError("All candidate generations failed")
+
+        # A conversational answer at the lowest temperature wins outright
+        if not self._extract_sql(responses[0]):
+            return responses[0]
+
+        candidates = {}
+        for index, response in enumerate(responses):
+            sql = self._extract_sql(response)
+            if sql:
+                candidates.setdefault(" ".join(sql.split()), (index, response, sql))
+
+        parent = tracing.current_span()
+
+        def cost(candidate):
+            index, response, sql = candidate
+            if not self._is_safe_query(sql) or validate_sql(sql):
+                return None
+            if self._query_source(sql, conversation_id) == "local":
+                return 0
+            try:
+                with tracing.span("sql.explain", parent=parent):
+                    return self.db.explain(sql)["bytes_assigned"]
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            costs = list(pool.map(cost, candidates.values()))
+
+        valid = [
+            (bytes_assigned, index, response)
+            for bytes_assigned, (index, response, _) in zip(costs, candidates.values())
+            if bytes_assigned is not None
+        ]
+        logger.info(
+            "Speculative SQL: drafted=%d distinct=%d valid=%d elapsed_ms=%.1f",
+            len(responses), len(candidates), len(valid), (time.perf_counter() - start) * 1000
+        )
+
+        if not valid:
+            return responses[0]
+        return min(valid)[2]
+
+    def _with_local_context(self, message: str, conversation_id: str | None) -> str:
+        """
+        Tell the LLM which earlier results it can refine in-process.
+
+        The note is appended to the user message rather than the system
+        prompt so the cached system prompt prefix stays unchanged.
+        """
+        tables = self.local.describe(conversation_id) if conversation_id else None
+        if not tables:
+            return message
+
+        return f"""{message}
+
+[Earlier results are cached locally and can be queried with SQL (DuckDB dialect, unqualified table names):
+{tables}
+If this question only filters, sorts, aggregates or joins those results, query these tables instead of the warehouse - it is instant and free. If it needs other rows, columns or tables, query the warehouse as usual.]"""
+
+    def _with_known_values(self, message: str) -> str:
+        """
+        Tell the LLM which exact warehouse values the question's terms refer to,
+        so it filters with = or IN (which prune partitions) instead of ILIKE.
+        """
+        known = dictionary.describe(message)
+        if not known:
+            return message
+
+        return f"""{message}
+
+[Exact warehouse values for terms in this question (use these literals with = or IN):
+{known}]"""
+
+    def _sampled(self, sql: str, conversation_id: str | None) -> str | None:
+        """The query rewritten to read a sample of the large tables, if it can be."""
+        if self._query_source(sql, conversation_id) != "warehouse":
+            return None
+        return sample_query(sql, settings.sample_percent, settings.sample_tables)
+
+    @staticmethod
+    def _preview_event(sql: str, results: list[dict]) -> dict:
+        """Stream event for an approximate result, replaced by the complete event."""
+        return {
+            "type": "preview",
+            "sql": sql,
+            "data": results,
+            "row_count": len(results),
+            "sample_percent": sample_percent(sql)
+        }
+
+    @staticmethod
+    def _label_approximate(event: dict) -> None:
+        """Mark a complete event whose data came from a sampled query."""
+        percent = sample_percent(event["sql"]) if event.get("sql") and event.get("data") else None
+        if percent is not None:
+            event["approximate"] = {"sample_percent": percent}
+
+    def _query_source(self, sql: str, conversation_id: str | None) -> str:
+        """Where a query runs: the in-process result engine or Snowflake."""
+        if conversation_id and self.local.references_local(sql):
+            return "local"
+        return "warehouse"
+
+    def _execute(
+        self,
+        sql: str,
+        conversation_id: str | None,
+        timeout: float | None = None
+    ) -> list[dict]:
+        """
+        Execute a query locally or in the warehouse and cache its result.
+
+        Queries over LAST_RESULT/PREVIOUS_RESULT run in-process; everything
+        else goes to Snowflake (within ``timeout`` seconds, if given).
+        Successful results become the conversation's new LAST_RESULT.
+        """
+        source = self._query_source(sql, conversation_id)
+
+        start = time.perf_counter()
+        with tracing.span("sql.execute", source=source) as span:
+            if source == "local":
+                results = self.local.execute_query(conversation_id, sql)
+            else:
+                results = self.db.execute_query(sql, timeout=timeout)
+            span.set_attribute("rows", len(results))
+        self._record_execution(source, sql, results, time.perf_counter() - start, conversation_id)
+        return results
+
+    def _record_execution(
+        self,
+        source: str,
+        sql: str,
+        results: list[dict],
+        seconds: float,
+        conversation_id: str | None
+    ):
+        """Log and export an execution and make its result the conversation's LAST_RESULT."""
+        if conversation_id:
+            self.local.store(conversation_id, results, complete=len(results) < self.db.MAX_ROWS)
+        logger.info("Executed %s query: rows=%d elapsed_ms=%.1f", source, len(results), seconds * 1000)
+        metrics.SQL_EXECUTION.observe(seconds, source=source)
+        metrics.RESULT_ROWS.observe(len(results), source=source)
+        # Queries the warehouse ran (not result cache hits) feed the
+        # fingerprint log (python -m app.database.workload); written off this thread
+        if source == "warehouse" and workload is not None and not served_from_cache():
+            workload.submit(sql, seconds, len(results))
+
     def _extract_sql(self, response: str) -> str | None:
         """Extract SQL query from LLM response."""
         # Look for SQL in code blocks
@@ -148,32 +585,77 @@ class SQLAgent:
         self, 
         question: str, 
         sql: str, 
-        results: list[dict]
+        results: list[dict],
+        model_key: str | None = None,
+        deadline: Deadline | None = None
     ) -> str:
-        """Generate a natural language summary of query results."""
+        """
+        Generate a natural language summary of query results.
+
+        With a deadline, the summary uses whatever time is left; when too
+        little is left, or the call runs out of time, a one-line fallback is
+        returned instead.
+        """
         if not results:
             return "The query returned no results."
-        
-        # For smaller result sets, include all data
-        if len(results) <= 20:
-            results_to_show = results
-            results_note = f"Results ({len(results)} rows):"
-        else:
-            # For larger sets, show top 20 and summarize
-            results_to_show = results[:20]
-            results_note = f"Results (showing top 20 of {len(results)} total rows):"
-        
-        summary_prompt = f"""The user asked: "{question}"
+
+        summary_prompt = self._build_summary_prompt(question, sql, results)
+
+        if deadline is None:
+            with self._timed_llm("summary", model_key):
+                return self.llm.generate(summary_prompt, self.system_prompt, model_key=model_key)
+
+        if deadline.allows(self.MIN_PHASE_SECONDS["summary"]):
+            try:
+                with deadline.phase("summary"), self._timed_llm("summary", model_key):
+                    return self.llm.generate(
+                        summary_prompt, self.system_prompt, model_key=model_key,
+                        timeout=deadline.share(self.PHASE_SHARES["summary"])
+                    )
+            except Exception as e:
+                logger.warning("Summary abandoned: %s", e)
+                metrics.ERRORS.inc(stage="summary")
+
+        deadline.skip("summary")
+        return self._budget_fallback(results)
+
+    @staticmethod
+    def _budget_fallback(results: list[dict]) -> str:
+        """Answer used when the time budget leaves no room for a summary."""
+        return (
+            f"The query returned {len(results)} rows (shown below); there was not "
+            "enough time left to summarize them."
+        )
+
+    def _timeout(self, deadline: Deadline | None, phase: str) -> float | None:
+        """Seconds a phase may use, or None without a deadline."""
+        return deadline.share(self.PHASE_SHARES[phase]) if deadline else None
+
+    @staticmethod
+    def _phase(deadline: Deadline | None, name: str):
+        """Time a phase against the deadline, if there is one."""
+        return deadline.phase(name) if deadline else nullcontext()
+    
+    def _build_summary_prompt(
+        self,
+        question: str,
+        sql: str,
+        results: list[dict]
+    ) -> str:
+        """Build the summarization prompt from a digest of the full result set."""
+        digest = build_result_digest(results, max_tokens=self.SUMMARY_DIGEST_TOKENS)
+
+        return f"""The user asked: "{question}"
 
 I ran this query:
 ```sql
 {sql}
 ```
 
-{results_note}
-{results_to_show}
-
-Please provide a helpful, conversational answer to the user's question based on these results. 
+Result digest ({len(results)} rows; statistics cover every row, the sample is a subset):
+{digest}
+{self._sample_note(sql)}
+Please provide a helpful, conversational answer to the user's question based on these results.
 
 Guidelines:
 - Lead with the key insight or recommendation that directly answers their question
@@ -182,16 +664,65 @@ Guidelines:
 - If relevant, mention any patterns you notice in the data
 - Keep it concise but informative — write like you're advising a colleague
 - Don't just list data — interpret it and provide actionable recommendations"""
-        
-        return self.llm.generate(summary_prompt, self.system_prompt)
-    
-    def _handle_query_error(
-        self, 
-        question: str, 
-        failed_sql: str, 
-        error: str
-    ) -> dict:
-        """Handle a failed query by asking LLM to fix it."""
+
+    @staticmethod
+    def _sample_note(sql: str) -> str:
+        """Summary prompt caveat for a query that read a table sample."""
+        percent = sample_percent(sql)
+        if percent is None:
+            return ""
+        return f"""
+The query read a ~{percent:g}% sample of the table, so averages, spreads, shares and rankings are
+estimates. Say that the answer is approximate.
+"""
+
+    def _fast_answer(
+        self,
+        sql: str,
+        results: list[dict],
+        llm_summary: bool = False
+    ) -> dict | None:
+        """
+        Answer trivial result shapes without the summarization LLM call.
+
+        Returns:
+            {"answer": str, "shape": str, "render_ms": float,
+             "input_tokens_saved": int} or None if an LLM summary is needed
+        """
+        if llm_summary or not settings.summary_fast_path:
+            return None
+
+        start = time.perf_counter()
+        fast = render_fast_answer(results)
+        if fast is None:
+            return None
+        render_ms = (time.perf_counter() - start) * 1000
+
+        # Input tokens the skipped summary call would have sent
+        tokens_saved = estimate_tokens(self.system_prompt)
+        if results:
+            tokens_saved += estimate_tokens(self._build_summary_prompt("", sql, results))
+
+        logger.info(
+            "Fast-path answer: shape=%s render_ms=%.2f input_tokens_saved=%d",
+            fast.shape, render_ms, tokens_saved
+        )
+        percent = sample_percent(sql)
+        return {
+            "answer": fast.text if percent is None else f"Approximate (~{percent:g}% sample): {fast.text}",
+            "shape": fast.shape,
+            "render_ms": round(render_ms, 2),
+            "input_tokens_saved": tokens_saved
+        }
+
+    def _build_fix_prompt(
+        self,
+        question: str,
+        failed_sql: str,
+        error: str,
+        conversation_id: str | None
+    ) -> str:
+        """Ask the LLM to repair a query that failed to execute."""
         fix_prompt = f"""The following query failed:
 
 ```sql
@@ -203,26 +734,71 @@ Error: {error}
 Original question: "{question}"
 
 Please fix the query and explain what went wrong."""
-        
+
+        return self._with_local_context(fix_prompt, conversation_id)
+
+    def _handle_query_error(
+        self, 
+        question: str, 
+        failed_sql: str, 
+        error: str,
+        llm_summary: bool = False,
+        conversation_id: str | None = None,
+        route: RouteDecision | None = None,
+        deadline: Deadline | None = None
+    ) -> dict:
+        """Handle a failed query by asking LLM to fix it (skipped if out of time)."""
+        fix_model = route.model("fix") if route else None
+        summary_model = route.model("summary") if route else None
+
+        if deadline is not None and not deadline.allows(self.MIN_PHASE_SECONDS["fix"]):
+            deadline.skip("fix")
+            metrics.FIX_ATTEMPTS.inc(outcome="skipped")
+            return {
+                "answer": f"I generated a query but it failed: {error}",
+                "sql": failed_sql,
+                "data": None,
+                "error": error
+            }
+
+        fix_prompt = self._build_fix_prompt(question, failed_sql, error, conversation_id)
+
         try:
-            response = self.llm.generate(fix_prompt, self.system_prompt)
-            fixed_sql = self._extract_sql(response)
+            with self._phase(deadline, "fix"), self._timed_llm("fix", fix_model):
+                response = self.llm.generate(
+                    fix_prompt, self.system_prompt, model_key=fix_model,
+                    timeout=self._timeout(deadline, "fix")
+                )
+            fixed_sql, fixed_safe = self._extract_checked(response)
             
-            if fixed_sql and self._is_safe_query(fixed_sql):
+            if fixed_sql and fixed_safe:
                 # Try the fixed query
-                results = self.db.execute_query(fixed_sql)
-                summary = self._summarize_results(question, fixed_sql, results)
+                with self._phase(deadline, "execute"):
+                    results = self._execute(
+                        fixed_sql, conversation_id, self._timeout(deadline, "execute")
+                    )
+                fast_path = self._fast_answer(fixed_sql, results, llm_summary)
+                if fast_path:
+                    summary = fast_path.pop("answer")
+                else:
+                    summary = self._summarize_results(
+                        question, fixed_sql, results, summary_model, deadline
+                    )
                 
+                metrics.FIX_ATTEMPTS.inc(outcome="fixed")
                 return {
                     "answer": f"(Fixed query) {summary}",
                     "sql": fixed_sql,
                     "data": results,
-                    "error": None
+                    "error": None,
+                    "fast_path": fast_path,
+                    "source": self._query_source(fixed_sql, conversation_id)
                 }
         except Exception:
             pass
         
         # Couldn't fix it
+        metrics.FIX_ATTEMPTS.inc(outcome="failed")
         return {
             "answer": f"I generated a query but it failed: {error}",
             "sql": failed_sql,
@@ -230,7 +806,14 @@ Please fix the query and explain what went wrong."""
             "error": error
         }
 
-    def ask_stream(self, question: str):
+    def ask_stream(
+        self,
+        question: str,
+        llm_summary: bool = False,
+        conversation_id: str | None = None,
+        deadline: Deadline | None = None,
+        approximate: bool = False
+    ):
         """
         Process a user question and stream the response in real-time.
 
@@ -238,19 +821,161 @@ Please fix the query and explain what went wrong."""
             {"type": "token", "content": "text"}
             {"type": "sql", "content": "SELECT ..."}
             {"type": "status", "content": "status message"}
+            {"type": "preview", "sql": "...", "data": [...], "sample_percent": 10.0}
             {"type": "data_ready", "row_count": 123}
             {"type": "complete", "sql": "...", "data": [...]}
             {"type": "error", "content": "error message"}
+
+        The complete event carries a "fast_path" report when the summary
+        LLM call was skipped (see _fast_answer), and a "budget" report of
+        the time each phase used out of the deadline (see ask).
+
+        With approximate, an aggregate over the large tables first runs on
+        a sample and streams as a preview (see _sampled); the exact query
+        then runs and its complete event replaces the preview, unless
+        APPROXIMATE_EXACT is off. A complete event answered from a sample
+        carries "approximate": {"sample_percent": ...}.
+
+        With a conversation_id, earlier turns are sent as conversation
+        history and the answered turn is recorded once complete.
+        """
+        yield from self._drive(
+            self._stream_pipeline(question, llm_summary, conversation_id, deadline, approximate)
+        )
+
+    def _drive(self, pipeline):
+        """Run a stream pipeline (see _stream_pipeline), performing its steps in this thread."""
+        reply, error = None, None
+        try:
+            while True:
+                try:
+                    step = pipeline.throw(error) if error else pipeline.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(step, dict):
+                    yield step
+                    continue
+                try:
+                    if isinstance(step, Stream):
+                        tokens = self.llm.generate_stream(
+                            step.prompt, self.system_prompt, step.history,
+                            model_key=step.model_key, timeout=step.timeout
+                        )
+                        reply = iter(self._timed_stream(step.phase, step.model_key, tokens))
+                    elif isinstance(step, NextToken):
+                        reply = next(step.stream, None)
+                    elif isinstance(step, Speculate):
+                        reply = self._generate_speculative(
+                            step.prompt, step.history, step.conversation_id, step.model_key, step.timeout
+                        )
+                    elif isinstance(step, Execute):
+                        reply = self._execute(step.sql, step.conversation_id, step.timeout)
+                    else:
+                        reply = step.fn(*step.args)
+                except Exception as e:
+                    error = e
+        finally:
+            pipeline.close()
+
+    def _stream_pipeline(
+        self,
+        question: str,
+        llm_summary: bool,
+        conversation_id: str | None,
+        deadline: Deadline | None,
+        approximate: bool
+    ):
         """
+        ask_stream as a generator of events and steps, shared by the sync
+        and async drivers.
+
+        Events (dicts) go to the client. Steps (Stream, NextToken,
+        Speculate, Execute, Call) are the LLM, warehouse and blocking work:
+        the driver performs each one and sends its result back, or throws
+        its exception in. SQLAgent._drive performs them in the calling
+        thread; AsyncSQLAgent._drive awaits them, running blocking calls
+        in threads.
+        """
+        start = time.perf_counter()
+        deadline = deadline or Deadline(settings.request_deadline_seconds)
+        route = yield Call(self._route, question, conversation_id)
+        answer = []
+        with tracing.span("agent.ask_stream", conversation_id=conversation_id or "") as span:
+            phases = self._ask_stream(question, llm_summary, conversation_id, route, deadline, approximate)
+            reply, error = None, None
+            try:
+                while True:
+                    try:
+                        step = phases.throw(error) if error else phases.send(reply)
+                    except StopIteration:
+                        return
+                    if isinstance(step, dict):
+                        if step["type"] == "token":
+                            answer.append(step["content"])
+                        elif step["type"] == "complete":
+                            step["budget"] = deadline.report()
+                            self._label_approximate(step)
+                            self._trace_result(span, step)
+                            yield Call(
+                                self._finish_stream, question, route, (time.perf_counter() - start) * 1000,
+                                deadline, conversation_id, step, "".join(answer)
+                            )
+                    try:
+                        reply, error = (yield step), None
+                    except Exception as e:
+                        reply, error = None, e
+            finally:
+                phases.close()
+
+    def _finish_stream(
+        self,
+        question: str,
+        route: RouteDecision,
+        elapsed_ms: float,
+        deadline: Deadline,
+        conversation_id: str | None,
+        event: dict,
+        answer: str
+    ):
+        """Log, export and remember a streamed question once its complete event is ready."""
+        self.router.log(question, route, elapsed_ms, event["error"])
+        self.record_metrics("stream", deadline, event["error"])
+        if conversation_id:
+            self.memory.record(conversation_id, question, event["sql"], event["data"], answer)
+
+    def _ask_stream(
+        self,
+        question: str,
+        llm_summary: bool,
+        conversation_id: str | None,
+        route: RouteDecision,
+        deadline: Deadline,
+        approximate: bool = False
+    ):
+        """Phases behind ask_stream: events and steps (see _stream_pipeline)."""
+        history, prompt = yield Call(self._build_prompt, question, conversation_id)
+
         try:
             # Phase 1: Collect initial LLM response (SQL generation) WITHOUT streaming
             # We need to process it first to extract and remove SQL blocks
-            full_response = ""
-            for token in self.llm.generate_stream(question, self.system_prompt):
-                full_response += token
+            if settings.speculative_candidates > 1:
+                yield {"type": "status", "content": "Drafting candidate queries..."}
+            with deadline.phase("sql"):
+                timeout = deadline.share(self.PHASE_SHARES["sql"])
+                if settings.speculative_candidates > 1:
+                    with self._timed_llm("sql", route.model("sql")):
+                        full_response = yield Speculate(
+                            prompt, history, conversation_id, route.model("sql"), timeout
+                        )
+                else:
+                    full_response = ""
+                    tokens = yield Stream("sql", route.model("sql"), prompt, history, timeout)
+                    while (token := (yield NextToken(tokens))) is not None:
+                        full_response += token
 
-            # Extract SQL from the response
-            sql_query = self._extract_sql(full_response)
+            # Extract SQL from the response, and check it is safe
+            sql_query, safe = self._extract_checked(full_response)
 
             # Remove SQL code blocks from the displayed response
             display_response = self._remove_sql_blocks(full_response)
@@ -273,8 +998,9 @@ Please fix the query and explain what went wrong."""
             # Send the SQL query to frontend
             yield {"type": "sql", "content": sql_query}
 
-            # Validate the query is safe
-            if not self._is_safe_query(sql_query):
+            # Refuse anything but a SELECT
+            if not safe:
+                metrics.QUERIES_BLOCKED.inc()
                 yield {
                     "type": "error",
                     "content": "Query blocked: only SELECT statements allowed"
@@ -287,16 +1013,60 @@ Please fix the query and explain what went wrong."""
                 }
                 return
 
+            # Approximate mode: preview the query on a sample first
+            sampled = (yield Call(self._sampled, sql_query, conversation_id)) if approximate else None
+            preview = None
+            if sampled:
+                yield {"type": "status", "content": f"Previewing a {settings.sample_percent:g}% sample..."}
+                try:
+                    with deadline.phase("preview"):
+                        preview = yield Execute(
+                            sampled, None, deadline.share(self.PHASE_SHARES["preview"])
+                        )
+                except Exception as e:
+                    logger.warning("Sampled preview failed: %s", e)
+                    metrics.ERRORS.inc(stage="preview")
+                if preview:
+                    yield self._preview_event(sampled, preview)
+            from_sample = bool(preview) and not settings.approximate_exact
+            if from_sample:
+                sql_query = sampled
+
             # Execute the query
-            yield {"type": "status", "content": "Executing query..."}
+            source = self._query_source(sql_query, conversation_id)
+            if from_sample:
+                yield {"type": "status", "content": "Answering from the sample..."}
+            elif source == "local":
+                yield {"type": "status", "content": "Refining previous result locally..."}
+            else:
+                yield {"type": "status", "content": "Executing query..."}
 
             try:
-                results = self.db.execute_query(sql_query)
+                if from_sample:
+                    results = preview
+                else:
+                    with deadline.phase("execute"):
+                        results = yield Execute(
+                            sql_query, conversation_id, deadline.share(self.PHASE_SHARES["execute"])
+                        )
 
                 # Notify that data is ready
                 yield {"type": "data_ready", "row_count": len(results)}
 
-                # Phase 2: Stream summary of results
+                # Phase 2: Answer trivial shapes directly, else stream a summary
+                fast_path = yield Call(self._fast_answer, sql_query, results, llm_summary)
+                if fast_path:
+                    yield {"type": "token", "content": "\n\n" + fast_path.pop("answer")}
+                    yield {
+                        "type": "complete",
+                        "sql": sql_query,
+                        "data": results,
+                        "error": None,
+                        "fast_path": fast_path,
+                        "source": source
+                    }
+                    return
+
                 if not results:
                     yield {"type": "token", "content": "\n\nThe query returned no results."}
                     yield {
@@ -307,107 +1077,117 @@ Please fix the query and explain what went wrong."""
                     }
                     return
 
-                # Generate summary prompt
-                if len(results) <= 20:
-                    results_to_show = results
-                    results_note = f"Results ({len(results)} rows):"
-                else:
-                    results_to_show = results[:20]
-                    results_note = f"Results (showing top 20 of {len(results)} total rows):"
-
-                summary_prompt = f"""The user asked: "{question}"
-
-I ran this query:
-```sql
-{sql_query}
-```
-
-{results_note}
-{results_to_show}
-
-Please provide a helpful, conversational answer to the user's question based on these results.
-
-Guidelines:
-- Lead with the key insight or recommendation that directly answers their question
-- Highlight the top 3-5 most important items with specific numbers
-- Explain WHY these are the best options (e.g., "high search volume + strong April seasonality")
-- If relevant, mention any patterns you notice in the data
-- Keep it concise but informative — write like you're advising a colleague
-- Don't just list data — interpret it and provide actionable recommendations"""
+                summary_prompt = yield Call(self._build_summary_prompt, question, sql_query, results)
 
                 # Add spacing before summary
                 yield {"type": "token", "content": "\n\n"}
 
-                # Stream the summary
-                for token in self.llm.generate_stream(summary_prompt, self.system_prompt):
-                    yield {"type": "token", "content": token}
+                # Stream the summary, or fall back if the budget is nearly spent
+                if deadline.allows(self.MIN_PHASE_SECONDS["summary"]):
+                    try:
+                        with deadline.phase("summary"):
+                            tokens = yield Stream(
+                                "summary", route.model("summary"), summary_prompt, None,
+                                deadline.share(self.PHASE_SHARES["summary"])
+                            )
+                            while (token := (yield NextToken(tokens))) is not None:
+                                yield {"type": "token", "content": token}
+                    except Exception as e:
+                        logger.warning("Summary abandoned: %s", e)
+                        metrics.ERRORS.inc(stage="summary")
+                        deadline.skip("summary")
+                else:
+                    deadline.skip("summary")
+                    yield {"type": "token", "content": self._budget_fallback(results)}
 
                 # Send completion with full data
                 yield {
                     "type": "complete",
                     "sql": sql_query,
                     "data": results,
-                    "error": None
+                    "error": None,
+                    "source": source
                 }
 
             except Exception as db_error:
                 # Query execution failed
+                metrics.ERRORS.inc(stage="execute")
                 yield {"type": "error", "content": f"Query failed: {str(db_error)}"}
 
-                # Try to fix the query
-                fix_prompt = f"""The following query failed:
-
-```sql
-{sql_query}
-```
+                # Not enough time left for another generate-and-execute round
+                if not deadline.allows(self.MIN_PHASE_SECONDS["fix"]):
+                    deadline.skip("fix")
+                    metrics.FIX_ATTEMPTS.inc(outcome="skipped")
+                    yield {
+                        "type": "complete",
+                        "sql": sql_query,
+                        "data": None,
+                        "error": str(db_error)
+                    }
+                    return
 
-Error: {db_error}
+                # Try to fix the query
+                with tracing.span("agent.fix", error=str(db_error)) as fix_span:
+                    fix_prompt = yield Call(
+                        self._build_fix_prompt, question, sql_query, str(db_error), conversation_id
+                    )
 
-Original question: "{question}"
+                    yield {"type": "token", "content": "\n\nLet me try to fix that query...\n\n"}
 
-Please fix the query and explain what went wrong."""
+                    fixed_response = ""
+                    with deadline.phase("fix"):
+                        tokens = yield Stream(
+                            "fix", route.model("fix"), fix_prompt, None,
+                            deadline.share(self.PHASE_SHARES["fix"])
+                        )
+                        while (token := (yield NextToken(tokens))) is not None:
+                            yield {"type": "token", "content": token}
+                            fixed_response += token
 
-                yield {"type": "token", "content": "\n\nLet me try to fix that query...\n\n"}
+                    # Try to extract and execute fixed SQL
+                    fixed_sql, fixed_safe = self._extract_checked(fixed_response)
 
-                fixed_response = ""
-                for token in self.llm.generate_stream(fix_prompt, self.system_prompt):
-                    yield {"type": "token", "content": token}
-                    fixed_response += token
+                    if fixed_sql and fixed_safe:
+                        try:
+                            yield {"type": "sql", "content": fixed_sql}
+                            yield {"type": "status", "content": "Executing fixed query..."}
 
-                # Try to extract and execute fixed SQL
-                fixed_sql = self._extract_sql(fixed_response)
+                            with deadline.phase("execute"):
+                                results = yield Execute(
+                                    fixed_sql, conversation_id,
+                                    deadline.share(self.PHASE_SHARES["execute"])
+                                )
+                            yield {"type": "data_ready", "row_count": len(results)}
 
-                if fixed_sql and self._is_safe_query(fixed_sql):
-                    try:
-                        yield {"type": "sql", "content": fixed_sql}
-                        yield {"type": "status", "content": "Executing fixed query..."}
-
-                        results = self.db.execute_query(fixed_sql)
-                        yield {"type": "data_ready", "row_count": len(results)}
-
-                        yield {
-                            "type": "complete",
-                            "sql": fixed_sql,
-                            "data": results,
-                            "error": None
-                        }
-                        return
-                    except Exception:
-                        pass
+                            metrics.FIX_ATTEMPTS.inc(outcome="fixed")
+                            fix_span.set_attribute("fixed", True)
+                            yield {
+                                "type": "complete",
+                                "sql": fixed_sql,
+                                "data": results,
+                                "error": None,
+                                "source": self._query_source(fixed_sql, conversation_id)
+                            }
+                            return
+                        except Exception:
+                            pass
 
-                # Couldn't fix it
-                yield {
-                    "type": "complete",
-                    "sql": sql_query,
-                    "data": None,
-                    "error": str(db_error)
-                }
+                    # Couldn't fix it
+                    metrics.FIX_ATTEMPTS.inc(outcome="failed")
+                    fix_span.set_attribute("fixed", False)
+                    yield {
+                        "type": "complete",
+                        "sql": sql_query,
+                        "data": None,
+                        "error": str(db_error)
+                    }
 
         except Exception as e:
+            metrics.ERRORS.inc(stage="agent")
             yield {"type": "error", "content": f"Error: {str(e)}"}
             yield {
                 "type": "complete",
                 "sql": None,
                 "data": None,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
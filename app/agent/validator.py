@@ -0,0 +1,121 @@
+"""Static validation of generated SQL against the known schema."""
+
+import re
+
+from app.database.catalog import catalog
+from app.database.schema import TABLES
+
+
+# Cached result tables queried in-process (see app.database.local)
+LOCAL_TABLES = {"LAST_RESULT", "PREVIOUS_RESULT"}
+
+# Words that can follow a table reference but are not aliases
+_NOT_ALIASES = {
+    "WHERE", "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS",
+    "NATURAL", "LATERAL", "GROUP", "ORDER", "HAVING", "LIMIT", "QUALIFY", "UNION",
+    "EXCEPT", "MINUS", "INTERSECT", "SAMPLE", "TABLESAMPLE", "WINDOW", "PIVOT", "UNPIVOT",
+    "AS", "OFFSET", "FETCH",
+}
+
+_IDENT = r'[A-Za-z_][A-Za-z0-9_$]*'
+_TABLE_REF = re.compile(
+    rf"\b(?:FROM|JOIN)\s+({_IDENT}(?:\.{_IDENT}){{0,2}})\b(?!\s*\()(?:\s+(?:AS\s+)?({_IDENT}))?",
+    re.IGNORECASE
+)
+_CTE_NAME = re.compile(rf"(?:\bWITH|,)\s*({_IDENT})\s+AS\s*\(", re.IGNORECASE)
+_COLUMN_REF = re.compile(rf"(?<![.\w])({_IDENT})\.({_IDENT})\b(?!\s*\.)")
+
+
+def table_columns() -> dict[str, set[str]]:
+    """
+    Known columns per fully qualified table name (upper case).
+
+    Tables found in the cached live metadata use its columns, so columns
+    the warehouse lacks are caught before a query runs; the others use
+    schema.TABLES.
+    """
+    columns = {
+        table.name.upper(): {col.name.upper() for col in table.columns}
+        for table in TABLES
+    }
+    live = catalog.columns()
+    if live:
+        columns.update((name, live[name]) for name in columns if name in live)
+    return columns
+
+
+def _clean(sql: str) -> str:
+    """Remove literals, comments and non-table uses of FROM."""
+    cleaned = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    cleaned = re.sub(r"--.*?$", "", cleaned, flags=re.MULTILINE)
+    cleaned = re.sub(r"/\*.*?\*/", "", cleaned, flags=re.DOTALL)
+    # FROM inside expressions is not a table reference
+    cleaned = re.sub(r"\b(EXTRACT\s*\(\s*\w+|TRIM\s*\([^()]*?|DISTINCT)\s+FROM\b", r"\1,", cleaned, flags=re.IGNORECASE)
+    return cleaned
+
+
+def referenced_tables(sql: str) -> list[str]:
+    """Fully qualified names of the configured tables a query reads."""
+    known = table_columns()
+    short_names = {name.rsplit(".", 1)[-1]: name for name in known}
+
+    tables = []
+    for ref, _ in _TABLE_REF.findall(_clean(sql)):
+        table = ref.upper() if ref.upper() in known else short_names.get(ref.upper())
+        if table and table not in tables:
+            tables.append(table)
+    return tables
+
+
+def validate_sql(sql: str, columns: dict[str, set[str]] | None = None) -> list[str]:
+    """
+    Check that a query only references known tables and columns.
+
+    Table references must be configured tables, CTEs or the cached local
+    result tables. Qualified column references (``alias.COLUMN``) are checked
+    against the referenced table's columns. Unqualified columns are left to
+    EXPLAIN, since telling them apart from aliases needs a full parser.
+
+    Args:
+        sql: Query to validate
+        columns: Known columns per table (defaults to table_columns())
+
+    Returns:
+        List of problems; empty if the query looks valid
+    """
+    columns = columns if columns is not None else table_columns()
+    short_names = {name.rsplit(".", 1)[-1]: name for name in columns}
+
+    cleaned = _clean(sql)
+
+    ctes = {name.upper() for name in _CTE_NAME.findall(cleaned)}
+    problems = []
+    aliases: dict[str, str | None] = {}
+
+    for ref, alias in _TABLE_REF.findall(cleaned):
+        ref = ref.upper()
+        if ref in ctes or ref in LOCAL_TABLES:
+            table = None
+        elif ref in columns:
+            table = ref
+        elif ref in short_names:
+            table = short_names[ref]
+        else:
+            problems.append(f"Unknown table: {ref}")
+            continue
+
+        qualifier = ref.rsplit(".", 1)[-1]
+        aliases[qualifier] = table
+        if alias and alias.upper() not in _NOT_ALIASES:
+            aliases[alias.upper()] = table
+
+    # Strip table references so their dotted names aren't read as columns
+    without_tables = _TABLE_REF.sub(" ", cleaned)
+    for qualifier, column in _COLUMN_REF.findall(without_tables):
+        table = aliases.get(qualifier.upper())
+        if table and column.upper() not in columns[table]:
+            problem = f"Unknown column: {qualifier}.{column} (not in {table})"
+            if problem not in problems:
+                problems.append(problem)
+
+    return problems
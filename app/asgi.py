@@ -0,0 +1,745 @@
+"""
+ASGI entry point for serving chat streams asynchronously.
+
+POST /api/chat/stream is handled natively: the SSE response, the LLM
+stream and the warehouse polling are all awaited, so an open stream costs
+a coroutine rather than a worker thread. With a job store, questions run
+as background tasks whose events are logged there, and GET
+/api/jobs/<id>/events resumes them natively too. The /api/chat/ws
+WebSocket carries several question streams over one connection (see
+ChatSocketSession). Every other route is served by the Flask app through
+asgiref's WSGI adapter, as are profiled streams (see app.utils.profiling),
+whose work then runs on threads the profiler can sample apart from other
+requests.
+
+Run with:
+    uvicorn app.main:asgi_app --host 0.0.0.0 --port 8080 --workers 2
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs
+
+from app.agent.admission import (
+    BROWSER_COOKIE,
+    AdmissionController,
+    AdmissionTimeout,
+    Rejected,
+    Ticket,
+    conversation_key,
+    owner_key,
+    user_key,
+)
+from app.agent.async_agent import AsyncSQLAgent
+from app.agent.jobs import FINISHED, JobRecorder, JobStore
+from app.utils import metrics, tracing
+from app.utils.deadline import Deadline, parse_deadline
+from app.utils.profiling import profiler
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),  # Disable nginx buffering
+]
+
+# Error carried by the error and complete events of a cancelled stream
+CANCELLED = "Cancelled by client"
+
+
+class StreamingApp:
+    """
+    ASGI app serving /api/chat/stream and /api/chat/ws, delegating everything else.
+
+    Args:
+        agent: Async agent producing the stream events
+        fallback: ASGI app for all other requests (the wrapped Flask app)
+        pinned: Optional callable(question, conversation_id) returning the
+            events of a pinned answer, or None if the question is not pinned
+        max_deadline: Cap on client-supplied deadlines, in seconds
+        jobs: Optional job store; questions then outlive their connection and
+            can be resumed (same protocol as the Flask job routes)
+        admission: Optional admission controller limiting questions in flight
+    """
+
+    STREAM_PATH = "/api/chat/stream"
+    SOCKET_PATH = "/api/chat/ws"
+    JOB_EVENTS_PATH = re.compile(r"^/api/jobs/([0-9a-f]+)/events$")
+
+    # Largest request body (or WebSocket message) accepted
+    MAX_BODY_BYTES = 1024 * 1024
+
+    # Seconds between store polls while following a job run elsewhere
+    POLL_SECONDS = 0.25
+
+    def __init__(
+        self,
+        agent: AsyncSQLAgent,
+        fallback=None,
+        pinned=None,
+        max_deadline: float = 300,
+        jobs: JobStore | None = None,
+        admission: AdmissionController | None = None
+    ):
+        self.agent = agent
+        self.fallback = fallback
+        self.pinned = pinned
+        self.max_deadline = max_deadline
+        self.jobs = jobs
+        self.admission = admission
+        # Jobs running on this event loop, and wake-ups for their followers
+        self._running: dict[str, asyncio.Task] = {}
+        self._signals: dict[str, set[asyncio.Event]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "websocket" and scope["path"] == self.SOCKET_PATH:
+            await ChatSocketSession(self, receive, send, _user(scope), _owner(scope)).run()
+        elif (
+            scope["type"] == "http"
+            and scope["path"] == self.STREAM_PATH
+            and scope["method"] == "POST"
+            and not (self.fallback is not None and _profiled(scope))
+        ):
+            with _trace(scope, self.STREAM_PATH):
+                await self._chat_stream(scope, receive, send)
+        elif (
+            scope["type"] == "http"
+            and self.jobs is not None
+            and scope["method"] == "GET"
+            and self.JOB_EVENTS_PATH.match(scope["path"])
+        ):
+            with _trace(scope, "/api/jobs/<job_id>/events"):
+                await self._job_events(scope, receive, send)
+        elif self.fallback is not None:
+            await self.fallback(scope, receive, send)
+        elif scope["type"] == "http":
+            await self._json(send, 404, {"error": "Not found"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def parse_question(
+        self, data, headers: dict, owner: str | None = None
+    ) -> tuple[dict | None, str | None]:
+        """
+        Question parameters from a request body (or socket message).
+
+        The conversation id is scoped to ``owner`` (see conversation_key).
+
+        Returns:
+            (params, None), or (None, error message) if the request is invalid
+        """
+        if not isinstance(data, dict) or "message" not in data:
+            return None, "Missing 'message' in request body"
+
+        user_message = str(data["message"]).strip()
+        if not user_message:
+            return None, "Message cannot be empty"
+
+        deadline = parse_deadline(
+            headers.get("x-request-deadline", data.get("deadline_seconds")),
+            settings.request_deadline_seconds, self.max_deadline
+        )
+        if deadline is None:
+            return None, "Invalid deadline"
+
+        return {
+            "user_message": user_message,
+            "llm_summary": bool(data.get("llm_summary")),
+            "conversation_id": conversation_key(owner, data.get("conversation_id")),
+            "deadline": deadline,
+            "approximate": bool(data.get("approximate")),
+        }, None
+
+    async def open_stream(self, params: dict, client_key: str | None = None, user: str = "anonymous"):
+        """
+        Start answering a question.
+
+        Pinned answers are replayed; with a job store the question runs as
+        a job (or the job already created under ``client_key`` is reused),
+        otherwise the agent's events are numbered as they are produced.
+        New questions take an admission ticket first and wait for it inside
+        their stream.
+
+        Returns:
+            (job_id, None) for a job, else (None, async iterator of (seq, event))
+
+        Raises:
+            Rejected: If admission control sheds the question
+        """
+        pinned = None
+        if self.pinned is not None:
+            pinned = await asyncio.to_thread(
+                self.pinned, params["user_message"], params["conversation_id"]
+            )
+        if pinned is not None:
+            return None, self._numbered(self._events(pinned, **params))
+
+        if self.jobs is not None:
+            job, created = await asyncio.to_thread(
+                self.jobs.create, params["user_message"], params["conversation_id"],
+                params["llm_summary"], params["deadline"].budget, client_key, params["approximate"]
+            )
+            if created:
+                try:
+                    ticket = self._admit(user, params["deadline"])
+                except Rejected:
+                    await asyncio.to_thread(self.jobs.delete, job["id"])
+                    raise
+                self._start_job(job["id"], params, ticket)
+            return job["id"], None
+
+        ticket = self._admit(user, params["deadline"])
+        return None, self._numbered(self._events(None, **params, ticket=ticket))
+
+    def _admit(self, user: str, deadline: Deadline) -> Ticket | None:
+        if self.admission is None:
+            return None
+        return self.admission.request(user, deadline.remaining())
+
+    async def _chat_stream(self, scope, receive, send):
+        """Same request and event protocol as the Flask /api/chat/stream route."""
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > self.MAX_BODY_BYTES:
+                await self._json(send, 413, {"error": "Request body too large"})
+                return
+            if not message.get("more_body"):
+                break
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+
+        headers = _headers(scope)
+        params, error = self.parse_question(data, headers, _owner(scope))
+        if error:
+            await self._json(send, 400, {"error": error})
+            return
+
+        try:
+            job_id, events = await self.open_stream(params, headers.get("idempotency-key"), _user(scope))
+        except Rejected as e:
+            await self._json(send, e.status, {"error": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+            return
+        if job_id is not None:
+            await self._follow(job_id, _last_event_id(headers.get("last-event-id")), receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS + _trace_headers()})
+
+        # Stop generating (and stop paying for LLM tokens) once the client leaves
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        start = time.perf_counter()
+        try:
+            async for _, event in events:
+                if disconnected.is_set():
+                    break
+                await send({
+                    "type": "http.response.body",
+                    "body": f"data: {json.dumps(event, default=str)}\n\n".encode(),
+                    "more_body": True,
+                })
+        finally:
+            await events.aclose()
+            watcher.cancel()
+            metrics.STREAM_DURATION.observe(time.perf_counter() - start, transport="sse")
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _job_events(self, scope, receive, send):
+        """Same protocol as the Flask GET /api/jobs/<id>/events route."""
+        job_id = self.JOB_EVENTS_PATH.match(scope["path"]).group(1)
+        job = await asyncio.to_thread(self.jobs.get, job_id, False)
+        if job is None:
+            await self._json(send, 404, {"error": "Job not found"})
+            return
+
+        headers = _headers(scope)
+        query = parse_qs(scope.get("query_string", b"").decode())
+        after = _last_event_id(headers.get("last-event-id", query.get("after", ["0"])[0]))
+        await self._follow(job_id, after, receive, send)
+
+    def _start_job(self, job_id: str, params: dict, ticket: Ticket | None = None):
+        """Run a job on this event loop, independent of the request that started it."""
+        task = asyncio.create_task(self._run_job(job_id, params, ticket))
+        self._running[job_id] = task
+        task.add_done_callback(lambda _: self._job_done(job_id))
+
+    def _job_done(self, job_id: str):
+        # Followers still waiting on the job fall back to polling
+        self._running.pop(job_id, None)
+        self._signal(job_id)
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Stop a job running on this event loop; its log ends with a cancelled error."""
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def _run_job(self, job_id: str, params: dict, ticket: Ticket | None = None):
+        """Async counterpart of JobQueue.run."""
+        recorder = JobRecorder()
+        try:
+            try:
+                await asyncio.to_thread(self.jobs.start, job_id)
+                with tracing.span("job.run", job_id=job_id):
+                    async for event in self._events(None, **params, ticket=ticket):
+                        if recorder.add(event):
+                            await self._write(job_id, recorder)
+            except asyncio.CancelledError:
+                if recorder.complete is None:
+                    recorder.add({"type": "error", "content": CANCELLED})
+                    recorder.add({"type": "complete", "sql": None, "data": None, "error": CANCELLED})
+            await asyncio.to_thread(self.jobs.finish, job_id, recorder.result(), recorder.take())
+        except Exception:
+            logger.exception("Job %s failed", job_id)
+        finally:
+            self._signal(job_id)
+
+    async def _write(self, job_id: str, recorder: JobRecorder):
+        await asyncio.to_thread(self.jobs.append, job_id, recorder.take())
+        self._signal(job_id)
+
+    def _signal(self, job_id: str):
+        for signal in self._signals.get(job_id, ()):
+            signal.set()
+
+    async def job_log(self, job_id: str, after: int = 0):
+        """
+        Yield (seq, event) from a job's log after ``after``, until its complete event.
+
+        Jobs running on this event loop wake their followers as they write;
+        only jobs run elsewhere are polled every POLL_SECONDS.
+        """
+        signal = asyncio.Event()
+        self._signals.setdefault(job_id, set()).add(signal)
+        try:
+            while True:
+                # Reset the wake-up before reading, so no write goes unnoticed
+                signal.clear()
+                status, events = await asyncio.to_thread(self.jobs.poll, job_id, after)
+                for seq, event in events:
+                    after = seq
+                    yield seq, event
+                    if event["type"] == "complete":
+                        return
+                if status is None or status in FINISHED:
+                    return
+                if not events:
+                    try:
+                        await asyncio.wait_for(
+                            signal.wait(), None if job_id in self._running else self.POLL_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            followers = self._signals.get(job_id)
+            if followers is not None:
+                followers.discard(signal)
+                if not followers:
+                    del self._signals[job_id]
+
+    async def _follow(self, job_id: str, after: int, receive, send):
+        """Stream a job's logged events until its complete event or a disconnect."""
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": SSE_HEADERS + [(b"x-job-id", job_id.encode())] + _trace_headers(),
+        })
+
+        # Leaving only stops the stream; the job itself runs to completion
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        events = self.job_log(job_id, after)
+        start = time.perf_counter()
+        try:
+            async for seq, event in events:
+                if disconnected.is_set():
+                    break
+                await send({
+                    "type": "http.response.body",
+                    "body": f"id: {seq}\ndata: {json.dumps(event, default=str)}\n\n".encode(),
+                    "more_body": True,
+                })
+        finally:
+            await events.aclose()
+            watcher.cancel()
+            metrics.STREAM_DURATION.observe(time.perf_counter() - start, transport="sse")
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _events(
+        self, pinned, user_message, llm_summary, conversation_id, deadline: Deadline,
+        approximate: bool = False, ticket: Ticket | None = None
+    ):
+        """
+        Agent events, or the pinned answer's; failures end with error + complete.
+
+        With a ticket, queue-position status events come first, and the
+        ticket is released when the stream ends.
+        """
+        if pinned is not None:
+            for event in pinned:
+                yield event
+            return
+
+        try:
+            if ticket is not None:
+                async for event in ticket.events():
+                    yield event
+            async for event in self.agent.ask_stream(
+                user_message, llm_summary=llm_summary, conversation_id=conversation_id,
+                deadline=deadline, approximate=approximate
+            ):
+                yield event
+        except AdmissionTimeout as e:
+            yield {"type": "error", "content": str(e)}
+            yield {"type": "complete", "sql": None, "data": None, "error": str(e)}
+        except Exception as e:
+            logger.exception("Stream error")
+            yield {"type": "error", "content": f"Stream error: {str(e)}"}
+            yield {"type": "complete", "sql": None, "data": None, "error": str(e)}
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    @staticmethod
+    async def _numbered(events):
+        seq = 0
+        try:
+            async for event in events:
+                seq += 1
+                yield seq, event
+        finally:
+            await events.aclose()
+
+    @staticmethod
+    async def _json(send, status: int, payload: dict, headers: list = ()):
+        body = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+                *_trace_headers(),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+@dataclass
+class SocketStream:
+    """One question stream on a ChatSocketSession."""
+
+    id: str
+    job_id: str | None = None
+    task: asyncio.Task | None = None
+    trace: tracing.Span | None = None
+    sent: int = 0
+    acked: int = 0
+    credit: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class ChatSocketSession:
+    """
+    One /api/chat/ws connection multiplexing several question streams.
+
+    Client messages (JSON text frames):
+        {"type": "ask", "stream_id": "s1", "message": "...", "conversation_id": "conv-...",
+         "llm_summary": false, "deadline_seconds": 30, "approximate": false, "idempotency_key": "..."}
+        {"type": "resume", "stream_id": "s2", "job_id": "...", "after": 12}
+        {"type": "cancel", "stream_id": "s1"}
+        {"type": "ack", "stream_id": "s1", "received": 64}
+
+    Server messages are /api/chat/stream events with "stream_id" and "seq"
+    added, after an {"type": "accepted", "stream_id": ..., "job_id": ...,
+    "trace_id": ...} message per stream (asks are traced from the ask to
+    their complete event; an ask may carry a W3C "traceparent"). Every stream ends with its complete event; a
+    cancelled one with error and complete events carrying CANCELLED.
+
+    Backpressure: a stream sends at most WINDOW events beyond the count
+    the client last acknowledged, so a slow client holds its events back
+    (in the job log, or by pausing the agent) instead of buffering them in
+    the socket.
+    """
+
+    # Events a stream may send before waiting for an ack
+    WINDOW = 256
+
+    # Concurrent streams per connection
+    MAX_STREAMS = 8
+
+    def __init__(
+        self, app: StreamingApp, receive, send, user: str = "anonymous", owner: str | None = None
+    ):
+        self.app = app
+        self.receive = receive
+        self._send = send
+        self.user = user
+        self.owner = owner
+        self.streams: dict[str, SocketStream] = {}
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def run(self):
+        if (await self.receive())["type"] != "websocket.connect":
+            return
+        await self._send({"type": "websocket.accept"})
+        try:
+            while True:
+                message = await self.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                text = message.get("text")
+                if text is None and message.get("bytes") is not None:
+                    text = message["bytes"].decode("utf-8", "replace")
+                await self._handle(text or "")
+        finally:
+            self.closed = True
+            # Leaving stops the streams; jobs keep running and can be resumed
+            for stream in list(self.streams.values()):
+                if stream.task:
+                    stream.task.cancel()
+
+    async def send(self, payload: dict):
+        if self.closed:
+            return
+        async with self._send_lock:
+            await self._send({"type": "websocket.send", "text": json.dumps(payload, default=str)})
+
+    async def _handle(self, text: str):
+        if len(text) > self.app.MAX_BODY_BYTES:
+            await self.send({"type": "error", "stream_id": None, "content": "Message too large"})
+            return
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or not message.get("stream_id"):
+            await self.send({"type": "error", "stream_id": None, "content": "Invalid message"})
+            return
+
+        stream_id = str(message["stream_id"])
+        kind = message.get("type")
+        if kind == "ack":
+            stream = self.streams.get(stream_id)
+            if stream:
+                stream.acked = max(stream.acked, _last_event_id(message.get("received")))
+                stream.credit.set()
+        elif kind == "cancel":
+            self._cancel(stream_id)
+        elif kind in ("ask", "resume"):
+            await self._open(stream_id, message)
+        else:
+            await self.send({"type": "error", "stream_id": stream_id, "content": f"Unknown message type: {kind}"})
+
+    async def _open(self, stream_id: str, message: dict):
+        if stream_id in self.streams:
+            await self._fail(stream_id, "Stream ID already in use")
+            return
+        if len(self.streams) >= self.MAX_STREAMS:
+            await self._fail(stream_id, f"At most {self.MAX_STREAMS} concurrent streams per connection")
+            return
+
+        stream = SocketStream(stream_id)
+        self.streams[stream_id] = stream
+
+        if message["type"] == "resume":
+            job = None
+            if self.app.jobs is not None and message.get("job_id"):
+                job = await asyncio.to_thread(self.app.jobs.get, str(message["job_id"]), False)
+            if job is None:
+                del self.streams[stream_id]
+                await self._fail(stream_id, "Job not found")
+                return
+            stream.job_id = job["id"]
+            events = self.app.job_log(stream.job_id, _last_event_id(message.get("after")))
+        else:
+            params, error = self.app.parse_question(message, {}, self.owner)
+            if error:
+                del self.streams[stream_id]
+                await self._fail(stream_id, error)
+                return
+            stream.trace = tracing.start_span(
+                "websocket ask", traceparent=message.get("traceparent"), stream_id=stream_id
+            )
+            try:
+                with tracing.activated(stream.trace):
+                    stream.job_id, events = await self.app.open_stream(
+                        params, message.get("idempotency_key"), self.user
+                    )
+            except Rejected as e:
+                del self.streams[stream_id]
+                stream.trace.fail(e)
+                stream.trace.end()
+                await self._fail(stream_id, str(e))
+                return
+            if events is None:
+                events = self.app.job_log(stream.job_id)
+
+        await self.send({
+            "type": "accepted", "stream_id": stream_id, "job_id": stream.job_id,
+            "trace_id": stream.trace.trace_id if stream.trace else None
+        })
+        # The stream's task (and the agent within it) runs under the ask's span
+        with tracing.activated(stream.trace):
+            stream.task = asyncio.create_task(self._stream(stream, events))
+
+    async def _stream(self, stream: SocketStream, events):
+        start = time.perf_counter()
+        try:
+            async for seq, event in events:
+                while stream.sent - stream.acked >= self.WINDOW:
+                    stream.credit.clear()
+                    await stream.credit.wait()
+                await self.send({**event, "stream_id": stream.id, "seq": seq})
+                stream.sent += 1
+        except asyncio.CancelledError:
+            await self.send({"type": "error", "stream_id": stream.id, "content": CANCELLED})
+            await self.send({
+                "type": "complete", "stream_id": stream.id,
+                "sql": None, "data": None, "error": CANCELLED
+            })
+        except Exception as e:
+            logger.exception("Socket stream error")
+            await self._fail(stream.id, f"Stream error: {str(e)}")
+        finally:
+            await events.aclose()
+            self.streams.pop(stream.id, None)
+            metrics.STREAM_DURATION.observe(time.perf_counter() - start, transport="websocket")
+            if stream.trace is not None:
+                stream.trace.end()
+
+    def _cancel(self, stream_id: str):
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.task is None:
+            return
+        # A job running here ends its own log; otherwise stop following it
+        if not (stream.job_id and self.app.cancel_job(stream.job_id)):
+            stream.task.cancel()
+
+    async def _fail(self, stream_id: str, error: str):
+        """End a stream that could not start (or broke) with error + complete."""
+        await self.send({"type": "error", "stream_id": stream_id, "content": error})
+        await self.send({"type": "complete", "stream_id": stream_id, "sql": None, "data": None, "error": error})
+
+
+def _headers(scope) -> dict:
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+
+def _profiled(scope) -> bool:
+    """Whether a request sends the profiling token (X-Profile-Token header or ?profile=)."""
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return profiler.authorized(_headers(scope).get("x-profile-token") or query.get("profile", [None])[0])
+
+
+def _trace(scope, route: str):
+    """Trace a natively served request, continuing the caller's traceparent if sent."""
+    return tracing.span(
+        f"{scope['method']} {route}", traceparent=_headers(scope).get("traceparent"),
+        **{"http.method": scope["method"], "http.route": route}
+    )
+
+
+def _trace_headers() -> list:
+    """X-Trace-Id response header for the current trace, if any."""
+    trace_id = tracing.current_trace_id()
+    return [(b"x-trace-id", trace_id.encode())] if trace_id else []
+
+
+def _user(scope) -> str:
+    """Who is asking (see user_key)."""
+    client = scope.get("client")
+    return user_key(_headers(scope), client[0] if client else None)
+
+
+def _owner(scope) -> str | None:
+    """Who owns the caller's conversations (see owner_key)."""
+    client = scope.get("client")
+    headers = _headers(scope)
+    try:
+        cookie = SimpleCookie(headers.get("cookie", "")).get(BROWSER_COOKIE)
+    except CookieError:
+        cookie = None
+    return owner_key(headers, client[0] if client else None, cookie.value if cookie else None)
+
+
+def _last_event_id(value) -> int:
+    """Sequence number a reconnecting client last received (0 if none)."""
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def create_asgi_app(flask_app):
+    """
+    Wrap the Flask app with the native async streaming routes.
+
+    Args:
+        flask_app: App from app.create_app(); serves all other routes
+
+    Returns:
+        ASGI application
+    """
+    from asgiref.wsgi import WsgiToAsgi
+    from app.routes import chat
+    from app.routes.jobs import job_store
+
+    def pinned(question: str, conversation_id: str | None) -> list[dict] | None:
+        pin = chat._find_pin(question)
+        if not pin:
+            return None
+        chat._remember_pin(pin, question, conversation_id)
+        return list(chat._pinned_events(pin))
+
+    return StreamingApp(
+        AsyncSQLAgent(chat.agent),
+        fallback=WsgiToAsgi(flask_app),
+        pinned=pinned,
+        max_deadline=chat.MAX_DEADLINE_SECONDS,
+        jobs=job_store,
+        admission=chat.admission
+    )
@@ -0,0 +1,271 @@
+"""
+Live column metadata of the configured tables, cached on disk.
+
+One INFORMATION_SCHEMA query fetches the columns of every table in
+``schema.TABLES``. The result is saved with a version hash (of the
+metadata itself) and a key for the set of configured tables, so a cache
+written for other tables is ignored. The static SQL validator checks
+column references against the cached metadata, never the network, and
+the metadata is diffed against ``schema.TABLES`` to flag columns the
+hand-written schema is missing or describes but the warehouse lacks.
+
+Refresh the cache and print the drift report:
+    python -m app.database.catalog
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from app.database.schema import TABLES, Table
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Bumped when the cache file layout changes
+CACHE_FORMAT = 1
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def columns_query(table_names: list[str]) -> str:
+    """
+    One query returning the columns of fully qualified tables.
+
+    INFORMATION_SCHEMA is per database, so tables in several databases
+    are combined with UNION ALL (still one round trip).
+    """
+    by_database: dict[str, dict[str, list[str]]] = defaultdict(lambda: defaultdict(list))
+    for name in table_names:
+        database, schema, table = name.upper().split(".")
+        by_database[database][schema].append(table)
+
+    selects = []
+    for database, schemas in sorted(by_database.items()):
+        conditions = " OR ".join(
+            f"(TABLE_SCHEMA = {_quote(schema)} AND TABLE_NAME IN ({', '.join(_quote(t) for t in sorted(tables))}))"
+            for schema, tables in sorted(schemas.items())
+        )
+        selects.append(
+            "SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, "
+            f"ORDINAL_POSITION FROM {database}.INFORMATION_SCHEMA.COLUMNS WHERE {conditions}"
+        )
+    return "\nUNION ALL\n".join(selects) + "\nORDER BY TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION"
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def save_json(path: str, data):
+    """Write a cache file aside and rename it, so other workers never read a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+class RefreshedCache(ABC):
+    """
+    A JSON cache file, keyed to what it was built for and refreshed from the
+    warehouse in a background thread once it is older than the TTL.
+
+    Subclasses set ``key`` in ``__init__`` and implement ``refresh`` and ``_use``.
+
+    Args:
+        path: Cache file
+        ttl: Seconds before the cache is refreshed
+    """
+
+    # Seconds before a failed refresh is retried
+    RETRY_SECONDS = 300
+
+    # Used in log messages and the refresh thread's name
+    NAME = "cache"
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.key: str | None = None
+        self._cache: dict | None = None
+        self._thread: threading.Thread | None = None
+
+    def load(self) -> bool:
+        """Read the disk cache (no network); False if there is none for this key."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cache.get("key") != self.key:
+            logger.info("Ignoring %s %s written for other settings", self.NAME, self.path)
+            return False
+        self._use(cache)
+        return True
+
+    @abstractmethod
+    def refresh(self, db):
+        """Fetch from the warehouse, ``_use`` and ``save_json`` a dict with "key" and "fetched_at"."""
+
+    def stale(self, now: float | None = None) -> bool:
+        return self._cache is None or (now or time.time()) - self._cache["fetched_at"] > self.ttl
+
+    def start(self, db):
+        """Refresh the cache in the background whenever it is older than the TTL (idempotent)."""
+        if self._thread is None:
+            name = f"{self.NAME.replace(' ', '-')}-refresh"
+            self._thread = threading.Thread(target=self._run, args=(db,), name=name, daemon=True)
+            self._thread.start()
+
+    def _run(self, db):
+        while True:
+            # Another worker may have refreshed the shared cache file already
+            if self.stale() and (not self.load() or self.stale()):
+                try:
+                    self.refresh(db)
+                except Exception:
+                    logger.exception("Refreshing the %s failed", self.NAME)
+            if self.stale():
+                time.sleep(self.RETRY_SECONDS)
+            else:
+                time.sleep(max(60.0, self._cache["fetched_at"] + self.ttl - time.time()))
+
+    @abstractmethod
+    def _use(self, cache: dict):
+        """Adopt a cache dict read from disk or just fetched."""
+
+
+class SchemaCatalog(RefreshedCache):
+    """
+    Cached live columns of the configured tables and their drift from ``TABLES``.
+
+    Args:
+        path: Cache file
+        ttl: Seconds before the cached metadata is refreshed
+        tables: Configured tables (defaults to schema.TABLES)
+    """
+
+    NAME = "schema metadata"
+
+    def __init__(self, path: str, ttl: float, tables: list[Table] | None = None):
+        super().__init__(path, ttl)
+        self.tables = tables if tables is not None else TABLES
+        self.key = _digest([CACHE_FORMAT, sorted(table.name.upper() for table in self.tables)])
+        self._columns: dict[str, set[str]] | None = None
+
+    def refresh(self, db) -> dict:
+        """
+        Fetch the columns of every configured table in one query and save them.
+
+        Args:
+            db: Database client (its execute_query runs the INFORMATION_SCHEMA query)
+
+        Returns:
+            The drift report of the new metadata
+        """
+        names = [table.name.upper() for table in self.tables]
+        rows = db.execute_query(columns_query(names), use_cache=False)
+
+        tables: dict[str, list[dict]] = {}
+        for row in rows:
+            name = f"{row['TABLE_CATALOG']}.{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}".upper()
+            tables.setdefault(name, []).append({
+                "name": row["COLUMN_NAME"].upper(),
+                "type": row["DATA_TYPE"],
+                "nullable": row["IS_NULLABLE"] == "YES",
+            })
+        cache = {
+            "key": self.key,
+            "version": _digest(tables),
+            "fetched_at": time.time(),
+            # The row limit cut the metadata short: columns may be missing from it
+            "complete": len(rows) < getattr(db, "MAX_ROWS", float("inf")),
+            "tables": tables,
+        }
+        if not cache["complete"]:
+            logger.warning("Schema metadata hit the %d row limit; not used for validation", len(rows))
+
+        previous = self._cache["version"] if self._cache else None
+        self._use(cache)
+        save_json(self.path, cache)
+
+        report = self.drift()
+        if cache["version"] != previous:
+            logger.info("Schema metadata version %s (%d tables)", cache["version"], len(tables))
+            for table, problems in report["tables"].items():
+                logger.warning("Schema drift in %s: %s", table, problems)
+        return report
+
+    def columns(self) -> dict[str, set[str]] | None:
+        """Live column names per configured table, or None if no complete metadata is loaded."""
+        return self._columns
+
+    def table_columns(self, table_name: str) -> list[dict] | None:
+        """
+        Cached columns of one table (fully qualified or bare name), as
+        [{"name": str, "type": str, "nullable": bool}], or None if not cached.
+        """
+        cache = self._cache
+        if cache is None:
+            return None
+        name = table_name.upper()
+        for qualified, columns in cache["tables"].items():
+            if qualified == name or qualified.rsplit(".", 1)[-1] == name:
+                return columns
+        return None
+
+    def drift(self) -> dict:
+        """
+        Differences between ``TABLES`` and the live metadata.
+
+        Returns:
+            {"version": "...", "fetched_at": ..., "tables": {"DB.SCHEMA.TABLE":
+             {"missing_table": True} or {"missing": [...], "extra": [...]}}},
+            listing only tables that differ. ``missing`` columns are described
+            in TABLES but absent from the warehouse (queries using them fail);
+            ``extra`` columns exist but the agent is not told about them.
+        """
+        cache = self._cache
+        if cache is None:
+            return {"version": None, "fetched_at": None, "tables": {}}
+
+        report = {}
+        for table in self.tables:
+            name = table.name.upper()
+            live = cache["tables"].get(name)
+            if live is None:
+                report[name] = {"missing_table": True}
+                continue
+            configured = [col.name.upper() for col in table.columns]
+            live_names = [col["name"] for col in live]
+            missing = [col for col in configured if col not in live_names]
+            extra = [col for col in live_names if col not in configured]
+            if missing or extra:
+                report[name] = {"missing": missing, "extra": extra}
+        return {"version": cache["version"], "fetched_at": cache["fetched_at"], "tables": report}
+
+    def _use(self, cache: dict):
+        self._columns = {
+            name: {col["name"] for col in cols} for name, cols in cache["tables"].items()
+        } if cache["complete"] else None
+        self._cache = cache
+
+
+catalog = SchemaCatalog(settings.schema_cache_file, settings.schema_cache_ttl_hours * 3600)
+
+
+if __name__ == "__main__":
+    from app.database.snowflake import SnowflakeClient
+
+    print(json.dumps(catalog.refresh(SnowflakeClient()), indent=2))
@@ -0,0 +1,152 @@
+"""In-process columnar engine for refining cached result sets locally."""
+
+import re
+import threading
+from collections import OrderedDict
+
+import duckdb
+import pandas as pd
+
+from app.utils.digest import results_to_frame
+
+
+class LocalResultEngine:
+    """
+    Keeps the last result sets of each conversation in DuckDB-queryable frames.
+
+    Follow-up questions that only filter, sort, aggregate or join what the
+    user just saw can be answered by running SQL against ``LAST_RESULT``
+    (and ``PREVIOUS_RESULT``) in-process, in milliseconds and at zero
+    warehouse cost.
+    """
+
+    LAST_TABLE = "LAST_RESULT"
+    PREVIOUS_TABLE = "PREVIOUS_RESULT"
+
+    # Maximum rows returned from a local query (mirrors SnowflakeClient)
+    MAX_ROWS = 1000
+
+    # Conversations whose results are kept (least recently used are evicted)
+    MAX_CONVERSATIONS = 200
+
+    def __init__(self):
+        self._results: OrderedDict[str, list[tuple[pd.DataFrame, bool]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def store(self, conversation_id: str, results: list[dict], complete: bool):
+        """
+        Cache a result set as the conversation's LAST_RESULT.
+
+        Args:
+            conversation_id: Conversation the result belongs to
+            results: Rows as returned by SnowflakeClient
+            complete: False if the result was truncated at the row limit
+        """
+        frame = results_to_frame(results)
+        with self._lock:
+            history = self._results.setdefault(conversation_id, [])
+            history.insert(0, (frame, complete))
+            del history[2:]
+            self._results.move_to_end(conversation_id)
+            while len(self._results) > self.MAX_CONVERSATIONS:
+                self._results.popitem(last=False)
+
+    def describe(self, conversation_id: str) -> str | None:
+        """
+        Describe the cached tables for the LLM, or None if nothing usable is cached.
+
+        Truncated results are not offered, since refining them locally would
+        silently drop rows the warehouse query would have returned.
+        """
+        with self._lock:
+            history = list(self._results.get(conversation_id, []))
+
+        lines = []
+        for name, (frame, complete) in zip((self.LAST_TABLE, self.PREVIOUS_TABLE), history):
+            if not complete:
+                continue
+            columns = ", ".join(f"{col} ({_duck_type(frame[col])})" for col in frame.columns)
+            lines.append(f"- {name} ({len(frame)} rows): {columns}")
+
+        return "\n".join(lines) or None
+
+    def references_local(self, sql: str) -> bool:
+        """Check whether a query reads from the cached result tables."""
+        return bool(re.search(
+            rf"\b({self.LAST_TABLE}|{self.PREVIOUS_TABLE})\b", sql, re.IGNORECASE
+        ))
+
+    def execute_query(self, conversation_id: str, sql: str) -> list[dict]:
+        """
+        Run a SELECT against the conversation's cached results.
+
+        Only complete results are queryable: a result truncated at the row
+        limit would silently answer from its first rows.
+
+        Returns:
+            List of dictionaries, one per row
+
+        Raises:
+            ValueError: If nothing is cached for the conversation, or the
+                query reads a truncated result (the fix loop then rewrites
+                it against the warehouse)
+            duckdb.Error: Query errors (passed to the usual fix loop)
+        """
+        with self._lock:
+            history = list(self._results.get(conversation_id, []))
+        if not history:
+            raise ValueError(f"No cached result to query for {self.LAST_TABLE}")
+
+        tables = dict(zip((self.LAST_TABLE, self.PREVIOUS_TABLE), history))
+        for name, (_, complete) in tables.items():
+            if not complete and re.search(rf"\b{name}\b", sql, re.IGNORECASE):
+                raise ValueError(
+                    f"{name} was cut off at the {self.MAX_ROWS} row limit; query the warehouse tables instead"
+                )
+
+        conn = duckdb.connect()
+        try:
+            # Queries may only see the registered frames, never local files
+            for name, (frame, complete) in tables.items():
+                if complete:
+                    conn.register(name, frame)
+            conn.execute("SET enable_external_access = false")
+            conn.execute("SET lock_configuration = true")
+
+            frame = conn.execute(sql).fetch_df().head(self.MAX_ROWS)
+        finally:
+            conn.close()
+
+        return _to_records(frame)
+
+
+def _duck_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(series):
+        return "NUMBER"
+    if pd.api.types.is_numeric_dtype(series):
+        return "FLOAT"
+    return "TEXT"
+
+
+def _to_records(frame: pd.DataFrame) -> list[dict]:
+    """Convert a result frame to JSON-safe row dicts (same shape as SnowflakeClient)."""
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    for row in records:
+        for key, value in row.items():
+            row[key] = _plain(value)
+    return records
+
+
+def _plain(value):
+    """A cell as JSON-safe Python: LIST columns arrive as numpy arrays, STRUCTs as dicts of them."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
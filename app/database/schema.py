@@ -17,6 +17,7 @@ class Column:
     data_type: str
     description: str
     example_values: str = ""
+    unit: str = ""  # usd, ratio (0-1, shown as a percentage) or empty
 
 
 @dataclass
@@ -46,8 +47,8 @@ TABLES = [
             Column("LOCATION", "TEXT", "Geographic location for search", "Florida, United States"),
             Column("POSITION", "NUMBER", "Position in Google Shopping results (1 = top)"),
             Column("PRODUCT_TITLE", "TEXT", "Full product listing title"),
-            Column("PRICE", "FLOAT", "Current listed price in USD"),
-            Column("OLD_PRICE", "FLOAT", "Previous/strikethrough price if on sale (often NULL)"),
+            Column("PRICE", "FLOAT", "Current listed price in USD", unit="usd"),
+            Column("OLD_PRICE", "FLOAT", "Previous/strikethrough price if on sale (often NULL)", unit="usd"),
             Column("RATING", "FLOAT", "Product rating (0-5 scale, can be NULL)"),
             Column("REVIEWS", "FLOAT", "Number of reviews (can be NULL)"),
             Column("SELLER", "TEXT", "Merchant/retailer name", "Walmart, Giga Tires, Tire Rack, Priority Tire, Tires Easy"),
@@ -72,7 +73,7 @@ TABLES = [
             Column("CURRENT_POSITION", "NUMBER", "Current SERP position (1-100)"),
             Column("CURRENT_TRAFFIC", "NUMBER", "Estimated monthly organic traffic"),
             Column("KEYWORD_DIFFICULTY", "NUMBER", "Ahrefs KD score (0-100, higher = harder to rank)"),
-            Column("CPC", "FLOAT", "Cost per click for paid ads on this keyword"),
+            Column("CPC", "FLOAT", "Cost per click for paid ads on this keyword", unit="usd"),
             Column("LOADED_AT", "TIMESTAMP_NTZ", "When this data was imported"),
         ],
         notes="Lower CURRENT_POSITION = better ranking. Use for SEO opportunity analysis."
@@ -87,8 +88,8 @@ TABLES = [
         columns=[
             Column("PAGE_PATH", "TEXT", "URL path of the page"),
             Column("TOTAL_USERS", "NUMBER", "Total unique users who viewed this page"),
-            Column("USER_KEY_EVENT_RATE", "FLOAT", "Conversion rate (key events / users)"),
-            Column("TOTAL_REVENUE", "FLOAT", "Total revenue attributed to this page"),
+            Column("USER_KEY_EVENT_RATE", "FLOAT", "Conversion rate (key events / users)", unit="ratio"),
+            Column("TOTAL_REVENUE", "FLOAT", "Total revenue attributed to this page", unit="usd"),
             Column("LOADED_AT", "TIMESTAMP_NTZ", "When this data was imported"),
         ],
         notes="Join with AHREFS_KEYWORDS on PAGE_PATH to connect SEO rankings with conversion data."
@@ -139,8 +140,8 @@ TABLES = [
             Column("CURRENT_TRAFFIC", "NUMBER", "Estimated organic traffic"),
             Column("KEYWORD_DIFFICULTY", "NUMBER", "Ahrefs KD score"),
             Column("TOTAL_USERS", "NUMBER", "GA4 users for ranking page"),
-            Column("USER_KEY_EVENT_RATE", "FLOAT", "Conversion rate"),
-            Column("TOTAL_REVENUE", "FLOAT", "Revenue from ranking page"),
+            Column("USER_KEY_EVENT_RATE", "FLOAT", "Conversion rate", unit="ratio"),
+            Column("TOTAL_REVENUE", "FLOAT", "Revenue from ranking page", unit="usd"),
             Column("SLOPE", "FLOAT", "Trend line slope (positive = growing)"),
             Column("P_VALUE", "FLOAT", "Statistical significance of trend"),
             Column("ANNUAL_GROWTH", "FLOAT", "Year-over-year growth rate"),
@@ -243,9 +244,9 @@ TABLES = [
             Column("CAMPAIGN_TYPE", "TEXT", "Campaign type", "Search, Shopping, Performance Max"),
             Column("IMPRESSIONS", "NUMBER", "Ad impressions"),
             Column("CLICKS", "NUMBER", "Ad clicks"),
-            Column("COST", "FLOAT", "Ad spend in USD"),
+            Column("COST", "FLOAT", "Ad spend in USD", unit="usd"),
             Column("CONVERSIONS", "FLOAT", "Conversion count"),
-            Column("CONVERSION_VALUE", "FLOAT", "Total conversion value in USD"),
+            Column("CONVERSION_VALUE", "FLOAT", "Total conversion value in USD", unit="usd"),
         ],
         notes="PLACEHOLDER TABLE - Not yet populated. Will be imported via Google Ads API through N8N."
     ),
@@ -263,8 +264,8 @@ TABLES = [
             Column("SIZE", "TEXT", "Tire size", "225/65R17"),
             Column("QUANTITY_ON_HAND", "NUMBER", "Current stock level"),
             Column("QUANTITY_AVAILABLE", "NUMBER", "Available to sell"),
-            Column("UNIT_COST", "FLOAT", "Our cost per unit"),
-            Column("LIST_PRICE", "FLOAT", "Current selling price"),
+            Column("UNIT_COST", "FLOAT", "Our cost per unit", unit="usd"),
+            Column("LIST_PRICE", "FLOAT", "Current selling price", unit="usd"),
             Column("LAST_UPDATED", "TIMESTAMP_NTZ", "Last sync timestamp"),
         ],
         notes="PLACEHOLDER TABLE - Not yet populated. Will be imported via NetSuite API through N8N."
@@ -301,4 +302,20 @@ def get_schema_documentation() -> str:
 
 def get_table_names() -> list[str]:
     """Return list of all table names."""
-    return [table.name for table in TABLES]
\ No newline at end of file
+    return [table.name for table in TABLES]
+
+_COLUMN_INDEX: dict[str, Column] = {}
+
+
+def get_column(column_name: str) -> Column | None:
+    """
+    Look up column metadata by (unqualified) column name.
+
+    Columns that appear in several tables (e.g. KEYWORD) share semantics,
+    so the first definition is returned.
+    """
+    if not _COLUMN_INDEX:
+        for table in TABLES:
+            for col in table.columns:
+                _COLUMN_INDEX.setdefault(col.name.upper(), col)
+    return _COLUMN_INDEX.get(column_name.upper())
@@ -1,10 +1,41 @@
 """Snowflake database connection and query execution."""
 
-import snowflake.connector
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from contextvars import ContextVar
+from app.database.catalog import catalog
+from app.utils import metrics, tracing
 from config import settings
 
 
+@contextmanager
+def _stage(stage: str, **attributes):
+    """Time a Snowflake stage for metrics and trace it as a db.<stage> span."""
+    with tracing.span(f"db.{stage}", **attributes) as span, metrics.WAREHOUSE_STAGE.time(stage=stage):
+        yield span
+
+
+# Whether the last execute_query in this context was served from the result cache
+_cache_hit: ContextVar[bool] = ContextVar("snowflake_cache_hit", default=False)
+
+
+def served_from_cache() -> bool:
+    """Whether the calling context's last query was answered by the result cache, not the warehouse."""
+    return _cache_hit.get()
+
+
+def _trace_cache_hit():
+    span = tracing.current_span()
+    if span is not None:
+        span.add_event("result_cache_hit")
+
+
 class SnowflakeClient:
     """Client for executing queries against Snowflake."""
     
@@ -14,24 +45,86 @@ class SnowflakeClient:
     # Query timeout in seconds
     QUERY_TIMEOUT = 30
     
+    # Idle connections kept open for reuse: as many as the threads that query
+    # at once (JOB_WORKERS, the asyncio executor's submits and fetches), so a
+    # burst reuses connections instead of logging in and closing the overflow
+    POOL_SIZE = 16
+    
+    # Results kept in the in-process result cache (for RESULT_CACHE_TTL_SECONDS)
+    RESULT_CACHE_SIZE = 128
+    
     def __init__(self):
         self.config = settings.snowflake_config
+        self._pool = queue.LifoQueue(maxsize=self.POOL_SIZE)
+        self._cache: OrderedDict[str, tuple[float, tuple[dict, ...]]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def _connect(self):
+        """Open a new connection."""
+        with _stage("connect"):
+            # Imported on first connect: the connector is slow to import
+            import snowflake.connector
+            return snowflake.connector.connect(**self.config)
     
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections."""
-        conn = snowflake.connector.connect(**self.config)
+        """Context manager for pooled database connections."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
         try:
             yield conn
         finally:
-            conn.close()
+            # Return healthy connections to the pool, close the overflow
+            if not conn.is_closed():
+                try:
+                    self._pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+    
+    def _cache_get(self, key: str) -> list[dict] | None:
+        """A copy of a cached result, so callers may change their rows."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, results = entry
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+        return [dict(row) for row in results]
     
-    def execute_query(self, sql: str) -> list[dict]:
+    def _cache_put(self, key: str, results: list[dict]):
+        """Cache a copy of a result; later changes to the caller's rows don't reach it."""
+        ttl = settings.result_cache_ttl_seconds
+        if ttl <= 0:
+            return
+        rows = tuple(dict(row) for row in results)
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, rows)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.RESULT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    def execute_query(
+        self,
+        sql: str,
+        use_cache: bool = True,
+        timeout: float | None = None,
+        max_rows: int | None = None
+    ) -> list[dict]:
         """
         Execute a SELECT query and return results as a list of dicts.
         
         Args:
             sql: SQL query to execute (must be SELECT)
+            use_cache: Serve identical recent queries from the result cache
+            timeout: Seconds left for this query in the request's budget
+                (capped at QUERY_TIMEOUT; at least one second)
+            max_rows: Row limit instead of MAX_ROWS (for bulk metadata reads)
         
         Returns:
             List of dictionaries, one per row
@@ -44,36 +137,98 @@ class SnowflakeClient:
         if not (sql_stripped.startswith("SELECT") or sql_stripped.startswith("WITH")):
             raise ValueError("Only SELECT queries are allowed")
         
+        # Identical queries within the TTL are served without a round trip
+        cache_key = " ".join(sql.split())
+        cached = self._cache_get(cache_key) if use_cache else None
+        _cache_hit.set(cached is not None)
+        if cached is not None:
+            metrics.WAREHOUSE_QUERIES.inc(outcome="cached")
+            _trace_cache_hit()
+            return cached
+        
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
             try:
                 # Set query timeout
-                cursor.execute(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {self.QUERY_TIMEOUT}")
+                self._set_statement_timeout(cursor, timeout)
                 
                 # Execute the query
-                cursor.execute(sql)
+                with _stage("execute"):
+                    cursor.execute(sql)
                 
-                # Fetch results
-                columns = [col[0] for col in cursor.description]
-                rows = cursor.fetchmany(self.MAX_ROWS)
-                
-                # Convert to list of dicts
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, value in enumerate(row):
-                        # Convert non-serializable types
-                        if hasattr(value, "isoformat"):
-                            value = value.isoformat()
-                        row_dict[columns[i]] = value
-                    results.append(row_dict)
+                results = self._fetch_records(cursor, max_rows)
                 
+                if max_rows is None:
+                    self._cache_put(cache_key, results)
+                metrics.WAREHOUSE_QUERIES.inc(outcome="ok")
                 return results
+            
+            except Exception:
+                metrics.WAREHOUSE_QUERIES.inc(outcome="error")
+                raise
                 
             finally:
                 cursor.close()
     
+    def _set_statement_timeout(self, cursor, timeout: float | None):
+        """Apply QUERY_TIMEOUT, or the request's remaining budget if shorter."""
+        statement_timeout = self.QUERY_TIMEOUT
+        if timeout is not None:
+            statement_timeout = max(1, min(statement_timeout, int(timeout)))
+        with _stage("session", statement_timeout=statement_timeout):
+            cursor.execute(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {statement_timeout}")
+    
+    def _fetch_records(self, cursor, max_rows: int | None = None) -> list[dict]:
+        """Fetch up to MAX_ROWS (or max_rows) rows from an executed cursor as a list of dicts."""
+        columns = [col[0] for col in cursor.description]
+        with _stage("fetch") as span:
+            rows = cursor.fetchmany(max_rows or self.MAX_ROWS)
+            span.set_attribute("rows", len(rows))
+        
+        # Convert to list of dicts
+        with _stage("convert"):
+            results = []
+            for row in rows:
+                row_dict = {}
+                for i, value in enumerate(row):
+                    # Convert non-serializable types
+                    if hasattr(value, "isoformat"):
+                        value = value.isoformat()
+                    row_dict[columns[i]] = value
+                results.append(row_dict)
+        return results
+    
+    def explain(self, sql: str) -> dict:
+        """
+        Compile a query with EXPLAIN (no execution) and return its cost estimate.
+        
+        Returns:
+            {"partitions_total": int, "partitions_assigned": int, "bytes_assigned": int}
+        
+        Raises:
+            ValueError: If query is not a SELECT statement
+            Exception: Compilation errors (unknown objects, syntax)
+        """
+        sql_stripped = sql.strip().upper()
+        if not (sql_stripped.startswith("SELECT") or sql_stripped.startswith("WITH")):
+            raise ValueError("Only SELECT queries are allowed")
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"EXPLAIN USING JSON {sql}")
+                plan = json.loads(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+        
+        stats = plan.get("GlobalStats", {})
+        return {
+            "partitions_total": stats.get("partitionsTotal", 0),
+            "partitions_assigned": stats.get("partitionsAssigned", 0),
+            "bytes_assigned": stats.get("bytesAssigned", 0),
+        }
+    
     def test_connection(self) -> bool:
         """Test if we can connect to Snowflake."""
         try:
@@ -89,9 +244,16 @@ class SnowflakeClient:
         """
         Get column information for a table.
         
+        Served from the schema catalog's cached metadata when it has the
+        table (see app.database.catalog); queried otherwise.
+        
         Returns:
             List of {"name": str, "type": str, "nullable": bool}
         """
+        cached = catalog.table_columns(table_name)
+        if cached is not None:
+            return cached
+        
         sql = f"""
         SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE
         FROM INFORMATION_SCHEMA.COLUMNS
@@ -108,3 +270,154 @@ class SnowflakeClient:
             }
             for row in results
         ]
+
+
+class AsyncSnowflakeClient:
+    """
+    Awaitable query execution for the ASGI streaming path.
+
+    Queries are submitted with ``execute_async``; a single poller task
+    checks the status of every pending query each POLL_INTERVAL on one
+    dedicated status connection, so a stream waiting on the warehouse holds
+    no thread and no pooled connection, however many streams are open. Only
+    the short submit, status, fetch and cancel calls run in the default
+    executor. Shares the wrapped client's connection pool and result cache.
+
+    Args:
+        db: SnowflakeClient whose pool and cache are shared
+    """
+
+    # Seconds between query status checks
+    POLL_INTERVAL = 0.25
+
+    # Threads checking statuses at once, all on the one status connection
+    # (connector connections are thread-safe)
+    STATUS_THREADS = 16
+
+    def __init__(self, db: SnowflakeClient):
+        self.db = db
+        self.MAX_ROWS = db.MAX_ROWS
+        self._pending: dict[str, asyncio.Future] = {}
+        self._poller: asyncio.Task | None = None
+        self._status_conn = None
+        self._status_lock = threading.Lock()
+        self._status_pool = ThreadPoolExecutor(self.STATUS_THREADS, thread_name_prefix="snowflake-status")
+
+    async def execute_query(
+        self,
+        sql: str,
+        use_cache: bool = True,
+        timeout: float | None = None
+    ) -> list[dict]:
+        """Async counterpart of SnowflakeClient.execute_query."""
+        sql_stripped = sql.strip().upper()
+        if not (sql_stripped.startswith("SELECT") or sql_stripped.startswith("WITH")):
+            raise ValueError("Only SELECT queries are allowed")
+
+        cache_key = " ".join(sql.split())
+        cached = self.db._cache_get(cache_key) if use_cache else None
+        _cache_hit.set(cached is not None)
+        if cached is not None:
+            metrics.WAREHOUSE_QUERIES.inc(outcome="cached")
+            _trace_cache_hit()
+            return cached
+
+        try:
+            query_id = await asyncio.to_thread(self._submit, sql, timeout)
+            limit = self.db.QUERY_TIMEOUT if timeout is None else min(timeout, self.db.QUERY_TIMEOUT)
+
+            with _stage("execute", query_id=query_id):
+                try:
+                    await asyncio.wait_for(self._finished(query_id), limit)
+                except TimeoutError:
+                    await asyncio.shield(asyncio.to_thread(self._cancel, query_id))
+                    raise TimeoutError(f"Query {query_id} exceeded its {limit:.1f}s budget") from None
+                except asyncio.CancelledError:
+                    # The stream went away (client disconnect, WebSocket or job
+                    # cancel): stop the warehouse query too, even if cancelled again
+                    await asyncio.shield(asyncio.to_thread(self._cancel, query_id))
+                    raise
+
+            results = await asyncio.to_thread(self._fetch, query_id)
+        except Exception:
+            metrics.WAREHOUSE_QUERIES.inc(outcome="error")
+            raise
+        self.db._cache_put(cache_key, results)
+        metrics.WAREHOUSE_QUERIES.inc(outcome="ok")
+        return results
+
+    def _submit(self, sql: str, timeout: float | None) -> str:
+        with self.db._get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self.db._set_statement_timeout(cursor, timeout)
+                cursor.execute_async(sql)
+                return cursor.sfqid
+            finally:
+                cursor.close()
+
+    async def _finished(self, query_id: str):
+        """Wait until the poller sees the query finish; raises its error if it failed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[query_id] = future
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+        try:
+            await future
+        finally:
+            self._pending.pop(query_id, None)
+
+    async def _poll(self):
+        """Check all pending queries each POLL_INTERVAL until none are left."""
+        while self._pending:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            pending = {query_id: future for query_id, future in self._pending.items() if not future.done()}
+            if not pending:
+                continue
+            try:
+                statuses = await asyncio.to_thread(self._statuses, list(pending))
+            except Exception as e:
+                # No status connection: fail the waiting queries rather than hang them
+                statuses = dict.fromkeys(pending, e)
+            for query_id, status in statuses.items():
+                future = pending[query_id]
+                if future.done():
+                    continue
+                if isinstance(status, Exception):
+                    future.set_exception(status)
+                elif not status:
+                    future.set_result(None)
+
+    def _statuses(self, query_ids: list[str]) -> dict[str, bool | Exception]:
+        """Whether each query is still running (or its error), on the status connection."""
+        with self._status_lock:
+            if self._status_conn is None or self._status_conn.is_closed():
+                self._status_conn = self.db._connect()
+            conn = self._status_conn
+
+        def status(query_id: str) -> bool | Exception:
+            try:
+                # Raises for failed queries, surfacing the compilation/runtime error
+                return conn.is_still_running(conn.get_query_status_throw_if_error(query_id))
+            except Exception as e:
+                return e
+
+        return dict(zip(query_ids, self._status_pool.map(status, query_ids)))
+
+    def _fetch(self, query_id: str) -> list[dict]:
+        with self.db._get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.get_results_from_sfqid(query_id)
+                return self.db._fetch_records(cursor)
+            finally:
+                cursor.close()
+
+    def _cancel(self, query_id: str):
+        with self.db._get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT SYSTEM$CANCEL_QUERY('{query_id}')")
+            finally:
+                cursor.close()
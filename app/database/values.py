@@ -0,0 +1,325 @@
+"""
+Distinct keyword, brand and seller values, cached on disk and looked up
+from questions.
+
+Users spell the values they ask about loosely ("Cross Climate 2", "giga
+tire", "2756020"), and the agent used to match them with ILIKE '%...%'
+scans, which cannot prune partitions. One query fetches the distinct
+values of the ``SOURCES`` columns; an in-memory trigram index over their
+normalized spellings (casefolded letters and digits only) finds them
+regardless of spacing, punctuation or small typos, and the agent passes
+the exact values to the LLM so generated SQL compares with = or IN.
+
+Tire sizes are recognized in any common spelling (275/60R20, 275-60-20,
+275 60 R20, 2756020) and resolved to the values containing that size.
+
+Refresh the cache and resolve a question:
+    python -m app.database.values "Cross Climate 2 prices at giga tire"
+"""
+
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass, field
+
+from app.database.catalog import RefreshedCache, _digest, _quote, save_json
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Bumped when the cache file layout changes
+CACHE_FORMAT = 1
+
+SCRAPER = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+
+# (table, column) pairs whose distinct values are indexed
+SOURCES = [
+    (SCRAPER, "KEYWORD"),
+    (SCRAPER, "BRAND"),
+    (SCRAPER, "SELLER"),
+    (SCRAPER, "MATCHED_SELLER"),
+    ("PRIORITY_TIRE_DATA.UMIP_MOCK.KEYWORDS_MASTER", "KEYWORD"),
+]
+
+# Width / aspect ratio / rim diameter, with or without separators
+TIRE_SIZE = re.compile(r"(?<![\d.])(\d{3})\s*[/-]?\s*(\d{2})\s*(?:[/-]|Z?R)?\s*(\d{2})(?!\d)", re.IGNORECASE)
+
+WORD = re.compile(r"[^\W_]+")
+
+# Words that are part of the question rather than a value
+STOPWORDS = frozenset("""
+    a about all an and any are as at average avg be best between brand brands but by can cheap cheaper
+    cheapest compare compared count data did do does each for from get give had has have how i in is it
+    keyword keywords last list lowest highest many me month most much my of on or our over per price
+    prices priced rank ranking sale sales search searches sell seller sellers selling show size sizes so
+    than that the their them these this those to top under us vs was we week what when where which who
+    why with year you
+""".split())
+
+# Too generic to look up alone, but part of names like "Tire Rack"
+GENERIC = frozenset({"tire", "tires"})
+
+
+def normalize(text: str) -> str:
+    """Casefolded letters and digits only: 'Cross Climate 2' -> 'crossclimate2'."""
+    return "".join(ch for ch in text.casefold() if ch.isalnum())
+
+
+def tire_sizes(text: str) -> list[str]:
+    """Tire sizes mentioned in text, spelled canonically ('2756020' -> '275/60R20')."""
+    sizes = []
+    for match in TIRE_SIZE.finditer(text):
+        width, aspect, rim = (int(group) for group in match.groups())
+        if 125 <= width <= 395 and 25 <= aspect <= 95 and aspect % 5 == 0 and 12 <= rim <= 30:
+            size = f"{width}/{aspect}R{rim}"
+            if size not in sizes:
+                sizes.append(size)
+    return sizes
+
+
+def _trigrams(norm: str) -> set[str]:
+    return {norm[i:i + 3] for i in range(len(norm) - 2)}
+
+
+def values_query(sources: list[tuple[str, str]]) -> str:
+    """One query returning every distinct value of the source columns with its row count."""
+    return "\nUNION ALL\n".join(
+        f"SELECT {i} AS SOURCE, {column} AS VALUE, COUNT(*) AS ROW_COUNT FROM {table} "
+        f"WHERE {column} IS NOT NULL GROUP BY {column}"
+        for i, (table, column) in enumerate(sources)
+    )
+
+
+@dataclass
+class Match:
+    """Values one phrase of a question resolved to."""
+
+    term: str
+    # "exact", "contains", "fuzzy" or "size"
+    kind: str
+    # "TABLE.COLUMN" -> values, most rows first
+    values: dict[str, list[str]] = field(default_factory=dict)
+
+
+class ValueDictionary(RefreshedCache):
+    """
+    Cached distinct values of ``SOURCES`` with a spelling-tolerant lookup.
+
+    Args:
+        path: Cache file
+        ttl: Seconds before the cached values are refreshed
+        sources: (table, column) pairs (defaults to SOURCES)
+    """
+
+    # Rows fetched by the refresh query (values beyond it are not indexed)
+    FETCH_LIMIT = 200_000
+
+    NAME = "value dictionary"
+
+    # Values listed per column and phrase; more are left to ILIKE
+    MAX_LISTED = 20
+
+    # Words per phrase looked up
+    MAX_PHRASE_WORDS = 4
+
+    # Shortest normalized phrase matched inside values / with typos
+    MIN_CONTAINED = 4
+    MIN_FUZZY = 5
+
+    # Longest phrase (in words) matched with typos
+    MAX_FUZZY_WORDS = 2
+
+    # Trigram Dice similarity of a phrase and a value to count as a typo of it
+    FUZZY_SIMILARITY = 0.6
+
+    def __init__(self, path: str, ttl: float, sources: list[tuple[str, str]] | None = None):
+        super().__init__(path, ttl)
+        self.sources = sources if sources is not None else SOURCES
+        self.key = _digest([CACHE_FORMAT, [[table.upper(), column.upper()] for table, column in self.sources]])
+        self._index: _Index | None = None
+
+    def refresh(self, db) -> int:
+        """
+        Fetch the distinct values of every source column in one query and save them.
+
+        Args:
+            db: Database client (its execute_query runs the DISTINCT query)
+
+        Returns:
+            Number of values indexed
+        """
+        rows = db.execute_query(values_query(self.sources), use_cache=False, max_rows=self.FETCH_LIMIT)
+        cache = {
+            "key": self.key,
+            "fetched_at": time.time(),
+            "complete": len(rows) < self.FETCH_LIMIT,
+            "values": [[int(row["SOURCE"]), str(row["VALUE"]), int(row["ROW_COUNT"])] for row in rows],
+        }
+        if not cache["complete"]:
+            logger.warning("Value dictionary hit the %d row limit; some values are not indexed", len(rows))
+
+        self._use(cache)
+        save_json(self.path, cache)
+        logger.info("Value dictionary refreshed (%d values)", len(rows))
+        return len(rows)
+
+    def resolve(self, question: str) -> list[Match]:
+        """
+        Warehouse values the phrases of a question refer to.
+
+        Tire sizes are resolved first. Remaining phrases of up to
+        MAX_PHRASE_WORDS words, longest first, are matched by normalized
+        spelling: equal to a value, else contained in values, else a close
+        trigram match. Each word belongs to at most one matched phrase.
+        """
+        index = self._index
+        if index is None:
+            return []
+
+        matches = []
+        for size in tire_sizes(question):
+            values = index.group(index.sizes.get(size, ()), self.sources)
+            if values:
+                matches.append(Match(size, "size", values))
+
+        sizes = [match.span() for match in TIRE_SIZE.finditer(question)]
+        words = [
+            (word.group(), word.start(), word.end()) for word in WORD.finditer(question)
+            if not any(start <= word.start() < end for start, end in sizes)
+        ]
+        used = [False] * len(words)
+        for length in range(min(self.MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                span = range(start, start + length)
+                folded = [words[i][0].casefold() for i in span]
+                if (any(used[i] for i in span) or folded[0] in STOPWORDS or folded[-1] in STOPWORDS
+                        or all(word in GENERIC for word in folded)):
+                    continue
+                norm = normalize("".join(words[i][0] for i in span))
+                if len(norm) < 3 or norm.isdigit():
+                    continue
+                found = self._lookup(index, norm, fuzzy=length <= self.MAX_FUZZY_WORDS)
+                if found:
+                    kind, ids = found
+                    term = question[words[start][1]:words[start + length - 1][2]]
+                    matches.append(Match(term, kind, index.group(ids, self.sources)))
+                    for i in span:
+                        used[i] = True
+        return matches
+
+    def describe(self, question: str) -> str | None:
+        """
+        Resolved values as a note for the LLM, or None if nothing matched.
+
+        Phrases with at most MAX_LISTED values per column become = / IN
+        predicates; longer lists are summarized so the LLM keeps ILIKE.
+        """
+        lines = []
+        for match in self.resolve(question):
+            predicates = []
+            for column, values in match.values.items():
+                column = column.split(".", 2)[-1]
+                if len(values) == 1:
+                    predicates.append(f"{column} = {_quote(values[0])}")
+                elif len(values) <= self.MAX_LISTED:
+                    predicates.append(f"{column} IN ({', '.join(_quote(v) for v in values)})")
+                else:
+                    examples = ", ".join(_quote(v) for v in values[:3])
+                    predicates.append(f"{column}: {len(values)} values (e.g. {examples}), too many to list - use ILIKE")
+            lines.append(f'- "{match.term}": ' + "; ".join(predicates))
+        return "\n".join(lines) if lines else None
+
+    def _lookup(self, index: "_Index", norm: str, fuzzy: bool) -> tuple[str, list[int]] | None:
+        if norm in index.by_norm:
+            return "exact", index.by_norm[norm]
+        if len(norm) >= self.MIN_CONTAINED:
+            ids = index.containing(norm)
+            if ids:
+                return "contains", ids
+        if fuzzy and len(norm) >= self.MIN_FUZZY:
+            ids = index.similar(norm, self.FUZZY_SIMILARITY)
+            if ids:
+                return "fuzzy", ids
+        return None
+
+    def _use(self, cache: dict):
+        self._index = _Index(cache["values"])
+        self._cache = cache
+
+
+class _Index:
+    """Trigram postings over the distinct normalized spellings of the values."""
+
+    def __init__(self, values: list[list]):
+        # Entries sorted by row count so lookups list the most common values first
+        self.entries = sorted(values, key=lambda entry: -entry[2])
+        self.by_norm: dict[str, list[int]] = {}
+        self.sizes: dict[str, list[int]] = {}
+        for i, (_, value, _) in enumerate(self.entries):
+            self.by_norm.setdefault(normalize(value), []).append(i)
+            for size in tire_sizes(value):
+                self.sizes.setdefault(size, []).append(i)
+
+        self.norms = list(self.by_norm)
+        self.postings: dict[str, list[int]] = {}
+        for n, norm in enumerate(self.norms):
+            for trigram in _trigrams(norm):
+                self.postings.setdefault(trigram, []).append(n)
+
+    def containing(self, norm: str) -> list[int]:
+        """Entries whose normalized value contains norm."""
+        postings = sorted((self.postings.get(t, ()) for t in _trigrams(norm)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return self._entries(n for n in candidates if norm in self.norms[n])
+
+    def similar(self, norm: str, threshold: float) -> list[int]:
+        """Entries whose normalized value is a close trigram match (Dice similarity) to norm."""
+        grams = sorted(_trigrams(norm), key=lambda t: len(self.postings.get(t, ())))
+        # A match shares at least this many trigrams, so it is in one of the
+        # rarest len(grams) - shared + 1 postings (the common ones are skipped)
+        shared = math.ceil(threshold * len(grams) / (2 - threshold))
+        candidates = set().union(*(self.postings.get(t, ()) for t in grams[:len(grams) - shared + 1]))
+        longest = len(grams) * (2 - threshold) / threshold
+
+        best = {}
+        wanted = set(grams)
+        for n in candidates:
+            if len(self.norms[n]) - 2 > longest:
+                continue
+            theirs = _trigrams(self.norms[n])
+            score = 2 * len(wanted & theirs) / (len(wanted) + len(theirs))
+            if score >= threshold:
+                best[n] = score
+        if not best:
+            return []
+        top = max(best.values())
+        return self._entries(n for n, score in best.items() if score == top)
+
+    def group(self, ids, sources: list[tuple[str, str]]) -> dict[str, list[str]]:
+        """Values of entries by "TABLE.COLUMN", most rows first."""
+        grouped: dict[str, list[str]] = {}
+        for i in sorted(ids):
+            source, value, _ = self.entries[i]
+            table, column = sources[source]
+            grouped.setdefault(f"{table}.{column}", []).append(value)
+        return grouped
+
+    def _entries(self, norm_ids) -> list[int]:
+        return [i for n in norm_ids for i in self.by_norm[self.norms[n]]]
+
+
+dictionary = ValueDictionary(settings.value_dictionary_file, settings.value_dictionary_ttl_hours * 3600)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app.database.snowflake import SnowflakeClient
+
+    if not dictionary.load() or dictionary.stale():
+        print(f"Indexed {dictionary.refresh(SnowflakeClient())} values")
+    print(dictionary.describe(" ".join(sys.argv[1:])) or "No known values in the question")
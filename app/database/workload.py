@@ -0,0 +1,544 @@
+"""
+Fingerprints of the queries the agent runs, and an advisor built on them.
+
+Every warehouse query is reduced to a fingerprint: its token stream with
+literals replaced by ``?``, IN lists collapsed, keywords upper-cased and
+table aliases renamed in order of appearance, so queries that differ only
+in their values or aliases share one. Executions are logged per
+fingerprint with their latency in a local SQLite store, together with the
+query's shape: tables read, columns filtered (equality, range or pattern)
+and grouped, and aggregates computed. Bytes and partitions scanned are
+backfilled from the warehouse's QUERY_HISTORY.
+
+The advisor ranks fingerprints by total time and, per table, recommends
+clustering keys for the filter columns that dominate the time spent,
+search optimization for substring and point lookups, and pre-aggregated
+materialized views for repeated GROUP BY queries.
+
+Backfill scan statistics and print the report:
+    python -m app.database.workload [--days 7] [--no-backfill]
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from app.agent.validator import _NOT_ALIASES, _TABLE_REF, _clean, table_columns
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>(?<![\w$])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><>|!=|<=|>=|\|\||::|\S)
+""", re.VERBOSE | re.DOTALL)
+
+COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">=", "IN", "BETWEEN", "LIKE", "ILIKE"}
+RANGES = {"<", ">", "<=", ">=", "BETWEEN"}
+
+AGGREGATES = {
+    "SUM", "AVG", "COUNT", "MIN", "MAX", "MEDIAN", "STDDEV", "VARIANCE", "APPROX_COUNT_DISTINCT",
+    "COUNT_IF", "LISTAGG", "ARRAY_AGG",
+}
+
+# Words after GROUP BY that end its column list
+_CLAUSES = {"HAVING", "ORDER", "LIMIT", "QUALIFY", "UNION", "EXCEPT", "MINUS", "INTERSECT", "WINDOW"}
+
+
+def _tokens(sql: str) -> list[tuple[str, str]]:
+    """(kind, text) tokens without whitespace and comments; words upper-cased."""
+    tokens = []
+    for match in TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        text = match.group()
+        tokens.append((kind, text.upper() if kind == "word" else text))
+    return tokens
+
+
+def _table_aliases(sql: str) -> list[tuple[str, str | None]]:
+    """(table reference, alias or None) pairs in order of appearance."""
+    return [
+        (ref.upper(), alias.upper() if alias and alias.upper() not in _NOT_ALIASES else None)
+        for ref, alias in _TABLE_REF.findall(_clean(sql))
+    ]
+
+
+def _aliases(sql: str) -> dict[str, str]:
+    """Alias (or bare table name) -> fully qualified configured table."""
+    known = table_columns()
+    short_names = {name.rsplit(".", 1)[-1]: name for name in known}
+    aliases = {}
+    for ref, alias in _table_aliases(sql):
+        table = ref if ref in known else short_names.get(ref)
+        if table:
+            aliases[table.rsplit(".", 1)[-1]] = table
+            if alias:
+                aliases.setdefault(alias, table)
+    return aliases
+
+
+def fingerprint(sql: str) -> tuple[str, str]:
+    """
+    Fingerprint of a query and the normalized text it hashes.
+
+    Literals become ``?``, ``IN (?, ?, ...)`` becomes ``IN (?)``, aliases
+    become T1, T2... in order of appearance, and whitespace, comments,
+    keyword case and a trailing semicolon are ignored.
+    """
+    tokens = _tokens(sql.strip().rstrip(";"))
+    renamed: dict[str, str] = {}
+    for _, alias in _table_aliases(sql):
+        if alias and alias not in renamed:
+            renamed[alias] = f"T{len(renamed) + 1}"
+
+    parts = []
+    for kind, text in tokens:
+        if kind in ("string", "number"):
+            parts.append("?")
+        elif kind == "word" and text in renamed:
+            parts.append(renamed[text])
+        else:
+            parts.append(text)
+    normalized = " ".join(parts)
+    normalized = re.sub(r"\( \?(?: , \?)+ \)", "( ? )", normalized)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16], normalized
+
+
+def shape(sql: str) -> dict:
+    """
+    Tables a query reads and how it uses their columns.
+
+    Returns:
+        {"tables": [...], "filters": [[table, column, "equality" | "range" |
+         "substring" | "pattern"], ...], "group_by": [[table, column], ...],
+         "aggregates": ["AVG(PRICE)", ...]}
+
+        Columns are attributed through aliases, or for unqualified names to
+        the first referenced table that has the column. Comparisons with
+        another column (joins) and columns wrapped in functions are not
+        filters on the stored column, so they are not listed.
+    """
+    aliases = _aliases(sql)
+    tables = list(dict.fromkeys(aliases.values()))
+    known = table_columns()
+
+    def owner(qualifier: str | None, column: str) -> str | None:
+        if qualifier:
+            return aliases.get(qualifier)
+        return next((table for table in tables if column in known.get(table, ())), None)
+
+    def is_column(position: int) -> bool:
+        kind, text = tokens[position] if position < len(tokens) else ("", "")
+        following = tokens[position + 1][1] if position + 1 < len(tokens) else ""
+        return kind == "word" and (following == "." or owner(None, text) is not None)
+
+    def without_qualifiers(part: list[tuple[str, str]]) -> str:
+        kept = [t for n, (_, t) in enumerate(part) if t != "." and (n + 1 >= len(part) or part[n + 1][1] != ".")]
+        text = re.sub(r"\s*\(\s*", "(", " ".join(kept))
+        return re.sub(r"\s+\)", ")", text).replace(" , ", ", ")
+
+    tokens = _tokens(sql)
+    filters, group_by, aggregates = [], [], []
+    for i, (kind, text) in enumerate(tokens):
+        if kind != "word" or i + 1 >= len(tokens):
+            continue
+        qualifier = tokens[i - 2][1] if i >= 2 and tokens[i - 1][1] == "." else None
+        after = i + 2 if tokens[i + 1][1] == "NOT" else i + 1
+        operator = tokens[after][1] if after < len(tokens) else ""
+
+        # column <op> constant; column <op> column is a join, not a filter
+        if operator in COMPARISONS and (operator in ("IN", "BETWEEN") or not is_column(after + 1)):
+            table = owner(qualifier, text)
+            if table:
+                if operator in ("LIKE", "ILIKE"):
+                    right = tokens[after + 1] if after + 1 < len(tokens) else ("", "")
+                    usage = "substring" if right[0] == "string" and right[1].startswith("'%") else "pattern"
+                else:
+                    usage = "range" if operator in RANGES else "equality"
+                filters.append([table, text, usage])
+
+        if text in AGGREGATES and operator == "(":
+            depth = 0
+            for end in range(i + 1, len(tokens)):
+                depth += {"(": 1, ")": -1}.get(tokens[end][1], 0)
+                if depth == 0:
+                    break
+            aggregates.append(without_qualifiers(tokens[i:end + 1]))
+
+        if text == "GROUP" and operator == "BY":
+            depth = 0
+            for j in range(i + 2, len(tokens)):
+                word = tokens[j][1]
+                depth += {"(": 1, ")": -1}.get(word, 0)
+                if depth < 0 or (depth == 0 and word in _CLAUSES) or word == ";":
+                    break
+                if tokens[j][0] == "word" and depth == 0 and (j + 1 >= len(tokens) or tokens[j + 1][1] != "."):
+                    prefix = tokens[j - 2][1] if tokens[j - 1][1] == "." else None
+                    table = owner(prefix, word)
+                    if table and [table, word] not in group_by:
+                        group_by.append([table, word])
+
+    return {
+        "tables": tables,
+        "filters": [f for n, f in enumerate(filters) if f not in filters[:n]],
+        "group_by": group_by,
+        "aggregates": list(dict.fromkeys(aggregates)),
+    }
+
+
+def history_query(days: int) -> str:
+    """This user's successful SELECTs of the last ``days`` days with their scan statistics."""
+    database = settings.snowflake_database or "PRIORITY_TIRE_DATA"
+    return f"""SELECT QUERY_ID, QUERY_TEXT, START_TIME, TOTAL_ELAPSED_TIME, BYTES_SCANNED,
+    PARTITIONS_SCANNED, PARTITIONS_TOTAL
+FROM TABLE({database}.INFORMATION_SCHEMA.QUERY_HISTORY_BY_USER(
+    END_TIME_RANGE_START => DATEADD('day', -{int(days)}, CURRENT_TIMESTAMP()), RESULT_LIMIT => 10000))
+WHERE EXECUTION_STATUS = 'SUCCESS' AND QUERY_TYPE = 'SELECT'"""
+
+
+def _timestamp(value) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+class WorkloadLog:
+    """
+    SQLite log of query executions by fingerprint, and the advisor report.
+
+    Args:
+        path: SQLite database file
+    """
+
+    # Days of executions kept
+    RETENTION_DAYS = 30
+
+    # Rows read from QUERY_HISTORY per backfill
+    HISTORY_LIMIT = 10_000
+
+    # A table needs this many executions in the window to get recommendations
+    MIN_EXECUTIONS = 5
+
+    # Share of a table's query time a column's filters must account for
+    MIN_SHARE = 0.25
+
+    # Most clustering key columns recommended
+    MAX_CLUSTER_COLUMNS = 3
+
+    # Average share of partitions scanned below which pruning already works
+    GOOD_PRUNING = 0.1
+
+    # Executions of an aggregate fingerprint that justify a pre-aggregate
+    MIN_AGGREGATE_REPEATS = 5
+
+    # Executions waiting for the writer thread; more are dropped
+    MAX_QUEUED = 10_000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=self.MAX_QUEUED)
+        self._writer: threading.Thread | None = None
+        self._writer_lock = threading.Lock()
+        self._known: set[str] = set()
+        self._pruned_at = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    fingerprint TEXT PRIMARY KEY,
+                    normalized TEXT NOT NULL,
+                    example TEXT NOT NULL,
+                    shape TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS executions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint TEXT NOT NULL,
+                    executed_at REAL NOT NULL,
+                    elapsed_ms REAL NOT NULL,
+                    row_count INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS executions_time ON executions (executed_at);
+                CREATE TABLE IF NOT EXISTS scans (
+                    query_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    started_at REAL,
+                    elapsed_ms REAL,
+                    bytes_scanned INTEGER,
+                    partitions_scanned INTEGER,
+                    partitions_total INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS scans_fingerprint ON scans (fingerprint, started_at);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, sql: str, seconds: float, row_count: int, now: float | None = None) -> str:
+        """Log one warehouse execution; returns its fingerprint."""
+        now = now or time.time()
+        key, normalized = fingerprint(sql)
+        with self._lock, self._connect() as conn:
+            if key not in self._known:
+                conn.execute(
+                    "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, normalized, sql, json.dumps(shape(sql)), now, now)
+                )
+                self._known.add(key)
+            conn.execute("UPDATE fingerprints SET last_seen = ? WHERE fingerprint = ?", (now, key))
+            conn.execute(
+                "INSERT INTO executions (fingerprint, executed_at, elapsed_ms, row_count) VALUES (?, ?, ?, ?)",
+                (key, now, seconds * 1000, row_count)
+            )
+            # Old executions are dropped at most hourly
+            if now - self._pruned_at > 3600:
+                conn.execute("DELETE FROM executions WHERE executed_at < ?", (now - self.RETENTION_DAYS * 86400,))
+                self._pruned_at = now
+        return key
+
+    def submit(self, sql: str, seconds: float, row_count: int):
+        """
+        Queue one warehouse execution for the writer thread.
+
+        Returns at once, so callers on the event loop or answering a
+        question never wait on SQLite or on a backfill holding the lock.
+        """
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write, name="workload-writer", daemon=True)
+                self._writer.start()
+        try:
+            self._queue.put_nowait((sql, seconds, row_count, time.time()))
+        except queue.Full:
+            logger.warning("Workload log queue full; execution not logged")
+
+    def flush(self):
+        """Wait until queued executions are written."""
+        self._queue.join()
+
+    def _write(self):
+        while True:
+            sql, seconds, row_count, now = self._queue.get()
+            try:
+                self.record(sql, seconds, row_count, now)
+            except Exception:
+                logger.exception("Could not log the query fingerprint")
+            finally:
+                self._queue.task_done()
+
+    def backfill(self, db, days: int = 7) -> int:
+        """
+        Attach bytes and partitions scanned from QUERY_HISTORY to logged fingerprints.
+
+        History rows are fingerprinted like executions; rows of queries the
+        agent never ran are skipped. Returns the number of new scan rows.
+        """
+        rows = db.execute_query(history_query(days), use_cache=False, max_rows=self.HISTORY_LIMIT)
+        added = 0
+        with self._lock, self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT fingerprint FROM fingerprints")}
+            for row in rows:
+                key, _ = fingerprint(row["QUERY_TEXT"])
+                if key not in known:
+                    continue
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO scans VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (row["QUERY_ID"], key, _timestamp(row["START_TIME"]), row["TOTAL_ELAPSED_TIME"],
+                     row["BYTES_SCANNED"], row["PARTITIONS_SCANNED"], row["PARTITIONS_TOTAL"])
+                )
+                added += cursor.rowcount
+        return added
+
+    def hottest(self, days: float = 7, limit: int = 20, now: float | None = None) -> list[dict]:
+        """Fingerprints of the last ``days`` days by total execution time, with their scan statistics."""
+        since = (now or time.time()) - days * 86400
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT f.fingerprint, f.normalized, f.example, f.shape, COUNT(*) AS executions,
+                       SUM(e.elapsed_ms) AS total_ms, AVG(e.elapsed_ms) AS avg_ms,
+                       MAX(e.elapsed_ms) AS max_ms, AVG(e.row_count) AS avg_rows
+                FROM executions e JOIN fingerprints f ON f.fingerprint = e.fingerprint
+                WHERE e.executed_at >= ?
+                GROUP BY f.fingerprint
+                ORDER BY total_ms DESC
+                LIMIT ?
+            """, (since, limit)).fetchall()
+            scans = {row["fingerprint"]: row for row in conn.execute("""
+                SELECT fingerprint, COUNT(*) AS scans, AVG(bytes_scanned) AS avg_bytes,
+                       AVG(CAST(partitions_scanned AS REAL) / NULLIF(partitions_total, 0)) AS scanned_share
+                FROM scans WHERE started_at >= ? GROUP BY fingerprint
+            """, (since,))}
+
+        report = []
+        for row in rows:
+            scan = scans.get(row["fingerprint"])
+            report.append({
+                "fingerprint": row["fingerprint"],
+                "normalized": row["normalized"],
+                "example": row["example"],
+                "executions": row["executions"],
+                "total_ms": round(row["total_ms"], 1),
+                "avg_ms": round(row["avg_ms"], 1),
+                "max_ms": round(row["max_ms"], 1),
+                "avg_rows": round(row["avg_rows"], 1),
+                "avg_bytes_scanned": round(scan["avg_bytes"]) if scan and scan["avg_bytes"] is not None else None,
+                "partitions_scanned_share": (
+                    round(scan["scanned_share"], 3) if scan and scan["scanned_share"] is not None else None
+                ),
+                **json.loads(row["shape"]),
+            })
+        return report
+
+    def advise(self, days: float = 7, limit: int = 20, now: float | None = None) -> dict:
+        """
+        Hottest fingerprints and per-table recommendations.
+
+        Returns:
+            {"days": ..., "fingerprints": [...], "tables": {"DB.SCHEMA.TABLE":
+             {"executions": n, "total_ms": ..., "partitions_scanned_share": ...,
+              "filters": {"COLUMN": {"equality": ms, ...}},
+              "recommendations": [{"kind": "clustering" | "search_optimization" |
+               "pre_aggregate", "sql": "...", "reason": "..."}]}}}
+
+            Filter and share figures weigh each fingerprint by its total
+            time, so a rare slow query counts as much as many fast ones.
+        """
+        hot = self.hottest(days, limit=1000, now=now)
+        tables: dict[str, dict] = {}
+        for entry in hot:
+            for table in entry["tables"]:
+                stats = tables.setdefault(table, {
+                    "executions": 0, "total_ms": 0.0, "filters": {}, "_scanned": [], "_aggregates": []
+                })
+                stats["executions"] += entry["executions"]
+                stats["total_ms"] += entry["total_ms"]
+                if entry["partitions_scanned_share"] is not None and len(entry["tables"]) == 1:
+                    stats["_scanned"].append((entry["partitions_scanned_share"], entry["total_ms"]))
+                for filtered_table, column, kind in entry["filters"]:
+                    if filtered_table == table:
+                        usage = stats["filters"].setdefault(column, {})
+                        usage[kind] = round(usage.get(kind, 0.0) + entry["total_ms"], 1)
+                if entry["aggregates"] and entry["group_by"] and entry["tables"] == [table]:
+                    stats["_aggregates"].append(entry)
+
+        for table, stats in tables.items():
+            scanned = stats.pop("_scanned")
+            weight = sum(ms for _, ms in scanned)
+            stats["partitions_scanned_share"] = (
+                round(sum(share * ms for share, ms in scanned) / weight, 3) if weight else None
+            )
+            stats["total_ms"] = round(stats["total_ms"], 1)
+            stats["recommendations"] = self._recommend(table, stats, stats.pop("_aggregates"))
+
+        return {
+            "days": days,
+            "fingerprints": hot[:limit],
+            "tables": dict(sorted(tables.items(), key=lambda item: -item[1]["total_ms"])),
+        }
+
+    def _recommend(self, table: str, stats: dict, aggregates: list[dict]) -> list[dict]:
+        if stats["executions"] < self.MIN_EXECUTIONS:
+            return []
+        total = stats["total_ms"] or 1.0
+        recommendations = []
+
+        def share(column: str, *kinds: str) -> float:
+            return sum(stats["filters"][column].get(kind, 0.0) for kind in kinds) / total
+
+        # Clustering: columns whose equality/range filters carry the most time,
+        # equality columns first (range columns prune best at the end of the key)
+        pruning = stats["partitions_scanned_share"]
+        candidates = [
+            column for column in stats["filters"] if share(column, "equality", "range") >= self.MIN_SHARE
+        ]
+        candidates.sort(key=lambda c: (share(c, "range") > share(c, "equality"), -share(c, "equality", "range")))
+        key = candidates[:self.MAX_CLUSTER_COLUMNS]
+        if key and (pruning is None or pruning > self.GOOD_PRUNING):
+            scanned = "" if pruning is None else f"; queries scan {pruning:.0%} of its partitions"
+            recommendations.append({
+                "kind": "clustering",
+                "sql": f"ALTER TABLE {table} CLUSTER BY ({', '.join(key)})",
+                "reason": "Filters on " + ", ".join(
+                    f"{column} ({share(column, 'equality', 'range'):.0%} of query time)" for column in key
+                ) + scanned,
+            })
+
+        # Search optimization: substring matches, and point lookups on columns
+        # the clustering key does not lead with
+        methods = [
+            f"SUBSTRING({column})" for column in stats["filters"] if share(column, "substring") >= self.MIN_SHARE
+        ] + [
+            f"EQUALITY({column})" for column in stats["filters"]
+            if column not in key[:1] and share(column, "equality") >= self.MIN_SHARE
+        ]
+        if methods:
+            recommendations.append({
+                "kind": "search_optimization",
+                "sql": f"ALTER TABLE {table} ADD SEARCH OPTIMIZATION ON {', '.join(methods)}",
+                "reason": "Selective lookups that clustering on another key cannot prune: " + ", ".join(methods),
+            })
+
+        # Pre-aggregates: repeated GROUP BY queries, grouped by their dimensions
+        views: dict[tuple, dict] = {}
+        for entry in aggregates:
+            dimensions = [column for _, column in entry["group_by"]]
+            dimensions += [column for _, column, _ in entry["filters"] if column not in dimensions]
+            view = views.setdefault(tuple(dimensions), {"executions": 0, "total_ms": 0.0, "aggregates": []})
+            view["executions"] += entry["executions"]
+            view["total_ms"] += entry["total_ms"]
+            view["aggregates"] += [a for a in entry["aggregates"] if a not in view["aggregates"]]
+        for dimensions, view in sorted(views.items(), key=lambda item: -item[1]["total_ms"]):
+            if view["executions"] < self.MIN_AGGREGATE_REPEATS:
+                continue
+            name = f"{table}_BY_{'_'.join(dimensions[:3])}"
+            columns = ", ".join(list(dimensions) + view["aggregates"])
+            recommendations.append({
+                "kind": "pre_aggregate",
+                "sql": f"CREATE MATERIALIZED VIEW {name} AS SELECT {columns} FROM {table} "
+                       f"GROUP BY {', '.join(dimensions)}",
+                "reason": f"{view['executions']} aggregate queries ({view['total_ms'] / total:.0%} of query time) "
+                          f"group or filter by {', '.join(dimensions)}",
+            })
+        return recommendations
+
+
+workload = WorkloadLog(settings.workload_log_file) if settings.workload_log_enabled else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank query fingerprints and recommend physical design changes.")
+    parser.add_argument("--days", type=int, default=7, help="Window of executions to analyze")
+    parser.add_argument("--no-backfill", action="store_true", help="Skip reading QUERY_HISTORY")
+    args = parser.parse_args()
+
+    log = workload or WorkloadLog(settings.workload_log_file)
+    if not args.no_backfill:
+        from app.database.snowflake import SnowflakeClient
+        print(f"Backfilled {log.backfill(SnowflakeClient(), args.days)} scans")
+    print(json.dumps(log.advise(args.days), indent=2))
@@ -1,7 +1,11 @@
 from app import create_app
+from app.asgi import create_asgi_app
 from config import settings
 
 app = create_app()
 
+# Async entry point: uvicorn app.main:asgi_app
+asgi_app = create_asgi_app(app)
+
 if __name__ == "__main__":
     app.run(debug=settings.flask_debug, host="0.0.0.0", port=5000)
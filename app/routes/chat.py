@@ -1,27 +1,67 @@
-from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask import Blueprint, request, jsonify, Response, g, stream_with_context
 import json
+from app.agent.admission import (
+    BROWSER_COOKIE,
+    TIMED_OUT,
+    AdmissionController,
+    Rejected,
+    conversation_key,
+    owner_key,
+    user_key,
+)
+from app.agent.batch import BatchRunner
+from app.agent.models import MODELS
 from app.agent.sql_agent import SQLAgent
+from app.routes.profiles import profiled
+from app.utils import metrics
+from app.utils.deadline import Deadline, parse_deadline
+from config import settings
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api")
 
 # Initialize agent (singleton for the app)
 agent = SQLAgent()
 
+# Limits on questions answered at once (shared by /chat, /chat/stream and /jobs)
+admission = AdmissionController(
+    settings.admission_max_concurrent,
+    settings.admission_max_per_user,
+    settings.admission_queue_size,
+    settings.admission_max_queued_per_user
+)
+metrics.registry.add_collector(admission.collect)
+
+# Longest per-request deadline a client may ask for, in seconds
+MAX_DEADLINE_SECONDS = 300
+
 
 @chat_bp.route("/chat", methods=["POST"])
+@profiled
 def chat():
     """
     Main chat endpoint (non-streaming).
 
     Request body:
-        {"message": "user's question"}
+        {"message": "user's question", "conversation_id": "conv-...", "llm_summary": false,
+         "deadline_seconds": 30}
+
+    The deadline may also be sent as an X-Request-Deadline header (seconds).
+
+    Questions beyond the admission limits wait for a slot within the
+    deadline; a user over their limit gets 429 and a full queue 503, with
+    a Retry-After header.
+
+    With the profiling token (X-Profile-Token header or ?profile=), the
+    request runs under a sampling profiler (see /api/profiles).
 
     Response:
         {
             "answer": "natural language response",
             "sql": "generated SQL query (if any)",
             "data": [...] or null,
-            "error": null or "error message"
+            "error": null or "error message",
+            "fast_path": null or {"shape": ..., "render_ms": ..., "input_tokens_saved": ...},
+            "budget": {"budget_ms": ..., "used_ms": ..., "phases": {...}, "skipped": [...]}
         }
     """
     data = request.get_json()
@@ -34,29 +74,83 @@ def chat():
     if not user_message:
         return jsonify({"error": "Message cannot be empty"}), 400
 
+    deadline = _request_deadline(data)
+    if deadline is None:
+        return jsonify({"error": "Invalid deadline"}), 400
+
+    # Pinned questions are served from the store without LLM or warehouse work
+    pin = _find_pin(user_message)
+    if pin:
+        _remember_pin(pin, user_message, _conversation(data))
+        return jsonify({
+            "answer": pin["answer"],
+            "sql": pin["sql"],
+            "data": pin["data"],
+            "error": None,
+            "pinned": {"id": pin["id"], "refreshed_at": pin["refreshed_at"]}
+        })
+
+    try:
+        ticket = admission.request(_user(), deadline.remaining())
+    except Rejected as e:
+        return _rejected(e)
+    if not ticket.wait(deadline.remaining()):
+        return _rejected(Rejected(503, TIMED_OUT, admission.RETRY_AFTER_FULL))
+
     # Process the question through the agent
-    result = agent.ask(user_message)
+    try:
+        result = agent.ask(
+            user_message,
+            llm_summary=bool(data.get("llm_summary")),
+            conversation_id=_conversation(data),
+            deadline=deadline
+        )
+    finally:
+        ticket.release()
 
     return jsonify(result)
 
 
 @chat_bp.route("/chat/stream", methods=["POST"])
+@profiled
 def chat_stream():
     """
     Streaming chat endpoint using Server-Sent Events (SSE).
 
     Request body:
-        {"message": "user's question"}
+        {"message": "user's question", "conversation_id": "conv-...", "llm_summary": false,
+         "deadline_seconds": 30, "approximate": false}
+
+    The deadline may also be sent as an X-Request-Deadline header (seconds).
+
+    With "approximate", aggregates over the large tables first stream a
+    preview computed on a sample (a "preview" event), which the complete
+    event replaces (see SQLAgent.ask_stream).
+
+    The question runs as a background job (see /api/jobs), so a dropped
+    connection loses nothing: the X-Job-Id response header names the job,
+    and each event carries an SSE id. Reconnect with GET
+    /api/jobs/<id>/events and a Last-Event-ID header, or repeat this request
+    with the same Idempotency-Key header, to resume without re-running it.
+
+    While the question waits for an admission slot, status events carry
+    its "queue_position"; shed questions get 429 or 503 before streaming.
+
+    With the profiling token, the request and the job answering it run
+    under a sampling profiler, named in the X-Profile-Id header.
 
     Response:
         Server-Sent Events stream with JSON objects:
         - {"type": "token", "content": "text"}
         - {"type": "sql", "content": "SELECT ..."}
         - {"type": "status", "content": "status message"}
+        - {"type": "preview", "sql": "...", "data": [...], "row_count": 12, "sample_percent": 10.0}
         - {"type": "data_ready", "row_count": 123}
-        - {"type": "complete", "sql": "...", "data": [...]}
+        - {"type": "complete", "sql": "...", "data": [...], "budget": {...}}
         - {"type": "error", "content": "error message"}
     """
+    from app.routes.jobs import job_queue, job_stream, last_event_id
+
     data = request.get_json()
 
     if not data or "message" not in data:
@@ -67,35 +161,189 @@ def chat_stream():
     if not user_message:
         return jsonify({"error": "Message cannot be empty"}), 400
 
+    deadline = _request_deadline(data)
+    if deadline is None:
+        return jsonify({"error": "Invalid deadline"}), 400
+
+    conversation_id = _conversation(data)
+
+    pin = _find_pin(user_message)
+    if pin:
+        _remember_pin(pin, user_message, conversation_id)
+
+        def generate():
+            for event in _pinned_events(pin):
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Disable nginx buffering
+            }
+        )
+
+    try:
+        job = job_queue.submit(
+            user_message,
+            conversation_id=conversation_id,
+            llm_summary=bool(data.get("llm_summary")),
+            deadline_seconds=deadline.budget,
+            client_key=request.headers.get("Idempotency-Key"),
+            user=_user(),
+            profile=g.get("profile"),
+            approximate=bool(data.get("approximate"))
+        )
+    except Rejected as e:
+        return _rejected(e)
+    return job_stream(job["id"], last_event_id())
+
+
+@chat_bp.route("/admission", methods=["GET"])
+def admission_stats():
+    """
+    Admission control state for this worker process.
+
+    Response:
+        {"running": 3, "queued": 0, "users_running": 2, "limits": {...},
+         "admitted_total": ..., "rejected_user_limit_total": ..., "rejected_queue_full_total": ...,
+         "expired_total": ..., "cancelled_total": ...,
+         "wait_seconds": {"count": ..., "sum": ..., "buckets": {"0.1": ..., ..., "+Inf": ...}}}
+    """
+    return jsonify(admission.stats())
+
+
+def _user() -> str:
+    """Who is asking, for per-user admission limits."""
+    return user_key(request.headers, request.remote_addr)
+
+
+def _owner() -> str | None:
+    """Who owns the caller's conversations (see owner_key), or None if nobody can be named."""
+    return owner_key(request.headers, request.remote_addr, request.cookies.get(BROWSER_COOKIE))
+
+
+def _conversation(data: dict) -> str | None:
+    """The request's conversation, scoped to its owner (see conversation_key)."""
+    return conversation_key(_owner(), data.get("conversation_id"))
+
+
+def _rejected(error: Rejected) -> Response:
+    """JSON error for a shed request, telling the client when to retry."""
+    response = jsonify({"error": str(error)})
+    response.status_code = error.status
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def _request_deadline(data: dict) -> Deadline | None:
+    """
+    Deadline for a request, from the X-Request-Deadline header or the body.
+
+    Defaults to REQUEST_DEADLINE_SECONDS, is capped at MAX_DEADLINE_SECONDS,
+    and is None when the value is not a positive number.
+    """
+    seconds = request.headers.get("X-Request-Deadline", data.get("deadline_seconds"))
+    return parse_deadline(seconds, settings.request_deadline_seconds, MAX_DEADLINE_SECONDS)
+
+
+def _find_pin(question: str) -> dict | None:
+    """Return the stored pinned answer for a question, if it has one."""
+    from app.routes.pins import pin_store
+    pin = pin_store.find(question)
+    return pin if pin and pin["answer"] and not pin["error"] else None
+
+
+def _remember_pin(pin: dict, question: str, conversation_id: str | None):
+    """Keep pinned answers in the conversation so follow-ups have context."""
+    if conversation_id:
+        agent.remember(conversation_id, question, pin["sql"], pin["data"], pin["answer"])
+
+
+def _pinned_events(pin: dict):
+    """Replay a pinned answer using the ask_stream event protocol."""
+    yield {"type": "sql", "content": pin["sql"]}
+    yield {"type": "data_ready", "row_count": len(pin["data"] or [])}
+    yield {"type": "token", "content": pin["answer"]}
+    yield {
+        "type": "complete",
+        "sql": pin["sql"],
+        "data": pin["data"],
+        "error": None,
+        "pinned": {"id": pin["id"], "refreshed_at": pin["refreshed_at"]}
+    }
+
+
+@chat_bp.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """
+    Answer a list of questions (e.g. a weekly report) concurrently.
+
+    Request body:
+        {"questions": ["...", "..."], "stream": true, "llm_summary": false, "deadline_seconds": 30}
+
+    The batch takes one admission ticket weighted by the questions it
+    answers at once, so it counts against the same per-user and global
+    limits as that many /chat requests. It waits for the slots within the
+    deadline (X-Request-Deadline header or body); a user over their limit
+    gets 429 and a full queue 503, with a Retry-After header.
+
+    Response:
+        With "stream" (default), Server-Sent Events:
+        - {"type": "question_complete", "index": 0, "completed": 1, "total": 30, "result": {...}}
+        - {"type": "batch_complete", "elapsed_ms": 12345.6, "results": [...]}
+        Otherwise the batch_complete document as JSON.
+    """
+    data = request.get_json()
+
+    if not data or not isinstance(data.get("questions"), list):
+        return jsonify({"error": "Missing 'questions' list in request body"}), 400
+
+    questions = [str(q).strip() for q in data["questions"] if str(q).strip()]
+
+    if not questions:
+        return jsonify({"error": "Questions cannot be empty"}), 400
+    if len(questions) > BatchRunner.MAX_QUESTIONS:
+        return jsonify({"error": f"At most {BatchRunner.MAX_QUESTIONS} questions per batch"}), 400
+
+    deadline = _request_deadline(data)
+    if deadline is None:
+        return jsonify({"error": "Invalid deadline"}), 400
+
+    try:
+        ticket = admission.request(
+            _user(), deadline.remaining(), weight=BatchRunner.workers_for(len(questions))
+        )
+    except Rejected as e:
+        return _rejected(e)
+    if not ticket.wait(deadline.remaining()):
+        return _rejected(Rejected(503, TIMED_OUT, admission.RETRY_AFTER_FULL))
+
+    runner = BatchRunner(agent)
+    events = runner.run(questions, llm_summary=bool(data.get("llm_summary")), workers=ticket.weight)
+
+    if not data.get("stream", True):
+        try:
+            for event in events:
+                if event["type"] == "batch_complete":
+                    return jsonify(event)
+        finally:
+            ticket.release()
+
     def generate():
-        """Generator function for streaming events."""
         try:
-            for event in agent.ask_stream(user_message):
-                # Format as SSE: data: {json}\n\n
-                yield f"data: {json.dumps(event)}\n\n"
-        except Exception as e:
-            # Send error event
-            error_event = {
-                "type": "error",
-                "content": f"Stream error: {str(e)}"
-            }
-            yield f"data: {json.dumps(error_event)}\n\n"
-
-            # Send completion event
-            complete_event = {
-                "type": "complete",
-                "sql": None,
-                "data": None,
-                "error": str(e)
-            }
-            yield f"data: {json.dumps(complete_event)}\n\n"
+            for event in events:
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            ticket.release()
 
     return Response(
         stream_with_context(generate()),
         mimetype="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
+            "X-Accel-Buffering": "no"
         }
     )
 
@@ -107,13 +355,48 @@ def get_schema():
     return jsonify({"schema": get_schema_documentation()})
 
 
+@chat_bp.route("/schema/drift", methods=["GET"])
+def get_schema_drift():
+    """
+    Differences between the configured schema and the warehouse's live columns.
+
+    Response:
+        {"version": "...", "fetched_at": ..., "tables": {"DB.SCHEMA.TABLE":
+         {"missing": ["COLUMN"], "extra": ["COLUMN"]} or {"missing_table": true}}}
+    """
+    from app.database.catalog import catalog
+    return jsonify(catalog.drift())
+
+
+@chat_bp.route("/workload", methods=["GET"])
+def get_workload():
+    """
+    Hottest query fingerprints and clustering/materialization recommendations.
+
+    Query parameters:
+        days: Window of executions analyzed (default 7)
+        limit: Fingerprints listed (default 20)
+
+    Response:
+        See WorkloadLog.advise; 404 when WORKLOAD_LOG_ENABLED is false.
+        Scan statistics appear once ``python -m app.database.workload``
+        has backfilled them from QUERY_HISTORY.
+    """
+    from app.database.workload import workload
+    if workload is None:
+        return jsonify({"error": "Workload log is disabled"}), 404
+    days = min(max(request.args.get("days", 7, type=float), 0.0), 90.0)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    return jsonify(workload.advise(days, limit))
+
+
 @chat_bp.route("/model", methods=["POST"])
 def set_model():
     """
     Set the active LLM model.
 
     Request body:
-        {"model": "claude-sonnet" | "deepseek-v3"}
+        {"model": "claude-sonnet" | "claude-haiku" | "deepseek-v3"}
 
     Response:
         {"success": true, "model": "selected-model-name"}
@@ -125,16 +408,10 @@ def set_model():
 
     model_key = data["model"]
 
-    # Map frontend model keys to actual model identifiers
-    model_mapping = {
-        "claude-sonnet": "claude-sonnet-4-5-20250929",
-        "deepseek-v3": "deepseek-ai/DeepSeek-V3"
-    }
-
-    if model_key not in model_mapping:
+    if model_key not in MODELS:
         return jsonify({"error": f"Invalid model: {model_key}"}), 400
 
     # Update the agent's model
-    agent.set_model(model_key, model_mapping[model_key])
+    agent.set_model(model_key, MODELS[model_key][1])
 
     return jsonify({"success": True, "model": model_key})
\ No newline at end of file
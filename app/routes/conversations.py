@@ -0,0 +1,189 @@
+import os
+
+from flask import Blueprint, g, request, jsonify
+from app.agent.conversations import ConversationStore
+from app.agent.admission import conversation_key
+from app.routes.chat import agent, _owner
+from config import settings
+
+conversations_bp = Blueprint("conversations", __name__, url_prefix="/api")
+
+conversation_store = ConversationStore(os.path.join(settings.data_dir, "conversations.db"))
+
+# Largest page of conversations or search results
+MAX_PAGE_SIZE = 100
+
+# Message roles the chat page saves
+ROLES = ("user", "assistant")
+
+
+@conversations_bp.before_request
+def require_owner():
+    """
+    Conversations belong to the authenticated user or the browser (see
+    owner_key); a request naming neither is refused rather than given
+    someone else's, or a shared, history.
+    """
+    owner = _owner()
+    if owner is None:
+        return jsonify({"error": "No user or browser session; reload the page"}), 401
+    g.owner = owner
+
+
+@conversations_bp.route("/conversations", methods=["GET"])
+def list_conversations():
+    """
+    A page of the caller's conversations, most recently active first (titles only).
+
+    Query params:
+        limit (default 30), offset (default 0)
+
+    Response:
+        {"conversations": [{"id": "conv-...", "title": "...", "message_count": 4,
+                            "created_at": ..., "updated_at": ...}],
+         "total": 57, "next_offset": 30}
+    """
+    limit, offset = _page(30)
+    conversations, total = conversation_store.list_conversations(g.owner, limit, offset)
+    next_offset = offset + len(conversations)
+    return jsonify({
+        "conversations": conversations,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None,
+    })
+
+
+@conversations_bp.route("/conversations/search", methods=["GET"])
+def search_conversations():
+    """
+    Full-text search over the caller's messages and their SQL.
+
+    Query params:
+        q (words to match; the last one may be a prefix), limit (default 20), offset (default 0)
+
+    Response:
+        {"conversations": [{"id": "...", "title": "...", ..., "message_id": 12, "snippet": "..."}]}
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing 'q' query parameter"}), 400
+    limit, offset = _page(20)
+    return jsonify({"conversations": conversation_store.search(g.owner, query, limit, offset)})
+
+
+@conversations_bp.route("/conversations", methods=["POST"])
+def import_conversation():
+    """
+    Save a whole conversation, e.g. one from the chat page's local history.
+
+    Request body:
+        {"id": "conv-...", "title": "...", "created_at": 1700000000.0,
+         "messages": [{"role": "user", "content": "...", "sql": null, "row_count": null,
+                       "columns": null, "job_id": null, "created_at": ...}]}
+
+    Response:
+        The conversation's summary (201), or 200 if it was already stored.
+    """
+    data = request.get_json()
+
+    if not data or not data.get("id") or not isinstance(data.get("messages"), list):
+        return jsonify({"error": "Missing 'id' or 'messages' in request body"}), 400
+    messages = data["messages"]
+    if not all(isinstance(m, dict) and m.get("role") in ROLES and isinstance(m.get("content"), str)
+               for m in messages):
+        return jsonify({"error": "Each message needs a 'role' (user or assistant) and 'content'"}), 400
+
+    title = str(data.get("title") or "New conversation").strip()
+    created = conversation_store.import_conversation(
+        g.owner, data["id"], title, messages, _timestamp(data.get("created_at"))
+    )
+    if created is None:
+        return jsonify(conversation_store.get(g.owner, data["id"], include_messages=False))
+    return jsonify(created), 201
+
+
+@conversations_bp.route("/conversations/<conversation_id>", methods=["GET"])
+def get_conversation(conversation_id):
+    """
+    A conversation with its messages.
+
+    Result rows are not stored; messages answered by a job carry its ``job_id``,
+    whose result (/api/jobs/<id>) holds the rows while the job is kept.
+    """
+    conversation = conversation_store.get(g.owner, conversation_id)
+    if not conversation:
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify(conversation)
+
+
+@conversations_bp.route("/conversations/<conversation_id>/messages", methods=["POST"])
+def add_message(conversation_id):
+    """
+    Append a message, starting the conversation if it is new.
+
+    Request body:
+        {"role": "assistant", "content": "...", "sql": "SELECT ...", "row_count": 25,
+         "columns": ["BRAND", "PRICE"], "job_id": "..."}
+
+    Response:
+        The conversation's summary (201).
+    """
+    data = request.get_json()
+
+    if not data or data.get("role") not in ROLES or not isinstance(data.get("content"), str):
+        return jsonify({"error": "Missing 'role' (user or assistant) or 'content' in request body"}), 400
+
+    columns = data.get("columns")
+    conversation = conversation_store.add_message(
+        g.owner, conversation_id, data["role"], data["content"],
+        sql=data.get("sql"),
+        row_count=data.get("row_count"),
+        columns=columns if isinstance(columns, list) else None,
+        job_id=data.get("job_id")
+    )
+    return jsonify(conversation), 201
+
+
+@conversations_bp.route("/conversations/<conversation_id>", methods=["PATCH"])
+def rename_conversation(conversation_id):
+    """
+    Rename a conversation.
+
+    Request body:
+        {"title": "..."}
+    """
+    data = request.get_json()
+    title = str((data or {}).get("title") or "").strip()
+    if not title:
+        return jsonify({"error": "Missing 'title' in request body"}), 400
+    if not conversation_store.rename(g.owner, conversation_id, title):
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify({"success": True})
+
+
+@conversations_bp.route("/conversations/<conversation_id>", methods=["DELETE"])
+def delete_conversation(conversation_id):
+    """Delete a conversation and forget its context."""
+    if not conversation_store.delete(g.owner, conversation_id):
+        return jsonify({"error": "Conversation not found"}), 404
+    agent.memory.clear(conversation_key(g.owner, conversation_id))
+    return jsonify({"success": True})
+
+
+@conversations_bp.route("/conversations", methods=["DELETE"])
+def clear_conversations():
+    """Delete all of the caller's conversations."""
+    deleted = conversation_store.clear(g.owner)
+    for conversation_id in deleted:
+        agent.memory.clear(conversation_key(g.owner, conversation_id))
+    return jsonify({"success": True, "deleted": len(deleted)})
+
+
+def _page(default_limit: int) -> tuple[int, int]:
+    limit = request.args.get("limit", default_limit, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    return min(max(1, limit), MAX_PAGE_SIZE), max(0, offset)
+
+
+def _timestamp(value) -> float | None:
+    return float(value) if isinstance(value, (int, float)) and value > 0 else None
@@ -0,0 +1,118 @@
+import json
+import os
+import time
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.agent.admission import Rejected
+from app.agent.jobs import JobQueue, JobStore
+from app.routes.chat import agent, admission, _conversation, _request_deadline, _rejected, _user
+from app.utils import metrics
+from config import settings
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api")
+
+job_store = JobStore(os.path.join(settings.data_dir, "jobs.db"))
+job_queue = JobQueue(agent, job_store, workers=settings.job_workers, admission=admission)
+
+
+@jobs_bp.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Queue a question without holding a stream open.
+
+    Request body:
+        {"message": "user's question", "conversation_id": "conv-...", "llm_summary": false,
+         "deadline_seconds": 30, "approximate": false}
+
+    An Idempotency-Key header makes retries return the same job.
+
+    Response:
+        The job (202); poll /api/jobs/<id> or follow /api/jobs/<id>/events.
+        429 or 503 (with Retry-After) if admission control sheds it.
+    """
+    data = request.get_json()
+
+    if not data or "message" not in data:
+        return jsonify({"error": "Missing 'message' in request body"}), 400
+
+    user_message = data["message"].strip()
+
+    if not user_message:
+        return jsonify({"error": "Message cannot be empty"}), 400
+
+    deadline = _request_deadline(data)
+    if deadline is None:
+        return jsonify({"error": "Invalid deadline"}), 400
+
+    try:
+        job = job_queue.submit(
+            user_message,
+            conversation_id=_conversation(data),
+            llm_summary=bool(data.get("llm_summary")),
+            deadline_seconds=deadline.budget,
+            client_key=request.headers.get("Idempotency-Key"),
+            user=_user(),
+            approximate=bool(data.get("approximate"))
+        )
+    except Rejected as e:
+        return _rejected(e)
+    return jsonify(job), 202
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Return a job's status and, once finished, its final answer.
+
+    Response:
+        {"id": "...", "status": "queued" | "running" | "done" | "failed",
+         "result": null or {"answer": ..., "sql": ..., "data": [...], "error": ..., "budget": {...}}}
+    """
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Follow a job's events as Server-Sent Events, from the start or resuming
+    after the Last-Event-ID header (or ?after=N).
+
+    Response:
+        The /api/chat/stream event protocol; each event carries an SSE id.
+    """
+    if not job_store.get(job_id, include_result=False):
+        return jsonify({"error": "Job not found"}), 404
+    return job_stream(job_id, last_event_id())
+
+
+def last_event_id() -> int:
+    """Sequence number a reconnecting client last received (0 if none)."""
+    value = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return 0
+
+
+def job_stream(job_id: str, after: int = 0) -> Response:
+    """SSE response following a job's event log."""
+    def generate():
+        start = time.perf_counter()
+        try:
+            for seq, event in job_queue.follow(job_id, after):
+                yield f"id: {seq}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            metrics.STREAM_DURATION.observe(time.perf_counter() - start, transport="sse")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Job-Id": job_id
+        }
+    )
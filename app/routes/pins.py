@@ -0,0 +1,72 @@
+import os
+
+from flask import Blueprint, request, jsonify
+from app.agent.pinned import PinnedStore, PinScheduler
+from app.agent.validator import validate_sql
+from app.routes.chat import agent
+from config import settings
+
+pins_bp = Blueprint("pins", __name__, url_prefix="/api")
+
+pin_store = PinnedStore(os.path.join(settings.data_dir, "pins.db"))
+scheduler = PinScheduler(agent, pin_store)
+
+# Shortest allowed refresh interval, in minutes
+MIN_REFRESH_MINUTES = 5
+
+
+@pins_bp.route("/pins", methods=["GET"])
+def list_pins():
+    """List pinned questions with their latest answer (without data)."""
+    return jsonify({"pins": pin_store.list_pins()})
+
+
+@pins_bp.route("/pins", methods=["POST"])
+def add_pin():
+    """
+    Pin a question with its validated SQL.
+
+    Request body:
+        {"question": "...", "sql": "SELECT ...", "refresh_minutes": 60}
+
+    Response:
+        The created pin; its result is computed in the background.
+    """
+    data = request.get_json()
+
+    if not isinstance(data, dict) or not data.get("question") or not data.get("sql"):
+        return jsonify({"error": "Missing 'question' or 'sql' in request body"}), 400
+
+    sql = data["sql"].strip()
+    if not agent._is_safe_query(sql):
+        return jsonify({"error": "Query blocked: only SELECT statements allowed"}), 400
+
+    problems = validate_sql(sql)
+    if problems:
+        return jsonify({"error": "Invalid query", "problems": problems}), 400
+
+    try:
+        refresh_minutes = max(MIN_REFRESH_MINUTES, int(data.get("refresh_minutes", 60)))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "Invalid 'refresh_minutes'"}), 400
+    pin = pin_store.add(data["question"].strip(), sql, refresh_minutes * 60)
+    scheduler.wake()
+
+    return jsonify(pin), 201
+
+
+@pins_bp.route("/pins/<pin_id>", methods=["GET"])
+def get_pin(pin_id):
+    """Return a pinned question with its stored result."""
+    pin = pin_store.get(pin_id)
+    if not pin:
+        return jsonify({"error": "Pin not found"}), 404
+    return jsonify(pin)
+
+
+@pins_bp.route("/pins/<pin_id>", methods=["DELETE"])
+def delete_pin(pin_id):
+    """Unpin a question."""
+    if not pin_store.remove(pin_id):
+        return jsonify({"error": "Pin not found"}), 404
+    return jsonify({"success": True})
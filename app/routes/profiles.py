@@ -0,0 +1,83 @@
+import functools
+
+from flask import Blueprint, request, jsonify, g, make_response, send_file
+from app.utils import tracing
+from app.utils.profiling import profiler
+
+profiles_bp = Blueprint("profiles", __name__, url_prefix="/api")
+
+
+@profiles_bp.route("/profiles", methods=["GET"])
+def list_profiles():
+    """
+    List recent request profiles (requires the profiling token).
+
+    Response:
+        {"profiles": [{"id": "...", "route": "/api/chat", "trace_id": "...", "started_at": ...,
+                       "duration_ms": ..., "samples": ..., "interval_ms": ..., "threads": ...}]}
+    """
+    denied = _check_token()
+    if denied:
+        return denied
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"profiles": profiler.recent(max(1, limit))})
+
+
+@profiles_bp.route("/profiles/<profile_id>", methods=["GET"])
+def download_profile(profile_id):
+    """
+    Download a profile as folded stacks (flamegraph.pl, inferno, speedscope).
+
+    Requires the profiling token.
+    """
+    denied = _check_token()
+    if denied:
+        return denied
+    path = profiler.path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype="text/plain", as_attachment=True, download_name=f"{profile_id}.folded")
+
+
+def profiled(view):
+    """
+    Run a view under the sampling profiler when the request sends the
+    profiling token (X-Profile-Token header or ?profile=).
+
+    The request thread is sampled until the response has been sent, so
+    serializing and streaming it are included; the profile ID is returned
+    in X-Profile-Id. Views hand ``g.profile`` to any worker answering for them.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiler.authorized(_token()):
+            return view(*args, **kwargs)
+        profile = profiler.start(route=request.path, trace_id=tracing.current_trace_id())
+        if profile is None:
+            return view(*args, **kwargs)
+
+        thread = profile.attach()
+        g.profile = profile
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            profile.detach(thread)
+            raise
+        response.headers["X-Profile-Id"] = profile.id
+        response.call_on_close(lambda: profile.detach(thread))
+        return response
+
+    return wrapper
+
+
+def _token() -> str | None:
+    return request.headers.get("X-Profile-Token", request.args.get("profile"))
+
+
+def _check_token():
+    """Error response unless profiling is enabled and the request carries its token."""
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not profiler.authorized(_token()):
+        return jsonify({"error": "Invalid or missing profiling token"}), 403
+    return None
@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify
+from app.routes.jobs import job_store
+from app.routes.pins import pin_store
+from app.utils.charting import build_chart
+
+results_bp = Blueprint("results", __name__, url_prefix="/api")
+
+# Chart width assumed when the client does not send one, in pixels
+DEFAULT_CHART_WIDTH = 800
+
+
+@results_bp.route("/results/<result_id>/chart", methods=["GET"])
+def result_chart(result_id):
+    """
+    Chart series for a stored result: a job's answer or a pinned answer.
+
+    Time and month axes and the series are detected server-side, rows are
+    averaged per series and x value, and each series is downsampled to
+    about one point per pixel (see app.utils.charting.build_chart).
+
+    Query parameters:
+        width: Chart width in pixels (default 800)
+
+    Response:
+        {"axis": {"column": "TREND_DATE", "type": "time" | "month", "bucket": null | "day" | ...},
+         "aggregate": "mean", "series_column": "KEYWORD", "value_columns": ["INTEREST"],
+         "series": [{"name": "...", "x": [...], "y": [...]}], "series_total": 40,
+         "rows": 4160, "points": 800}
+        404 if the result is unknown or expired, 422 if it has nothing to chart.
+    """
+    width = request.args.get("width", DEFAULT_CHART_WIDTH, type=int)
+
+    rows = _result_rows(result_id)
+    if rows is None:
+        return jsonify({"error": "Result not found"}), 404
+
+    chart = build_chart(rows, width)
+    if chart is None:
+        return jsonify({"error": "Nothing to chart in this result"}), 422
+    return jsonify(chart)
+
+
+def _result_rows(result_id: str) -> list[dict] | None:
+    """Rows of a finished job's answer, else of a pinned answer."""
+    job = job_store.get(result_id)
+    if job is not None:
+        return (job["result"] or {}).get("data")
+    pin = pin_store.get(result_id)
+    return pin["data"] if pin is not None else None
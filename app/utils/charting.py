@@ -0,0 +1,239 @@
+"""Chart series for query results, aggregated and downsampled server-side."""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from app.utils.digest import results_to_frame
+
+
+# Points per series never go below or above these, whatever the chart width
+MIN_POINTS = 50
+MAX_POINTS = 2000
+
+# Series per chart (the chart palette has five colors) and value columns charted
+MAX_SERIES = 5
+MAX_VALUE_COLUMNS = 3
+
+# Timestamps are bucketed to the finest of these units that leaves at most
+# BUCKETS_PER_POINT buckets per plotted point
+BUCKETS = [("h", "hour"), ("D", "day"), ("W", "week"), ("M", "month")]
+BUCKETS_PER_POINT = 4
+
+# Share of a text column's values that must parse as dates for a time axis
+MIN_DATE_SHARE = 0.9
+
+# Integer columns in this range are epoch seconds (2001-09-09 to 2286-11-20)
+EPOCH_SECONDS = (1e9, 1e10)
+
+TIME_NAME = re.compile(r"date|time|month|week|year|period|quarter|day|_at$", re.IGNORECASE)
+MONTH_NAME = re.compile(r"^month(_name)?$", re.IGNORECASE)
+LABEL_NAME = re.compile(r"keyword|name|label|campaign|seller|brand", re.IGNORECASE)
+
+MONTHS = ["january", "february", "march", "april", "may", "june",
+          "july", "august", "september", "october", "november", "december"]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of a series sorted by x.
+
+    Keeps the first and last points and, from each of ``points - 2``
+    equal-count buckets in between, the point forming the largest triangle
+    with the point kept before it and the average of the next bucket, so
+    peaks and troughs survive where plain striding would drop them.
+
+    Returns:
+        Sorted indices of the kept points (all of them if ``points`` >= len(x))
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (end, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def build_chart(results: list[dict], width: int = 800) -> dict | None:
+    """
+    Build compact chart series from a result's rows.
+
+    The x axis is a month-of-year column (MONTH as 1-12 or month names) or
+    a time column: dates, timestamps, epoch seconds (e.g. SCRAPED_AT) or
+    years. Series are the first value column per category of a label
+    column (e.g. KEYWORD; the MAX_SERIES largest by total), or else up to
+    MAX_VALUE_COLUMNS value columns. Timestamps are bucketed when there
+    are many more than the point budget, rows are averaged per series and
+    x in one grouped pass, and each series is downsampled with LTTB to
+    about one point per pixel of ``width``.
+
+    Returns:
+        {"axis": {"column", "type": "time" | "month", "bucket"},
+         "aggregate": "mean", "series_column", "value_columns",
+         "series": [{"name", "x", "y"}], "series_total", "rows", "points"},
+        where time x values are epoch milliseconds; or None if the result
+        has no chartable axis and value
+    """
+    if not results:
+        return None
+    df = _numbers_from_text(results_to_frame(results))
+
+    axis = _month_axis(df) or _time_axis(df)
+    if axis is None:
+        return None
+    axis_column, axis_type, x = axis
+
+    value_columns = [
+        col for col in df.columns
+        if col != axis_column
+        and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+    ][:MAX_VALUE_COLUMNS]
+    if not value_columns:
+        return None
+
+    series_column = next(
+        (col for col in df.columns
+         if col != axis_column and col not in value_columns and LABEL_NAME.search(col)
+         and not pd.api.types.is_numeric_dtype(df[col])),
+        None
+    )
+    if series_column is not None:
+        value_columns = value_columns[:1]
+        long = pd.DataFrame({
+            "series": df[series_column].astype(str), "x": x, "y": df[value_columns[0]]
+        })
+    else:
+        long = pd.concat(
+            [pd.DataFrame({"series": col, "x": x, "y": df[col]}) for col in value_columns],
+            ignore_index=True
+        )
+    long = long.dropna(subset=["x", "y"])
+    if long.empty:
+        return None
+
+    points = min(MAX_POINTS, max(MIN_POINTS, int(width)))
+    bucket = None
+    if axis_type == "time":
+        long["x"], bucket = _bucket(long["x"], points * BUCKETS_PER_POINT)
+        long["x"] = long["x"].astype("datetime64[ms]").astype("int64")
+    else:
+        long["x"] = long["x"].astype(int)
+
+    means = long.groupby(["series", "x"], sort=True)["y"].mean()
+
+    if series_column is not None:
+        totals = means.groupby(level="series").sum()
+        names = list(totals.sort_values(ascending=False, kind="stable").index)
+    else:
+        present = set(means.index.get_level_values("series"))
+        names = [col for col in value_columns if col in present]
+
+    series = []
+    for name in names[:MAX_SERIES]:
+        values = means.xs(name, level="series")
+        xs = values.index.to_numpy()
+        ys = values.to_numpy(dtype=float)
+        kept = lttb(xs.astype(float), ys, points)
+        series.append({
+            "name": name,
+            "x": xs[kept].tolist(),
+            "y": np.round(ys[kept], 6).tolist()
+        })
+
+    return {
+        "axis": {"column": axis_column, "type": axis_type, "bucket": bucket},
+        "aggregate": "mean",
+        "series_column": series_column,
+        "value_columns": value_columns,
+        "series": series,
+        "series_total": len(names),
+        "rows": len(results),
+        "points": points
+    }
+
+
+def _numbers_from_text(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert text columns holding only numbers to numeric.
+
+    Stored results (job and pin answers) went through JSON, where Decimal
+    values became strings.
+    """
+    for col in df.columns:
+        if df[col].dtype != object and not pd.api.types.is_string_dtype(df[col]):
+            continue
+        present = df[col].dropna()
+        if present.empty:
+            continue
+        numbers = pd.to_numeric(present, errors="coerce")
+        if numbers.notna().all():
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def _month_axis(df: pd.DataFrame) -> tuple[str, str, pd.Series] | None:
+    """A month-of-year column as month numbers 1-12."""
+    for col in df.columns:
+        if not MONTH_NAME.search(col):
+            continue
+        values = df[col]
+        numbers = pd.to_numeric(values, errors="coerce")
+        names = values.astype(str).str.strip().str.lower().str[:3]
+        months = numbers.where(numbers.between(1, 12)).fillna(
+            names.map({month[:3]: i for i, month in enumerate(MONTHS, 1)})
+        )
+        if months.notna().mean() >= MIN_DATE_SHARE:
+            return col, "month", months
+    return None
+
+
+def _time_axis(df: pd.DataFrame) -> tuple[str, str, pd.Series] | None:
+    """The first date, timestamp, epoch seconds or year column, as datetimes."""
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return col, "time", values
+        if not TIME_NAME.search(col) or pd.api.types.is_bool_dtype(values):
+            continue
+
+        if pd.api.types.is_numeric_dtype(values):
+            present = values.dropna()
+            if present.empty:
+                continue
+            if present.between(*EPOCH_SECONDS).all():
+                return col, "time", pd.to_datetime(values, unit="s")
+            if re.search("year", col, re.IGNORECASE) and present.between(1900, 2100).all():
+                return col, "time", pd.to_datetime(values.astype("Int64").astype(str), format="%Y", errors="coerce")
+            continue
+
+        times = pd.to_datetime(values.astype("string"), errors="coerce", format="mixed", utc=True)
+        if times.notna().mean() >= MIN_DATE_SHARE:
+            return col, "time", times.dt.tz_localize(None)
+    return None
+
+
+def _bucket(times: pd.Series, budget: int) -> tuple[pd.Series, str | None]:
+    """Floor timestamps to the finest unit leaving at most ``budget`` buckets."""
+    if times.nunique() <= budget:
+        return times, None
+    for freq, name in BUCKETS:
+        floored = times.dt.to_period(freq).dt.start_time
+        if floored.nunique() <= budget:
+            return floored, name
+    return floored, name
@@ -0,0 +1,95 @@
+"""Per-request time budget shared by the phases of a question."""
+
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a phase cannot start because the request budget is spent."""
+
+
+class Deadline:
+    """
+    Wall-clock budget for one request.
+
+    Phases take a share of whatever time is left (``share``), and record how
+    long they ran (``phase``) so the split can be reported back to the
+    client. Phases that are skipped or degraded for lack of time are noted
+    with ``skip``.
+
+    Args:
+        seconds: Total budget for the request
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.start = time.monotonic()
+        self.expires_at = self.start + seconds
+        self.phases: dict[str, float] = {}
+        self.skipped: list[str] = []
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def share(self, fraction: float) -> float:
+        """
+        Timeout for the next phase: a fraction of the remaining time.
+
+        Raises:
+            DeadlineExceeded: If the budget is already spent
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget:g}s exceeded")
+        return remaining * fraction
+
+    def allows(self, seconds: float) -> bool:
+        """Whether at least ``seconds`` remain."""
+        return self.remaining() >= seconds
+
+    def skip(self, phase: str):
+        """Note a phase skipped or degraded for lack of time."""
+        self.skipped.append(phase)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase; repeated phases (e.g. two executions) accumulate."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.monotonic() - start) * 1000
+
+    def report(self) -> dict:
+        """Budget use per phase, in milliseconds."""
+        return {
+            "budget_ms": round(self.budget * 1000),
+            "used_ms": round((time.monotonic() - self.start) * 1000, 1),
+            "remaining_ms": round(self.remaining() * 1000, 1),
+            "phases": {name: round(ms, 1) for name, ms in self.phases.items()},
+            "skipped": list(self.skipped),
+        }
+
+
+def parse_deadline(value, default: float, maximum: float) -> Deadline | None:
+    """
+    Deadline from a client-supplied number of seconds.
+
+    Args:
+        value: Seconds from a header or request body (None for the default)
+        default: Budget when the client sends none
+        maximum: Cap on client-supplied budgets
+
+    Returns:
+        The Deadline, or None if the value is not a positive number
+    """
+    if value is None:
+        return Deadline(default)
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not seconds > 0:
+        return None
+    return Deadline(min(seconds, maximum))
@@ -0,0 +1,247 @@
+"""Compact statistical digests of query results for LLM prompts."""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+
+# Rough characters-per-token ratio used for prompt budgeting
+CHARS_PER_TOKEN = 4
+
+# Longest cell value shown before truncation
+MAX_CELL_CHARS = 40
+
+# Categorical columns with more distinct values than this are not grouped on
+MAX_GROUP_CARDINALITY = 50
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting (no tokenizer dependency)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def results_to_frame(results: list[dict]) -> pd.DataFrame:
+    """
+    Convert query results to a DataFrame with numeric columns coerced.
+
+    Snowflake returns NUMBER columns with a scale as ``Decimal`` objects,
+    which pandas keeps as ``object`` dtype. Those are converted to floats
+    so statistics can be computed column-wise.
+    """
+    df = pd.DataFrame.from_records(results)
+
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object:
+            continue
+        values = series.dropna()
+        if values.empty:
+            continue
+        if values.map(lambda v: isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)).all():
+            df[col] = pd.to_numeric(series, errors="coerce")
+
+    return df
+
+
+def build_result_digest(
+    results: list[dict],
+    max_tokens: int = 1500,
+    top_k: int = 5,
+    sample_rows: int = 16
+) -> str:
+    """
+    Build a compact, token-bounded digest of a full result set.
+
+    The digest covers every row (not just a prefix) and contains:
+      - per-column statistics (numeric ranges/totals, distinct counts)
+      - top-k most frequent values for text columns
+      - group-level extremes for low-cardinality dimensions
+      - a stratified sample of rows serialized as CSV
+
+    Sections are shrunk (sample first, then top-k, then groups) until the
+    digest fits within ``max_tokens``.
+
+    Args:
+        results: List of row dictionaries as returned by SnowflakeClient
+        max_tokens: Approximate token budget for the whole digest
+        top_k: Number of frequent values to list per text column
+        sample_rows: Maximum number of sample rows to include
+
+    Returns:
+        Markdown/CSV formatted digest string
+    """
+    if not results:
+        return "No rows returned."
+
+    df = results_to_frame(results)
+    numeric_cols = [
+        col for col in df.columns
+        if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+    ]
+    text_cols = [col for col in df.columns if col not in numeric_cols]
+
+    include_groups = True
+    while True:
+        sections = [f"Rows: {len(df)} | Columns: {len(df.columns)}"]
+        sections.append(_numeric_section(df, numeric_cols))
+        sections.append(_text_section(df, text_cols, top_k))
+        if include_groups:
+            sections.append(_group_section(df, text_cols, numeric_cols))
+        sections.append(_sample_section(df, text_cols, sample_rows))
+
+        digest = "\n\n".join(section for section in sections if section)
+        if estimate_tokens(digest) <= max_tokens:
+            return digest
+
+        # Shrink the least informative parts first
+        if sample_rows > 4:
+            sample_rows //= 2
+        elif top_k > 2:
+            top_k -= 1
+        elif include_groups:
+            include_groups = False
+        elif sample_rows > 0:
+            sample_rows = 0
+        else:
+            # estimate_tokens counts one token more than the characters fill
+            return digest[:max(0, max_tokens - 1) * CHARS_PER_TOKEN]
+
+
+def _fmt(value) -> str:
+    """Format a scalar compactly for the prompt."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "NULL"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        if float(value).is_integer():
+            return str(int(value))
+        if abs(value) >= 1:
+            return f"{value:.2f}".rstrip("0").rstrip(".")
+        return f"{value:.4g}"
+    text = str(value)
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 3] + "..."
+    return text
+
+
+def _numeric_section(df: pd.DataFrame, numeric_cols: list[str]) -> str:
+    """Per-column statistics for numeric columns, computed in one pass."""
+    if not numeric_cols:
+        return ""
+
+    stats = df[numeric_cols].agg(["count", "min", "max", "mean", "median", "sum"]).T
+    lines = [
+        "Numeric columns (all rows):",
+        "| column | non-null | min | max | mean | median | sum |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for col, row in stats.iterrows():
+        lines.append(
+            f"| {col} | {int(row['count'])} | {_fmt(row['min'])} | {_fmt(row['max'])} "
+            f"| {_fmt(row['mean'])} | {_fmt(row['median'])} | {_fmt(row['sum'])} |"
+        )
+    return "\n".join(lines)
+
+
+def _text_section(df: pd.DataFrame, text_cols: list[str], top_k: int) -> str:
+    """Distinct counts, date ranges and top-k values for non-numeric columns."""
+    if not text_cols:
+        return ""
+
+    lines = ["Text columns (all rows):"]
+    for col in text_cols:
+        series = df[col].dropna().astype(str)
+        distinct = series.nunique()
+        line = f"- {col}: {distinct} distinct"
+        if len(series) < len(df):
+            line += f", {len(df) - len(series)} null"
+
+        dates = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        if len(series) and dates.notna().all():
+            line += f", range {dates.min().date()} to {dates.max().date()}"
+        elif distinct:
+            counts = series.value_counts().head(top_k)
+            top = ", ".join(f"{_fmt(value)} ({count})" for value, count in counts.items())
+            line += f"; top: {top}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _dimension_columns(df: pd.DataFrame, text_cols: list[str]) -> list[str]:
+    """Text columns that are useful to group on (repeated, low cardinality)."""
+    dims = []
+    for col in text_cols:
+        distinct = df[col].nunique(dropna=True)
+        if 1 < distinct <= MAX_GROUP_CARDINALITY and distinct < len(df):
+            dims.append(col)
+    return dims
+
+
+def _group_section(df: pd.DataFrame, text_cols: list[str], numeric_cols: list[str]) -> str:
+    """Highest/lowest groups per measure, or per-row extremes if nothing repeats."""
+    if not numeric_cols:
+        return ""
+
+    measures = numeric_cols[:3]
+    dims = _dimension_columns(df, text_cols)[:2]
+    lines = []
+
+    if dims:
+        lines.append("Group extremes (sum over all rows):")
+        for dim in dims:
+            totals = df.groupby(dim, dropna=True)[measures].sum()
+            for measure in measures:
+                column = totals[measure]
+                lines.append(
+                    f"- {measure} by {dim}: highest {_fmt(column.idxmax())} ({_fmt(column.max())}), "
+                    f"lowest {_fmt(column.idxmin())} ({_fmt(column.min())})"
+                )
+    elif text_cols:
+        label = text_cols[0]
+        lines.append("Row extremes:")
+        for measure in measures:
+            column = df[measure]
+            if column.notna().any():
+                high, low = column.idxmax(), column.idxmin()
+                lines.append(
+                    f"- {measure}: highest {_fmt(df.at[high, label])} ({_fmt(column[high])}), "
+                    f"lowest {_fmt(df.at[low, label])} ({_fmt(column[low])})"
+                )
+
+    return "\n".join(lines)
+
+
+def _sample_section(df: pd.DataFrame, text_cols: list[str], sample_rows: int) -> str:
+    """
+    Stratified sample of rows as CSV.
+
+    The first half of the sample keeps the query's own ordering (usually the
+    top rows the user cares about); the rest is drawn round-robin across the
+    groups of the first dimension column, or evenly spaced when there is none.
+    """
+    if sample_rows <= 0:
+        return ""
+
+    if len(df) <= sample_rows:
+        sample = df
+        title = f"All {len(df)} rows (CSV):"
+    else:
+        head_count = sample_rows // 2
+        rest = df.iloc[head_count:]
+        remaining = sample_rows - head_count
+
+        dims = _dimension_columns(df, text_cols)
+        if dims:
+            rank = rest.groupby(dims[0], sort=False, dropna=False).cumcount()
+            picked = rank.sort_values(kind="stable").index[:remaining]
+        else:
+            positions = np.linspace(0, len(rest) - 1, remaining).round().astype(int)
+            picked = rest.index[np.unique(positions)]
+
+        sample = pd.concat([df.iloc[:head_count], df.loc[picked].sort_index()])
+        title = f"Sample of {len(sample)} rows (first {head_count} in query order, rest stratified) (CSV):"
+
+    formatted = sample.apply(lambda column: column.map(_fmt))
+    return f"{title}\n{formatted.to_csv(index=False).strip()}"
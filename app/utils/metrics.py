@@ -0,0 +1,406 @@
+"""
+Metrics in the Prometheus text exposition format.
+
+Metrics are kept per process. Under a preforking server the workers can
+share them through a SQLite file (see Registry.share), so a scrape that
+any one worker answers covers them all.
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets for durations, in seconds
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Histogram buckets for result sizes, in rows
+ROW_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000)
+
+
+class Metric:
+    """Base for labelled metrics; values are kept per tuple of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key: tuple, extra: dict | None = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self, values: dict | None = None) -> list[str]:
+        """Exposition lines for this process's values, or for ``values`` (see snapshot)."""
+        if values is None:
+            values = self.snapshot()
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples(values)
+
+    def snapshot(self) -> dict:
+        """Copy of this process's values per label key."""
+        raise NotImplementedError
+
+    def dump(self) -> list:
+        """This process's values as JSON-serializable rows (see Registry.share)."""
+        raise NotImplementedError
+
+    def merge(self, values: dict, rows: list):
+        """Add another process's dumped rows to a snapshot."""
+        raise NotImplementedError
+
+    def _samples(self, values: dict) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic count, e.g. of errors or blocked queries."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: dict, rows: list):
+        for key, value in rows:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def dump(self) -> list:
+        return [[list(key), value] for key, value in self.snapshot().items()]
+
+    def _samples(self, values: dict) -> list[str]:
+        return [f"{self.name}{self._label_text(key)} {_number(v)}" for key, v in sorted(values.items())]
+
+
+class Histogram(Metric):
+    """Distribution of observations over fixed buckets (cumulative on export)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = SECONDS_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label key: [count per bucket (+Inf last), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            else:
+                entry[0][-1] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in a block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._values.items()}
+
+    def merge(self, values: dict, rows: list):
+        for key, counts, total in rows:
+            entry = values.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0])
+            # Snapshots written before a change of buckets are skipped
+            if len(counts) == len(entry[0]):
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+
+    def dump(self) -> list:
+        return [[list(key), counts, total] for key, (counts, total) in self.snapshot().items()]
+
+    def _samples(self, values: dict) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, {'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    All metrics of this process, plus collectors for state owned elsewhere
+    (e.g. admission control), rendered together for /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        # Shared with other worker processes (see share)
+        self._shared_path: str | None = None
+        self._interval = 5.0
+        # (pid, id) of this process's row, and the pid running the publisher thread
+        self._worker: tuple[int, str] | None = None
+        self._publisher_pid: int | None = None
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def add_collector(self, collector):
+        """
+        Add a callable returning ``[(name, kind, description, [(labels, value), ...])]``
+        for gauges or counters read at export time.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def share(self, path: str, interval: float = 5):
+        """
+        Sum metrics over the worker processes publishing to a SQLite file.
+
+        This process publishes its values every ``interval`` seconds from a
+        daemon thread, and whenever it renders; render() then adds up the
+        latest values of every process, so whichever worker answers a
+        scrape reports them all. Rows of exited workers are kept, so
+        counters never go backwards; collector gauges (live state such as
+        queue depth) only count for workers that published within the last
+        three intervals. Call it in each worker, after the fork.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(sqlite3.connect(path, timeout=10)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    worker TEXT PRIMARY KEY,
+                    published_at REAL NOT NULL,
+                    metrics TEXT NOT NULL,
+                    collected TEXT NOT NULL
+                )
+            """)
+        with self._lock:
+            self._shared_path = path
+            self._interval = interval
+            if self._publisher_pid == os.getpid():
+                return
+            self._publisher_pid = os.getpid()
+        threading.Thread(target=self._publish_every, name="metrics-publisher", daemon=True).start()
+
+    def publish(self):
+        """Write this process's values to the shared file (no-op unless shared)."""
+        with self._lock:
+            path = self._shared_path
+            metrics = list(self._metrics.values())
+            if self._worker is None or self._worker[0] != os.getpid():
+                self._worker = (os.getpid(), uuid.uuid4().hex)
+            worker = self._worker[1]
+        if path is None:
+            return
+        dumped = {metric.name: metric.dump() for metric in metrics}
+        collected = [
+            [name, kind, description, [[labels, value] for labels, value in samples]]
+            for name, kind, description, samples in self._collect()
+        ]
+        with closing(sqlite3.connect(path, timeout=10)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (worker, published_at, metrics, collected) VALUES (?, ?, ?, ?)",
+                (worker, time.time(), json.dumps(dumped), json.dumps(collected))
+            )
+
+    def _publish_every(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Publishing metrics failed")
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            path = self._shared_path
+
+        if path is None:
+            values = {metric.name: metric.snapshot() for metric in metrics}
+            collected = self._collect()
+        else:
+            self.publish()
+            values, collected = self._merged(path)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(values.get(metric.name, {})))
+        for name, kind, description, samples in collected:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _collect(self) -> list:
+        with self._lock:
+            collectors = list(self._collectors)
+        return [family for collector in collectors for family in collector()]
+
+    def _merged(self, path: str) -> tuple[dict, list]:
+        """Values and collector families summed over every published process."""
+        with closing(sqlite3.connect(path, timeout=10)) as conn:
+            rows = conn.execute("SELECT published_at, metrics, collected FROM snapshots").fetchall()
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        live_after = time.time() - 3 * self._interval
+        values: dict[str, dict] = {name: {} for name in metrics}
+        families: dict[str, tuple] = {}
+        for published_at, dumped, collected in rows:
+            for name, metric_rows in json.loads(dumped).items():
+                if name in metrics:
+                    metrics[name].merge(values[name], metric_rows)
+            for name, kind, description, samples in json.loads(collected):
+                if kind == "gauge" and published_at < live_after:
+                    continue
+                _, _, totals = families.setdefault(name, (kind, description, {}))
+                for labels, value in samples:
+                    key = tuple(sorted(labels.items()))
+                    totals[key] = totals.get(key, 0) + value
+
+        collected = [
+            (name, kind, description, [(dict(key), value) for key, value in totals.items()])
+            for name, (kind, description, totals) in families.items()
+        ]
+        return values, collected
+
+
+def clear_shared(path: str):
+    """Delete a shared metrics file, so a new server's workers start from zero."""
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+# Content type of the exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# LLM calls (model is the routed model key, or the active model)
+LLM_FIRST_TOKEN = Histogram(
+    "umip_llm_first_token_seconds", "Time to the first streamed LLM token.", ("model", "phase")
+)
+LLM_GENERATION = Histogram(
+    "umip_llm_generation_seconds", "Total LLM generation time.", ("model", "phase")
+)
+LLM_REQUESTS = Counter(
+    "umip_llm_requests_total", "LLM API calls by provider, model and outcome.",
+    ("provider", "model", "outcome")
+)
+
+# Query execution
+SQL_EXECUTION = Histogram(
+    "umip_sql_execution_seconds", "Query execution time, including fetch.", ("source",)
+)
+WAREHOUSE_STAGE = Histogram(
+    "umip_warehouse_stage_seconds", "Snowflake time per stage (connect, session, execute, fetch, convert).",
+    ("stage",)
+)
+WAREHOUSE_QUERIES = Counter(
+    "umip_warehouse_queries_total", "Snowflake queries by outcome (ok, cached, error).", ("outcome",)
+)
+RESULT_ROWS = Histogram(
+    "umip_result_rows", "Rows returned per executed query.", ("source",), buckets=ROW_BUCKETS
+)
+
+# Question pipeline
+PHASE_DURATION = Histogram(
+    "umip_phase_seconds", "Time per question phase (sql, execute, fix, summary).", ("phase",)
+)
+QUESTIONS = Counter(
+    "umip_questions_total", "Answered questions by mode (ask, stream) and outcome.", ("mode", "outcome")
+)
+QUERIES_BLOCKED = Counter(
+    "umip_queries_blocked_total", "Generated queries refused by the safety check."
+)
+FIX_ATTEMPTS = Counter(
+    "umip_fix_attempts_total", "Failed queries sent back to the LLM, by outcome.", ("outcome",)
+)
+ERRORS = Counter(
+    "umip_errors_total", "Errors by pipeline stage.", ("stage",)
+)
+
+# Admission control (queue depth and rejections are collected from the controller)
+ADMISSION_WAIT = Histogram(
+    "umip_admission_wait_seconds", "Time questions waited in the admission queue before starting."
+)
+
+# Streams
+STREAM_DURATION = Histogram(
+    "umip_stream_seconds", "Open time of SSE and WebSocket answer streams.", ("transport",)
+)
@@ -0,0 +1,238 @@
+"""
+On-demand sampling profiler for single requests.
+
+A profile samples the Python stacks of the threads attached to it (the
+request thread, and the job worker answering a streamed question) every
+few milliseconds, using ``sys._current_frames``, so other requests served
+meanwhile do not show up. When the last thread detaches, the samples are
+saved in the folded-stack format read by flamegraph.pl, inferno and
+speedscope (one ``frame;frame;frame count`` line per distinct stack).
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Project root, stripped from frame file names
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+class Profile:
+    """
+    Stack samples of the threads working on one request.
+
+    Args:
+        profile_id: Hex ID naming the saved files
+        interval: Seconds between samples
+        max_seconds: Sampling stops after this long, even if threads stay attached
+        attributes: Metadata saved with the profile (route, trace ID)
+        on_finish: Called with the profile once the last thread detaches
+    """
+
+    def __init__(self, profile_id: str, interval: float, max_seconds: float, attributes: dict, on_finish):
+        self.id = profile_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.attributes = attributes
+        self.on_finish = on_finish
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self._threads: Counter[int] = Counter()
+        self._sampled: set[int] = set()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{profile_id}", daemon=True)
+        self._sampler.start()
+
+    def attach(self, thread_id: int | None = None) -> int | None:
+        """
+        Sample a thread (the calling one by default) until it detaches.
+
+        Returns:
+            The thread ID to detach, or None if the profile already finished
+        """
+        thread_id = thread_id or threading.get_ident()
+        with self._lock:
+            if self._done.is_set():
+                return None
+            self._threads[thread_id] += 1
+        return thread_id
+
+    def detach(self, thread_id: int | None = None):
+        """Stop sampling a thread; the profile finishes when none is left."""
+        thread_id = thread_id or threading.get_ident()
+        with self._lock:
+            if thread_id not in self._threads:
+                return
+            if self._threads[thread_id] == 1:
+                del self._threads[thread_id]
+            else:
+                self._threads[thread_id] -= 1
+            if self._threads or self._done.is_set():
+                return
+            self._done.set()
+            self.finished_at = time.time()
+        self._sampler.join()
+        self.on_finish(self)
+
+    def folded(self) -> str:
+        """Samples in the folded-stack format, hottest stacks first."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def metadata(self) -> dict:
+        return {
+            "id": self.id,
+            **self.attributes,
+            "started_at": self.started_at,
+            "duration_ms": round(((self.finished_at or time.time()) - self.started_at) * 1000, 1),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "threads": len(self._sampled),
+        }
+
+    def _sample(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._done.wait(self.interval):
+            if time.monotonic() > deadline:
+                logger.warning("Profile %s stopped sampling after %.0fs", self.id, self.max_seconds)
+                return
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in self._threads:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self.stacks[_fold(frame)] += 1
+                        self.samples += 1
+                        self._sampled.add(thread_id)
+
+
+class Profiler:
+    """
+    Starts profiles for authorized requests and keeps the most recent ones on disk.
+
+    Args:
+        directory: Where profiles are saved (<id>.folded plus <id>.json metadata)
+        token: Secret a request must send to be profiled (empty disables profiling)
+        interval: Seconds between samples
+        keep: Number of saved profiles kept; older ones are deleted
+    """
+
+    # Profiles sampling at once; further requests run unprofiled
+    MAX_ACTIVE = 4
+
+    # Longest a profile samples, in seconds
+    MAX_SECONDS = 600
+
+    def __init__(self, directory: str, token: str = "", interval: float = 0.01, keep: int = 50):
+        self.directory = directory
+        self.token = token
+        self.interval = interval
+        self.keep = keep
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, token: str | None) -> bool:
+        """Whether a request's profiling token (header or query param) is valid."""
+        return self.enabled and bool(token) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def start(self, **attributes) -> Profile | None:
+        """Start a profile (attach threads to sample them), or None if too many are running."""
+        with self._lock:
+            if self._active >= self.MAX_ACTIVE:
+                logger.warning("Profile not started: %d already running", self._active)
+                return None
+            self._active += 1
+        return Profile(secrets.token_hex(8), self.interval, self.MAX_SECONDS, attributes, self._finish)
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        """Metadata of saved profiles, newest first."""
+        profiles = []
+        for path in self._saved()[:limit]:
+            try:
+                with open(path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def path(self, profile_id: str) -> str | None:
+        """Folded-stack file of a saved profile, or None."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.exists(path) else None
+
+    def _finish(self, profile: Profile):
+        with self._lock:
+            self._active -= 1
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile.id}.folded"), "w") as f:
+                f.write(profile.folded())
+            with open(os.path.join(self.directory, f"{profile.id}.json"), "w") as f:
+                json.dump(profile.metadata(), f)
+            for path in self._saved()[self.keep:]:
+                os.remove(path)
+                os.remove(path[:-len(".json")] + ".folded")
+        except OSError:
+            logger.exception("Could not save profile %s", profile.id)
+            return
+        logger.info("Saved profile %s (%d samples)", profile.id, profile.samples)
+
+    def _saved(self) -> list[str]:
+        """Metadata files of saved profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith(".json")
+        ]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def _fold(frame) -> str:
+    """One sampled stack as ``outermost;...;innermost``."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(_frame_name(code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+@lru_cache(maxsize=4096)
+def _frame_name(qualname: str, filename: str, line: int) -> str:
+    if filename.startswith(ROOT + os.sep):
+        filename = filename[len(ROOT) + 1:]
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    return f"{qualname} ({filename}:{line})".replace(";", ",")
+
+
+profiler = Profiler(
+    os.path.join(settings.data_dir, "profiles"),
+    settings.profile_token,
+    settings.profile_interval_ms / 1000,
+    settings.profile_keep
+)
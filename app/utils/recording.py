@@ -0,0 +1,460 @@
+"""
+Record/replay harness for LLM and Snowflake calls.
+
+Wraps LLMClient and SnowflakeClient so every request/response pair
+(including streaming chunk timings) is captured into a JSON fixture file
+("cassette"). In replay mode the same requests are served back from the
+fixture deterministically, optionally with their original latencies, so
+the full request path runs offline with no API keys or warehouse.
+
+Enable through the environment:
+    REPLAY_MODE=record  REPLAY_FIXTURE=fixtures/session.json
+    REPLAY_MODE=replay  REPLAY_FIXTURE=fixtures/session.json  [REPLAY_REALTIME=true]
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+
+from app.agent.models import MODELS
+from config import settings
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class ReplayedQueryError(Exception):
+    """A database error replayed from a fixture."""
+
+
+def _request_key(payload: dict) -> str:
+    """Stable hash of a request payload."""
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class Cassette:
+    """
+    JSON fixture of recorded interactions, keyed by request hash.
+
+    Identical requests recorded several times are replayed in recorded
+    order; once exhausted, the last recording is repeated.
+
+    New interactions are appended to a JSON-lines journal next to the
+    fixture (``<path>.jsonl``), which flush() folds into the fixture; a
+    journal left by a process that never flushed is read back on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_path = f"{path}.jsonl"
+        self._lock = threading.Lock()
+        self._cursors: dict[str, int] = {}
+        self._journal = None
+        self._flush_at_exit = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"llm": {}, "db": {}}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.data[entry["kind"]].setdefault(entry["key"], []).append(entry["interaction"])
+
+    def add(self, kind: str, key: str, interaction: dict):
+        """Record an interaction, appending it to the journal."""
+        line = json.dumps({"kind": kind, "key": key, "interaction": interaction}, default=_json_default)
+        with self._lock:
+            self.data[kind].setdefault(key, []).append(interaction)
+            if self._journal is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+                if not self._flush_at_exit:
+                    atexit.register(self.flush)
+                    self._flush_at_exit = True
+            self._journal.write(line + "\n")
+            self._journal.flush()
+
+    def flush(self):
+        """Rewrite the fixture with every recorded interaction and drop the journal."""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._save()
+            self._journal.close()
+            self._journal = None
+            os.remove(self.journal_path)
+
+    def next(self, kind: str, key: str) -> dict:
+        """Return the next recorded interaction for a request."""
+        with self._lock:
+            recorded = self.data[kind].get(key)
+            if not recorded:
+                raise ReplayMissError(
+                    f"No recorded {kind} interaction for request {key} in {self.path}"
+                )
+            cursor = self._cursors.get(f"{kind}:{key}", 0)
+            self._cursors[f"{kind}:{key}"] = cursor + 1
+            return recorded[min(cursor, len(recorded) - 1)]
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1, default=_json_default)
+        os.replace(tmp_path, self.path)
+
+
+class RecordingLLMClient:
+    """
+    LLMClient stand-in that records to or replays from a cassette.
+
+    Args:
+        cassette: Fixture to record into or replay from
+        llm: Real LLMClient to record (None in replay mode)
+        realtime: In replay mode, reproduce recorded latencies
+    """
+
+    def __init__(self, cassette: Cassette, llm=None, realtime: bool = False):
+        self.cassette = cassette
+        self.llm = llm
+        self.realtime = realtime
+        self.current_provider = llm.current_provider if llm else "hyperbolic"
+        self.model = llm.model if llm else settings.llm_model
+
+    def set_model(self, model_key: str, model_identifier: str):
+        """Switch models; the model is part of every request key."""
+        if self.llm:
+            self.llm.set_model(model_key, model_identifier)
+            self.current_provider = self.llm.current_provider
+        self.model = model_identifier
+
+    def _key(self, user_message, system_prompt, conversation_history,
+             temperature=None, model_key=None) -> str:
+        payload = {
+            "model": MODELS[model_key][1] if model_key else self.model,
+            "system": system_prompt,
+            "history": conversation_history or [],
+            "user": user_message,
+        }
+        if temperature is not None:
+            payload["temperature"] = temperature
+        return _request_key(payload)
+
+    def generate(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ) -> str:
+        """Record or replay a non-streaming generation (the timeout is not part of the key)."""
+        key = self._key(user_message, system_prompt, conversation_history, temperature, model_key)
+
+        if self.llm is None:
+            recorded = self.cassette.next("llm", key)
+            if self.realtime:
+                time.sleep(recorded["elapsed"])
+            return recorded["text"]
+
+        start = time.perf_counter()
+        text = self.llm.generate(
+            user_message, system_prompt, conversation_history, temperature, model_key, timeout
+        )
+        self.cassette.add("llm", key, {
+            "user": user_message[:200],
+            "text": text,
+            "elapsed": time.perf_counter() - start,
+        })
+        return text
+
+    def generate_stream(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ):
+        """Record or replay a streaming generation, chunk by chunk."""
+        key = self._key(user_message, system_prompt, conversation_history, model_key=model_key)
+
+        if self.llm is None:
+            recorded = self.cassette.next("llm", key)
+            if "chunks" not in recorded:
+                # Recorded without streaming: serve as a single chunk
+                yield recorded["text"]
+                return
+            start = time.perf_counter()
+            for offset, chunk in recorded["chunks"]:
+                if self.realtime:
+                    delay = offset - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.llm.generate_stream(
+            user_message, system_prompt, conversation_history, model_key, timeout
+        ):
+            chunks.append([time.perf_counter() - start, chunk])
+            yield chunk
+        self.cassette.add("llm", key, {
+            "user": user_message[:200],
+            "text": "".join(chunk for _, chunk in chunks),
+            "chunks": chunks,
+            "elapsed": time.perf_counter() - start,
+        })
+
+    def generate_with_retry(
+        self,
+        user_message: str,
+        system_prompt: str,
+        max_retries: int = 2
+    ) -> str:
+        """Retries are a transport concern; recordings hold the final outcome."""
+        return self.generate(user_message, system_prompt)
+
+
+class RecordingSnowflakeClient:
+    """
+    SnowflakeClient stand-in that records to or replays from a cassette.
+
+    Query errors are recorded too, so fix-and-retry paths replay faithfully.
+
+    Args:
+        cassette: Fixture to record into or replay from
+        db: Real SnowflakeClient to record (None in replay mode)
+        realtime: In replay mode, reproduce recorded latencies
+    """
+
+    MAX_ROWS = 1000
+
+    def __init__(self, cassette: Cassette, db=None, realtime: bool = False):
+        self.cassette = cassette
+        self.db = db
+        self.realtime = realtime
+        if db is not None:
+            self.MAX_ROWS = db.MAX_ROWS
+
+    def execute_query(
+        self,
+        sql: str,
+        use_cache: bool = True,
+        timeout: float | None = None,
+        max_rows: int | None = None
+    ) -> list[dict]:
+        """Record or replay a query (recordings are never cached)."""
+        key = _request_key({"sql": " ".join(sql.split())})
+
+        if self.db is None:
+            recorded = self.cassette.next("db", key)
+            if self.realtime:
+                time.sleep(recorded["elapsed"])
+            if "error" in recorded:
+                raise ReplayedQueryError(recorded["error"])
+            return recorded["rows"]
+
+        start = time.perf_counter()
+        try:
+            if max_rows is None:
+                rows = self.db.execute_query(sql, use_cache, timeout)
+            else:
+                rows = self.db.execute_query(sql, use_cache, timeout, max_rows)
+        except Exception as e:
+            self.cassette.add("db", key, {
+                "sql": sql,
+                "error": str(e),
+                "elapsed": time.perf_counter() - start,
+            })
+            raise
+        self.cassette.add("db", key, {
+            "sql": sql,
+            "rows": rows,
+            "elapsed": time.perf_counter() - start,
+        })
+        return rows
+
+    def explain(self, sql: str) -> dict:
+        """Record or replay an EXPLAIN cost estimate."""
+        key = _request_key({"explain": " ".join(sql.split())})
+
+        if self.db is None:
+            recorded = self.cassette.next("db", key)
+            if "error" in recorded:
+                raise ReplayedQueryError(recorded["error"])
+            return recorded["plan"]
+
+        try:
+            plan = self.db.explain(sql)
+        except Exception as e:
+            self.cassette.add("db", key, {"sql": sql, "error": str(e)})
+            raise
+        self.cassette.add("db", key, {"sql": sql, "plan": plan})
+        return plan
+
+    def test_connection(self) -> bool:
+        return self.db.test_connection() if self.db else True
+
+
+class AsyncReplayLLMClient(RecordingLLMClient):
+    """
+    Async replay for the ASGI streaming path.
+
+    Request keys match RecordingLLMClient, so sessions recorded through the
+    WSGI path replay here unchanged; recorded latencies are reproduced with
+    ``asyncio.sleep`` so replayed streams hold no thread.
+    """
+
+    def __init__(self, cassette: Cassette, realtime: bool = False):
+        super().__init__(cassette, realtime=realtime)
+
+    async def generate(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        temperature: float | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ) -> str:
+        key = self._key(user_message, system_prompt, conversation_history, temperature, model_key)
+        recorded = self.cassette.next("llm", key)
+        if self.realtime:
+            await asyncio.sleep(recorded["elapsed"])
+        return recorded["text"]
+
+    async def generate_stream(
+        self,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] | None = None,
+        model_key: str | None = None,
+        timeout: float | None = None
+    ):
+        key = self._key(user_message, system_prompt, conversation_history, model_key=model_key)
+        recorded = self.cassette.next("llm", key)
+        if "chunks" not in recorded:
+            yield recorded["text"]
+            return
+        start = time.perf_counter()
+        for offset, chunk in recorded["chunks"]:
+            if self.realtime:
+                delay = offset - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+
+class AsyncReplaySnowflakeClient(RecordingSnowflakeClient):
+    """Async replay of recorded queries for the ASGI streaming path."""
+
+    def __init__(self, cassette: Cassette, realtime: bool = False):
+        super().__init__(cassette, realtime=realtime)
+
+    async def execute_query(
+        self,
+        sql: str,
+        use_cache: bool = True,
+        timeout: float | None = None
+    ) -> list[dict]:
+        recorded = self.cassette.next("db", _request_key({"sql": " ".join(sql.split())}))
+        if self.realtime:
+            await asyncio.sleep(recorded["elapsed"])
+        if "error" in recorded:
+            raise ReplayedQueryError(recorded["error"])
+        return recorded["rows"]
+
+    async def explain(self, sql: str) -> dict:
+        return super().explain(sql)
+
+
+def build_clients(mode: str, fixture: str, realtime: bool = False):
+    """
+    Create the LLM and database clients for a replay mode.
+
+    Args:
+        mode: "off", "record" or "replay"
+        fixture: Path of the cassette file
+        realtime: Reproduce recorded latencies when replaying
+
+    Returns:
+        (llm, db) tuple
+    """
+    if mode == "replay":
+        cassette = Cassette(fixture)
+        return (
+            RecordingLLMClient(cassette, realtime=realtime),
+            RecordingSnowflakeClient(cassette, realtime=realtime),
+        )
+
+    from app.agent.llm import LLMClient
+    from app.database.snowflake import SnowflakeClient
+
+    if mode == "record":
+        cassette = Cassette(fixture)
+        return (
+            RecordingLLMClient(cassette, llm=LLMClient()),
+            RecordingSnowflakeClient(cassette, db=SnowflakeClient()),
+        )
+
+    return LLMClient(), SnowflakeClient()
+
+
+def build_async_clients(mode: str, fixture: str, realtime: bool, llm, db):
+    """
+    Create the async LLM and database clients for the ASGI streaming path.
+
+    Args:
+        mode: "off", "record" or "replay"
+        fixture: Path of the cassette file
+        realtime: Reproduce recorded latencies when replaying
+        llm: The synchronous agent's LLM client (its model selection is shared)
+        db: The synchronous agent's database client (its pool and cache are shared)
+
+    Returns:
+        (llm, db) tuple of awaitable clients
+
+    Recording only covers the synchronous path; in record mode the async
+    path talks to the live services unrecorded.
+    """
+    if mode == "replay":
+        cassette = Cassette(fixture)
+        return (
+            AsyncReplayLLMClient(cassette, realtime=realtime),
+            AsyncReplaySnowflakeClient(cassette, realtime=realtime),
+        )
+
+    from app.agent.llm import AsyncLLMClient
+    from app.database.snowflake import AsyncSnowflakeClient
+
+    if mode == "record":
+        llm, db = llm.llm, db.db
+
+    return AsyncLLMClient(llm), AsyncSnowflakeClient(db)
@@ -0,0 +1,316 @@
+"""
+Request tracing: OpenTelemetry-style spans exported as JSON lines or OTLP.
+
+A trace is a tree of timed spans (prompt build, LLM call, query execution,
+...) for one request. The current span lives in a context variable, so
+nested ``span()`` blocks become children without passing spans around;
+work handed to another thread or job carries its parent explicitly.
+
+Finished spans are queued and written by a background thread, either as
+one JSON object per line (TRACE_EXPORTER=jsonl) or posted in the OTLP/HTTP
+JSON encoding to a collector (TRACE_EXPORTER=otlp).
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+# W3C traceparent: version-traceid-spanid-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """
+    One timed operation in a trace.
+
+    Args:
+        name: Operation name (e.g. "llm.request")
+        trace_id: 32 hex characters shared by the whole trace
+        parent_id: Span ID of the parent (None for a root span)
+        attributes: Initial attributes
+        parent: Parent span in this process, if any
+    """
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        attributes: dict | None = None,
+        parent: "Span | None" = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.events: list[dict] = []
+        self.status = "ok"
+        self.error: str | None = None
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        """Mark a point in time within the span (e.g. the first LLM token)."""
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = str(error)
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        tracer.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to a background exporter.
+
+    Args:
+        exporter: "off", "jsonl" or "otlp"
+        path: JSON-lines file for the jsonl exporter
+        endpoint: OTLP/HTTP traces URL for the otlp exporter
+        service: service.name resource attribute
+    """
+
+    # Spans written per batch, and seconds between flushes
+    BATCH_SIZE = 256
+    FLUSH_SECONDS = 1.0
+
+    # Finished spans held while the exporter is behind; extra spans are dropped
+    MAX_QUEUED = 10000
+
+    def __init__(self, exporter: str = "off", path: str = "traces.jsonl", endpoint: str = "", service: str = "umip"):
+        self.exporter = exporter
+        self.path = path
+        self.endpoint = endpoint
+        self.service = service
+        self._queue: queue.Queue[Span] = queue.Queue(maxsize=self.MAX_QUEUED)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if self.exporter == "off":
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("Trace export queue full; dropping span %s", span.name)
+
+    def flush(self):
+        """Write every queued span now (used at shutdown and in tests)."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.FLUSH_SECONDS
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Trace export failed (%d spans dropped)", len(batch))
+
+    def _write(self, spans: list[Span]):
+        if self.exporter == "jsonl":
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+        elif self.exporter == "otlp":
+            request = urllib.request.Request(
+                self.endpoint,
+                data=json.dumps(to_otlp(spans, self.service), default=str).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST"
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+
+
+def to_otlp(spans: list[Span], service: str) -> dict:
+    """Spans in the OTLP/HTTP JSON encoding (ExportTraceServiceRequest)."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service})},
+            "scopeSpans": [{
+                "scope": {"name": "app.utils.tracing"},
+                "spans": [
+                    {
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                        "name": span.name,
+                        "kind": 2 if span.parent_id is None else 1,  # SERVER for roots, else INTERNAL
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": _otlp_attributes(span.attributes),
+                        "events": [
+                            {
+                                "name": event["name"],
+                                "timeUnixNano": str(event["time_ns"]),
+                                "attributes": _otlp_attributes(event["attributes"]),
+                            }
+                            for event in span.events
+                        ],
+                        "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        values.append({"key": key, "value": typed})
+    return values
+
+
+tracer = Tracer(settings.trace_exporter, settings.trace_file, settings.trace_otlp_endpoint)
+atexit.register(lambda: tracer.flush())
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def current_trace_id() -> str | None:
+    span = _current.get()
+    return span.trace_id if span else None
+
+
+def start_span(name: str, parent: Span | None = None, traceparent: str | None = None, **attributes) -> Span:
+    """
+    Start a span without making it current (end it with ``span.end()``).
+
+    The parent defaults to the current span; a W3C ``traceparent`` header
+    value continues a caller's trace when there is no parent.
+    """
+    parent = parent or _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, attributes, parent)
+    match = TRACEPARENT.match(traceparent or "")
+    if match:
+        return Span(name, match.group(1), match.group(2), attributes)
+    return Span(name, secrets.token_hex(16), None, attributes)
+
+
+def activate(span: Span | None):
+    """Make a span current (None clears it)."""
+    _current.set(span)
+
+
+@contextmanager
+def activated(span: Span | None):
+    """Make a span current for a block without ending it afterwards."""
+    previous = _current.get()
+    _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.set(previous)
+
+
+@contextmanager
+def span(name: str, parent: Span | None = None, traceparent: str | None = None, **attributes):
+    """
+    Run a block as a child of the current span (or of ``parent``; see start_span).
+
+    Errors raised in the block mark the span failed and propagate.
+    """
+    current = start_span(name, parent, traceparent, **attributes)
+    previous = _current.get()
+    _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.fail(e)
+        raise
+    finally:
+        # Restore the parent unless this span is no longer on the current
+        # chain (a generator closed late, from another context)
+        if _within(current):
+            _current.set(previous)
+        current.end()
+
+
+def _within(span: Span) -> bool:
+    """Whether the current span is ``span`` or one of its descendants."""
+    node = _current.get()
+    while node is not None:
+        if node is span:
+            return True
+        node = node.parent
+    return False
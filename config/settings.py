@@ -23,6 +23,119 @@ class Settings:
         self.snowflake_database = os.getenv("SNOWFLAKE_DATABASE")
         self.snowflake_schema = os.getenv("SNOWFLAKE_SCHEMA")
         
+        # Answer rendering: skip the summary LLM call for trivial result shapes
+        self.summary_fast_path = os.getenv("SUMMARY_FAST_PATH", "true").lower() == "true"
+
+        # Speculative SQL: number of concurrent candidates (0 or 1 disables)
+        self.speculative_candidates = int(os.getenv("SPECULATIVE_SQL_CANDIDATES", "0"))
+
+        # Approximate mode (requests with "approximate": true): aggregates over
+        # these tables first run on a SAMPLE SYSTEM sample of this many percent
+        self.sample_percent = float(os.getenv("SAMPLE_PERCENT", "10"))
+        self.sample_tables = {
+            name.strip().upper()
+            for name in os.getenv(
+                "SAMPLE_TABLES", "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+            ).split(",")
+            if name.strip()
+        }
+        # ...then the exact query runs and replaces the preview (false: answer from the sample)
+        self.approximate_exact = os.getenv("APPROXIMATE_EXACT", "true").lower() == "true"
+
+        # Model routing: send simple questions to a fast model, complex ones to a strong one
+        self.routing_enabled = os.getenv("ROUTING_ENABLED", "false").lower() == "true"
+        self.routing_fast_model = os.getenv("ROUTING_FAST_MODEL", "claude-haiku")
+        self.routing_strong_model = os.getenv("ROUTING_STRONG_MODEL", "claude-sonnet")
+        self.routing_threshold = float(os.getenv("ROUTING_THRESHOLD", "3"))
+        # Tier per phase: auto (by question complexity), fast or strong
+        self.routing_sql_tier = os.getenv("ROUTING_SQL_TIER", "auto").lower()
+        self.routing_summary_tier = os.getenv("ROUTING_SUMMARY_TIER", "auto").lower()
+        self.routing_fix_tier = os.getenv("ROUTING_FIX_TIER", "strong").lower()
+
+        # Time budget per question across generation, execution and summary
+        self.request_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+
+        # Batch questions: concurrent calls allowed per pipeline stage
+        self.batch_generation_concurrency = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+        self.batch_execution_concurrency = int(os.getenv("BATCH_EXECUTION_CONCURRENCY", "4"))
+        self.batch_summary_concurrency = int(os.getenv("BATCH_SUMMARY_CONCURRENCY", "8"))
+
+        # Seconds identical warehouse queries are answered from the in-process
+        # result cache (data changed in the meantime is not seen); 0 disables it
+        self.result_cache_ttl_seconds = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+
+        # Local state (pins, jobs, conversation history, caches)
+        self.data_dir = os.getenv("DATA_DIR", "data")
+
+        # Question jobs: worker threads answering streamed questions in the background
+        self.job_workers = int(os.getenv("JOB_WORKERS", "16"))
+
+        # Admission control (per worker process): questions answered at once,
+        # overall and per user, and how many may wait for a slot
+        self.admission_max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+        self.admission_max_per_user = int(os.getenv("ADMISSION_MAX_PER_USER", "3"))
+        self.admission_queue_size = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+        self.admission_max_queued_per_user = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", "5"))
+        # Proxy addresses whose X-User-Id or Sf-Context-Current-User header
+        # names the user (otherwise the client address is the user)
+        self.trusted_proxies = {
+            address.strip() for address in os.getenv("TRUSTED_PROXIES", "").split(",") if address.strip()
+        }
+        # The app is reached only through Snowpark Container Services ingress,
+        # which sets Sf-Context-Current-User, so that header names the user
+        self.snowflake_ingress = os.getenv("SNOWFLAKE_INGRESS", "false").lower() == "true"
+
+        # Metrics shared by the worker processes of one server: each publishes
+        # its values to METRICS_FILE every METRICS_PUBLISH_SECONDS and /metrics
+        # sums them (gunicorn.conf.py turns this on); otherwise per process
+        self.metrics_shared = os.getenv("METRICS_SHARED", "false").lower() == "true"
+        self.metrics_file = os.getenv("METRICS_FILE", os.path.join(self.data_dir, "metrics.db"))
+        self.metrics_publish_seconds = float(os.getenv("METRICS_PUBLISH_SECONDS", "5"))
+
+        # Request tracing: off, jsonl (spans appended to TRACE_FILE) or otlp
+        # (posted as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT)
+        self.trace_exporter = os.getenv("TRACE_EXPORTER", "off").lower()
+        self.trace_file = os.getenv("TRACE_FILE", os.path.join(self.data_dir, "traces.jsonl"))
+        self.trace_otlp_endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+        # On-demand profiling: /api/chat and /api/chat/stream requests sending this
+        # token (X-Profile-Token header or ?profile=) run under a sampling
+        # profiler; empty disables profiling
+        self.profile_token = os.getenv("PROFILE_TOKEN", "")
+        self.profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+        self.profile_keep = int(os.getenv("PROFILE_KEEP", "50"))
+
+        # Live column metadata of the configured tables (one INFORMATION_SCHEMA
+        # query), cached on disk for the SQL validator and refreshed in the background
+        self.schema_cache_file = os.getenv("SCHEMA_CACHE_FILE", os.path.join(self.data_dir, "schema_cache.json"))
+        self.schema_cache_ttl_hours = float(os.getenv("SCHEMA_CACHE_TTL_HOURS", "24"))
+        self.schema_refresh_enabled = os.getenv("SCHEMA_REFRESH_ENABLED", "true").lower() == "true"
+
+        # Distinct keyword, brand and seller values (one query), cached on disk and
+        # resolved from questions so generated SQL can compare with = or IN
+        self.value_dictionary_file = os.getenv(
+            "VALUE_DICTIONARY_FILE", os.path.join(self.data_dir, "value_dictionary.json")
+        )
+        self.value_dictionary_ttl_hours = float(os.getenv("VALUE_DICTIONARY_TTL_HOURS", "24"))
+        self.value_refresh_enabled = os.getenv("VALUE_REFRESH_ENABLED", "true").lower() == "true"
+
+        # Fingerprints and latencies of executed warehouse queries, for the
+        # clustering/materialization advisor (python -m app.database.workload)
+        self.workload_log_enabled = os.getenv("WORKLOAD_LOG_ENABLED", "true").lower() == "true"
+        self.workload_log_file = os.getenv("WORKLOAD_LOG_FILE", os.path.join(self.data_dir, "workload.db"))
+
+        # Pinned questions: background refresh scheduler
+        self.pin_scheduler_enabled = os.getenv("PIN_SCHEDULER_ENABLED", "true").lower() == "true"
+
+        # App imported by a preforking master (gunicorn.conf.py): background
+        # threads start in each worker after the fork instead of at import
+        self.preload_app = os.getenv("PRELOAD_APP", "false").lower() == "true"
+
+        # Record/replay of LLM and Snowflake calls: off, record, replay
+        self.replay_mode = os.getenv("REPLAY_MODE", "off").lower()
+        self.replay_fixture = os.getenv("REPLAY_FIXTURE", "fixtures/session.json")
+        self.replay_realtime = os.getenv("REPLAY_REALTIME", "false").lower() == "true"
+
         # Flask
         self.flask_secret_key = os.getenv("FLASK_SECRET_KEY", "dev-key-change-in-prod")
         self.flask_debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
@@ -43,6 +156,10 @@ class Settings:
         """Check for missing required configuration. Returns list of missing vars."""
         missing = []
 
+        # Replayed sessions need no credentials
+        if self.replay_mode == "replay":
+            return missing
+
         # Check for at least one LLM provider
         if not any([self.anthropic_api_key, self.hyperbolic_api_key]):
             missing.append("At least one LLM API key (ANTHROPIC/HYPERBOLIC)")
@@ -0,0 +1,50 @@
+"""
+Preload-and-fork serving: gunicorn -c gunicorn.conf.py app.main:asgi_app
+
+The master imports the app once (agent, schema prompt, stores) and forks
+its workers from it, so they start in milliseconds and share those pages
+copy-on-write. Provider SDK clients, Snowflake connections and background
+threads are created in each worker after the fork.
+"""
+
+import importlib
+import os
+
+# Read by config.settings when the master preloads the app
+os.environ.setdefault("PRELOAD_APP", "true")
+# Every worker publishes its metrics, so any of them answers a scrape for all
+os.environ.setdefault("METRICS_SHARED", "true")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    """Start the workers' shared metrics from zero, like a single process would."""
+    from app.utils.metrics import clear_shared
+    from config import settings
+    if settings.metrics_shared:
+        clear_shared(settings.metrics_file)
+
+
+def when_ready(server):
+    """Import the SDKs once, before forking, instead of in every worker."""
+    for module in ("anthropic", "openai", "snowflake.connector"):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            server.log.warning("%s is not installed; skipped preloading it", module)
+
+
+def post_fork(server, worker):
+    from app import start_background_tasks
+    start_background_tasks()
+
+
+def worker_exit(server, worker):
+    """Publish the exiting worker's last counts, which later scrapes keep."""
+    from app.utils.metrics import registry
+    registry.publish()
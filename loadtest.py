@@ -0,0 +1,335 @@
+"""
+Load test for /api/chat/stream: how many chat streams one worker holds open.
+
+Everything runs offline against a replayed session with realistic latencies.
+
+1. Write a synthetic fixture (LLM and warehouse latencies in seconds):
+    python loadtest.py fixture fixtures/load.json --llm-seconds 3 --db-seconds 2
+
+2a. Serve it and drive it over HTTP, once per serving path:
+    export REPLAY_MODE=replay REPLAY_REALTIME=true REPLAY_FIXTURE=fixtures/load.json PIN_SCHEDULER_ENABLED=false
+    gunicorn -w 1 --threads 32 -b :8080 'app:create_app()'        # before: WSGI
+    uvicorn app.main:asgi_app --workers 1 --port 8080               # after: ASGI
+    python loadtest.py run http://localhost:8080 --connections 500
+
+2b. Or compare both paths in-process, one worker each:
+    python loadtest.py inprocess fixtures/load.json --mode wsgi --threads 32 --connections 500
+    python loadtest.py inprocess fixtures/load.json --mode asgi --connections 500
+
+   Add --warehouse-seconds to run the ASGI path's queries through the real
+   AsyncSnowflakeClient against a simulated warehouse; the report then counts
+   warehouse connections opened (logins):
+    python loadtest.py inprocess fixtures/load.json --mode asgi --connections 500 --warehouse-seconds 2
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+QUESTION = "Which brand has the highest average price?"
+
+
+class Stats:
+    """Per-stream timings and the peak number of streams open at once."""
+
+    def __init__(self):
+        self.first_event: list[float] = []
+        self.total: list[float] = []
+        self.failed = 0
+        self.open = 0
+        self.peak_open = 0
+        self._lock = threading.Lock()
+
+    def opened(self):
+        with self._lock:
+            self.open += 1
+            self.peak_open = max(self.peak_open, self.open)
+
+    def closed(self, first_event: float | None, total: float, ok: bool):
+        with self._lock:
+            self.open -= 1
+            if ok:
+                self.first_event.append(first_event)
+                self.total.append(total)
+            else:
+                self.failed += 1
+
+    def report(self, label: str, connections: int, wall: float):
+        def pct(values, q):
+            values = sorted(values)
+            return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+        print(f"\n=== {label}: {connections} connections ===")
+        print(f"completed {len(self.total)} | failed {self.failed} | wall {wall:.1f} s")
+        print(f"peak streams open at once: {self.peak_open}")
+        if self.total:
+            print(f"first event p50 {pct(self.first_event, 0.5):.0f} ms | p95 {pct(self.first_event, 0.95):.0f} ms")
+            print(f"full answer p50 {statistics.median(self.total) * 1000:.0f} ms | p95 {pct(self.total, 0.95):.0f} ms")
+
+
+def simulated_warehouse(seconds: float, round_trip: float = 0.02):
+    """
+    A SnowflakeClient whose connections are simulated: each query runs for
+    ``seconds``, each call on a connection takes ``round_trip`` seconds, and
+    every connection opened is counted in ``connects``.
+    """
+    import itertools
+    from app.database.snowflake import SnowflakeClient
+
+    ids = itertools.count()
+    finishes: dict[str, float] = {}
+
+    class Cursor:
+        description = [("BRAND",), ("AVG_PRICE",)]
+
+        def execute(self, sql):
+            pass
+
+        def execute_async(self, sql):
+            time.sleep(round_trip)
+            self.sfqid = f"q{next(ids)}"
+            finishes[self.sfqid] = time.monotonic() + seconds
+
+        def get_results_from_sfqid(self, query_id):
+            pass
+
+        def fetchmany(self, size):
+            time.sleep(round_trip)
+            return [(f"Brand {i}", 180.0 - i) for i in range(25)]
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+        def get_query_status_throw_if_error(self, query_id):
+            time.sleep(round_trip)
+            return finishes[query_id]
+
+        def is_still_running(self, finish):
+            return time.monotonic() < finish
+
+        def is_closed(self):
+            return False
+
+        def close(self):
+            pass
+
+    class Client(SnowflakeClient):
+        connects = 0
+
+        def _connect(self):
+            Client.connects += 1
+            return Connection()
+
+    return Client()
+
+
+def make_fixture(path: str, llm_seconds: float, db_seconds: float):
+    """Record one question against stub clients, then stretch its timings."""
+    from app.agent.sql_agent import SQLAgent
+    from app.utils.recording import Cassette, RecordingLLMClient, RecordingSnowflakeClient
+    from config import settings
+
+    class StubLLM:
+        current_provider = "hyperbolic"
+        model = settings.llm_model
+
+        def generate(self, user_message, system_prompt, conversation_history=None,
+                     temperature=None, model_key=None, timeout=None):
+            if user_message.startswith("The user asked"):
+                return "Michelin has the highest average price, followed by Bridgestone. " * 4
+            return "```sql\nSELECT BRAND, AVG(PRICE) AS AVG_PRICE FROM PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER GROUP BY BRAND ORDER BY AVG_PRICE DESC\n```"
+
+        def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                            model_key=None, timeout=None):
+            text = self.generate(user_message, system_prompt, conversation_history)
+            for i in range(0, len(text), 6):
+                yield text[i:i + 6]
+
+    class StubDB:
+        MAX_ROWS = 1000
+
+        def execute_query(self, sql, use_cache=True, timeout=None):
+            return [{"BRAND": f"Brand {i}", "AVG_PRICE": 180.0 - i} for i in range(25)]
+
+    cassette = Cassette(path)
+    agent = SQLAgent(
+        llm=RecordingLLMClient(cassette, llm=StubLLM()),
+        db=RecordingSnowflakeClient(cassette, db=StubDB())
+    )
+    list(agent.ask_stream(QUESTION))
+
+    for recordings in cassette.data["llm"].values():
+        for recorded in recordings:
+            chunks = recorded.get("chunks", [])
+            for i, chunk in enumerate(chunks):
+                chunk[0] = llm_seconds * (i + 1) / len(chunks)
+            recorded["elapsed"] = llm_seconds
+    for recordings in cassette.data["db"].values():
+        for recorded in recordings:
+            recorded["elapsed"] = db_seconds
+    cassette._save()
+    print(f"Wrote {path}: LLM calls {llm_seconds}s each, query {db_seconds}s")
+
+
+async def http_stream(url, body: bytes, stats: Stats):
+    parsed = urlparse(url)
+    start = time.perf_counter()
+    first_event = None
+    ok = False
+    stats.opened()
+    try:
+        reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+        writer.write(
+            f"POST /api/chat/stream HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        received = b""
+        while chunk := await reader.read(65536):
+            if first_event is None and b"data: " in received + chunk:
+                first_event = time.perf_counter() - start
+            received += chunk
+        writer.close()
+        ok = b'"type": "complete"' in received and b'"error": null' in received
+    except OSError:
+        pass
+    finally:
+        stats.closed(first_event, time.perf_counter() - start, ok)
+
+
+async def run_http(url: str, connections: int):
+    stats = Stats()
+    body = json.dumps({"message": QUESTION}).encode()
+    start = time.perf_counter()
+    await asyncio.gather(*(http_stream(url, body, stats) for _ in range(connections)))
+    stats.report(f"HTTP {url}", connections, time.perf_counter() - start)
+
+
+def run_inprocess(fixture: str, mode: str, connections: int, threads: int,
+                  warehouse_seconds: float | None = None):
+    from app.agent.async_agent import AsyncSQLAgent
+    from app.agent.sql_agent import SQLAgent
+    from app.asgi import StreamingApp
+    from app.utils.recording import (
+        AsyncReplayLLMClient,
+        AsyncReplaySnowflakeClient,
+        Cassette,
+        RecordingLLMClient,
+        RecordingSnowflakeClient,
+    )
+
+    cassette = Cassette(fixture)
+    agent = SQLAgent(
+        llm=RecordingLLMClient(cassette, realtime=True),
+        db=RecordingSnowflakeClient(cassette, realtime=True)
+    )
+    stats = Stats()
+    start = time.perf_counter()
+
+    if mode == "wsgi":
+        # A sync worker holds one thread per open stream, like gunicorn --threads
+        def one(t0):
+            stats.opened()
+            first, ok = None, False
+            for event in agent.ask_stream(QUESTION):
+                first = first or time.perf_counter() - t0
+                ok = event["type"] == "complete" and event["error"] is None
+            stats.closed(first, time.perf_counter() - t0, ok)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            # Timed from submission: queueing for a free thread counts
+            for future in [pool.submit(one, time.perf_counter()) for _ in range(connections)]:
+                future.result()
+        label = f"in-process WSGI, {threads} threads"
+    else:
+        warehouse = None
+        if warehouse_seconds is None:
+            db = AsyncReplaySnowflakeClient(cassette, realtime=True)
+        else:
+            from app.database.snowflake import AsyncSnowflakeClient
+            warehouse = simulated_warehouse(warehouse_seconds)
+            db = AsyncSnowflakeClient(warehouse)
+        app = StreamingApp(AsyncSQLAgent(
+            agent,
+            llm=AsyncReplayLLMClient(cassette, realtime=True),
+            db=db
+        ))
+        body = json.dumps({"message": QUESTION}).encode()
+
+        async def one():
+            t0 = time.perf_counter()
+            first, received = None, []
+            done = asyncio.Event()
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                nonlocal first
+                if message.get("body"):
+                    first = first or time.perf_counter() - t0
+                    received.append(message["body"])
+
+            stats.opened()
+            scope = {"type": "http", "method": "POST", "path": StreamingApp.STREAM_PATH, "headers": []}
+            await app(scope, receive, send)
+            done.set()
+            ok = b'"error": null' in received[-1] if received else False
+            stats.closed(first, time.perf_counter() - t0, ok)
+
+        async def many():
+            await asyncio.gather(*(one() for _ in range(connections)))
+
+        asyncio.run(many())
+        label = "in-process ASGI, 1 event loop"
+        if warehouse is not None:
+            label += f", simulated warehouse ({warehouse.connects} connections opened)"
+
+    stats.report(label, connections, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fixture = commands.add_parser("fixture", help="Write a synthetic replay fixture")
+    fixture.add_argument("path")
+    fixture.add_argument("--llm-seconds", type=float, default=3.0)
+    fixture.add_argument("--db-seconds", type=float, default=2.0)
+
+    run = commands.add_parser("run", help="Open concurrent streams against a server")
+    run.add_argument("url")
+    run.add_argument("--connections", type=int, default=200)
+
+    inprocess = commands.add_parser("inprocess", help="Compare serving paths without a server")
+    inprocess.add_argument("fixture")
+    inprocess.add_argument("--mode", choices=["wsgi", "asgi"], default="asgi")
+    inprocess.add_argument("--connections", type=int, default=200)
+    inprocess.add_argument("--threads", type=int, default=32, help="Worker threads (wsgi mode)")
+    inprocess.add_argument("--warehouse-seconds", type=float,
+                           help="Query a simulated warehouse through AsyncSnowflakeClient (asgi mode)")
+
+    args = parser.parse_args()
+    if args.command == "fixture":
+        make_fixture(args.path, args.llm_seconds, args.db_seconds)
+    elif args.command == "run":
+        asyncio.run(run_http(args.url, args.connections))
+    else:
+        run_inprocess(args.fixture, args.mode, args.connections, args.threads, args.warehouse_seconds)
+
+
+if __name__ == "__main__":
+    main()
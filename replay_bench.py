@@ -0,0 +1,56 @@
+"""
+Offline end-to-end benchmark over a recorded session.
+
+Record a session once against the live services:
+    REPLAY_MODE=record REPLAY_FIXTURE=fixtures/weekly.json python -m app.main
+
+Then replay the same questions anywhere, with no network:
+    python replay_bench.py fixtures/weekly.json questions.txt [--realtime] [--stream]
+"""
+import argparse
+import statistics
+import time
+
+from app.agent.sql_agent import SQLAgent
+from app.utils.recording import Cassette, RecordingLLMClient, RecordingSnowflakeClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixture", help="Cassette recorded with REPLAY_MODE=record")
+    parser.add_argument("questions", help="Text file with one question per line")
+    parser.add_argument("--realtime", action="store_true", help="Reproduce recorded latencies")
+    parser.add_argument("--stream", action="store_true", help="Use ask_stream instead of ask")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    cassette = Cassette(args.fixture)
+    agent = SQLAgent(
+        llm=RecordingLLMClient(cassette, realtime=args.realtime),
+        db=RecordingSnowflakeClient(cassette, realtime=args.realtime)
+    )
+
+    print(f"\n=== Replaying {len(questions)} questions from {args.fixture} ===\n")
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        if args.stream:
+            events = list(agent.ask_stream(question))
+            error = events[-1].get("error")
+        else:
+            error = agent.ask(question)["error"]
+        elapsed = (time.perf_counter() - start) * 1000
+        latencies.append(elapsed)
+        status = f"error: {error}" if error else "ok"
+        print(f"{elapsed:9.1f} ms  {status:<10}  {question[:70]}")
+
+    if latencies:
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"\np50 {statistics.median(latencies):.1f} ms | p95 {p95:.1f} ms | max {latencies[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
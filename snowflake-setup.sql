@@ -64,6 +64,7 @@ spec:
         SNOWFLAKE_WAREHOUSE: "{{secrets.snowflake_warehouse}}"
         SNOWFLAKE_DATABASE: "PRIORITY_TIRE_DATA"
         SNOWFLAKE_SCHEMA: "UMIP_MOCK"
+        SNOWFLAKE_INGRESS: "true"
       readinessProbe:
         port: 8080
         path: /health
@@ -0,0 +1,95 @@
+"""
+Cold-start benchmark: import time per module and time to the first response.
+
+Each run starts a fresh interpreter that imports the app under
+``python -X importtime`` and then serves one request to /health:
+    python startup_bench.py [--runs 5] [--top 20] [--module app.main]
+
+It uses the current environment, so REPLAY_MODE=replay runs it with no
+credentials. Import times are the median over the runs.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+app = getattr(sys.modules[{module!r}], "app", None)
+if app is not None:
+    app.test_client().get("/health")
+served = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000,
+                  "first_response_ms": (served - start) * 1000 if app is not None else None}}))
+"""
+
+
+def run_once(module: str) -> tuple[dict, dict[str, tuple[int, int]]]:
+    """One cold start: probe timings and {module: (self_us, cumulative_us)}."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=False
+    )
+    if completed.returncode != 0:
+        sys.exit(f"Probe failed:\n{completed.stderr[-2000:]}")
+
+    modules = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return json.loads(completed.stdout.strip().splitlines()[-1]), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list")
+    parser.add_argument("--module", default="app.main", help="Module imported at startup")
+    args = parser.parse_args()
+
+    timings = []
+    self_us: dict[str, list[int]] = defaultdict(list)
+    cumulative_us: dict[str, list[int]] = defaultdict(list)
+    for _ in range(args.runs):
+        timing, modules = run_once(args.module)
+        timings.append(timing)
+        for name, (own, total) in modules.items():
+            self_us[name].append(own)
+            cumulative_us[name].append(total)
+
+    def median_ms(values: list[int]) -> float:
+        return statistics.median(values) / 1000
+
+    import_ms = statistics.median(t["import_ms"] for t in timings)
+    print(f"\n=== Cold start of {args.module} ({args.runs} runs) ===\n")
+    print(f"import {import_ms:.0f} ms", end="")
+    if timings[0]["first_response_ms"] is not None:
+        print(f" | first response {statistics.median(t['first_response_ms'] for t in timings):.0f} ms", end="")
+    print()
+
+    packages: dict[str, float] = defaultdict(float)
+    for name, values in self_us.items():
+        packages[name.split(".")[0]] += median_ms(values)
+    print("\nImport time by top-level package (self time):")
+    for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{ms:9.1f} ms  {package}")
+
+    print(f"\nSlowest {args.top} modules (cumulative, including what they import):")
+    slowest = sorted(cumulative_us, key=lambda name: -median_ms(cumulative_us[name]))[:args.top]
+    for name in slowest:
+        print(f"{median_ms(cumulative_us[name]):9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+// Sorts the data panel's rows off the main thread.
+//
+// The page sends {type: 'load', token, rows} when it shows a new result,
+// then {type: 'sort', token, column, direction, values?} per header click.
+// A column's values arrive once, as a Float64Array (NaN for nulls) when
+// every value is numeric and as lower-cased strings otherwise. Replies are
+// {token, order}: a Uint32Array mapping display position to row index.
+// Each sort starts from the previous order, so ties keep it (like sorting
+// the rows in place).
+
+let token = 0;
+let order = new Uint32Array(0);
+let columns = new Map();
+
+function compareNumbers(values, sign) {
+    return (i, j) => {
+        const a = values[i];
+        const b = values[j];
+        if (a !== a) return b !== b ? 0 : 1;  // NaN (null) last
+        if (b !== b) return -1;
+        return sign * (a - b);
+    };
+}
+
+function compareStrings(values, sign) {
+    return (i, j) => {
+        const a = values[i];
+        const b = values[j];
+        if (a === null) return b === null ? 0 : 1;  // Nulls last
+        if (b === null) return -1;
+        return a < b ? -sign : a > b ? sign : 0;
+    };
+}
+
+self.onmessage = (e) => {
+    const message = e.data;
+
+    if (message.type === 'load') {
+        token = message.token;
+        order = new Uint32Array(message.rows);
+        for (let i = 0; i < order.length; i++) order[i] = i;
+        columns = new Map();
+        return;
+    }
+
+    if (message.type !== 'sort' || message.token !== token) return;
+    if (message.values) columns.set(message.column, message.values);
+    const values = columns.get(message.column);
+    if (!values) return;
+
+    const sign = message.direction === 'asc' ? 1 : -1;
+    const compare = values instanceof Float64Array
+        ? compareNumbers(values, sign)
+        : compareStrings(values, sign);
+    order = order.slice().sort(compare);
+
+    // Keep our copy; the page gets its own
+    const reply = order.slice();
+    self.postMessage({ token, order: reply }, [reply.buffer]);
+};
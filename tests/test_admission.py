@@ -0,0 +1,290 @@
+"""Tests for admission control of questions in flight."""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from app.agent.admission import (
+    ADMITTED,
+    EXPIRED,
+    WAITING,
+    BROWSER_COOKIE,
+    AdmissionController,
+    Rejected,
+    conversation_key,
+    new_browser_token,
+    owner_key,
+    user_key,
+)
+from app.agent.async_agent import AsyncSQLAgent
+from app.agent.jobs import JobQueue, JobStore
+from app.agent.sql_agent import SQLAgent
+from app.asgi import StreamingApp, _owner
+from config import settings
+
+
+class GatedAgent:
+    """Streams a short answer once the gate opens."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def ask_stream(self, question, llm_summary=False, conversation_id=None, deadline=None):
+        self.gate.wait(5)
+        yield {"type": "token", "content": "Done."}
+        yield {"type": "complete", "sql": None, "data": None, "error": None}
+
+
+class SlowAsyncLLM:
+    async def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                              model_key=None, timeout=None):
+        await asyncio.sleep(0.1)
+        yield "Done." if user_message.startswith("The user asked") else "```sql\nSELECT 1 AS N\n```"
+
+
+class AsyncDB:
+    MAX_ROWS = 1000
+
+    async def execute_query(self, sql, use_cache=True, timeout=None):
+        return [{"N": 1}]
+
+
+async def request(app, body, headers=()):
+    """Drive one POST /api/chat/stream; returns (status, headers, events)."""
+    messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    sent = []
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/chat/stream",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    await app(scope, receive, send)
+    done.set()
+    body = b"".join(m.get("body", b"") for m in sent[1:]).decode()
+    events = [
+        json.loads(line[6:])
+        for frame in body.split("\n\n") for line in frame.split("\n") if line.startswith("data: ")
+    ]
+    return sent[0]["status"], dict(sent[0]["headers"]), events
+
+
+class TestAdmissionController:
+    """Test limits, queueing order and shedding."""
+
+    def test_global_limit_queues_in_order(self):
+        admission = AdmissionController(2, 2, 10, 5)
+        first, second = admission.request("a", 5), admission.request("b", 5)
+        third, fourth = admission.request("c", 5), admission.request("d", 5)
+
+        assert first.state == second.state == ADMITTED
+        assert (third.state, third.position) == (WAITING, 1)
+        assert (fourth.state, fourth.position) == (WAITING, 2)
+
+        first.release()
+        assert third.state == ADMITTED
+        assert fourth.position == 1
+
+    def test_user_at_limit_lets_others_pass(self):
+        admission = AdmissionController(4, 1, 10, 5)
+        admission.request("a", 5)
+        queued = admission.request("a", 5)
+        other = admission.request("b", 5)
+
+        assert queued.state == WAITING
+        assert other.state == ADMITTED
+
+    def test_shedding(self):
+        admission = AdmissionController(1, 1, 2, 1)
+        admission.request("a", 5)
+        admission.request("a", 5)
+
+        with pytest.raises(Rejected) as user_limit:
+            admission.request("a", 5)
+        admission.request("b", 5)
+        with pytest.raises(Rejected) as queue_full:
+            admission.request("c", 5)
+
+        assert user_limit.value.status == 429
+        assert queue_full.value.status == 503
+        stats = admission.stats()
+        assert stats["rejected_user_limit_total"] == 1
+        assert stats["rejected_queue_full_total"] == 1
+        assert stats["queued"] == 2
+
+    def test_weighted_ticket_takes_several_slots(self):
+        admission = AdmissionController(4, 3, 10, 1)
+        batch = admission.request("a", 5, weight=10)
+        assert (batch.weight, batch.state) == (3, ADMITTED)
+
+        # The user's own next question waits; another user gets the last slot
+        queued = admission.request("a", 5)
+        assert queued.state == WAITING
+        assert admission.request("b", 5).state == ADMITTED
+        with pytest.raises(Rejected) as user_limit:
+            admission.request("a", 5, weight=3)
+        assert user_limit.value.status == 429
+
+        batch.release()
+        assert queued.state == ADMITTED
+        assert admission.stats()["running"] == 2
+
+    def test_wait_times_out(self):
+        admission = AdmissionController(1, 1, 10, 5)
+        admission.request("a", 5)
+        ticket = admission.request("b", 0.05)
+
+        assert not ticket.wait(0.05)
+        assert ticket.state == EXPIRED
+        stats = admission.stats()
+        assert stats["expired_total"] == 1
+        assert stats["queued"] == 0
+
+    def test_wait_histogram(self):
+        admission = AdmissionController(1, 1, 10, 5)
+        admission.request("a", 5).release()
+
+        wait = admission.stats()["wait_seconds"]
+        assert wait["count"] == 1
+        assert wait["buckets"]["0.1"] == 1
+        assert wait["buckets"]["+Inf"] == 1
+
+    def test_user_key(self, monkeypatch):
+        monkeypatch.setattr(settings, "trusted_proxies", {"10.0.0.9"})
+        monkeypatch.setattr(settings, "snowflake_ingress", True)
+        assert user_key({"sf-context-current-user": "ANA", "x-user-id": "u1"}, "10.0.0.1") == "ANA"
+        assert user_key({"x-user-id": "u1"}, "10.0.0.9") == "u1"
+        assert user_key({}, "10.0.0.1") == "10.0.0.1"
+
+    def test_ingress_header_needs_ingress_or_proxy(self, monkeypatch):
+        monkeypatch.setattr(settings, "trusted_proxies", {"10.0.0.9"})
+        monkeypatch.setattr(settings, "snowflake_ingress", False)
+        assert user_key({"sf-context-current-user": "ANA"}, "203.0.113.7") == "203.0.113.7"
+        assert user_key({"sf-context-current-user": "ANA"}, "10.0.0.9") == "ANA"
+
+    def test_client_chosen_user_ids_ignored(self):
+        # Rotating X-User-Id must not buy fresh per-user limits
+        assert {user_key({"x-user-id": f"u{i}"}, "203.0.113.7") for i in range(5)} == {"203.0.113.7"}
+
+    def test_owner_is_user_or_browser_never_address(self, monkeypatch):
+        monkeypatch.setattr(settings, "snowflake_ingress", True)
+        token = new_browser_token()
+        assert owner_key({"sf-context-current-user": "ANA"}, "10.0.0.1", token) == "ANA"
+
+        monkeypatch.setattr(settings, "snowflake_ingress", False)
+        # Two browsers behind one address own different histories
+        first, second = owner_key({}, "10.0.0.1", token), owner_key({}, "10.0.0.1", new_browser_token())
+        assert first.startswith("browser:") and token not in first and first != second
+        assert owner_key({"sf-context-current-user": "ANA"}, "10.0.0.1", None) is None
+        assert owner_key({}, "10.0.0.1", "guessable") is None
+
+    def test_conversations_scoped_by_owner(self, monkeypatch):
+        monkeypatch.setattr(settings, "snowflake_ingress", False)
+        app = StreamingApp(AsyncSQLAgent(SQLAgent(llm=object(), db=object()), llm=SlowAsyncLLM(), db=AsyncDB()))
+
+        def conversation(cookie):
+            headers = {"cookie": f"{BROWSER_COOKIE}={cookie}"} if cookie else {}
+            scope = {"client": ("10.0.0.1", 5000), "headers": [(k.encode(), v.encode()) for k, v in headers.items()]}
+            params, _ = app.parse_question({"message": "And Goodyear?", "conversation_id": "conv-1"}, {}, _owner(scope))
+            return params["conversation_id"]
+
+        first, second = conversation(new_browser_token()), conversation(new_browser_token())
+        # The same client-chosen id names two LAST_RESULT tables, and none without an owner
+        assert first != second and first.endswith("/conv-1")
+        assert conversation(None) is None
+        assert conversation_key("ANA", None) is None
+
+
+class TestJobQueueAdmission:
+    """Test admission in front of background jobs."""
+
+    def test_queued_job_reports_position(self, tmp_path):
+        agent = GatedAgent()
+        admission = AdmissionController(1, 1, 10, 5)
+        jobs = JobQueue(agent, JobStore(str(tmp_path / "jobs.db")), workers=2, admission=admission)
+        first = jobs.submit("First?", user="a")
+        second = jobs.submit("Second?", user="b")
+
+        first_event = next(jobs.follow(second["id"]))
+        agent.gate.set()
+        events = list(jobs.follow(second["id"]))
+
+        assert first_event[1]["queue_position"] == 1
+        assert [seq for seq, _ in events] == list(range(1, len(events) + 1))
+        assert events[-1][1]["error"] is None
+        assert list(jobs.follow(first["id"]))[-1][1]["error"] is None
+        assert admission.stats()["running"] == 0
+
+    def test_rejected_job_is_not_kept(self, tmp_path):
+        agent = GatedAgent()
+        store = JobStore(str(tmp_path / "jobs.db"))
+        jobs = JobQueue(agent, store, workers=1, admission=AdmissionController(1, 1, 0, 0))
+        first = jobs.submit("First?", user="a")
+
+        with pytest.raises(Rejected):
+            jobs.submit("Second?", client_key="k1", user="b")
+        agent.gate.set()
+        list(jobs.follow(first["id"]))
+        # The key is free again for a retry
+        retried = jobs.submit("Second?", client_key="k1", user="b")
+        assert list(jobs.follow(retried["id"]))[-1][1]["type"] == "complete"
+
+
+class TestStreamingAppAdmission:
+    """Test admission on the ASGI stream route."""
+
+    def make_app(self, admission, jobs=None):
+        agent = SQLAgent(llm=object(), db=object())
+        return StreamingApp(
+            AsyncSQLAgent(agent, llm=SlowAsyncLLM(), db=AsyncDB()), jobs=jobs, admission=admission
+        )
+
+    def test_queue_and_shed(self, monkeypatch):
+        monkeypatch.setattr(settings, "snowflake_ingress", True)
+        admission = AdmissionController(1, 1, 1, 1)
+        app = self.make_app(admission)
+
+        async def scenario():
+            return await asyncio.gather(*(
+                request(app, {"message": f"q{i}"}, [("Sf-Context-Current-User", f"u{i}")]) for i in range(3)
+            ))
+
+        responses = asyncio.run(scenario())
+        statuses = sorted(status for status, _, _ in responses)
+
+        assert statuses == [200, 200, 503]
+        shed = next(r for r in responses if r[0] == 503)
+        assert shed[1][b"retry-after"] == b"5"
+        queued = [events for status, _, events in responses if status == 200]
+        assert any(e.get("queue_position") == 1 for events in queued for e in events)
+        assert all(events[-1]["error"] is None for events in queued)
+        assert admission.stats()["running"] == 0
+
+    def test_jobs_release_their_ticket(self, tmp_path):
+        admission = AdmissionController(1, 1, 4, 4)
+        app = self.make_app(admission, jobs=JobStore(str(tmp_path / "jobs.db")))
+
+        async def scenario():
+            return await asyncio.gather(*(request(app, {"message": f"q{i}"}) for i in range(3)))
+
+        responses = asyncio.run(scenario())
+
+        assert all(events[-1]["error"] is None for _, _, events in responses)
+        assert admission.stats()["admitted_total"] == 3
+        assert admission.stats()["running"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,340 @@
+"""Tests for the async streaming path (ASGI app and AsyncSQLAgent)."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from app.agent.async_agent import AsyncSQLAgent
+from app.agent.jobs import JobStore
+from app.agent.sql_agent import SQLAgent
+from app.asgi import CANCELLED, ChatSocketSession, StreamingApp
+from app.database.snowflake import AsyncSnowflakeClient
+from test_snowflake import FakeClient, FakeWarehouse
+
+
+class SlowAsyncLLM:
+    """Streams a fixed answer with a delay, like a remote model."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+
+    async def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                              model_key=None, timeout=None):
+        await asyncio.sleep(self.delay)
+        if user_message.startswith("The user asked"):
+            text = "Michelin is the priciest brand."
+        else:
+            text = "Here you go.\n```sql\nSELECT BRAND, PRICE FROM PRICES\n```"
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+
+class SlowAsyncDB:
+    MAX_ROWS = 1000
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+
+    async def execute_query(self, sql, use_cache=True, timeout=None):
+        await asyncio.sleep(self.delay)
+        return [{"BRAND": f"Brand {i}", "PRICE": 100.0 + i} for i in range(30)]
+
+
+def make_app(delay=0.05, jobs=None):
+    agent = SQLAgent(llm=object(), db=object())
+    return StreamingApp(AsyncSQLAgent(agent, llm=SlowAsyncLLM(delay), db=SlowAsyncDB(delay)), jobs=jobs)
+
+
+async def request(app, body, headers=()):
+    """Drive one HTTP request through the ASGI app; returns (status, body bytes)."""
+    messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    sent = []
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/chat/stream",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    await app(scope, receive, send)
+    done.set()
+    status = sent[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def parse_events(body: bytes) -> list[dict]:
+    return [json.loads(line[6:]) for line in body.decode().split("\n\n") if line.startswith("data: ")]
+
+
+class TestStreamingApp:
+    """Test the native async /api/chat/stream route."""
+
+    def test_event_protocol(self):
+        status, body = asyncio.run(request(make_app(0), {"message": "Which brand is priciest?"}))
+        events = parse_events(body)
+
+        assert status == 200
+        assert [e["type"] for e in events if e["type"] != "token"] == [
+            "sql", "status", "data_ready", "complete"
+        ]
+        assert events[-1]["sql"] == "SELECT BRAND, PRICE FROM PRICES"
+        assert len(events[-1]["data"]) == 30
+        assert "Michelin" in "".join(e["content"] for e in events if e["type"] == "token")
+        assert "budget" in events[-1]
+
+    def test_validation_errors(self):
+        app = make_app(0)
+        assert asyncio.run(request(app, {}))[0] == 400
+        assert asyncio.run(request(app, {"message": "  "}))[0] == 400
+        assert asyncio.run(request(app, {"message": "hi"}, [("X-Request-Deadline", "-1")]))[0] == 400
+
+    def test_streams_run_concurrently(self):
+        app = make_app(delay=0.2)
+
+        async def many(n):
+            return await asyncio.gather(*(request(app, {"message": f"q{i}"}) for i in range(n)))
+
+        start = time.perf_counter()
+        responses = asyncio.run(many(200))
+        elapsed = time.perf_counter() - start
+
+        assert all(status == 200 for status, _ in responses)
+        assert all(parse_events(body)[-1]["error"] is None for _, body in responses)
+        # Three awaited phases of 0.2s each; serially this would take 120s
+        assert elapsed < 5
+
+
+class ScriptedLLM:
+    """Writes a broken query, then fixes it, through both the sync and async interfaces."""
+
+    def _text(self, user_message):
+        if user_message.startswith("The following query failed"):
+            return "Fixed the column.\n```sql\nSELECT BRAND, PRICE FROM PRICES\n```"
+        if user_message.startswith("The user asked"):
+            return "Michelin is the priciest brand."
+        return "Let me look.\n```sql\nSELECT BRAND, PRYCE FROM PRICES\n```"
+
+    def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                        model_key=None, timeout=None):
+        text = self._text(user_message)
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+
+class AsyncScriptedLLM(ScriptedLLM):
+    async def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                              model_key=None, timeout=None):
+        for token in ScriptedLLM.generate_stream(self, user_message, system_prompt):
+            yield token
+
+
+class ColumnCheckingDB:
+    MAX_ROWS = 1000
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        if "PRYCE" in sql:
+            raise RuntimeError("invalid identifier 'PRYCE'")
+        return [{"BRAND": f"Brand {i}", "PRICE": 100.0 + i} for i in range(30)]
+
+
+class AsyncColumnCheckingDB(ColumnCheckingDB):
+    async def execute_query(self, sql, use_cache=True, timeout=None):
+        return ColumnCheckingDB.execute_query(self, sql)
+
+
+class TestAsyncSQLAgent:
+    """Test the async driver runs the same pipeline as SQLAgent.ask_stream."""
+
+    def test_same_events_as_sync(self):
+        agent = SQLAgent(llm=ScriptedLLM(), db=ColumnCheckingDB())
+        async_agent = AsyncSQLAgent(agent, llm=AsyncScriptedLLM(), db=AsyncColumnCheckingDB())
+
+        async def collect():
+            return [event async for event in async_agent.ask_stream("Priciest brand?", conversation_id="a")]
+
+        expected = list(agent.ask_stream("Priciest brand?", conversation_id="s"))
+        events = asyncio.run(collect())
+        for event in expected + events:
+            event.pop("budget", None)
+        assert events == expected
+        assert [e["type"] for e in events if e["type"] in ("error", "complete")] == ["error", "complete"]
+        assert events[-1]["sql"] == "SELECT BRAND, PRICE FROM PRICES" and events[-1]["error"] is None
+        # Both drivers recorded the answered turn
+        assert agent.memory.history("a") == agent.memory.history("s")
+
+
+class SocketClient:
+    """Drives one /api/chat/ws connection through the ASGI app."""
+
+    def __init__(self, app):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        scope = {"type": "websocket", "path": StreamingApp.SOCKET_PATH, "headers": []}
+        self.task = asyncio.create_task(app(scope, self.inbox.get, self._send))
+
+    async def _send(self, message):
+        if message["type"] == "websocket.send":
+            await self.outbox.put(json.loads(message["text"]))
+
+    def post(self, **message):
+        self.inbox.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive(self, timeout=5):
+        return await asyncio.wait_for(self.outbox.get(), timeout)
+
+    async def until_complete(self, count):
+        """Collect messages per stream until ``count`` streams completed."""
+        streams, done = {}, 0
+        while done < count:
+            message = await self.receive()
+            streams.setdefault(message["stream_id"], []).append(message)
+            done += message["type"] == "complete"
+        return streams
+
+    async def close(self):
+        self.inbox.put_nowait({"type": "websocket.disconnect"})
+        await self.task
+
+
+class TestChatSocket:
+    """Test the multiplexed WebSocket route."""
+
+    def test_streams_are_multiplexed(self):
+        async def scenario():
+            client = SocketClient(make_app(0.1))
+            client.post(type="ask", stream_id="a", message="Which brand is priciest?")
+            client.post(type="ask", stream_id="b", message="And the cheapest?")
+            start = time.perf_counter()
+            streams = await client.until_complete(2)
+            elapsed = time.perf_counter() - start
+            await client.close()
+            return streams, elapsed
+
+        streams, elapsed = asyncio.run(scenario())
+
+        for stream_id in ("a", "b"):
+            messages = streams[stream_id]
+            trace_id = messages[0].pop("trace_id")
+            assert messages[0] == {"type": "accepted", "stream_id": stream_id, "job_id": None}
+            assert len(trace_id) == 32
+            assert [m["seq"] for m in messages[1:]] == list(range(1, len(messages)))
+            assert messages[-1]["error"] is None
+            assert len(messages[-1]["data"]) == 30
+        # Both answers (three 0.1s phases each) ran side by side
+        assert elapsed < 0.6
+
+    def test_cancel(self):
+        async def scenario():
+            client = SocketClient(make_app(0.5))
+            client.post(type="ask", stream_id="a", message="Which brand is priciest?")
+            await client.receive()  # accepted
+            client.post(type="cancel", stream_id="a")
+            streams = await client.until_complete(1)
+            await client.close()
+            return streams["a"]
+
+        messages = asyncio.run(scenario())
+        assert messages[-2] == {"type": "error", "stream_id": "a", "content": CANCELLED}
+        assert messages[-1]["error"] == CANCELLED
+
+    def test_cancel_stops_warehouse_query(self):
+        warehouse = FakeWarehouse(seconds=10)
+        agent = SQLAgent(llm=object(), db=object())
+        app = StreamingApp(AsyncSQLAgent(
+            agent, llm=SlowAsyncLLM(0), db=AsyncSnowflakeClient(FakeClient(warehouse))
+        ))
+
+        async def scenario():
+            client = SocketClient(app)
+            client.post(type="ask", stream_id="a", message="Which brand is priciest?")
+            while not warehouse.status_checks:  # executing
+                await asyncio.sleep(0.05)
+            client.post(type="cancel", stream_id="a")
+            streams = await client.until_complete(1)
+            await client.close()
+            return streams["a"]
+
+        messages = asyncio.run(scenario())
+        assert messages[-1]["error"] == CANCELLED
+        assert warehouse.cancelled == ["q1"]
+
+    def test_backpressure_waits_for_acks(self, monkeypatch):
+        monkeypatch.setattr(ChatSocketSession, "WINDOW", 5)
+
+        async def scenario():
+            client = SocketClient(make_app(0))
+            client.post(type="ask", stream_id="a", message="Which brand is priciest?")
+            received = [await client.receive() for _ in range(6)]  # accepted + window
+            with pytest.raises(asyncio.TimeoutError):
+                await client.receive(timeout=0.2)
+
+            # Acknowledging each message keeps the stream flowing
+            rest = []
+            while not rest or rest[-1]["type"] != "complete":
+                client.post(type="ack", stream_id="a", received=len(received) - 1 + len(rest))
+                rest.append(await client.receive())
+            await client.close()
+            return received, rest
+
+        received, rest = asyncio.run(scenario())
+        assert [m["seq"] for m in received[1:]] == [1, 2, 3, 4, 5]
+        assert [m["seq"] for m in rest] == list(range(6, 6 + len(rest)))
+        assert rest[-1]["error"] is None
+
+    def test_jobs_resume_and_cancel(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+
+        async def scenario():
+            app = make_app(0.1, jobs=store)
+            first = SocketClient(app)
+            first.post(type="ask", stream_id="a", message="Which brand is priciest?")
+            first.post(type="ask", stream_id="b", message="And the cheapest?")
+            accepted = {m["stream_id"]: m for m in [await first.receive(), await first.receive()]}
+            first.post(type="cancel", stream_id="b")
+            seen = await first.receive()
+            while seen["stream_id"] != "a":
+                seen = await first.receive()
+            await first.close()  # the tab goes away mid-answer
+
+            second = SocketClient(app)
+            second.post(type="resume", stream_id="a2", job_id=accepted["a"]["job_id"], after=seen["seq"])
+            resumed = (await second.until_complete(1))["a2"]
+            await second.close()
+            return accepted, seen, resumed
+
+        accepted, seen, resumed = asyncio.run(scenario())
+
+        assert resumed[1]["seq"] == seen["seq"] + 1
+        assert resumed[-1]["error"] is None
+        assert store.get(accepted["a"]["job_id"])["status"] == "done"
+        assert store.get(accepted["b"]["job_id"])["result"]["error"] == CANCELLED
+
+    def test_invalid_messages(self):
+        async def scenario():
+            client = SocketClient(make_app(0))
+            client.post(type="ask", stream_id="a", message="  ")
+            streams = await client.until_complete(1)
+            client.inbox.put_nowait({"type": "websocket.receive", "text": "not json"})
+            invalid = await client.receive()
+            await client.close()
+            return streams["a"], invalid
+
+        failed, invalid = asyncio.run(scenario())
+        assert failed[-1]["error"] == "Message cannot be empty"
+        assert invalid == {"type": "error", "stream_id": None, "content": "Invalid message"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+"""Tests for batch question execution."""
+
+import threading
+import time
+
+import pytest
+from app.agent.batch import BatchRunner
+from app.agent.sql_agent import SQLAgent
+from config import settings
+
+
+class EchoLLM:
+    """Turns each question into a query over a fake table."""
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        return f"```sql\nSELECT '{user_message}' AS QUESTION\n```"
+
+
+class FixingLLM(EchoLLM):
+    """Writes a broken query first, and a working one when asked to fix it."""
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        if user_message.startswith("The following query failed"):
+            return "```sql\nSELECT 'fixed' AS QUESTION\n```"
+        return "```sql\nSELECT MISSING_COLUMN AS QUESTION\n```"
+
+
+class SlowDB:
+    """Records peak concurrency of execute_query; queries naming MISSING_COLUMN fail."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if "MISSING_COLUMN" in sql:
+            raise RuntimeError("invalid identifier 'MISSING_COLUMN'")
+        return [{"QUESTION": sql}]
+
+
+class TestBatchRunner:
+    """Test ordering, completion events and per-stage limits."""
+
+    def test_results_in_question_order(self, monkeypatch):
+        monkeypatch.setattr(settings, "batch_execution_concurrency", 2)
+        db = SlowDB()
+        runner = BatchRunner(SQLAgent(llm=EchoLLM(), db=db))
+
+        questions = [f"q{i}" for i in range(10)]
+        events = list(runner.run(questions))
+
+        assert [e["type"] for e in events[:-1]] == ["question_complete"] * 10
+        final = events[-1]
+        assert final["type"] == "batch_complete"
+        assert [r["question"] for r in final["results"]] == questions
+        assert all(r["error"] is None and r["answer"] for r in final["results"])
+        assert db.peak <= 2
+
+    def test_fixed_queries_share_the_execution_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "batch_execution_concurrency", 2)
+        monkeypatch.setattr(settings, "batch_generation_concurrency", 4)
+        db = SlowDB()
+        runner = BatchRunner(SQLAgent(llm=FixingLLM(), db=db))
+
+        results = list(runner.run([f"q{i}" for i in range(10)]))[-1]["results"]
+
+        assert all(r["sql"] == "SELECT 'fixed' AS QUESTION" and r["error"] is None for r in results)
+        assert all(r["answer"].startswith("(Fixed query)") for r in results)
+        assert db.peak <= 2
+
+    def test_concurrent_batches_share_the_limits(self, monkeypatch):
+        monkeypatch.setattr(settings, "batch_execution_concurrency", 2)
+        db = SlowDB()
+        agent = SQLAgent(llm=EchoLLM(), db=db)
+
+        # One runner per request, as the batch route builds them
+        batches = [
+            threading.Thread(target=lambda i=i: list(BatchRunner(agent).run([f"b{i}q{j}" for j in range(5)])))
+            for i in range(3)
+        ]
+        for batch in batches:
+            batch.start()
+        for batch in batches:
+            batch.join()
+
+        assert db.peak <= 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,121 @@
+"""Tests for the cached live schema metadata and its drift report."""
+
+import json
+
+import pytest
+from app.agent import validator
+from app.agent.validator import validate_sql
+from app.database.catalog import RefreshedCache, SchemaCatalog, columns_query
+from app.database.schema import Column, Table
+
+
+SCRAPER = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+
+TABLES = [
+    Table(SCRAPER, "Prices", [Column("KEYWORD", "TEXT", ""), Column("PRICE", "FLOAT", ""),
+                              Column("SELLER_NAME", "TEXT", "")]),
+    Table("PRIORITY_TIRE_DATA.UMIP_MOCK.GA4", "Sessions", [Column("SESSIONS", "NUMBER", "")]),
+    Table("OTHER_DB.PUBLIC.RANKINGS", "Ranks", [Column("RANK", "NUMBER", "")]),
+]
+
+
+class MetadataDB:
+    """Answers the INFORMATION_SCHEMA query; counts round trips."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self.queries = []
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        self.queries.append(sql)
+        scraper = [("KEYWORD", "TEXT"), ("PRICE", "FLOAT"), ("SELLER", "TEXT"), ("BRAND", "TEXT")]
+        rows = [
+            {"TABLE_CATALOG": "PRIORITY_TIRE_DATA", "TABLE_SCHEMA": "UMIP_MOCK",
+             "TABLE_NAME": "GOOGLE_SHOPPING_SCRAPER", "COLUMN_NAME": name, "DATA_TYPE": data_type,
+             "IS_NULLABLE": "YES", "ORDINAL_POSITION": i}
+            for i, (name, data_type) in enumerate(scraper, 1)
+        ]
+        rows.append({"TABLE_CATALOG": "PRIORITY_TIRE_DATA", "TABLE_SCHEMA": "UMIP_MOCK",
+                     "TABLE_NAME": "GA4", "COLUMN_NAME": "SESSIONS", "DATA_TYPE": "NUMBER",
+                     "IS_NULLABLE": "NO", "ORDINAL_POSITION": 1})
+        return rows
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return SchemaCatalog(str(tmp_path / "schema_cache.json"), ttl=3600, tables=TABLES)
+
+
+class TestSchemaCatalog:
+    """Test loading, caching and diffing live metadata."""
+
+    def test_one_query_for_all_tables(self, catalog):
+        db = MetadataDB()
+        catalog.refresh(db)
+        assert len(db.queries) == 1
+
+        sql = columns_query([table.name for table in TABLES])
+        assert "PRIORITY_TIRE_DATA.INFORMATION_SCHEMA.COLUMNS" in sql
+        assert "OTHER_DB.INFORMATION_SCHEMA.COLUMNS" in sql and "UNION ALL" in sql
+        assert "TABLE_NAME IN ('GA4', 'GOOGLE_SHOPPING_SCRAPER')" in sql
+
+    def test_drift(self, catalog):
+        report = catalog.refresh(MetadataDB())
+        assert report["tables"] == {
+            SCRAPER: {"missing": ["SELLER_NAME"], "extra": ["SELLER", "BRAND"]},
+            "OTHER_DB.PUBLIC.RANKINGS": {"missing_table": True},
+        }
+        assert catalog.table_columns("ga4") == [{"name": "SESSIONS", "type": "NUMBER", "nullable": False}]
+
+    def test_disk_cache_and_version(self, catalog, tmp_path):
+        catalog.refresh(MetadataDB())
+        assert not catalog.stale()
+
+        reloaded = SchemaCatalog(catalog.path, ttl=3600, tables=TABLES)
+        assert reloaded.load()
+        assert reloaded.drift() == catalog.drift()
+        assert reloaded.stale(now=reloaded.drift()["fetched_at"] + 3601)
+
+        # A cache written for another set of tables is ignored
+        assert not SchemaCatalog(catalog.path, ttl=3600, tables=TABLES[:1]).load()
+
+        saved = json.loads((tmp_path / "schema_cache.json").read_text())
+        assert saved["version"] == catalog.drift()["version"] and len(saved["version"]) == 16
+
+    def test_truncated_metadata_is_not_trusted(self, catalog):
+        db = MetadataDB()
+        db.MAX_ROWS = 5
+        catalog.refresh(db)
+        assert catalog.columns() is None
+
+    def test_cache_subclasses_must_refresh(self, tmp_path):
+        class Incomplete(RefreshedCache):
+            def _use(self, cache):
+                pass
+
+        with pytest.raises(TypeError, match="refresh"):
+            Incomplete(str(tmp_path / "cache.json"), 60)
+
+
+class TestValidatorUsesCache:
+    """Test that column checks follow the cached live metadata."""
+
+    def test_live_columns_replace_configured_ones(self, catalog, monkeypatch):
+        sql = f"SELECT g.SELLER, g.BRAND FROM {SCRAPER} g"
+        assert validate_sql(sql) == []
+
+        live = SchemaCatalog(catalog.path, ttl=3600)
+        monkeypatch.setattr(validator, "catalog", live)
+        live._use({"complete": True, "tables": {SCRAPER: [{"name": "KEYWORD"}, {"name": "PRICE"}]}})
+
+        assert validate_sql(sql) == [
+            f"Unknown column: g.SELLER (not in {SCRAPER})",
+            f"Unknown column: g.BRAND (not in {SCRAPER})",
+        ]
+        # Tables the metadata lacks still use schema.TABLES
+        assert validate_sql("SELECT a.KEYWORD FROM PRIORITY_TIRE_DATA.UMIP_MOCK.AHREFS_KEYWORDS a") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
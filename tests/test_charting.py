@@ -0,0 +1,76 @@
+"""Tests for server-side chart series and LTTB downsampling."""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from app.utils.charting import MAX_SERIES, build_chart, lttb
+
+
+def trend_rows(keywords=40, weeks=104):
+    """GOOGLE_TRENDS_TIMESERIES-shaped rows, as stored in a job result (dates as text)."""
+    start = date(2023, 1, 2)
+    return [
+        {"KEYWORD": f"keyword {k}", "TREND_DATE": str(start + timedelta(weeks=w)), "INTEREST": k + w % 7}
+        for k in range(keywords) for w in range(weeks)
+    ]
+
+
+class TestLTTB:
+    """Test downsampling keeps the shape of a series."""
+
+    def test_keeps_ends_and_extremes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 40)
+        y[517] = 5.0
+        kept = lttb(x, y, 100)
+        assert len(kept) == 100 and kept[0] == 0 and kept[-1] == 999
+        assert (np.diff(kept) > 0).all()
+        assert 517 in kept
+
+    def test_short_series_untouched(self):
+        assert lttb(np.arange(10.0), np.arange(10.0), 50).tolist() == list(range(10))
+
+
+class TestBuildChart:
+    """Test axis and series detection, aggregation and point budgets."""
+
+    def test_series_per_keyword(self):
+        chart = build_chart(trend_rows(), width=600)
+        assert chart["axis"] == {"column": "TREND_DATE", "type": "time", "bucket": None}
+        assert chart["series_column"] == "KEYWORD" and chart["value_columns"] == ["INTEREST"]
+        assert chart["series_total"] == 40 and len(chart["series"]) == MAX_SERIES
+        # Largest series first; all 104 weeks fit the budget
+        assert chart["series"][0]["name"] == "keyword 39"
+        assert len(chart["series"][0]["x"]) == 104
+        assert chart["series"][0]["x"][0] == 1672617600000  # 2023-01-02 in epoch ms
+
+    def test_epoch_seconds_bucketed_and_downsampled(self):
+        rows = [{"SCRAPED_AT": 1_700_000_000 + i * 60, "PRICE": Decimal(f"{100 + i % 50}.5")} for i in range(50_000)]
+        chart = build_chart(rows, width=300)
+        assert chart["axis"]["type"] == "time" and chart["axis"]["bucket"] == "hour"
+        [series] = chart["series"]
+        assert series["name"] == "PRICE" and len(series["x"]) == 300
+        assert series["x"] == sorted(series["x"])
+
+    def test_duplicates_averaged(self):
+        rows = [{"TREND_DATE": "2024-01-01", "PRICE": 10}, {"TREND_DATE": "2024-01-01", "PRICE": "20"},
+                {"TREND_DATE": "2024-01-08", "PRICE": 30}]
+        [series] = build_chart(rows)["series"]
+        assert series["y"] == [15.0, 30.0]
+
+    def test_month_axis(self):
+        rows = [{"MONTH": month, "AVG_INTEREST": i} for i, month in enumerate(["March", "January", "February"])]
+        chart = build_chart(rows)
+        assert chart["axis"]["type"] == "month"
+        assert chart["series"] == [{"name": "AVG_INTEREST", "x": [1, 2, 3], "y": [1.0, 2.0, 0.0]}]
+
+    def test_nothing_to_chart(self):
+        assert build_chart([]) is None
+        assert build_chart([{"SELLER": "Walmart", "PRICE": 120.0}, {"SELLER": "Tire Rack", "PRICE": 95.0}]) is None
+        assert build_chart([{"TREND_DATE": "2024-01-01", "KEYWORD": "tires"}]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,96 @@
+"""Tests for the server-side conversation store and its search."""
+
+import pytest
+from app.agent.conversations import ConversationStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ConversationStore(str(tmp_path / "conversations.db"))
+
+
+class TestConversationStore:
+    """Test saving, paging and deleting conversations per user."""
+
+    def test_messages_and_result_handles(self, store):
+        store.add_message("ana", "conv-1", "user", "Top Michelin sizes by   price", created_at=100)
+        summary = store.add_message(
+            "ana", "conv-1", "assistant", "Here are the sizes.", sql="SELECT SIZE FROM PRICES",
+            row_count=12, columns=["SIZE"], job_id="job-1", created_at=105
+        )
+
+        assert summary["title"] == "Top Michelin sizes by price"
+        assert summary["message_count"] == 2
+        assert (summary["created_at"], summary["updated_at"]) == (100, 105)
+
+        answer = store.get("ana", "conv-1")["messages"][1]
+        assert answer["sql"] == "SELECT SIZE FROM PRICES"
+        assert (answer["row_count"], answer["columns"], answer["job_id"]) == (12, ["SIZE"], "job-1")
+
+    def test_pages_are_per_user_and_recent_first(self, store):
+        for i in range(5):
+            store.add_message("ana", f"conv-{i}", "user", f"Question {i}", created_at=100 + i)
+        store.add_message("ben", "conv-9", "user", "Someone else's question")
+        store.add_message("ana", "conv-0", "assistant", "Answered again", created_at=200)
+
+        page, total = store.list_conversations("ana", limit=2)
+        assert total == 5
+        assert [c["id"] for c in page] == ["conv-0", "conv-4"]
+        page, _ = store.list_conversations("ana", limit=2, offset=4)
+        assert [c["id"] for c in page] == ["conv-1"]
+        assert store.get("ben", "conv-0") is None
+
+    def test_import_is_idempotent(self, store):
+        messages = [
+            {"role": "user", "content": "Which sellers undercut us?", "created_at": 50},
+            {"role": "assistant", "content": "Three sellers.", "row_count": 3, "columns": ["SELLER"]},
+        ]
+        created = store.import_conversation("ana", "conv-old", "Undercutting", messages, created_at=40)
+        assert created["message_count"] == 2 and created["updated_at"] == 50
+        assert store.import_conversation("ana", "conv-old", "Again", messages) is None
+        assert store.get("ana", "conv-old")["title"] == "Undercutting"
+
+    def test_rename_delete_and_clear(self, store):
+        store.add_message("ana", "conv-1", "user", "Brand share")
+        store.add_message("ana", "conv-2", "user", "Seller share")
+
+        assert store.rename("ana", "conv-1", "Brands")
+        assert not store.rename("ben", "conv-1", "Stolen")
+        assert store.get("ana", "conv-1")["title"] == "Brands"
+
+        assert store.delete("ana", "conv-1")
+        assert not store.delete("ana", "conv-1")
+        assert store.search("ana", "brand") == []
+        assert store.clear("ana") == ["conv-2"]
+        assert store.list_conversations("ana") == ([], 0)
+
+
+class TestSearch:
+    """Test full-text search over message text and SQL."""
+
+    def test_matches_text_and_sql(self, store):
+        store.add_message("ana", "conv-1", "user", "Cheapest Michelin tires")
+        store.add_message("ana", "conv-2", "user", "Seller count")
+        store.add_message("ana", "conv-2", "assistant", "42 sellers.",
+                          sql="SELECT COUNT(DISTINCT MATCHED_SELLER) FROM PRICES")
+        store.add_message("ben", "conv-3", "user", "Michelin for Ben")
+
+        [hit] = store.search("ana", "michel")
+        assert hit["id"] == "conv-1" and "Michelin" in hit["snippet"]
+        [hit] = store.search("ana", "matched_seller prices")
+        assert hit["id"] == "conv-2" and hit["message_id"] == 3
+
+    def test_one_result_per_conversation(self, store):
+        store.add_message("ana", "conv-1", "user", "Michelin prices")
+        store.add_message("ana", "conv-1", "assistant", "Michelin prices rose.")
+        assert [hit["id"] for hit in store.search("ana", "michelin")] == ["conv-1"]
+
+    def test_query_syntax_is_not_exposed(self, store):
+        store.add_message("ana", "conv-1", "user", "Brand share")
+        assert store.search("ana", '") OR NEAR(*') == []
+        assert store.search("ana", "   ") == []
+        assert [hit["id"] for hit in store.search("ana", 'brand"')] == ["conv-1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
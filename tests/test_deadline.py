@@ -0,0 +1,101 @@
+"""Tests for per-request deadlines shared across phases."""
+
+import time
+
+import pytest
+from app.agent.sql_agent import SQLAgent
+from app.utils.deadline import Deadline, DeadlineExceeded
+
+
+class TimedLLM:
+    """Takes a fixed time per call and records the timeouts it was given."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.timeouts = []
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        self.timeouts.append(timeout)
+        time.sleep(self.delay)
+        if "fix the query" in user_message:
+            return "```sql\nSELECT BRAND, PRICE FROM PRICES\n```"
+        if user_message.startswith("The user asked"):
+            return "Michelin is the priciest brand."
+        return "```sql\nSELECT BRAND, PRICE FROM PRICE\n```"
+
+
+class PriceDB:
+    """Fails on PRICE, returns 30 rows from PRICES; records query timeouts."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self.timeouts = []
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        self.timeouts.append(timeout)
+        if "FROM PRICE\n" in sql + "\n":
+            raise RuntimeError("Object 'PRICE' does not exist")
+        return [{"BRAND": f"Brand {i}", "PRICE": 100.0 + i} for i in range(30)]
+
+
+class TestDeadline:
+    """Test budget shares and reporting."""
+
+    def test_share_of_remaining(self):
+        deadline = Deadline(10)
+        assert 4.9 < deadline.share(0.5) <= 5.0
+
+    def test_exhausted_budget_raises(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            deadline.share(0.5)
+
+    def test_report_accumulates_phases(self):
+        deadline = Deadline(10)
+        for _ in range(2):
+            with deadline.phase("execute"):
+                time.sleep(0.01)
+        deadline.skip("summary")
+        report = deadline.report()
+        assert report["budget_ms"] == 10000
+        assert report["phases"]["execute"] >= 20
+        assert report["skipped"] == ["summary"]
+
+
+class TestAgentDeadline:
+    """Test that the agent hands each phase a share of the budget."""
+
+    def test_timeouts_propagated(self):
+        llm, db = TimedLLM(), PriceDB()
+        result = SQLAgent(llm=llm, db=db).ask("Which brand is priciest?", deadline=Deadline(60))
+
+        assert result["answer"].startswith("(Fixed query)")
+        assert all(timeout is not None and timeout <= 60 for timeout in llm.timeouts + db.timeouts)
+        # Each phase gets a share of what is left, so timeouts shrink
+        assert llm.timeouts[0] == pytest.approx(30, abs=0.5)
+        assert set(result["budget"]["phases"]) == {"sql", "execute", "fix", "summary"}
+
+    def test_fix_skipped_when_short(self):
+        llm = TimedLLM(delay=0.05)
+        result = SQLAgent(llm=llm, db=PriceDB()).ask("Which brand is priciest?", deadline=Deadline(1))
+
+        assert result["error"] == "Object 'PRICE' does not exist"
+        assert result["budget"]["skipped"] == ["fix"]
+        assert len(llm.timeouts) == 1
+
+    def test_summary_degrades_when_short(self):
+        agent = SQLAgent(llm=TimedLLM(), db=PriceDB())
+        agent.MIN_PHASE_SECONDS = {"fix": 0.0, "summary": 120.0}
+
+        result = agent.ask("Which brand is priciest?", deadline=Deadline(60))
+
+        assert result["data"] and result["error"] is None
+        assert "not enough time left" in result["answer"]
+        assert result["budget"]["skipped"] == ["summary"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
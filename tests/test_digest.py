@@ -0,0 +1,59 @@
+"""Tests for result digests used in summary prompts."""
+
+from decimal import Decimal
+
+import pytest
+from app.utils.digest import build_result_digest, estimate_tokens
+
+
+def make_rows(count):
+    sellers = ["Walmart", "Tire Rack", "Priority Tire", "Giga Tires"]
+    return [
+        {
+            "SELLER": sellers[i % len(sellers)],
+            "KEYWORD": f"275/60R{i % 7 + 15}",
+            "PRICE": Decimal(f"{100 + i}.50"),
+            "POSITION": i % 10 + 1,
+        }
+        for i in range(count)
+    ]
+
+
+class TestResultDigest:
+    """Test digest content and budgeting."""
+
+    def test_empty_results(self):
+        assert build_result_digest([]) == "No rows returned."
+
+    def test_stats_cover_all_rows(self):
+        digest = build_result_digest(make_rows(1000))
+        assert "Rows: 1000" in digest
+        # Max price comes from the last row, far beyond any prefix sample
+        assert "1099.5" in digest
+        assert "PRICE by SELLER" in digest
+
+    def test_decimal_columns_are_numeric(self):
+        digest = build_result_digest(make_rows(10))
+        assert "| PRICE |" in digest
+
+    def test_small_results_include_all_rows(self):
+        digest = build_result_digest(make_rows(3))
+        assert "All 3 rows" in digest
+
+    def test_respects_token_budget(self):
+        digest = build_result_digest(make_rows(1000), max_tokens=200)
+        assert estimate_tokens(digest) <= 200
+
+    def test_truncated_digest_fits_budget(self):
+        # Too small a budget for even the column statistics
+        digest = build_result_digest(make_rows(1000), max_tokens=50)
+        assert estimate_tokens(digest) <= 50
+
+    def test_smaller_than_repr(self):
+        rows = make_rows(1000)
+        digest = build_result_digest(rows)
+        assert len(digest) < len(str(rows[:20])) * 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
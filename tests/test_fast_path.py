@@ -0,0 +1,60 @@
+"""Tests for deterministic fast-path answers."""
+
+import pytest
+from app.agent.fast_path import render_fast_answer, format_value
+
+
+class TestFastPathShapes:
+    """Test which result shapes skip the summary LLM call."""
+
+    def test_empty(self):
+        answer = render_fast_answer([])
+        assert answer.shape == "empty"
+
+    def test_scalar(self):
+        answer = render_fast_answer([{"KEYWORD_COUNT": 1234}])
+        assert answer.shape == "scalar"
+        assert "1,234" in answer.text
+
+    def test_short_list(self):
+        rows = [{"BRAND": b} for b in ["Michelin", "Goodyear", "Bridgestone"]]
+        answer = render_fast_answer(rows)
+        assert answer.shape == "list"
+        assert "Goodyear" in answer.text
+
+    def test_single_row_comparison(self):
+        answer = render_fast_answer([{"SELLER": "Walmart", "AVG_PRICE": 189.5, "LISTINGS": 42}])
+        assert answer.shape == "comparison"
+        assert "$189.50" in answer.text
+
+    def test_non_trivial_needs_llm(self):
+        rows = [{"KEYWORD": f"k{i}", "VOLUME": i} for i in range(30)]
+        assert render_fast_answer(rows) is None
+
+
+class TestValueFormatting:
+    """Test formatting grounded in schema column metadata."""
+
+    def test_revenue_is_currency(self):
+        assert format_value("TOTAL_REVENUE", 55000) == "$55,000.00"
+
+    def test_rate_is_percentage(self):
+        assert format_value("USER_KEY_EVENT_RATE", 0.0782) == "7.82%"
+
+    def test_count_has_separators(self):
+        assert format_value("VOLUME", 92000) == "92,000"
+
+    def test_counts_of_prices_are_not_currency(self):
+        assert format_value("PRICE_COUNT", 42) == "42"
+        assert format_value("COUNT_PRICE", 4210) == "4,210"
+        assert format_value("NUM_PRICE_POINTS", 12) == "12"
+        assert render_fast_answer([{"PRICE_COUNT": 4210}]).text == "**Price count:** **4,210**"
+
+    def test_units_come_from_schema_not_alias(self):
+        # An alias merely containing "price" carries no unit
+        assert format_value("PRICE_SPREAD", 35) == "35"
+        assert format_value("MIN_OLD_PRICE", 99.5) == "$99.50"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,251 @@
+"""Tests for question jobs and their resumable event log."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from app.agent.async_agent import AsyncSQLAgent
+from app.agent.jobs import JobQueue, JobRecorder, JobStore
+from app.agent.sql_agent import SQLAgent
+from app.asgi import StreamingApp
+
+
+class CountingAgent:
+    """Streams a fixed answer and counts how often it was asked."""
+
+    def __init__(self, release: threading.Event | None = None):
+        self.calls = 0
+        self.release = release
+
+    def ask_stream(self, question, llm_summary=False, conversation_id=None, deadline=None):
+        self.calls += 1
+        yield {"type": "sql", "content": "SELECT 1"}
+        for char in "Michelin ":
+            yield {"type": "token", "content": char}
+        if self.release:
+            self.release.wait(5)
+        for char in "leads.":
+            yield {"type": "token", "content": char}
+        yield {"type": "complete", "sql": "SELECT 1", "data": [{"N": 1}], "error": None}
+
+
+class CountingAsyncLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                              model_key=None, timeout=None):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        text = "Done." if user_message.startswith("The user asked") else "```sql\nSELECT BRAND FROM PRICES\n```"
+        for char in text:
+            yield char
+
+
+class AsyncDB:
+    MAX_ROWS = 1000
+
+    async def execute_query(self, sql, use_cache=True, timeout=None):
+        return [{"BRAND": f"Brand {i}"} for i in range(30)]
+
+
+def answer_text(events):
+    return "".join(event["content"] for _, event in events if event["type"] == "token")
+
+
+class TestJobRecorder:
+    """Test event numbering and token batching."""
+
+    def test_tokens_are_merged(self):
+        recorder = JobRecorder()
+        recorder.FLUSH_SECONDS = 60
+        assert recorder.add({"type": "sql", "content": "SELECT 1"})
+        recorder.take()
+        assert not recorder.add({"type": "token", "content": "a"})
+        assert not recorder.add({"type": "token", "content": "b"})
+        assert not recorder.add({"type": "complete", "sql": "SELECT 1", "data": [], "error": None})
+
+        assert recorder.take() == [
+            (2, {"type": "token", "content": "ab"}),
+            (3, {"type": "complete", "sql": "SELECT 1", "data": [], "error": None}),
+        ]
+        assert recorder.result() == {"answer": "ab", "sql": "SELECT 1", "data": [], "error": None}
+
+
+class TestJobQueue:
+    """Test running, following and resuming jobs."""
+
+    def test_result_and_events_are_stored(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        jobs = JobQueue(CountingAgent(), store, workers=1)
+        job = jobs.submit("Who leads?")
+
+        events = list(jobs.follow(job["id"]))
+        assert [seq for seq, _ in events] == list(range(1, len(events) + 1))
+        assert answer_text(events) == "Michelin leads."
+        assert events[-1][1]["type"] == "complete"
+
+        stored = store.get(job["id"])
+        assert stored["status"] == "done"
+        assert stored["result"]["answer"] == "Michelin leads."
+        assert stored["result"]["data"] == [{"N": 1}]
+
+    def test_resume_after_last_event_id(self, tmp_path):
+        release = threading.Event()
+        agent = CountingAgent(release)
+        jobs = JobQueue(agent, JobStore(str(tmp_path / "jobs.db")), workers=1)
+        job = jobs.submit("Who leads?")
+
+        # The client drops after the first event...
+        first = next(jobs.follow(job["id"]))
+        release.set()
+        # ...and reconnects with Last-Event-ID
+        rest = list(jobs.follow(job["id"], after=first[0]))
+
+        assert rest[0][0] == first[0] + 1
+        assert answer_text([first] + rest) == "Michelin leads."
+        assert agent.calls == 1
+
+    def test_idempotency_key_reuses_job(self, tmp_path):
+        agent = CountingAgent()
+        jobs = JobQueue(agent, JobStore(str(tmp_path / "jobs.db")), workers=1)
+        first = jobs.submit("Who leads?", client_key="tab-1-msg-1")
+        list(jobs.follow(first["id"]))
+        second = jobs.submit("Who leads?", client_key="tab-1-msg-1")
+
+        assert second["id"] == first["id"]
+        assert agent.calls == 1
+
+    def test_interrupted_job_is_closed(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        job, _ = store.create("Who leads?", None, False, deadline_seconds=1)
+
+        store.expire(now=job["created_at"] + 1 + store.GRACE_SECONDS + 1)
+        status, events = store.poll(job["id"], 0)
+
+        assert status == "failed"
+        assert [event["type"] for _, event in events] == ["error", "complete"]
+        assert store.get(job["id"])["result"]["error"]
+
+    def test_polls_reuse_connection_and_expiry(self, tmp_path, monkeypatch):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        job, _ = store.create("Who leads?", None, False, deadline_seconds=1)
+        sweeps = []
+        monkeypatch.setattr(store, "expire", lambda now=None: sweeps.append(now))
+
+        connection = store._connect()
+        for _ in range(20):
+            store.poll(job["id"], 0)
+        assert store._connect() is connection
+        # Swept on open; the next sweep is EXPIRE_SECONDS away
+        assert sweeps == []
+
+        store._next_expiry = 0
+        store.poll(job["id"], 0)
+        store.get(job["id"])
+        assert len(sweeps) == 1
+
+    def test_follower_of_local_job_does_not_poll(self, tmp_path, monkeypatch):
+        release = threading.Event()
+        store = JobStore(str(tmp_path / "jobs.db"))
+        jobs = JobQueue(CountingAgent(release), store, workers=1)
+        job = jobs.submit("Who leads?")
+        polls = []
+        poll = store.poll
+        monkeypatch.setattr(store, "poll", lambda *args: polls.append(args) or poll(*args))
+
+        events = []
+        follower = threading.Thread(target=lambda: events.extend(jobs.follow(job["id"])))
+        follower.start()
+        time.sleep(0.2)
+        before = len(polls)
+        # Nothing is written while the job waits, so its follower sleeps
+        time.sleep(4 * JobQueue.POLL_SECONDS)
+        idle = len(polls) - before
+        release.set()
+        follower.join(5)
+
+        assert events[-1][1]["type"] == "complete"
+        assert idle == 0
+
+
+class TestAsyncJobs:
+    """Test job-backed streams on the ASGI app."""
+
+    async def _request(self, app, method, path, body=None, headers=(), stop_after=None):
+        """Drive one request; with stop_after, disconnect after that many events."""
+        messages = [{"type": "http.request", "body": json.dumps(body or {}).encode(), "more_body": False}]
+        sent = []
+        done = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if stop_after and sum(b"data: " in m.get("body", b"") for m in sent) >= stop_after:
+                done.set()
+
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [(k.encode(), v.encode()) for k, v in headers],
+        }
+        await app(scope, receive, send)
+        done.set()
+        start = sent[0]
+        frames = b"".join(m.get("body", b"") for m in sent[1:]).decode().split("\n\n")
+        events = []
+        for frame in frames:
+            lines = dict(line.split(": ", 1) for line in frame.split("\n") if ": " in line)
+            if "data" in lines:
+                events.append((int(lines["id"]), json.loads(lines["data"])))
+        return start, events
+
+    def test_reconnect_does_not_rerun(self, tmp_path):
+        llm = CountingAsyncLLM()
+        agent = SQLAgent(llm=object(), db=object())
+        app = StreamingApp(
+            AsyncSQLAgent(agent, llm=llm, db=AsyncDB()), jobs=JobStore(str(tmp_path / "jobs.db"))
+        )
+
+        async def scenario():
+            start, first = await self._request(
+                app, "POST", "/api/chat/stream", {"message": "Which brands?"}, stop_after=1
+            )
+            job_id = dict(start["headers"])[b"x-job-id"].decode()
+            _, rest = await self._request(
+                app, "GET", f"/api/jobs/{job_id}/events", headers=[("Last-Event-ID", str(first[-1][0]))]
+            )
+            _, retried = await self._request(
+                app, "POST", "/api/chat/stream", {"message": "Which brands?"},
+                headers=[("Idempotency-Key", "k1")]
+            )
+            _, again = await self._request(
+                app, "POST", "/api/chat/stream", {"message": "Which brands?"},
+                headers=[("Idempotency-Key", "k1")]
+            )
+            return first, rest, retried, again
+
+        first, rest, retried, again = asyncio.run(scenario())
+
+        assert rest[0][0] == first[-1][0] + 1
+        assert rest[-1][1]["type"] == "complete"
+        assert len(rest[-1][1]["data"]) == 30
+        assert again == retried
+        # Two questions asked (SQL + summary each); the reconnect and the retry cost nothing
+        assert llm.calls == 4
+        # Followers that left, early or at the end, leave no wake-up behind
+        assert app._signals == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
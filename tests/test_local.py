@@ -0,0 +1,70 @@
+"""Tests for in-process refinement of cached results."""
+
+import pytest
+from app.database.local import LocalResultEngine
+
+
+ROWS = [
+    {"BRAND": "Michelin", "TOTAL_REVENUE": 5000.0},
+    {"BRAND": "Goodyear", "TOTAL_REVENUE": 7000.0},
+    {"BRAND": "Michelin", "TOTAL_REVENUE": 1000.0},
+]
+
+
+class TestLocalResultEngine:
+    """Test caching and querying of previous results."""
+
+    def setup_method(self):
+        self.engine = LocalResultEngine()
+        self.engine.store("conv-1", ROWS, complete=True)
+
+    def test_filter_and_sort(self):
+        rows = self.engine.execute_query(
+            "conv-1",
+            "SELECT * FROM LAST_RESULT WHERE BRAND = 'Michelin' ORDER BY TOTAL_REVENUE DESC"
+        )
+        assert [r["TOTAL_REVENUE"] for r in rows] == [5000.0, 1000.0]
+
+    def test_previous_result_is_joinable(self):
+        self.engine.store("conv-1", [{"BRAND": "Michelin", "SHARE": 0.4}], complete=True)
+        rows = self.engine.execute_query(
+            "conv-1",
+            "SELECT p.BRAND, SUM(p.TOTAL_REVENUE) AS REV FROM PREVIOUS_RESULT p "
+            "JOIN LAST_RESULT l ON p.BRAND = l.BRAND GROUP BY p.BRAND"
+        )
+        assert rows == [{"BRAND": "Michelin", "REV": 6000.0}]
+
+    def test_truncated_results_not_offered(self):
+        self.engine.store("conv-2", ROWS, complete=False)
+        assert self.engine.describe("conv-2") is None
+        assert "LAST_RESULT (3 rows)" in self.engine.describe("conv-1")
+
+    def test_truncated_results_not_queried(self):
+        self.engine.store("conv-1", ROWS, complete=False)
+        with pytest.raises(ValueError, match="row limit"):
+            self.engine.execute_query("conv-1", "SELECT COUNT(*) AS N FROM LAST_RESULT")
+        # The complete result before it is still queryable
+        rows = self.engine.execute_query("conv-1", "SELECT COUNT(*) AS N FROM PREVIOUS_RESULT")
+        assert rows == [{"N": 3}]
+
+    def test_list_and_struct_columns_are_plain(self):
+        rows = self.engine.execute_query(
+            "conv-1",
+            "SELECT LIST(TOTAL_REVENUE ORDER BY TOTAL_REVENUE) AS REVENUES, "
+            "{'brands': LIST(DISTINCT BRAND ORDER BY BRAND)} AS INFO FROM LAST_RESULT"
+        )
+        # numpy arrays would break jsonify and the digest
+        assert rows == [{"REVENUES": [1000.0, 5000.0, 7000.0], "INFO": {"brands": ["Goodyear", "Michelin"]}}]
+        assert type(rows[0]["REVENUES"]) is list
+
+    def test_file_access_blocked(self):
+        with pytest.raises(Exception):
+            self.engine.execute_query("conv-1", "SELECT * FROM read_csv('/etc/hosts')")
+
+    def test_references_local(self):
+        assert self.engine.references_local("select * from last_result")
+        assert not self.engine.references_local("SELECT * FROM PRIORITY_TIRE_DATA.UMIP_MOCK.KEYWORDS_MASTER")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
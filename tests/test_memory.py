@@ -0,0 +1,41 @@
+"""Tests for server-side conversation memory."""
+
+import pytest
+from app.agent.memory import ConversationMemory
+from app.utils.digest import estimate_tokens
+
+
+class TestConversationMemory:
+    """Test history rendering and compaction."""
+
+    def test_new_conversation_is_empty(self):
+        assert ConversationMemory().history("conv-1") == []
+
+    def test_history_alternates_roles(self):
+        memory = ConversationMemory()
+        memory.record("conv-1", "How many brands?", "SELECT COUNT(*) AS N FROM t", [{"N": 3}], "There are 3.")
+        messages = memory.history("conv-1")
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert "SELECT COUNT(*)" in messages[1]["content"]
+
+    def test_conversations_are_isolated(self):
+        memory = ConversationMemory()
+        memory.record("conv-1", "q1", None, None, "a1")
+        assert memory.history("conv-2") == []
+
+    def test_compaction_keeps_history_bounded(self):
+        memory = ConversationMemory(max_tokens=300)
+        for i in range(50):
+            rows = [{"KEYWORD": f"tire {j}", "VOLUME": j * i} for j in range(20)]
+            memory.record("conv-1", f"question number {i}", f"SELECT * FROM t WHERE x = {i}", rows, "answer " * 40)
+
+        messages = memory.history("conv-1")
+        total = sum(estimate_tokens(m["content"]) for m in messages)
+        assert total <= 300 * 2
+        assert messages[0]["content"].startswith("Summary of earlier questions")
+        # Most recent turn is kept verbatim
+        assert messages[-2]["content"] == "question number 49"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
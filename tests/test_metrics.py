@@ -0,0 +1,151 @@
+"""Tests for the Prometheus metrics registry and pipeline instrumentation."""
+
+import multiprocessing
+import sqlite3
+
+import pytest
+from app.agent.sql_agent import SQLAgent
+from app.utils import metrics
+from app.utils.metrics import Counter, Histogram, Registry
+
+
+class FixingLLM:
+    """First query targets a missing table; the fix and a blocked query are scripted."""
+
+    model = "test-model"
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        if "fix the query" in user_message:
+            return "```sql\nSELECT BRAND FROM PRICES\n```"
+        if user_message.startswith("The user asked"):
+            return "Michelin leads."
+        if "drop" in user_message:
+            return "```sql\nDROP TABLE PRICES\n```"
+        return "```sql\nSELECT BRAND FROM PRICE\n```"
+
+    def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                        model_key=None, timeout=None):
+        yield from self.generate(user_message, system_prompt)
+
+
+class PriceDB:
+    MAX_ROWS = 1000
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        if "FROM PRICE\n" in sql + "\n":
+            raise RuntimeError("Object 'PRICE' does not exist")
+        return [{"BRAND": f"Brand {i}"} for i in range(30)]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh registry, so test metrics do not collide with the app's."""
+    fresh = Registry()
+    monkeypatch.setattr(metrics, "registry", fresh)
+    return fresh
+
+
+class TestRegistry:
+    """Test the text exposition format."""
+
+    def test_counter_and_histogram(self, registry):
+        errors = Counter("test_errors_total", "Errors.", ("stage",))
+        latency = Histogram("test_latency_seconds", "Latency.", ("phase",), buckets=(0.1, 1))
+        errors.inc(stage="execute")
+        errors.inc(2, stage="execute")
+        latency.observe(0.05, phase="sql")
+        latency.observe(5, phase="sql")
+
+        text = registry.render()
+
+        assert "# TYPE test_errors_total counter" in text
+        assert 'test_errors_total{stage="execute"} 3' in text
+        assert 'test_latency_seconds_bucket{phase="sql",le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{phase="sql",le="1"} 1' in text
+        assert 'test_latency_seconds_bucket{phase="sql",le="+Inf"} 2' in text
+        assert 'test_latency_seconds_count{phase="sql"} 2' in text
+        assert 'test_latency_seconds_sum{phase="sql"} 5.05' in text
+
+    def test_labels_are_checked(self, registry):
+        errors = Counter("test_errors_total", "Errors.", ("stage",))
+        with pytest.raises(ValueError):
+            errors.inc(phase="sql")
+        with pytest.raises(ValueError):
+            Counter("test_errors_total", "Again.")
+
+    def test_collectors(self, registry):
+        registry.add_collector(lambda: [("test_queued", "gauge", "Queued.", [({}, 4)])])
+        assert "test_queued 4" in registry.render()
+
+    def test_shared_across_worker_processes(self, registry, tmp_path):
+        path = str(tmp_path / "metrics.db")
+        errors = Counter("test_errors_total", "Errors.", ("stage",))
+        latency = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1))
+        queued = [4]
+        registry.add_collector(lambda: [("test_queued", "gauge", "Queued.", [({}, queued[0])])])
+
+        def worker():
+            # A forked worker, as under gunicorn: its own values, same file
+            registry.share(path)
+            errors.inc(5, stage="execute")
+            latency.observe(2)
+            queued[0] = 2
+            registry.publish()
+
+        child = multiprocessing.get_context("fork").Process(target=worker)
+        child.start()
+        child.join(10)
+        assert child.exitcode == 0
+        registry.share(path)
+        errors.inc(stage="execute")
+        latency.observe(0.05)
+
+        text = registry.render()
+        assert 'test_errors_total{stage="execute"} 6' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 2' in text
+        assert "test_latency_seconds_sum 2.05" in text
+        assert "test_queued 6" in text
+
+        # An exited worker's counts are kept, its gauges dropped once stale
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE snapshots SET published_at = 0 WHERE worker != ?", (registry._worker[1],))
+        text = registry.render()
+        assert 'test_errors_total{stage="execute"} 6' in text
+        assert "test_queued 4" in text
+
+
+class TestInstrumentation:
+    """Test counters and histograms recorded by SQLAgent."""
+
+    def test_fix_and_phases(self):
+        agent = SQLAgent(llm=FixingLLM(), db=PriceDB())
+        fixed = metrics.FIX_ATTEMPTS.value(outcome="fixed")
+        errors = metrics.ERRORS.value(stage="execute")
+        summaries = metrics.LLM_GENERATION.count(model="test-model", phase="summary")
+        warehouse = metrics.SQL_EXECUTION.count(source="warehouse")
+
+        result = agent.ask("Which brands?", llm_summary=True)
+
+        assert result["error"] is None
+        assert metrics.FIX_ATTEMPTS.value(outcome="fixed") == fixed + 1
+        assert metrics.ERRORS.value(stage="execute") == errors + 1
+        assert metrics.LLM_GENERATION.count(model="test-model", phase="summary") == summaries + 1
+        assert metrics.SQL_EXECUTION.count(source="warehouse") == warehouse + 1
+
+    def test_stream_records_first_token_and_blocked_queries(self):
+        agent = SQLAgent(llm=FixingLLM(), db=PriceDB())
+        blocked = metrics.QUERIES_BLOCKED.value()
+        first_tokens = metrics.LLM_FIRST_TOKEN.count(model="test-model", phase="sql")
+        questions = metrics.QUESTIONS.value(mode="stream", outcome="error")
+
+        events = list(agent.ask_stream("Please drop the prices"))
+
+        assert events[-1]["error"]
+        assert metrics.QUERIES_BLOCKED.value() == blocked + 1
+        assert metrics.LLM_FIRST_TOKEN.count(model="test-model", phase="sql") == first_tokens + 1
+        assert metrics.QUESTIONS.value(mode="stream", outcome="error") == questions + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
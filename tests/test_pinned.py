@@ -0,0 +1,71 @@
+"""Tests for pinned questions and their refresh scheduler."""
+
+import pytest
+from app.agent.pinned import PinnedStore, PinScheduler, freshness_column
+from app.agent.sql_agent import SQLAgent
+
+
+AHREFS = "PRIORITY_TIRE_DATA.UMIP_MOCK.AHREFS_KEYWORDS"
+
+
+class LoadTrackingDB:
+    """Serves a settable LOADED_AT and counts pinned query runs."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self.loaded_at = "2026-01-01T00:00:00"
+        self.runs = 0
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        if "MAX(LOADED_AT)" in sql:
+            return [{"T0": self.loaded_at}]
+        self.runs += 1
+        return [{"KEYWORD_COUNT": 42}]
+
+
+class TestPinScheduler:
+    """Test that pins refresh only when their tables change."""
+
+    def setup_method(self):
+        self.db = LoadTrackingDB()
+        self.agent = SQLAgent(llm=object(), db=self.db)
+
+    def test_refresh_only_on_new_load(self, tmp_path):
+        store = PinnedStore(str(tmp_path / "pins.db"))
+        scheduler = PinScheduler(self.agent, store)
+        pin = store.add("How many keywords?", f"SELECT COUNT(*) AS KEYWORD_COUNT FROM {AHREFS}", 300)
+
+        scheduler.tick(now=1000)
+        assert self.db.runs == 1
+        assert "42" in store.get(pin["id"])["answer"]
+
+        # Due again, but the table has not been reloaded
+        scheduler.tick(now=2000)
+        assert self.db.runs == 1
+
+        self.db.loaded_at = "2026-01-02T00:00:00"
+        scheduler.tick(now=3000)
+        assert self.db.runs == 2
+
+    def test_find_by_question(self, tmp_path):
+        store = PinnedStore(str(tmp_path / "pins.db"))
+        pin = store.add("How many keywords?", f"SELECT COUNT(*) AS KEYWORD_COUNT FROM {AHREFS}", 300)
+        assert store.find("how many keywords") is None  # not refreshed yet
+
+        PinScheduler(self.agent, store).tick(now=1000)
+        assert store.find("  How many   keywords ")["id"] == pin["id"]
+
+    def test_lease_is_exclusive(self, tmp_path):
+        store = PinnedStore(str(tmp_path / "pins.db"))
+        assert store.acquire_lease("worker-1", ttl=60)
+        assert not store.acquire_lease("worker-2", ttl=60)
+        assert store.acquire_lease("worker-1", ttl=60)
+
+    def test_freshness_column(self):
+        assert freshness_column(AHREFS) == "LOADED_AT"
+        assert freshness_column("PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_TRENDS_TIMESERIES") == "FETCHED_AT"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
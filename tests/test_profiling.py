@@ -0,0 +1,89 @@
+"""Tests for the on-demand request profiler."""
+
+import threading
+import time
+
+import pytest
+from app.agent.jobs import JobQueue, JobStore
+from app.utils.profiling import Profiler
+
+
+def spin(seconds):
+    """Busy loop that shows up in the samples."""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+class SpinningAgent:
+    def ask_stream(self, question, llm_summary=False, conversation_id=None, deadline=None):
+        spin(0.2)
+        yield {"type": "complete", "sql": None, "data": None, "error": None}
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return Profiler(str(tmp_path / "profiles"), token="secret", interval=0.005, keep=2)
+
+
+class TestProfiler:
+    """Test sampling, saving and retention."""
+
+    def test_token(self, profiler):
+        assert profiler.authorized("secret")
+        assert not profiler.authorized("wrong")
+        assert not profiler.authorized(None)
+        assert not Profiler("unused").authorized("")
+
+    def test_samples_attached_threads_only(self, profiler):
+        other = threading.Thread(target=spin, args=(0.3,))
+        other.start()
+        profile = profiler.start(route="/api/chat", trace_id="t" * 32)
+        thread = profile.attach()
+        spin(0.2)
+        profile.detach(thread)
+        other.join()
+
+        folded = open(profiler.path(profile.id)).read()
+        stacks = dict(line.rsplit(" ", 1) for line in folded.splitlines())
+        assert any("spin (tests/test_profiling.py" in stack for stack in stacks)
+        assert not any("Thread.run" in stack for stack in stacks)
+        assert sum(int(count) for count in stacks.values()) == profile.samples > 10
+
+        [saved] = profiler.recent()
+        assert saved["id"] == profile.id
+        assert saved["route"] == "/api/chat" and saved["trace_id"] == "t" * 32
+        assert saved["threads"] == 1 and saved["duration_ms"] >= 200
+
+    def test_keeps_the_newest(self, profiler):
+        ids = []
+        for _ in range(3):
+            profile = profiler.start()
+            profile.detach(profile.attach())
+            ids.append(profile.id)
+            time.sleep(0.01)
+
+        assert [p["id"] for p in profiler.recent()] == ids[:0:-1]
+        assert profiler.path(ids[0]) is None
+        assert profiler.path("../../etc/passwd") is None
+
+    def test_job_worker_is_sampled(self, profiler, tmp_path):
+        jobs = JobQueue(SpinningAgent(), JobStore(str(tmp_path / "jobs.db")), workers=1)
+        profile = profiler.start(route="/api/chat/stream")
+        thread = profile.attach()
+        job = jobs.submit("Which brands?", profile=profile)
+        list(jobs.follow(job["id"]))
+        profile.detach(thread)
+
+        # The worker detaches once the job is written; the profile is then saved
+        for _ in range(100):
+            if profiler.recent():
+                break
+            time.sleep(0.05)
+        folded = open(profiler.path(profile.id)).read()
+        assert "SpinningAgent.ask_stream" in folded
+        assert profiler.recent()[0]["threads"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,115 @@
+"""Tests for the record/replay harness and offline end-to-end runs."""
+
+import pytest
+from app.agent.sql_agent import SQLAgent
+from app.utils.recording import (
+    Cassette,
+    RecordingLLMClient,
+    RecordingSnowflakeClient,
+    ReplayMissError,
+)
+from config import settings
+
+
+class FakeLLM:
+    """Stands in for the live providers while recording."""
+
+    current_provider = "hyperbolic"
+    model = settings.llm_model
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        if "fix the query" in user_message:
+            return "```sql\nSELECT BRAND, PRICE FROM PRICES\n```"
+        if user_message.startswith("The user asked"):
+            return "Michelin is the priciest brand."
+        return "```sql\nSELECT BRAND, PRICE FROM PRICE\n```"
+
+    def generate_stream(self, user_message, system_prompt, conversation_history=None, model_key=None,
+                        timeout=None):
+        text = self.generate(user_message, system_prompt, conversation_history)
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+
+class FakeDB:
+    """Stands in for Snowflake while recording."""
+
+    MAX_ROWS = 1000
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        if "FROM PRICE\n" in sql + "\n":
+            raise RuntimeError("Object 'PRICE' does not exist")
+        return [{"BRAND": f"Brand {i}", "PRICE": 100.0 + i} for i in range(30)]
+
+
+def record_session(path, stream=False):
+    cassette = Cassette(path)
+    agent = SQLAgent(
+        llm=RecordingLLMClient(cassette, llm=FakeLLM()),
+        db=RecordingSnowflakeClient(cassette, db=FakeDB())
+    )
+    if stream:
+        return list(agent.ask_stream("Which brand is priciest?"))
+    return agent.ask("Which brand is priciest?")
+
+
+def without_budget(result):
+    """Drop the per-phase timings, which vary from run to run."""
+    return {key: value for key, value in result.items() if key != "budget"}
+
+
+def replay_agent(path):
+    cassette = Cassette(path)
+    return SQLAgent(llm=RecordingLLMClient(cassette), db=RecordingSnowflakeClient(cassette))
+
+
+class TestRecordReplay:
+    """Test that recorded sessions replay deterministically without network."""
+
+    def test_ask_replays_identically(self, tmp_path):
+        path = str(tmp_path / "session.json")
+        recorded = record_session(path)
+        assert recorded["answer"].startswith("(Fixed query)")
+
+        replayed = replay_agent(path).ask("Which brand is priciest?")
+        assert without_budget(replayed) == without_budget(recorded)
+
+    def test_stream_replays_identically(self, tmp_path):
+        path = str(tmp_path / "session.json")
+        recorded = record_session(path, stream=True)
+
+        replayed = list(replay_agent(path).ask_stream("Which brand is priciest?"))
+        assert [without_budget(e) for e in replayed] == [without_budget(e) for e in recorded]
+
+    def test_stream_chunk_timings_recorded(self, tmp_path):
+        path = str(tmp_path / "session.json")
+        record_session(path, stream=True)
+
+        interactions = [i for recs in Cassette(path).data["llm"].values() for i in recs]
+        assert all("chunks" in i for i in interactions)
+        assert all(offset >= 0 for i in interactions for offset, _ in i["chunks"])
+
+    def test_recording_appends_until_flushed(self, tmp_path):
+        path = tmp_path / "session.json"
+        cassette = Cassette(str(path))
+        cassette.add("db", "k1", {"rows": [1]})
+        cassette.add("db", "k1", {"rows": [2]})
+
+        # Each interaction is one appended line; the fixture is written once
+        assert not path.exists()
+        assert len((tmp_path / "session.json.jsonl").read_text().splitlines()) == 2
+        assert Cassette(str(path)).data["db"]["k1"] == [{"rows": [1]}, {"rows": [2]}]
+
+        cassette.flush()
+        assert not (tmp_path / "session.json.jsonl").exists()
+        assert Cassette(str(path)).data["db"]["k1"] == [{"rows": [1]}, {"rows": [2]}]
+
+    def test_unrecorded_request_raises(self, tmp_path):
+        llm = RecordingLLMClient(Cassette(str(tmp_path / "empty.json")))
+        with pytest.raises(ReplayMissError):
+            llm.generate("never recorded", "system")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
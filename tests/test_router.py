@@ -0,0 +1,99 @@
+"""Tests for complexity-based model routing."""
+
+import json
+
+import pytest
+from app.agent.router import ModelRouter, schema_footprint, summarize_log
+from app.agent.sql_agent import SQLAgent
+from config import settings
+
+
+class RecordingLLM:
+    """Returns a fixed response and records the model key of every call."""
+
+    def __init__(self, response):
+        self.response = response
+        self.model_keys = []
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        self.model_keys.append(model_key)
+        return self.response
+
+
+class ListDB:
+    MAX_ROWS = 1000
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        return [{"KEYWORD": f"tire {i}", "VOLUME": i * 100, "SELLER": "x"} for i in range(20)]
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(settings, "routing_enabled", True)
+    monkeypatch.setattr(settings, "routing_threshold", 3.0)
+    monkeypatch.setattr(settings, "routing_sql_tier", "auto")
+    monkeypatch.setattr(settings, "routing_summary_tier", "auto")
+    monkeypatch.setattr(settings, "routing_fix_tier", "strong")
+
+
+class TestClassifier:
+    """Test question features and tiers."""
+
+    def test_schema_footprint(self):
+        tables = schema_footprint("Which ahrefs keywords have the highest volume?")
+        assert tables == ["PRIORITY_TIRE_DATA.UMIP_MOCK.AHREFS_KEYWORDS"]
+        assert schema_footprint("hello there") == []
+
+    def test_simple_lookup_is_fast(self, routing, tmp_path):
+        decision = ModelRouter(str(tmp_path / "r.jsonl")).route("How many ahrefs keywords are there?")
+        assert decision.tier == "fast"
+        assert decision.model("sql") == settings.routing_fast_model
+        assert decision.model("fix") == settings.routing_strong_model
+
+    def test_multi_table_trend_is_strong(self, routing, tmp_path):
+        decision = ModelRouter(str(tmp_path / "r.jsonl")).route(
+            "Compare google shopping prices against ahrefs keyword volume by month over the last year"
+        )
+        assert decision.tier == "strong"
+        assert decision.features["tables"] >= 2
+        assert decision.model("summary") == settings.routing_strong_model
+
+    def test_conversational_is_fast(self, routing, tmp_path):
+        decision = ModelRouter(str(tmp_path / "r.jsonl")).route("Hello, what can you do?")
+        assert decision.features["conversational"]
+        assert decision.tier == "fast"
+
+    def test_unknown_model_fails_at_startup(self, routing, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, "routing_strong_model", "claude-sonet")
+        with pytest.raises(ValueError, match="ROUTING_STRONG_MODEL"):
+            ModelRouter(str(tmp_path / "r.jsonl"))
+
+    def test_disabled_uses_global_model(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, "routing_enabled", False)
+        decision = ModelRouter(str(tmp_path / "r.jsonl")).route("Compare prices vs volume by month")
+        assert decision.model("sql") is None
+
+
+class TestAgentRouting:
+    """Test that each phase is sent to its routed model and logged."""
+
+    def test_phases_use_routed_models(self, routing, tmp_path):
+        llm = RecordingLLM("```sql\nSELECT KEYWORD, VOLUME, SELLER FROM PRIORITY_TIRE_DATA.UMIP_MOCK.AHREFS_KEYWORDS\n```")
+        agent = SQLAgent(llm=llm, db=ListDB())
+        agent.router = ModelRouter(str(tmp_path / "routing.jsonl"))
+
+        result = agent.ask("List ahrefs keywords")
+        assert result["error"] is None
+        # SQL generation and summary both on the fast model
+        assert llm.model_keys == [settings.routing_fast_model] * 2
+
+        entry = json.loads((tmp_path / "routing.jsonl").read_text())
+        assert entry["tier"] == "fast" and entry["success"]
+
+        report = summarize_log(str(tmp_path / "routing.jsonl"))
+        assert report["tiers"]["fast"]["count"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
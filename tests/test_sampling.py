@@ -0,0 +1,141 @@
+"""Tests for approximate answers from sampled queries."""
+
+import pytest
+from app.agent.sampling import sample_percent, sample_query
+from app.agent.sql_agent import SQLAgent
+from config import settings
+
+
+SCRAPER = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+MASTER = "PRIORITY_TIRE_DATA.UMIP_MOCK.KEYWORDS_MASTER"
+TABLES = {SCRAPER}
+
+SPREAD = f"SELECT g.SELLER, MAX(g.PRICE) - MIN(g.PRICE) AS SPREAD FROM {SCRAPER} g GROUP BY g.SELLER"
+
+
+class SpreadDB:
+    """Answers every query; records them, and can fail sampled ones."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self, fail_sampled=False):
+        self.queries = []
+        self.fail_sampled = fail_sampled
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        self.queries.append(sql)
+        if "SAMPLE" in sql:
+            if self.fail_sampled:
+                raise RuntimeError("sampling not supported")
+            return [{"SELLER": "Walmart", "SPREAD": 80.0}]
+        return [{"SELLER": "Walmart", "SPREAD": 95.0}, {"SELLER": "Tire Rack", "SPREAD": 60.0}]
+
+
+class SpreadLLM:
+    """Writes the spread query and records summary prompts."""
+
+    def __init__(self):
+        self.summaries = []
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        return self._respond(user_message)
+
+    def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                        model_key=None, timeout=None):
+        yield self._respond(user_message)
+
+    def _respond(self, user_message):
+        if user_message.startswith("The user asked"):
+            self.summaries.append(user_message)
+            return "Walmart has the widest spread."
+        return f"```sql\n{SPREAD}\n```"
+
+
+class TestSampleQuery:
+    """Test rewriting queries to read a sample."""
+
+    def test_after_alias(self):
+        assert sample_query(SPREAD, 10, TABLES) == SPREAD.replace(" g GROUP", " g SAMPLE SYSTEM (10) GROUP")
+
+    def test_without_alias_and_short_name(self):
+        sql = "SELECT AVG(PRICE) FROM GOOGLE_SHOPPING_SCRAPER WHERE PRICE > 100"
+        assert sample_query(sql, 2.5, TABLES) == \
+            "SELECT AVG(PRICE) FROM GOOGLE_SHOPPING_SCRAPER SAMPLE SYSTEM (2.5) WHERE PRICE > 100"
+
+    def test_only_large_tables_in_joins(self):
+        sql = (f"SELECT m.CATEGORY, AVG(g.PRICE) FROM {MASTER} m "
+               f"JOIN {SCRAPER} AS g ON g.KEYWORD = m.KEYWORD GROUP BY m.CATEGORY")
+        rewritten = sample_query(sql, 10, TABLES)
+        assert rewritten.count("SAMPLE SYSTEM") == 1
+        assert f"JOIN {SCRAPER} AS g SAMPLE SYSTEM (10) ON" in rewritten
+
+    def test_nothing_to_sample(self):
+        # Row listings, already sampled queries, other tables, table names in literals
+        assert sample_query(f"SELECT * FROM {SCRAPER} ORDER BY PRICE LIMIT 10", 10, TABLES) is None
+        assert sample_query(SPREAD.replace(" g GROUP", " g SAMPLE (5) GROUP"), 10, TABLES) is None
+        assert sample_query(f"SELECT COUNT(*) FROM {MASTER}", 10, TABLES) is None
+        assert sample_query(
+            f"SELECT COUNT(*) FROM {MASTER} WHERE KEYWORD = 'from GOOGLE_SHOPPING_SCRAPER'", 10, TABLES
+        ) is None
+
+    def test_counts_and_totals_only_as_ratios(self):
+        # A sample's count or total is a fraction of the true one
+        assert sample_query(f"SELECT COUNT(*) FROM {SCRAPER} WHERE PRICE > 100", 10, TABLES) is None
+        assert sample_query(f"SELECT SELLER, SUM(PRICE) FROM {SCRAPER} GROUP BY SELLER", 10, TABLES) is None
+        assert sample_query(
+            f"SELECT SELLER, AVG(PRICE) FROM {SCRAPER} GROUP BY SELLER HAVING COUNT(*) > 50", 10, TABLES
+        ) is None
+        # In a ratio the factor cancels
+        for share in (
+            "COUNT_IF(PRICE < 100) / COUNT(*)",
+            "ROUND(100.0 * COUNT_IF(PRICE < 100) / NULLIF(COUNT(*), 0), 1)",
+            "SUM(PRICE)::FLOAT / SUM(QUANTITY)",
+        ):
+            assert sample_query(f"SELECT SELLER, {share} FROM {SCRAPER} GROUP BY SELLER", 10, TABLES)
+
+    def test_sample_percent(self):
+        assert sample_percent(sample_query(SPREAD, 10, TABLES)) == 10.0
+        assert sample_percent("SELECT * FROM T TABLESAMPLE BERNOULLI (0.5)") == 0.5
+        assert sample_percent(SPREAD) is None
+
+
+class TestApproximateStream:
+    """Test the preview event and what replaces it."""
+
+    def test_preview_then_exact(self):
+        db = SpreadDB()
+        events = list(SQLAgent(llm=SpreadLLM(), db=db).ask_stream("Price spread by seller?", approximate=True))
+
+        [preview] = [event for event in events if event["type"] == "preview"]
+        assert preview["sample_percent"] == settings.sample_percent and preview["row_count"] == 1
+        complete = events[-1]
+        assert complete["sql"] == SPREAD and len(complete["data"]) == 2
+        assert "approximate" not in complete
+        assert db.queries == [preview["sql"], SPREAD]
+
+    def test_answer_from_sample(self, monkeypatch):
+        monkeypatch.setattr(settings, "approximate_exact", False)
+        db, llm = SpreadDB(), SpreadLLM()
+        events = list(SQLAgent(llm=llm, db=db).ask_stream(
+            "Price spread by seller?", llm_summary=True, approximate=True
+        ))
+
+        assert len(db.queries) == 1
+        assert events[-1]["approximate"] == {"sample_percent": settings.sample_percent}
+        assert "sample of the table" in llm.summaries[0]
+
+    def test_failed_preview_falls_back_to_exact(self):
+        db = SpreadDB(fail_sampled=True)
+        events = list(SQLAgent(llm=SpreadLLM(), db=db).ask_stream("Price spread by seller?", approximate=True))
+        assert not [event for event in events if event["type"] == "preview"]
+        assert events[-1]["sql"] == SPREAD and len(events[-1]["data"]) == 2
+
+    def test_off_by_default(self):
+        db = SpreadDB()
+        list(SQLAgent(llm=SpreadLLM(), db=db).ask_stream("Price spread by seller?"))
+        assert db.queries == [SPREAD]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,153 @@
+"""Tests for the Snowflake clients (result cache, async status polling, cancel)."""
+
+import asyncio
+import itertools
+import threading
+
+import pytest
+from app.database.snowflake import AsyncSnowflakeClient, SnowflakeClient
+from config import settings
+
+
+class FakeWarehouse:
+    """Queries run for ``seconds`` unless cancelled; records every connection opened."""
+
+    def __init__(self, seconds=0.2):
+        self.seconds = seconds
+        self.connections = []
+        self.running: dict[str, int] = {}  # query id -> status checks left
+        self.cancelled: list[str] = []
+        self.status_checks: list[tuple[int, str]] = []  # (connection number, query id)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+
+class FakeCursor:
+    description = [("BRAND",), ("PRICE",)]
+
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.sfqid = None
+
+    def execute(self, sql):
+        if "SYSTEM$CANCEL_QUERY" in sql:
+            self.warehouse.cancelled.append(sql.split("'")[1])
+
+    def execute_async(self, sql):
+        self.sfqid = f"q{next(self.warehouse.ids)}"
+        self.warehouse.running[self.sfqid] = max(1, int(self.warehouse.seconds / AsyncSnowflakeClient.POLL_INTERVAL))
+
+    def get_results_from_sfqid(self, query_id):
+        self.sfqid = query_id
+
+    def fetchmany(self, size):
+        return [("Michelin", 199.0)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        with warehouse.lock:
+            warehouse.connections.append(self)
+            self.number = len(warehouse.connections)
+
+    def cursor(self):
+        return FakeCursor(self.warehouse)
+
+    def get_query_status_throw_if_error(self, query_id):
+        with self.warehouse.lock:
+            self.warehouse.status_checks.append((self.number, query_id))
+            left = self.warehouse.running.get(query_id, 0)
+            if left:
+                self.warehouse.running[query_id] = left - 1
+            return left
+
+    def is_still_running(self, status):
+        return status > 0
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class FakeClient(SnowflakeClient):
+    def __init__(self, warehouse):
+        super().__init__()
+        self.warehouse = warehouse
+
+    def _connect(self):
+        return FakeConnection(self.warehouse)
+
+
+class TestResultCache:
+    """Test cached results are private copies and the TTL setting."""
+
+    def test_callers_cannot_change_cached_rows(self):
+        warehouse = FakeWarehouse()
+        db = FakeClient(warehouse)
+        first = db.execute_query("SELECT BRAND, PRICE FROM PRICES")
+        first[0]["PRICE"] = 0.0
+        first.append({"BRAND": "Extra", "PRICE": 1.0})
+
+        assert db.execute_query("SELECT BRAND, PRICE FROM PRICES") == [{"BRAND": "Michelin", "PRICE": 199.0}]
+
+    def test_ttl_zero_disables(self, monkeypatch):
+        monkeypatch.setattr(settings, "result_cache_ttl_seconds", 0)
+        db = FakeClient(FakeWarehouse())
+        db.execute_query("SELECT BRAND, PRICE FROM PRICES")
+        assert db._cache_get("SELECT BRAND, PRICE FROM PRICES") is None
+
+
+class TestAsyncSnowflakeClient:
+    """Test queries are polled, and cancelled in the warehouse when abandoned."""
+
+    def test_result(self):
+        warehouse = FakeWarehouse(seconds=0.3)
+        db = AsyncSnowflakeClient(FakeClient(warehouse))
+        results = asyncio.run(db.execute_query("SELECT BRAND, PRICE FROM PRICES"))
+        assert results == [{"BRAND": "Michelin", "PRICE": 199.0}]
+        assert not warehouse.cancelled
+
+    def test_one_status_connection_for_many_queries(self):
+        warehouse = FakeWarehouse(seconds=0.5)
+        client = FakeClient(warehouse)
+        db = AsyncSnowflakeClient(client)
+
+        async def scenario():
+            return await asyncio.gather(*(db.execute_query(f"SELECT {i} AS N FROM PRICES") for i in range(40)))
+
+        assert len(asyncio.run(scenario())) == 40
+        # Every status check of every query went over the same connection
+        assert len({number for number, _ in warehouse.status_checks}) == 1
+        assert len({query_id for _, query_id in warehouse.status_checks}) == 40
+
+    def test_cancel_mid_poll_cancels_query(self):
+        warehouse = FakeWarehouse(seconds=10)
+        db = AsyncSnowflakeClient(FakeClient(warehouse))
+
+        async def scenario():
+            task = asyncio.create_task(db.execute_query("SELECT BRAND, PRICE FROM PRICES"))
+            await asyncio.sleep(0.6)
+            assert warehouse.status_checks
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+        assert warehouse.cancelled == ["q1"]
+
+    def test_timeout_cancels_query(self):
+        warehouse = FakeWarehouse(seconds=10)
+        db = AsyncSnowflakeClient(FakeClient(warehouse))
+        with pytest.raises(TimeoutError):
+            asyncio.run(db.execute_query("SELECT BRAND, PRICE FROM PRICES", timeout=0.5))
+        assert warehouse.cancelled == ["q1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
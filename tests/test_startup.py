@@ -0,0 +1,37 @@
+"""Tests for lazy provider and connector imports."""
+
+import subprocess
+import sys
+
+import pytest
+
+
+def imported_after(code: str) -> set[str]:
+    """Top-level modules loaded by a fresh interpreter running ``code``."""
+    probe = f"{code}\nimport sys\nprint(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    return set(completed.stdout.split())
+
+
+class TestLazyImports:
+    """Test that clients load their SDKs on first use only."""
+
+    def test_clients_import_nothing_until_used(self):
+        modules = imported_after(
+            "from app.agent.llm import AsyncLLMClient, LLMClient\n"
+            "from app.database.snowflake import SnowflakeClient\n"
+            "AsyncLLMClient(LLMClient()); SnowflakeClient()"
+        )
+        assert not {"anthropic", "openai", "snowflake"} & modules
+
+    def test_only_the_called_provider_is_loaded(self):
+        modules = imported_after(
+            "from app.agent.llm import LLMClient\n"
+            "llm = LLMClient()\n"
+            "assert llm.anthropic_client is llm.anthropic_client"
+        )
+        assert "anthropic" in modules and "openai" not in modules
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,226 @@
+"""Tests for request tracing spans and their export."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from app.agent.async_agent import AsyncSQLAgent
+from app.agent.jobs import JobQueue, JobStore
+from app.agent.sql_agent import SQLAgent
+from app.asgi import StreamingApp
+from app.utils import tracing
+from app.utils.tracing import Tracer, to_otlp
+
+
+class FixingLLM:
+    """First query targets a missing table; the fix is scripted."""
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        if "fix the query" in user_message:
+            return "```sql\nSELECT BRAND FROM PRICES\n```"
+        if user_message.startswith("The user asked"):
+            return "Michelin leads."
+        return "```sql\nSELECT BRAND FROM PRICE\n```"
+
+    def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                        model_key=None, timeout=None):
+        yield from self.generate(user_message, system_prompt)
+
+
+class PriceDB:
+    MAX_ROWS = 1000
+
+    def execute_query(self, sql, use_cache=True, timeout=None):
+        if "FROM PRICE\n" in sql + "\n":
+            raise RuntimeError("Object 'PRICE' does not exist")
+        return [{"BRAND": f"Brand {i}"} for i in range(30)]
+
+
+class AsyncLLM:
+    async def generate_stream(self, user_message, system_prompt, conversation_history=None,
+                              model_key=None, timeout=None):
+        yield "Done." if user_message.startswith("The user asked") else "```sql\nSELECT 1 AS N\n```"
+
+
+class AsyncDB:
+    MAX_ROWS = 1000
+
+    async def execute_query(self, sql, use_cache=True, timeout=None):
+        return [{"N": 1}]
+
+
+class Captured(list):
+    """Stands in for the tracer, keeping finished spans in memory."""
+
+    def export(self, span):
+        self.append(span)
+
+    def names(self) -> list[str]:
+        return [span.name for span in self]
+
+    def named(self, name: str) -> tracing.Span:
+        return next(span for span in self if span.name == name)
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    captured = Captured()
+    monkeypatch.setattr(tracing, "tracer", captured)
+    return captured
+
+
+class TestSpans:
+    """Test span nesting and trace continuation."""
+
+    def test_nesting_and_errors(self, spans):
+        with tracing.span("request") as root:
+            with tracing.span("child"):
+                assert tracing.current_trace_id() == root.trace_id
+            with pytest.raises(ValueError):
+                with tracing.span("failing"):
+                    raise ValueError("boom")
+            assert tracing.current_span() is root
+        assert tracing.current_span() is None
+
+        child, failing = spans.named("child"), spans.named("failing")
+        assert child.parent_id == failing.parent_id == root.span_id
+        assert child.trace_id == root.trace_id
+        assert failing.status == "error" and failing.error == "boom"
+        assert root.parent_id is None and root.end_ns >= child.end_ns
+
+    def test_traceparent_continues_a_trace(self, spans):
+        header = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+        with tracing.span("request", traceparent=header) as root:
+            pass
+        assert root.trace_id == "a" * 32
+        assert root.parent_id == "b" * 16
+
+        with tracing.span("request", traceparent="garbage") as other:
+            pass
+        assert other.parent_id is None and len(other.trace_id) == 32
+
+    def test_generator_closed_late_keeps_current_span(self, spans):
+        def tokens():
+            with tracing.span("llm.stream"):
+                yield "a"
+                yield "b"
+
+        with tracing.span("request") as root:
+            stream = tokens()
+            next(stream)
+            with tracing.span("stage") as stage:
+                pass
+        # The abandoned stream is closed after its parent ended
+        stream.close()
+
+        assert tracing.current_span() is None
+        assert stage.parent_id == spans.named("llm.stream").span_id
+        assert spans.named("llm.stream").parent_id == root.span_id
+
+
+class TestExport:
+    """Test the JSON-lines and OTLP encodings."""
+
+    def test_jsonl(self, tmp_path, spans):
+        with tracing.span("request", route="/api/chat") as root:
+            root.add_event("first_token")
+        tracer = Tracer("jsonl", str(tmp_path / "traces" / "spans.jsonl"))
+        tracer._write([root])
+
+        line = json.loads((tmp_path / "traces" / "spans.jsonl").read_text())
+        assert line["trace_id"] == root.trace_id
+        assert line["attributes"] == {"route": "/api/chat"}
+        assert line["events"][0]["name"] == "first_token"
+        assert line["duration_ms"] >= 0
+
+    def test_otlp(self, spans):
+        with tracing.span("request") as root:
+            with tracing.span("db.execute", rows=3, cached=False):
+                pass
+
+        payload = to_otlp(list(spans), "umip")
+        resource = payload["resourceSpans"][0]
+        encoded = {span["name"]: span for span in resource["scopeSpans"][0]["spans"]}
+        assert resource["resource"]["attributes"][0]["value"] == {"stringValue": "umip"}
+        assert encoded["db.execute"]["parentSpanId"] == root.span_id
+        assert "parentSpanId" not in encoded["request"]
+        assert {"key": "rows", "value": {"intValue": "3"}} in encoded["db.execute"]["attributes"]
+        assert {"key": "cached", "value": {"boolValue": False}} in encoded["db.execute"]["attributes"]
+
+
+class TestPipeline:
+    """Test the spans recorded for a question."""
+
+    def test_ask_timeline(self, spans):
+        agent = SQLAgent(llm=FixingLLM(), db=PriceDB())
+        with tracing.span("POST /api/chat") as request:
+            result = agent.ask("Which brands?", llm_summary=True)
+
+        assert result["error"] is None
+        names = spans.names()
+        for name in ("prompt.build", "llm.sql", "sql.extract", "sql.safety_check",
+                     "sql.execute", "agent.fix", "llm.fix", "llm.summary", "agent.ask"):
+            assert name in names
+        ask = spans.named("agent.ask")
+        assert ask.parent_id == request.span_id
+        assert spans.named("agent.fix").attributes["fixed"] is True
+        assert spans.named("agent.fix").parent_id == spans.named("agent.ask").span_id
+        failed = [s for s in spans if s.name == "sql.execute" and s.status == "error"]
+        assert len(failed) == 1 and "PRICE" in failed[0].error
+        assert all(span.trace_id == request.trace_id for span in spans)
+
+    def test_stream_records_first_token(self, spans):
+        agent = SQLAgent(llm=FixingLLM(), db=PriceDB())
+        events = list(agent.ask_stream("Which brands?", llm_summary=True))
+
+        assert events[-1]["error"] is None
+        assert spans.named("llm.sql").events[0]["name"] == "first_token"
+        assert spans.named("agent.ask_stream").attributes["rows"] == 30
+
+    def test_job_runs_under_the_submitting_request(self, spans, tmp_path):
+        agent = SQLAgent(llm=FixingLLM(), db=PriceDB())
+        jobs = JobQueue(agent, JobStore(str(tmp_path / "jobs.db")), workers=1)
+        with tracing.span("POST /api/chat/stream") as request:
+            job = jobs.submit("Which brands?")
+        list(jobs.follow(job["id"]))
+
+        # The job's span ends just after its complete event is written
+        for _ in range(100):
+            if "job.run" in spans.names():
+                break
+            time.sleep(0.05)
+        run = spans.named("job.run")
+        assert run.parent_id == request.span_id
+        assert spans.named("agent.ask_stream").parent_id == run.span_id
+
+    def test_asgi_trace_header(self, spans):
+        app = StreamingApp(AsyncSQLAgent(SQLAgent(llm=FixingLLM(), db=PriceDB()), AsyncLLM(), AsyncDB()))
+        sent = []
+        messages = [{
+            "type": "http.request", "more_body": False,
+            "body": json.dumps({"message": "How many?", "llm_summary": True}).encode(),
+        }]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(5)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/api/chat/stream", "headers": []}
+        asyncio.run(app(scope, receive, send))
+
+        trace_id = dict(sent[0]["headers"])[b"x-trace-id"].decode()
+        request = spans.named("POST /api/chat/stream")
+        assert request.trace_id == trace_id and request.parent_id is None
+        assert spans.named("agent.ask_stream").parent_id == request.span_id
+        assert spans.named("sql.execute").trace_id == trace_id
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,77 @@
+"""Tests for static SQL validation and speculative candidate selection."""
+
+import pytest
+from app.agent.sql_agent import SQLAgent
+from app.agent.validator import validate_sql
+from config import settings
+
+
+SCRAPER = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+
+
+class TestValidateSQL:
+    """Test table and column checks against schema.TABLES."""
+
+    def test_valid_query(self):
+        sql = f"SELECT g.SELLER, AVG(g.PRICE) FROM {SCRAPER} g GROUP BY 1"
+        assert validate_sql(sql) == []
+
+    def test_unknown_table(self):
+        assert validate_sql("SELECT * FROM PRIORITY_TIRE_DATA.UMIP_MOCK.NOPE") == [
+            "Unknown table: PRIORITY_TIRE_DATA.UMIP_MOCK.NOPE"
+        ]
+
+    def test_unknown_qualified_column(self):
+        problems = validate_sql(f"SELECT g.SELLER_NAME FROM {SCRAPER} AS g")
+        assert len(problems) == 1
+        assert "SELLER_NAME" in problems[0]
+
+    def test_ctes_and_local_tables_allowed(self):
+        sql = f"WITH t AS (SELECT KEYWORD FROM {SCRAPER}) SELECT * FROM t JOIN LAST_RESULT l ON l.KEYWORD = t.KEYWORD"
+        assert validate_sql(sql) == []
+
+    def test_from_inside_expressions_ignored(self):
+        sql = "SELECT EXTRACT(MONTH FROM TREND_DATE) FROM PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_TRENDS_TIMESERIES"
+        assert validate_sql(sql) == []
+
+    def test_literals_ignored(self):
+        sql = f"SELECT * FROM {SCRAPER} WHERE KEYWORD ILIKE '%from nowhere.x%'"
+        assert validate_sql(sql) == []
+
+
+class CandidateLLM:
+    """Returns a different draft per temperature."""
+
+    drafts = {
+        0.0: f"```sql\nSELECT * FROM {SCRAPER}\n```",
+        0.5: f"```sql\nSELECT SELLER FROM {SCRAPER} WHERE KEYWORD = '275/60R20'\n```",
+        1.0: "```sql\nSELECT * FROM MADE_UP_TABLE\n```",
+    }
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        return self.drafts[temperature]
+
+
+class CostDB:
+    """EXPLAIN costs proportional to how selective the query is."""
+
+    MAX_ROWS = 1000
+
+    def explain(self, sql):
+        return {"bytes_assigned": 100 if "WHERE" in sql else 10_000}
+
+
+class TestSpeculativeCandidates:
+    """Test that the cheapest valid candidate is chosen."""
+
+    def test_cheapest_valid_candidate_wins(self, monkeypatch):
+        monkeypatch.setattr(settings, "speculative_candidates", 3)
+        agent = SQLAgent(llm=CandidateLLM(), db=CostDB())
+
+        response = agent._generate_speculative("question", None, None)
+        assert "WHERE KEYWORD" in response
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
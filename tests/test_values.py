@@ -0,0 +1,135 @@
+"""Tests for the distinct-value dictionary and its lookup from questions."""
+
+import pytest
+from app.agent import sql_agent
+from app.agent.sql_agent import SQLAgent
+from app.database.values import SCRAPER, ValueDictionary, normalize, tire_sizes, values_query
+
+
+MASTER = "PRIORITY_TIRE_DATA.UMIP_MOCK.KEYWORDS_MASTER"
+
+SOURCES = [(SCRAPER, "KEYWORD"), (SCRAPER, "BRAND"), (SCRAPER, "SELLER"), (MASTER, "KEYWORD")]
+
+VALUES = [
+    (0, "275/60R20", 900), (0, "michelin crossclimate 2 225/65r17", 40), (0, "CrossClimate2", 60),
+    (0, "225/65R17", 800), (0, "goodyear wrangler 275/60r20", 30),
+    (1, "Michelin", 500), (1, "Goodyear", 400), (1, "Bridgestone", 300),
+    (2, "Giga Tires", 200), (2, "Tire Rack", 150), (2, "Walmart", 700),
+    (3, "crossclimate 2", 1),
+]
+
+
+class ValuesDB:
+    """Answers the distinct-values query; records the row limit it was given."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self.calls = []
+
+    def execute_query(self, sql, use_cache=True, timeout=None, max_rows=None):
+        self.calls.append((sql, max_rows))
+        return [{"SOURCE": source, "VALUE": value, "ROW_COUNT": rows} for source, value, rows in VALUES]
+
+
+class NoteLLM:
+    """Records SQL generation prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                 model_key=None, timeout=None):
+        if user_message.startswith("The user asked"):
+            return "Done."
+        self.prompts.append(user_message)
+        return "```sql\nSELECT 1\n```"
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    values = ValueDictionary(str(tmp_path / "value_dictionary.json"), ttl=3600, sources=SOURCES)
+    values.refresh(ValuesDB())
+    return values
+
+
+class TestSpellings:
+    """Test normalization and tire size recognition."""
+
+    def test_normalize(self):
+        assert normalize("Cross Climate 2") == normalize("CrossClimate-2") == "crossclimate2"
+
+    def test_tire_sizes(self):
+        for spelling in ["275/60R20", "275/60 r20", "275-60-20", "275 60 20", "2756020", "P275/60ZR20"]:
+            assert tire_sizes(f"prices for {spelling} tires") == ["275/60R20"]
+        assert tire_sizes("top 100 sellers in 2024") == []
+        assert tire_sizes("1234567") == []
+
+
+class TestValueDictionary:
+    """Test loading and resolving distinct values."""
+
+    def test_one_query_and_disk_cache(self, dictionary):
+        db = ValuesDB()
+        dictionary.refresh(db)
+        [(sql, max_rows)] = db.calls
+        assert sql == values_query(SOURCES) and sql.count("UNION ALL") == 3
+        assert max_rows == ValueDictionary.FETCH_LIMIT
+
+        reloaded = ValueDictionary(dictionary.path, ttl=3600, sources=SOURCES)
+        assert reloaded.load() and not reloaded.stale()
+        assert reloaded.describe("giga tires") == dictionary.describe("giga tires")
+        assert not ValueDictionary(dictionary.path, ttl=3600, sources=SOURCES[:2]).load()
+
+    def test_spacing_insensitive(self, dictionary):
+        [match] = dictionary.resolve("Cross Climate 2 prices")
+        assert (match.term, match.kind) == ("Cross Climate 2", "exact")
+        assert match.values == {f"{SCRAPER}.KEYWORD": ["CrossClimate2"], f"{MASTER}.KEYWORD": ["crossclimate 2"]}
+
+        [match] = dictionary.resolve("how is crossclimate-2 doing")
+        assert match.kind == "exact"
+
+    def test_contained_and_fuzzy(self, dictionary):
+        matches = {match.term: match for match in dictionary.resolve("Michelen prices at giga tire")}
+        assert matches["Michelen"].kind == "fuzzy"
+        assert matches["Michelen"].values == {f"{SCRAPER}.BRAND": ["Michelin"]}
+        assert matches["giga tire"].kind == "contains"
+        assert matches["giga tire"].values == {f"{SCRAPER}.SELLER": ["Giga Tires"]}
+
+    def test_tire_sizes_resolve_to_keywords(self, dictionary):
+        [match] = dictionary.resolve("Who sells 2756020 cheapest?")
+        assert (match.term, match.kind) == ("275/60R20", "size")
+        assert match.values == {f"{SCRAPER}.KEYWORD": ["275/60R20", "goodyear wrangler 275/60r20"]}
+
+    def test_question_words_are_not_values(self, dictionary):
+        assert dictionary.resolve("What are the cheapest tires this month?") == []
+
+    def test_describe(self, dictionary, monkeypatch):
+        note = dictionary.describe("Walmart vs Tire Rack for 225/65R17")
+        assert "- \"225/65R17\": GOOGLE_SHOPPING_SCRAPER.KEYWORD IN ('225/65R17', 'michelin crossclimate 2 225/65r17')" in note
+        assert "- \"Walmart\": GOOGLE_SHOPPING_SCRAPER.SELLER = 'Walmart'" in note
+        assert "- \"Tire Rack\": GOOGLE_SHOPPING_SCRAPER.SELLER = 'Tire Rack'" in note
+
+        monkeypatch.setattr(ValueDictionary, "MAX_LISTED", 1)
+        assert "2 values (e.g. '225/65R17', 'michelin crossclimate 2 225/65r17'), too many to list" in \
+            dictionary.describe("225/65R17")
+
+
+class TestAgentUsesValues:
+    """Test that resolved values reach the SQL generation prompt."""
+
+    def test_note_appended_to_question(self, dictionary, monkeypatch):
+        monkeypatch.setattr(sql_agent, "dictionary", dictionary)
+        llm = NoteLLM()
+        agent = SQLAgent(llm=llm, db=ValuesDB())
+
+        agent.ask("Giga Tires prices", llm_summary=False)
+        assert llm.prompts[0].startswith("Giga Tires prices\n\n[Exact warehouse values")
+        assert "GOOGLE_SHOPPING_SCRAPER.SELLER = 'Giga Tires'" in llm.prompts[0]
+
+        agent.ask("How many rows are there?", llm_summary=False)
+        assert llm.prompts[1] == "How many rows are there?"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
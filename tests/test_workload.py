@@ -0,0 +1,158 @@
+"""Tests for query fingerprints and the physical design advisor."""
+
+import pytest
+from app.agent import sql_agent
+from app.agent.sql_agent import SQLAgent
+from app.database.snowflake import SnowflakeClient
+from app.database.workload import WorkloadLog, fingerprint, shape
+
+
+SCRAPER = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_SHOPPING_SCRAPER"
+TRENDS = "PRIORITY_TIRE_DATA.UMIP_MOCK.GOOGLE_TRENDS_TIMESERIES"
+
+SELLER_PRICES = f"""SELECT g.SELLER, AVG(g.PRICE) AS AVG_PRICE FROM {SCRAPER} g
+WHERE g.KEYWORD = '275/60R20' AND g.SCRAPED_AT >= 1700000000 AND PRODUCT_TITLE ILIKE '%michelin%'
+GROUP BY g.SELLER ORDER BY AVG_PRICE"""
+
+
+class HistoryDB:
+    """Answers the QUERY_HISTORY backfill."""
+
+    MAX_ROWS = 1000
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute_query(self, sql, use_cache=True, timeout=None, max_rows=None):
+        assert "QUERY_HISTORY_BY_USER" in sql and max_rows == WorkloadLog.HISTORY_LIMIT
+        return self.rows
+
+
+@pytest.fixture
+def log(tmp_path):
+    return WorkloadLog(str(tmp_path / "workload.db"))
+
+
+class TestFingerprint:
+    """Test that queries differing only in values or aliases share a fingerprint."""
+
+    def test_literals_aliases_and_layout(self):
+        other = f"""select s.seller, avg(s.price) as avg_price -- per seller
+        from {SCRAPER} s where s.keyword = '225/65R17' and s.scraped_at >= 1600000000
+        and product_title ilike '%goodyear%' group by s.seller order by avg_price;"""
+        assert fingerprint(SELLER_PRICES)[0] == fingerprint(other)[0]
+        assert "WHERE T1 . KEYWORD = ? AND" in fingerprint(SELLER_PRICES)[1]
+
+    def test_in_lists_collapse(self):
+        one = f"SELECT PRICE FROM {SCRAPER} WHERE SELLER IN ('Walmart')"
+        three = f"SELECT PRICE FROM {SCRAPER} WHERE SELLER IN ('Walmart', 'Tire Rack', 'Giga Tires')"
+        assert fingerprint(one) == fingerprint(three)
+
+    def test_different_shapes_differ(self):
+        assert fingerprint(SELLER_PRICES)[0] != fingerprint(SELLER_PRICES.replace(">=", "<"))[0]
+
+
+class TestShape:
+    """Test filter, grouping and aggregate extraction."""
+
+    def test_filters_by_kind(self):
+        result = shape(SELLER_PRICES)
+        assert result["tables"] == [SCRAPER]
+        assert result["filters"] == [
+            [SCRAPER, "KEYWORD", "equality"], [SCRAPER, "SCRAPED_AT", "range"], [SCRAPER, "PRODUCT_TITLE", "substring"],
+        ]
+        assert result["group_by"] == [[SCRAPER, "SELLER"]]
+        assert result["aggregates"] == ["AVG(PRICE)"]
+
+    def test_joins_are_not_filters(self):
+        sql = (f"SELECT t.KEYWORD, SUM(t.INTEREST) FROM {TRENDS} t "
+               "JOIN PRIORITY_TIRE_DATA.UMIP_MOCK.KEYWORDS_MASTER m ON m.KEYWORD = t.KEYWORD "
+               "WHERE t.TREND_DATE BETWEEN '2024-01-01' AND '2024-06-30' AND UPPER(m.CATEGORY) = 'BRAND' "
+               "GROUP BY t.KEYWORD")
+        assert shape(sql)["filters"] == [[TRENDS, "TREND_DATE", "range"]]
+
+
+class TestAdvisor:
+    """Test ranking and recommendations."""
+
+    def test_hottest_and_backfill(self, log):
+        for i in range(3):
+            log.record(SELLER_PRICES.replace("275/60R20", f"2{i}5/65R17"), 2.0, 10, now=1000 + i)
+        key = log.record(f"SELECT COUNT(*) FROM {SCRAPER}", 0.1, 1, now=1000)
+
+        history = [
+            {"QUERY_ID": "q1", "QUERY_TEXT": SELLER_PRICES, "START_TIME": "1970-01-01T00:16:40+00:00",
+             "TOTAL_ELAPSED_TIME": 1900, "BYTES_SCANNED": 5_000_000, "PARTITIONS_SCANNED": 40,
+             "PARTITIONS_TOTAL": 50},
+            {"QUERY_ID": "q2", "QUERY_TEXT": "SELECT CURRENT_VERSION()", "START_TIME": None,
+             "TOTAL_ELAPSED_TIME": 5, "BYTES_SCANNED": 0, "PARTITIONS_SCANNED": 0, "PARTITIONS_TOTAL": 0},
+        ]
+        assert log.backfill(HistoryDB(history)) == 1
+        assert log.backfill(HistoryDB(history)) == 0
+
+        hot = log.hottest(days=1, now=2000)
+        assert [entry["executions"] for entry in hot] == [3, 1] and hot[1]["fingerprint"] == key
+        assert hot[0]["total_ms"] == 6000 and hot[0]["avg_bytes_scanned"] == 5_000_000
+        assert hot[0]["partitions_scanned_share"] == 0.8
+
+    def test_recommendations(self, log):
+        for i in range(6):
+            log.record(SELLER_PRICES.replace("275/60R20", f"2{i}5/65R17"), 2.0, 10, now=1000 + i)
+        tables = log.advise(days=1, now=2000)["tables"]
+        kinds = {rec["kind"]: rec["sql"] for rec in tables[SCRAPER]["recommendations"]}
+
+        assert kinds["clustering"] == f"ALTER TABLE {SCRAPER} CLUSTER BY (KEYWORD, SCRAPED_AT)"
+        assert kinds["search_optimization"] == f"ALTER TABLE {SCRAPER} ADD SEARCH OPTIMIZATION ON SUBSTRING(PRODUCT_TITLE)"
+        assert kinds["pre_aggregate"].startswith(
+            f"CREATE MATERIALIZED VIEW {SCRAPER}_BY_SELLER_KEYWORD_SCRAPED_AT AS SELECT SELLER, KEYWORD, "
+        )
+
+    def test_too_few_executions(self, log):
+        log.record(SELLER_PRICES, 2.0, 10, now=1000)
+        assert log.advise(days=1, now=2000)["tables"][SCRAPER]["recommendations"] == []
+
+
+class TestAgentLogsQueries:
+    """Test that warehouse executions reach the log."""
+
+    def test_executions_logged(self, log, monkeypatch):
+        class PriceDB:
+            MAX_ROWS = 1000
+
+            def execute_query(self, sql, use_cache=True, timeout=None):
+                return [{"SELLER": "Walmart", "PRICE": 120.0}]
+
+        class SQLOnlyLLM:
+            def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                         model_key=None, timeout=None):
+                return f"```sql\n{SELLER_PRICES}\n```"
+
+        monkeypatch.setattr(sql_agent, "workload", log)
+        SQLAgent(llm=SQLOnlyLLM(), db=PriceDB()).ask("Seller prices for 275/60R20")
+        log.flush()
+        [entry] = log.hottest()
+        assert entry["fingerprint"] == fingerprint(SELLER_PRICES)[0] and entry["executions"] == 1
+
+    def test_submit_does_not_wait_for_backfill(self, log):
+        with log._lock:  # Held by a backfill
+            log.submit(SELLER_PRICES, 1.0, 10)
+        log.flush()
+        assert log.hottest()[0]["executions"] == 1
+
+    def test_cache_hits_not_logged(self, log, monkeypatch):
+        db = SnowflakeClient()
+        db._cache_put(" ".join(SELLER_PRICES.split()), [{"SELLER": "Walmart", "AVG_PRICE": 120.0}])
+
+        class SQLOnlyLLM:
+            def generate(self, user_message, system_prompt, conversation_history=None, temperature=None,
+                         model_key=None, timeout=None):
+                return f"```sql\n{SELLER_PRICES}\n```"
+
+        monkeypatch.setattr(sql_agent, "workload", log)
+        result = SQLAgent(llm=SQLOnlyLLM(), db=db).ask("Seller prices for 275/60R20")
+        log.flush()
+        assert result["data"] and log.hottest() == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])